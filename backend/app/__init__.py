@@ -1,19 +1,38 @@
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 from dotenv import load_dotenv
-from app.extensions import db, cors
+from app.extensions import db, cors, cache, limiter, events, tracing, shards
+from app.utils.json_provider import get_json_provider_class
 
 load_dotenv()
 
-def create_app(config_name=None):
+def create_app(config_name=None, test_config=None):
   app = Flask(__name__)
 
   if config_name:
     app.config.from_object(f'app.config.{config_name}')
   else:
     app.config.from_object('app.config.DevelopmentConfig')
+  # Applied before any extension reads the config (e.g. the database URI)
+  if test_config:
+    app.config.update(test_config)
 
+  app.json = get_json_provider_class(app.config.get('JSON_PROVIDER'))(app)
+
+  # Only trust as many X-Forwarded-* hops as there are proxies of ours in front
+  hops = app.config.get('PROXY_FIX_HOPS', 0)
+  if hops:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+
+  # Adds the shard binds, so it goes before db.init_app
+  shards.init_app(app)
   db.init_app(app)
+  # Before the limiter, so the request span covers its token check
+  tracing.init_app(app)
+  cache.init_app(app)
+  limiter.init_app(app)
+  events.init_app(app)
 
   if app.config.get('DEBUG'):
     cors.init_app(app, resources={r"/*": {"origins": "*"}})
@@ -27,20 +46,45 @@ def create_app(config_name=None):
       }
     })
 
-  from app.models import User, Country, MarkedCountry
+  from app.models import User, Country, MarkedCountry, Job, Friendship, UserBitset, UserTimeline, UserShard, Region
 
   with app.app_context():
-    db.create_all()
-    from app.services.country_service import import_countries
+    from app.utils.sqlite_tuning import configure_sqlite
+    configure_sqlite(app, db.engine)
+    from app.migrations import ensure_schema
+    ensure_schema(app)
+    from app.services.country_service import import_countries, import_regions
     try:
       import_countries()
+      import_regions()
     except Exception:
       # Não precisa falhar o app inteiro só para importar os países :)
       pass
+    shards.ensure_schema()
+
+  if app.config.get('MARKS_WRITE_BUFFER'):
+    from app.services.write_buffer import MarkWriteBuffer
+    app.extensions['mark_buffer'] = MarkWriteBuffer(
+      app,
+      window=app.config['MARKS_WRITE_BUFFER_WINDOW'],
+      max_pending=app.config['MARKS_WRITE_BUFFER_MAX'],
+      max_failures=app.config['MARKS_WRITE_BUFFER_MAX_FAILURES']
+    )
 
   from app.api import api_bp
   app.register_blueprint(api_bp, url_prefix='/api')
 
+  from app.services import job_handlers
+  from app.commands import jobs_cli, geometry_cli, marks_cli, db_cli, shards_cli, purge_cli, admin_cli, analytics_cli
+  app.cli.add_command(jobs_cli)
+  app.cli.add_command(geometry_cli)
+  app.cli.add_command(marks_cli)
+  app.cli.add_command(db_cli)
+  app.cli.add_command(shards_cli)
+  app.cli.add_command(purge_cli)
+  app.cli.add_command(admin_cli)
+  app.cli.add_command(analytics_cli)
+
   @app.route('/health')
   def health_check():
     return {'status': 'healthy', 'message': 'Travel Map Tracker API'}, 200
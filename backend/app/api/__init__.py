@@ -8,7 +8,23 @@ api_bp = Blueprint('api', __name__)
 from .auth import auth_bp
 from .countries import countries_bp
 from .marked_countries import marked_countries_bp
+from .jobs import jobs_bp
+from .statistics import statistics_bp
+from .maps import maps_bp
+from .geometry import geometry_bp
+from .friends import friends_bp
+from .events import events_bp
+from .batch import batch_bp
+from .admin import admin_bp
 
 api_bp.register_blueprint(auth_bp, url_prefix='/auth')
 api_bp.register_blueprint(countries_bp, url_prefix='/countries')
 api_bp.register_blueprint(marked_countries_bp, url_prefix='/marked-countries')
+api_bp.register_blueprint(jobs_bp, url_prefix='/jobs')
+api_bp.register_blueprint(statistics_bp, url_prefix='/statistics')
+api_bp.register_blueprint(maps_bp, url_prefix='/maps')
+api_bp.register_blueprint(geometry_bp, url_prefix='/geometry')
+api_bp.register_blueprint(friends_bp, url_prefix='/friends')
+api_bp.register_blueprint(events_bp, url_prefix='/events')
+api_bp.register_blueprint(batch_bp)
+api_bp.register_blueprint(admin_bp, url_prefix='/admin')
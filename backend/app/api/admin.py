@@ -0,0 +1,141 @@
+import re
+from flask import Blueprint, request, jsonify
+from app.services.analytics_service import STATUSES, current_snapshot, schedule_snapshot
+from app.utils.auth import require_admin
+
+admin_bp = Blueprint('admin', __name__)
+
+MAX_TREND_CODES = 10
+MAX_MATRIX_CODES = 50
+
+def snapshot_or_error():
+  snapshot = current_snapshot()
+  if snapshot is None:
+    return None, (jsonify({'error': 'No analytics snapshot yet; run `flask analytics snapshot`'}), 404)
+  return snapshot, None
+
+def status_arg():
+  status = request.args.get('status', 'visited')
+  return status if status in STATUSES else None
+
+def limit_arg(default, maximum):
+  return min(max(request.args.get('limit', default, type=int), 1), maximum)
+
+def codes_arg():
+  return [code.strip().upper() for code in request.args.get('codes', '').split(',') if code.strip()]
+
+@admin_bp.route('/analytics/snapshot', methods=['GET'])
+@require_admin
+def get_snapshot(user):
+  try:
+    snapshot, error = snapshot_or_error()
+    if error:
+      return error
+    return jsonify(snapshot.info()), 200
+
+  except Exception as e:
+    print(f"Error reading analytics snapshot: {e}")
+    return jsonify({'error': 'Failed to read analytics snapshot'}), 500
+
+@admin_bp.route('/analytics/snapshot', methods=['POST'])
+@require_admin
+def create_snapshot(user):
+  try:
+    job = schedule_snapshot()
+    return jsonify({'message': 'Snapshot scheduled', 'job': job.to_dict()}), 202
+
+  except Exception as e:
+    print(f"Error scheduling analytics snapshot: {e}")
+    return jsonify({'error': 'Failed to schedule snapshot'}), 500
+
+@admin_bp.route('/analytics/popularity', methods=['GET'])
+@require_admin
+def get_popularity(user):
+  # Most visited (or wishlisted) countries, optionally within a continent
+  try:
+    status = status_arg()
+    if status is None:
+      return jsonify({'error': 'status must be "visited" or "wishlist"'}), 400
+    snapshot, error = snapshot_or_error()
+    if error:
+      return error
+    countries = snapshot.popularity(status, request.args.get('continent'), limit_arg(20, 300))
+    return jsonify({**snapshot.info(), 'status': status, 'countries': countries}), 200
+
+  except Exception as e:
+    print(f"Error getting popularity: {e}")
+    return jsonify({'error': 'Failed to get popularity'}), 500
+
+@admin_bp.route('/analytics/co-visitation', methods=['GET'])
+@require_admin
+def get_co_visitation(user):
+  # ?country=FR: what FR's visitors also visited; ?codes=FR,DE,IT: the co-visitation matrix of those
+  try:
+    country = request.args.get('country')
+    codes = codes_arg()
+    if bool(country) == bool(codes):
+      return jsonify({'error': 'Provide either country or codes'}), 400
+    if len(codes) > MAX_MATRIX_CODES:
+      return jsonify({'error': f'At most {MAX_MATRIX_CODES} codes'}), 400
+    snapshot, error = snapshot_or_error()
+    if error:
+      return error
+    try:
+      result = snapshot.co_visitation(country, limit_arg(10, 100)) if country else snapshot.co_visitation_matrix(codes)
+    except KeyError as e:
+      return jsonify({'error': f'Unknown country: {e.args[0]}'}), 404
+    return jsonify({**snapshot.info(), **result}), 200
+
+  except Exception as e:
+    print(f"Error getting co-visitation: {e}")
+    return jsonify({'error': 'Failed to get co-visitation'}), 500
+
+@admin_bp.route('/analytics/trends', methods=['GET'])
+@require_admin
+def get_trends(user):
+  # Marks per month or year, by the day they were marked (by=marked) or the visit start (by=visit)
+  try:
+    status = status_arg()
+    by = request.args.get('by', 'marked')
+    interval = request.args.get('interval', 'month')
+    since = request.args.get('since')
+    codes = codes_arg()
+    if status is None:
+      return jsonify({'error': 'status must be "visited" or "wishlist"'}), 400
+    if by not in ('marked', 'visit') or interval not in ('month', 'year'):
+      return jsonify({'error': 'by must be "marked" or "visit" and interval "month" or "year"'}), 400
+    if since is not None and not re.fullmatch(r'\d{4}(-\d{2})?', since):
+      return jsonify({'error': 'since must be YYYY or YYYY-MM'}), 400
+    if len(codes) > MAX_TREND_CODES:
+      return jsonify({'error': f'At most {MAX_TREND_CODES} codes'}), 400
+    snapshot, error = snapshot_or_error()
+    if error:
+      return error
+    try:
+      trends = snapshot.trends(codes, status, by, interval, since)
+    except KeyError as e:
+      return jsonify({'error': f'Unknown country: {e.args[0]}'}), 404
+    return jsonify({**snapshot.info(), 'status': status, 'by': by, 'interval': interval, **trends}), 200
+
+  except Exception as e:
+    print(f"Error getting trends: {e}")
+    return jsonify({'error': 'Failed to get trends'}), 500
+
+@admin_bp.route('/analytics/trends/rising', methods=['GET'])
+@require_admin
+def get_rising(user):
+  # Countries marked more in the last `window` months than in the `window` months before
+  try:
+    status = status_arg()
+    if status is None:
+      return jsonify({'error': 'status must be "visited" or "wishlist"'}), 400
+    window = min(max(request.args.get('window', 3, type=int), 1), 24)
+    snapshot, error = snapshot_or_error()
+    if error:
+      return error
+    countries = snapshot.rising(status, window, limit_arg(10, 100))
+    return jsonify({**snapshot.info(), 'status': status, 'window': window, 'countries': countries}), 200
+
+  except Exception as e:
+    print(f"Error getting rising countries: {e}")
+    return jsonify({'error': 'Failed to get rising countries'}), 500
@@ -1,24 +1,37 @@
 from flask import Blueprint, request, jsonify, current_app
 from datetime import datetime, timezone
 import requests
-from app.models import User, MarkedCountry
-from app.extensions import db
+from app.models import User
+from app.extensions import db, shards
+from app.services.purge_service import request_deletion
 from app.utils.validators import validate_email
 from app.utils.auth import generate_token, verify_token, get_user_from_request
+from app.utils.tracing import KIND_CLIENT, inject, span
 
 auth_bp = Blueprint('auth', __name__)
 
+GOOGLE_TOKENINFO_URL = 'https://www.googleapis.com/oauth2/v3/tokeninfo'
+
 def verify_google_token(id_token):
-  try:
-    response = requests.get(
-      f'https://www.googleapis.com/oauth2/v3/tokeninfo?id_token={id_token}'
-    )
-    if response.status_code == 200:
-      return response.json()
-    return None
-  except Exception as e:
-    print(f"Error verifying Google token: {e}")
-    return None
+  # The URL is recorded without its query string: it carries the token
+  with span('auth.google_verify', KIND_CLIENT, **{
+    'http.request.method': 'GET',
+    'url.full': GOOGLE_TOKENINFO_URL,
+    'server.address': 'www.googleapis.com'
+  }) as google_span:
+    try:
+      response = requests.get(
+        f'{GOOGLE_TOKENINFO_URL}?id_token={id_token}',
+        headers=inject({})
+      )
+      google_span.set_attribute('http.response.status_code', response.status_code)
+      if response.status_code == 200:
+        return response.json()
+      return None
+    except Exception as e:
+      google_span.record_exception(e)
+      print(f"Error verifying Google token: {e}")
+      return None
 
 def get_or_create_user_from_google(google_info):
   email = google_info.get('email')
@@ -56,6 +69,7 @@ def get_or_create_user_from_google(google_info):
   )
   db.session.add(user)
   db.session.commit()
+  shards.assign(user.id)
   return user
 
 @auth_bp.route('/google/verify', methods=['POST'])
@@ -108,17 +122,15 @@ def get_current_user():
 @auth_bp.route('/users/me', methods=['PUT', 'DELETE'])
 def manage_current_user():
   try:
-    user, error_response, status_code = get_user_from_request()
+    # Repeating the DELETE returns the pending deletion instead of a 401
+    user, error_response, status_code = get_user_from_request(allow_deleted=request.method == 'DELETE')
     if error_response:
       return error_response, status_code
 
     if request.method == 'DELETE':
-      MarkedCountry.query.filter_by(user_id=user.id).delete()
-
-      db.session.delete(user)
-      db.session.commit()
+      job = request_deletion(user)
 
-      return jsonify({'message': 'Account deleted successfully'}), 200
+      return jsonify({'message': 'Account deletion scheduled', 'job': job.to_dict()}), 202
 
     elif request.method == 'PUT':
       data = request.get_json()
@@ -131,7 +143,7 @@ def manage_current_user():
         if not validate_email(new_email):
           return jsonify({'error': 'Invalid email format'}), 400
 
-        existing_user = User.query.filter_by(email=new_email).first()
+        existing_user = User.query.filter(db.func.lower(User.email) == new_email.lower()).first()
         if existing_user and existing_user.id != user.id:
           return jsonify({'error': 'Email already taken'}), 400
 
@@ -0,0 +1,103 @@
+from flask import Blueprint, request, jsonify, current_app, g
+from app.utils.auth import get_user_from_request
+
+batch_bp = Blueprint('batch', __name__)
+
+# What the home page needs before the map can paint
+BOOTSTRAP_REQUESTS = [
+  ('me', '/api/auth/me'),
+  ('countries', '/api/countries'),
+  ('marked_countries', '/api/marked-countries/my')
+]
+
+# Endpoints that can't run inside a batch: batches themselves and the (long-lived) event stream
+EXCLUDED_PREFIXES = ('/api/batch', '/api/bootstrap', '/api/events')
+
+def sub_request_error(path):
+  if not isinstance(path, str) or not path.startswith('/api/'):
+    return 'path must start with /api/'
+  if path.split('?', 1)[0].startswith(EXCLUDED_PREFIXES):
+    return 'path cannot be used in a batch'
+  return None
+
+def dispatch(path, headers):
+  """
+  Runs GET `path` as a sub-request of the current one and returns (status, JSON body bytes).
+
+  The sub-request's context reuses the current app context, so every
+  sub-request shares `g` (the verified token and, through g.batch_auth, the
+  user) and the same SQLAlchemy session. Rate limits still apply per endpoint.
+  """
+  outer_rate_limit = g.get('rate_limit')
+  with current_app.test_request_context(path, method='GET', headers=headers, environ_base={
+    'REMOTE_ADDR': request.remote_addr
+  }):
+    response = current_app.full_dispatch_request()
+  g.rate_limit = outer_rate_limit
+  if response.mimetype != 'application/json':
+    return 406, current_app.json.dumps({'error': 'Not a JSON endpoint'}).encode('utf-8')
+  return response.status_code, response.get_data()
+
+def run_batch(sub_requests):
+  # [(id, path)] -> one JSON response; bodies are spliced in as produced, never decoded and re-encoded
+  user, error_response, status_code = get_user_from_request()
+  if error_response:
+    return error_response, status_code
+
+  headers = {'Authorization': request.headers['Authorization']}
+  dumps = current_app.json.dumps
+  g.batch_auth = (headers['Authorization'].split(' ')[1], user)
+  try:
+    parts = []
+    for request_id, path in sub_requests:
+      status, body = dispatch(path, headers)
+      parts.append(b'%s:{"status":%d,"body":%s}' % (dumps(request_id).encode('utf-8'), status, body))
+  finally:
+    g.pop('batch_auth', None)
+
+  return current_app.response_class(b'{"responses":{%s}}' % b','.join(parts), mimetype='application/json')
+
+@batch_bp.route('/batch', methods=['POST'])
+def batch():
+  """
+  Several read-only API calls in one round trip.
+
+  Body: {"requests": [{"id": "me", "path": "/api/auth/me"}, ...]} (GET only).
+  Returns {"responses": {"me": {"status": 200, "body": {...}}, ...}}; a failing
+  sub-request only fails its own entry.
+  """
+  try:
+    data = request.get_json(silent=True) or {}
+    sub_requests = data.get('requests')
+    if not isinstance(sub_requests, list) or not sub_requests:
+      return jsonify({'error': 'requests must be a non-empty list'}), 400
+    if len(sub_requests) > current_app.config.get('BATCH_MAX_REQUESTS', 10):
+      return jsonify({'error': f'At most {current_app.config.get("BATCH_MAX_REQUESTS", 10)} requests per batch'}), 400
+
+    parsed = []
+    for item in sub_requests:
+      if not isinstance(item, dict) or not isinstance(item.get('id'), str):
+        return jsonify({'error': 'Each request needs a string id and a path'}), 400
+      if item.get('method', 'GET').upper() != 'GET':
+        return jsonify({'error': 'Only GET requests can be batched'}), 400
+      error = sub_request_error(item.get('path'))
+      if error:
+        return jsonify({'error': f'{item["id"]}: {error}'}), 400
+      parsed.append((item['id'], item['path']))
+    if len({request_id for request_id, _ in parsed}) != len(parsed):
+      return jsonify({'error': 'Request ids must be unique'}), 400
+
+    return run_batch(parsed)
+
+  except Exception as e:
+    print(f"Error running batch: {e}")
+    return jsonify({'error': 'Failed to run batch'}), 500
+
+@batch_bp.route('/bootstrap', methods=['GET'])
+def bootstrap():
+  # The home page's first three calls (user, countries, marks) as one batch
+  try:
+    return run_batch(BOOTSTRAP_REQUESTS)
+  except Exception as e:
+    print(f"Error running bootstrap: {e}")
+    return jsonify({'error': 'Failed to load'}), 500
@@ -1,6 +1,9 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from app.models import Country
-from app.extensions import db
+from app.extensions import db, cache
+from app.services.bitset_service import CATALOG_SIZES, CATALOG_VERSION, catalog_codes
+from app.services import catalog_service
+from app.services.region_service import find_region, get_region_tree
 
 countries_bp = Blueprint('countries', __name__)
 
@@ -9,21 +12,50 @@ def get_countries():
   try:
     continent = request.args.get('continent')
     search = request.args.get('search')
+    subregion = request.args.get('subregion')
 
-    query = Country.query
+    if not search and not subregion:
+      # Serialized once per process (or once before fork), see catalog_service
+      return current_app.response_class(catalog_service.get_catalog().payload(continent or None), mimetype='application/json')
 
-    if continent:
-      query = query.filter_by(continent=continent)
+    codes = None
+    if subregion:
+      region = find_region(subregion, 'subregion')
+      if region is None:
+        return jsonify({'error': 'Unknown subregion'}), 400
+      codes = region.codes
 
-    if search:
-      query = query.filter(Country.name.ilike(f'%{search}%'))
-
-    countries = query.all()
-    return jsonify([country.to_dict() for country in countries]), 200
+    countries = cache.get_or_set(
+      f'list:{continent or ""}:{subregion or ""}:{search or ""}',
+      lambda: [Country.row_to_dict(row) for row in Country.list_rows(continent=continent, search=search, codes=codes)],
+      namespace='countries'
+    )
+    return jsonify(countries), 200
   except Exception as e:
     print(f"Error getting countries: {e}")
     return jsonify({'error': 'Failed to get countries'}), 500
 
+@countries_bp.route('/catalog', methods=['GET'])
+def get_catalog():
+  # Bit ordering used by map states; a given version never changes, so it can be cached for good
+  version = request.args.get('version', CATALOG_VERSION, type=int)
+  if version not in CATALOG_SIZES:
+    return jsonify({'error': 'Unknown catalog version'}), 404
+
+  response = jsonify({'version': version, 'codes': list(catalog_codes(version))})
+  if 'version' in request.args:
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+  else:
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+  return response
+
+@countries_bp.route('/regions', methods=['GET'])
+def get_regions():
+  # Continent -> subregion -> country codes; static per deploy
+  response = jsonify(get_region_tree().to_dict(include_codes=True))
+  response.headers['Cache-Control'] = 'public, max-age=3600'
+  return response
+
 @countries_bp.route('/<int:country_id>', methods=['GET'])
 def get_country(country_id):
   try:
@@ -0,0 +1,95 @@
+import time
+from flask import Blueprint, Response, request, jsonify, current_app
+from app.extensions import db, events
+from app.models import User
+from app.utils.auth import generate_stream_ticket, require_auth, verify_request_token, verify_stream_ticket
+from app.utils.events import format_event
+
+events_bp = Blueprint('events', __name__)
+
+def stream_identity():
+  # -> (user_id, error). EventSource can't send headers, so browsers pass a ticket (see /ticket) as ?ticket=
+  auth_header = request.headers.get('Authorization')
+  if auth_header:
+    parts = auth_header.split(' ')
+    return verify_request_token(parts[1]) if len(parts) > 1 else (None, 'missing')
+  ticket = request.args.get('ticket')
+  if ticket:
+    return verify_stream_ticket(ticket)
+  return None, 'missing'
+
+def last_event_id():
+  value = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+  if value is None:
+    return None
+  try:
+    return max(int(value), 0)
+  except ValueError:
+    return None
+
+@events_bp.route('/ticket', methods=['POST'])
+@require_auth
+def ticket(user):
+  """
+  Short-lived ticket for /stream?ticket=. A URL ends up in proxy and access
+  logs, so it carries this instead of the JWT: it expires after
+  EVENTS_TICKET_SECONDS and opens nothing but the user's stream. `ticket` is
+  null when streams are off (EVENTS_STREAM_ENABLED).
+  """
+  if not current_app.config.get('EVENTS_STREAM_ENABLED', True):
+    return jsonify({'ticket': None}), 200
+  seconds = current_app.config.get('EVENTS_TICKET_SECONDS', 60)
+  return jsonify({'ticket': generate_stream_ticket(user.id, seconds), 'expires_in': seconds}), 200
+
+@events_bp.route('/stream', methods=['GET'])
+def stream():
+  """
+  Server-sent events with the current user's mark changes (`mark`, `unmark`,
+  `sync`, and `reset` when the client must refetch everything).
+
+  Holds no database connection: the user is looked up once, to turn away
+  deleted accounts, and the session is torn down with the request's app
+  context, which Flask pops before the body streams.
+  Streams end after EVENTS_STREAM_MAX_SECONDS and the browser reconnects with
+  Last-Event-ID, which replays whatever it missed. With EVENTS_STREAM_ENABLED
+  off it answers 204, which tells EventSource to stop reconnecting.
+  """
+  if not current_app.config.get('EVENTS_STREAM_ENABLED', True):
+    return '', 204
+  user_id, token_error = stream_identity()
+  if token_error == 'missing':
+    return jsonify({'error': 'Authorization is required'}), 401
+  if not user_id:
+    if token_error == 'expired':
+      return jsonify({'error': 'Token has expired'}), 401
+    return jsonify({'error': 'Invalid token'}), 401
+  found = db.session.execute(db.select(User.deleted_at).where(User.id == user_id)).first()
+  if found is None:
+    return jsonify({'error': 'User not found'}), 404
+  if found.deleted_at is not None:
+    return jsonify({'error': 'Account has been deleted'}), 401
+
+  heartbeat = current_app.config.get('EVENTS_HEARTBEAT_SECONDS', 15)
+  max_seconds = current_app.config.get('EVENTS_STREAM_MAX_SECONDS', 300)
+  subscription = events.subscribe(user_id, last_event_id())
+
+  def generate():
+    try:
+      yield 'retry: 3000\n\n'
+      deadline = time.monotonic() + max_seconds
+      while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+          return
+        pending = subscription.wait(min(heartbeat, remaining))
+        if pending:
+          yield ''.join(format_event(event) for event in pending)
+        else:
+          yield ': keep-alive\n\n'
+    finally:
+      subscription.close()
+
+  response = Response(generate(), mimetype='text/event-stream')
+  response.headers['Cache-Control'] = 'no-cache'
+  response.headers['X-Accel-Buffering'] = 'no'
+  return response
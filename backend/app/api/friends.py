@@ -0,0 +1,157 @@
+from flask import Blueprint, request, jsonify
+from app.models import User, Friendship
+from app.extensions import db
+from app.services.friends_service import compare_users, similar_travelers
+from app.utils.auth import get_user_from_request
+
+friends_bp = Blueprint('friends', __name__)
+
+MAX_COMPARE = 10
+
+def user_summary(user):
+  return {'id': user.id, 'name': user.name, 'email': user.email}
+
+@friends_bp.route('', methods=['GET'])
+def list_friends():
+  try:
+    user, error_response, status_code = get_user_from_request()
+    if error_response:
+      return error_response, status_code
+
+    friendships = Friendship.query.filter(
+      db.or_(Friendship.user_id == user.id, Friendship.friend_id == user.id)
+    ).all()
+    other_ids = [f.friend_id if f.user_id == user.id else f.user_id for f in friendships]
+    users = {other.id: other for other in User.query.filter(User.id.in_(other_ids)).all()}
+
+    # Requests the user sent are not listed: that would tell which emails have an account
+    result = {'friends': [], 'incoming': []}
+    for friendship, other_id in zip(friendships, other_ids):
+      if friendship.status == 'accepted':
+        result['friends'].append(user_summary(users[other_id]))
+      elif friendship.friend_id == user.id:
+        result['incoming'].append(user_summary(users[other_id]))
+    return jsonify(result), 200
+
+  except Exception as e:
+    print(f"Error listing friends: {e}")
+    return jsonify({'error': 'Failed to list friends'}), 500
+
+@friends_bp.route('', methods=['POST'])
+def add_friend():
+  try:
+    user, error_response, status_code = get_user_from_request()
+    if error_response:
+      return error_response, status_code
+
+    data = request.get_json() or {}
+    email = data.get('email')
+    if not isinstance(email, str) or not email.strip():
+      return jsonify({'error': 'email is required'}), 400
+
+    if email.strip().lower() == (user.email or '').lower():
+      return jsonify({'error': 'You cannot add yourself'}), 400
+
+    # Unknown emails get the same answer as a sent request, so this cannot be used to find out who has an account
+    other = User.query.filter(db.func.lower(User.email) == email.strip().lower()).first()
+    sent = jsonify({'message': 'Friend request sent', 'status': 'pending'}), 202
+    if not other:
+      return sent
+
+    friendship = Friendship.between(user.id, other.id)
+    if friendship is None:
+      friendship = Friendship(user_id=user.id, friend_id=other.id)
+      db.session.add(friendship)
+    elif friendship.status == 'pending' and friendship.friend_id == user.id:
+      # They already asked: adding them back accepts
+      friendship.status = 'accepted'
+    db.session.commit()
+
+    if friendship.status == 'accepted':
+      return jsonify({'user': user_summary(other), 'status': friendship.status}), 200
+    return sent
+
+  except Exception as e:
+    db.session.rollback()
+    print(f"Error adding friend: {e}")
+    return jsonify({'error': 'Failed to add friend'}), 500
+
+@friends_bp.route('/<int:user_id>/accept', methods=['POST'])
+def accept_friend(user_id):
+  try:
+    user, error_response, status_code = get_user_from_request()
+    if error_response:
+      return error_response, status_code
+
+    friendship = Friendship.query.filter_by(user_id=user_id, friend_id=user.id).first()
+    if not friendship:
+      return jsonify({'error': 'Friend request not found'}), 404
+
+    friendship.status = 'accepted'
+    db.session.commit()
+    return jsonify({'status': friendship.status}), 200
+
+  except Exception as e:
+    db.session.rollback()
+    print(f"Error accepting friend: {e}")
+    return jsonify({'error': 'Failed to accept friend request'}), 500
+
+@friends_bp.route('/<int:user_id>', methods=['DELETE'])
+def remove_friend(user_id):
+  try:
+    user, error_response, status_code = get_user_from_request()
+    if error_response:
+      return error_response, status_code
+
+    friendship = Friendship.between(user.id, user_id)
+    if not friendship:
+      return jsonify({'error': 'Friend not found'}), 404
+
+    db.session.delete(friendship)
+    db.session.commit()
+    return jsonify({'message': 'Friend removed'}), 200
+
+  except Exception as e:
+    db.session.rollback()
+    print(f"Error removing friend: {e}")
+    return jsonify({'error': 'Failed to remove friend'}), 500
+
+@friends_bp.route('/compare', methods=['GET'])
+def compare_with_friends():
+  try:
+    user, error_response, status_code = get_user_from_request()
+    if error_response:
+      return error_response, status_code
+
+    try:
+      other_ids = list(dict.fromkeys(int(value) for value in request.args.get('user_ids', '').split(',') if value))
+    except ValueError:
+      return jsonify({'error': 'user_ids must be a comma-separated list of ids'}), 400
+    if not other_ids or len(other_ids) > MAX_COMPARE:
+      return jsonify({'error': f'Provide between 1 and {MAX_COMPARE} user_ids'}), 400
+
+    friend_ids = Friendship.friend_ids(user.id)
+    if any(other_id not in friend_ids for other_id in other_ids):
+      return jsonify({'error': 'You can only compare with friends'}), 403
+
+    return jsonify(compare_users(user.id, other_ids)), 200
+
+  except Exception as e:
+    print(f"Error comparing with friends: {e}")
+    return jsonify({'error': 'Failed to compare'}), 500
+
+@friends_bp.route('/suggestions', methods=['GET'])
+def get_suggestions():
+  try:
+    user, error_response, status_code = get_user_from_request()
+    if error_response:
+      return error_response, status_code
+
+    # Only friends of friends: strangers are never listed, and the candidates stay few
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    candidates = Friendship.friends_of_friends(user.id)
+    return jsonify(similar_travelers(user.id, candidates, limit=limit)), 200
+
+  except Exception as e:
+    print(f"Error getting suggestions: {e}")
+    return jsonify({'error': 'Failed to get suggestions'}), 500
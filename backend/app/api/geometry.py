@@ -0,0 +1,106 @@
+import math
+import numpy as np
+from flask import Blueprint, request, jsonify, current_app, url_for
+from app.extensions import db
+from app.models import Country
+from app.services.geocoding_service import locate_points
+from app.services.topology_service import LODS, country_bounds, load_topology
+
+geometry_bp = Blueprint('geometry', __name__)
+
+# Versioned URLs (?v=<hash>) never change content, so browsers and CDNs can keep them for a year
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=86400'
+
+@geometry_bp.route('', methods=['GET'])
+def get_geometry_index():
+  lods = {}
+  for lod, (tolerance, quantization) in LODS.items():
+    raw, compressed, digest = load_topology(lod)
+    lods[lod] = {
+      'url': url_for('api.geometry.get_topology', lod=lod, v=digest),
+      'tolerance': tolerance,
+      'quantization': quantization,
+      'bytes': len(raw),
+      'gzip_bytes': len(compressed)
+    }
+  return jsonify({'lods': lods}), 200
+
+@geometry_bp.route('/<lod>.json', methods=['GET'])
+def get_topology(lod):
+  if lod not in LODS:
+    return jsonify({'error': f'lod must be one of {", ".join(LODS)}'}), 404
+
+  raw, compressed, digest = load_topology(lod)
+  if request.if_none_match.contains(digest):
+    response = current_app.response_class(status=304)
+  elif 'gzip' in request.accept_encodings:
+    response = current_app.response_class(compressed, mimetype='application/json')
+    response.headers['Content-Encoding'] = 'gzip'
+  else:
+    response = current_app.response_class(raw, mimetype='application/json')
+
+  response.set_etag(digest)
+  response.vary.add('Accept-Encoding')
+  response.headers['Cache-Control'] = IMMUTABLE if request.args.get('v') == digest else REVALIDATE
+  return response
+
+@geometry_bp.route('/bounds', methods=['GET'])
+def get_bounds():
+  response = jsonify(country_bounds())
+  response.headers['Cache-Control'] = REVALIDATE
+  return response
+
+@geometry_bp.route('/bounds/<code>', methods=['GET'])
+def get_country_bounds(code):
+  bounds = country_bounds().get(code.upper())
+  if bounds is None:
+    return jsonify({'error': 'Country not found'}), 404
+  response = jsonify({'code': code.upper(), **bounds})
+  response.headers['Cache-Control'] = REVALIDATE
+  return response
+
+def valid_point(lat, lon):
+  return math.isfinite(lat) and math.isfinite(lon) and -90 <= lat <= 90 and -180 <= lon <= 180
+
+def country_ids(codes):
+  codes = {code for code in codes if code}
+  if not codes:
+    return {}
+  return dict(db.session.execute(db.select(Country.code, Country.id).where(Country.code.in_(codes))).all())
+
+@geometry_bp.route('/locate', methods=['GET'])
+def locate():
+  lat = request.args.get('lat', type=float)
+  lon = request.args.get('lon', type=float)
+  if lat is None or lon is None or not valid_point(lat, lon):
+    return jsonify({'error': 'lat and lon are required (-90..90, -180..180)'}), 400
+
+  code = locate_points([(lat, lon)])[0]
+  return jsonify({'lat': lat, 'lon': lon, 'code': code, 'country_id': country_ids([code]).get(code)}), 200
+
+@geometry_bp.route('/locate', methods=['POST'])
+def locate_batch():
+  """Body: {"points": [[lat, lon], ...]}. Codes come back in the same order, null over sea."""
+  data = request.get_json(silent=True)
+  if not isinstance(data, dict):
+    return jsonify({'error': 'Body must be a JSON object with points'}), 400
+  points = data.get('points')
+  if not isinstance(points, list):
+    return jsonify({'error': 'points must be a list of [lat, lon] pairs'}), 400
+
+  max_points = current_app.config.get('GEOCODING_MAX_POINTS', 10000)
+  if len(points) > max_points:
+    return jsonify({'error': f'At most {max_points} points per request'}), 400
+
+  try:
+    array = np.asarray(points, dtype=float) if points else np.empty((0, 2))
+  except (TypeError, ValueError):
+    array = None
+  if array is None or array.ndim != 2 or array.shape[1] != 2:
+    return jsonify({'error': 'points must be a list of [lat, lon] pairs'}), 400
+  if not (np.isfinite(array).all() and (np.abs(array[:, 0]) <= 90).all() and (np.abs(array[:, 1]) <= 180).all()):
+    return jsonify({'error': 'lat must be within -90..90 and lon within -180..180'}), 400
+
+  codes = locate_points(array)
+  return jsonify({'codes': codes, 'country_ids': country_ids(codes)}), 200
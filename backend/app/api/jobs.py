@@ -0,0 +1,82 @@
+from flask import Blueprint, request, jsonify, current_app
+from app.models import Job
+from app.extensions import db
+from app.services.job_service import enqueue
+from app.services.marks_service import flush_buffered_marks
+from app.utils.auth import get_user_from_request
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('', methods=['GET'])
+def list_my_jobs():
+  try:
+    user, error_response, status_code = get_user_from_request()
+    if error_response:
+      return error_response, status_code
+
+    jobs = Job.get_user_jobs(user.id)
+    return jsonify([job.to_dict(include_result=False) for job in jobs]), 200
+
+  except Exception as e:
+    print(f"Error listing jobs: {e}")
+    return jsonify({'error': 'Failed to list jobs'}), 500
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+  try:
+    user, error_response, status_code = get_user_from_request()
+    if error_response:
+      return error_response, status_code
+
+    job = db.session.get(Job, job_id)
+    if not job or job.user_id != user.id:
+      return jsonify({'error': 'Job not found'}), 404
+
+    return jsonify(job.to_dict()), 200
+
+  except Exception as e:
+    print(f"Error getting job: {e}")
+    return jsonify({'error': 'Failed to get job'}), 500
+
+@jobs_bp.route('/exports', methods=['POST'])
+def create_export():
+  try:
+    user, error_response, status_code = get_user_from_request()
+    if error_response:
+      return error_response, status_code
+
+    flush_buffered_marks(user.id)
+    job = enqueue('export_marks', user_id=user.id)
+    return jsonify({'message': 'Export scheduled', 'job': job.to_dict()}), 202
+
+  except Exception as e:
+    print(f"Error scheduling export: {e}")
+    db.session.rollback()
+    return jsonify({'error': 'Failed to schedule export'}), 500
+
+@jobs_bp.route('/imports', methods=['POST'])
+def create_import():
+  try:
+    user, error_response, status_code = get_user_from_request()
+    if error_response:
+      return error_response, status_code
+
+    data = request.get_json()
+    marked_countries = data.get('marked_countries') if data else None
+
+    if not isinstance(marked_countries, list) or not all(isinstance(entry, dict) for entry in marked_countries):
+      return jsonify({'error': 'marked_countries must be a list of objects'}), 400
+
+    max_entries = current_app.config.get('JOBS_IMPORT_MAX_ENTRIES', 1000)
+    if len(marked_countries) > max_entries:
+      return jsonify({'error': f'At most {max_entries} marked countries per import'}), 400
+
+    # Buffered clicks happened before the import, so they must not land on top of it
+    flush_buffered_marks(user.id)
+    job = enqueue('import_marks', payload={'marked_countries': marked_countries}, user_id=user.id)
+    return jsonify({'message': 'Import scheduled', 'job': job.to_dict()}), 202
+
+  except Exception as e:
+    print(f"Error scheduling import: {e}")
+    db.session.rollback()
+    return jsonify({'error': 'Failed to schedule import'}), 500
@@ -0,0 +1,57 @@
+import base64
+import hashlib
+from flask import Blueprint, request, jsonify, current_app
+from app.extensions import cache
+from app.services.bitset_service import map_state_statuses
+from app.services.marks_service import get_map_state
+from app.services.map_render_service import ALLOWED_WIDTHS, MAP_THEMES, RENDER_VERSION, render_png, render_svg
+from app.utils.auth import get_user_from_request
+
+maps_bp = Blueprint('maps', __name__)
+
+MIMETYPES = {'svg': 'image/svg+xml', 'png': 'image/png'}
+
+def render_cached(fmt, state, width, theme, digest):
+  # Keyed by the map state, not the user: identical maps are rendered once
+  ttl = current_app.config.get('MAP_RENDER_CACHE_TTL', 86400)
+  if fmt == 'svg':
+    return cache.get_or_set(f'map:{digest}', lambda: render_svg(map_state_statuses(state), width, theme), ttl=ttl).encode('utf-8')
+  encoded = cache.get_or_set(
+    f'map:{digest}',
+    lambda: base64.b64encode(render_png(map_state_statuses(state), width, theme)).decode('ascii'),
+    ttl=ttl
+  )
+  return base64.b64decode(encoded)
+
+@maps_bp.route('/my.<any(svg, png):fmt>', methods=['GET'])
+def get_my_map(fmt):
+  try:
+    user, error_response, status_code = get_user_from_request()
+    if error_response:
+      return error_response, status_code
+
+    theme = request.args.get('theme', 'light')
+    if theme not in MAP_THEMES:
+      return jsonify({'error': f'theme must be one of {", ".join(MAP_THEMES)}'}), 400
+
+    width = request.args.get('width', 1024, type=int)
+    if width not in ALLOWED_WIDTHS:
+      return jsonify({'error': f'width must be one of {", ".join(map(str, ALLOWED_WIDTHS))}'}), 400
+
+    state = get_map_state(user.id)
+    digest = hashlib.sha1(f'{RENDER_VERSION}:{fmt}:{width}:{theme}:{state}'.encode('utf-8')).hexdigest()
+
+    if request.if_none_match.contains(digest):
+      response = current_app.response_class(status=304)
+    else:
+      response = current_app.response_class(
+        render_cached(fmt, state, width, theme, digest),
+        mimetype=MIMETYPES[fmt]
+      )
+    response.set_etag(digest)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+  except Exception as e:
+    print(f"Error rendering map: {e}")
+    return jsonify({'error': 'Failed to render map'}), 500
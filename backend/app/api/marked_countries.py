@@ -1,11 +1,27 @@
-from flask import Blueprint, request, jsonify
-from app.models import MarkedCountry, Country
-from app.extensions import db
+from flask import Blueprint, request, jsonify, current_app
+from app.models import MarkedCountry
+from app.extensions import db, events
 from app.utils.auth import get_user_from_request
-from datetime import datetime, timezone, date
+from app.utils.validators import parse_iso_date
+from app.services.bitset_service import CATALOG_VERSION
+from app.services.country_service import get_country_catalog
+from app.services.marks_service import (
+  flush_buffered_marks, get_map_state, get_mark_buffer, get_user_marks, marks_changed, record_mark_changes, upsert_mark
+)
+from datetime import datetime
 
 marked_countries_bp = Blueprint('marked_countries', __name__)
 
+def publish_mark(user_id, country_id, country, status, start_date, end_date):
+  # Tells the user's other open tabs and devices (GET /api/events/stream)
+  events.publish(user_id, 'mark', {
+    'country_id': country_id,
+    'country_code': country[1],
+    'status': status,
+    'visit_start_date': start_date.isoformat() if start_date else None,
+    'visit_end_date': end_date.isoformat() if end_date else None
+  })
+
 @marked_countries_bp.route('/mark', methods=['POST'])
 def mark_country():
   try:
@@ -25,7 +41,11 @@ def mark_country():
     if status not in ['visited', 'wishlist']:
       return jsonify({'error': 'status must be "visited" or "wishlist"'}), 400
 
-    country = Country.query.get(country_id)
+    try:
+      country_id = int(country_id)
+    except (TypeError, ValueError):
+      return jsonify({'error': 'Country not found'}), 404
+    country = get_country_catalog().get(country_id)
     if not country:
       return jsonify({'error': 'Country not found'}), 404
 
@@ -34,13 +54,13 @@ def mark_country():
     end_date = None
     if visit_start_date:
       try:
-        start_date = datetime.fromisoformat(visit_start_date.replace('Z', '+00:00')).date()
+        start_date = parse_iso_date(visit_start_date)
       except (ValueError, AttributeError):
         return jsonify({'error': 'Invalid visit_start_date format. Use ISO format (YYYY-MM-DD)'}), 400
 
     if visit_end_date:
       try:
-        end_date = datetime.fromisoformat(visit_end_date.replace('Z', '+00:00')).date()
+        end_date = parse_iso_date(visit_end_date)
       except (ValueError, AttributeError):
         return jsonify({'error': 'Invalid visit_end_date format. Use ISO format (YYYY-MM-DD)'}), 400
 
@@ -48,27 +68,27 @@ def mark_country():
     if start_date and end_date and start_date > end_date:
       return jsonify({'error': 'visit_start_date cannot be after visit_end_date'}), 400
 
-    existing_mark = MarkedCountry.get_by_user_and_country(user.id, country_id)
-
-    if existing_mark:
-      existing_mark.status = status
-      existing_mark.visit_start_date = start_date
-      existing_mark.visit_end_date = end_date
-      existing_mark.updated_at = datetime.now(timezone.utc)
-      db.session.commit()
-      return jsonify({'message': 'Country status updated', 'marked_country': existing_mark.to_dict()}), 200
-
-    marked_country = MarkedCountry(
-      user_id=user.id,
-      country_id=country_id,
-      status=status,
-      visit_start_date=start_date,
-      visit_end_date=end_date
-    )
-    db.session.add(marked_country)
-    db.session.commit()
-
-    return jsonify({'message': 'Country marked successfully', 'marked_country': marked_country.to_dict()}), 201
+    buffer = get_mark_buffer()
+    if buffer is not None:
+      # Written within MARKS_WRITE_BUFFER_WINDOW seconds, together with the user's other clicks
+      marked_at = buffer.add(user.id, country_id, status, start_date, end_date)
+      publish_mark(user.id, country_id, country, status, start_date, end_date)
+      marked_country = MarkedCountry.row_to_dict((
+        None, user.id, country_id, *country, status, start_date, end_date, marked_at, marked_at
+      ))
+      return jsonify({'message': 'Country mark accepted', 'marked_country': marked_country}), 202
+
+    row, created = upsert_mark(user.id, country_id, status, start_date, end_date)
+    marks_changed(user.id)
+    publish_mark(user.id, country_id, country, status, start_date, end_date)
+
+    marked_country = MarkedCountry.row_to_dict((
+      row.id, row.user_id, row.country_id, *country, row.status,
+      row.visit_start_date, row.visit_end_date, row.created_at, row.updated_at
+    ))
+    if created:
+      return jsonify({'message': 'Country marked successfully', 'marked_country': marked_country}), 201
+    return jsonify({'message': 'Country status updated', 'marked_country': marked_country}), 200
 
   except Exception as e:
     print(f"Error marking country: {e}")
@@ -92,6 +112,8 @@ def unmark_country():
     if status and status not in ['visited', 'wishlist']:
       return jsonify({'error': 'status must be "visited" or "wishlist"'}), 400
 
+    flush_buffered_marks(user.id)
+
     existing_mark = MarkedCountry.get_by_user_and_country(user.id, country_id)
 
     if not existing_mark:
@@ -100,8 +122,12 @@ def unmark_country():
     if status and existing_mark.status != status:
       return jsonify({'error': f'Country is not marked as {status}'}), 400
 
+    country_id = existing_mark.country_id
     db.session.delete(existing_mark)
+    record_mark_changes(user.id, {country_id: None})
     db.session.commit()
+    marks_changed(user.id)
+    events.publish(user.id, 'unmark', {'country_id': country_id, 'country_code': get_country_catalog().get(country_id, (None, None))[1]})
 
     return jsonify({'message': 'Country unmarked successfully'}), 200
 
@@ -119,9 +145,7 @@ def get_my_marked_countries():
 
     status = request.args.get('status')
 
-    marked_countries = MarkedCountry.get_user_marked_countries(user.id, status)
-
-    return jsonify([mc.to_dict() for mc in marked_countries]), 200
+    return jsonify(get_user_marks(user.id, status)), 200
 
   except Exception as e:
     print(f"Error getting marked countries: {e}")
@@ -134,9 +158,7 @@ def get_my_visited_countries():
     if error_response:
       return error_response, status_code
 
-    marked_countries = MarkedCountry.get_user_marked_countries(user.id, 'visited')
-
-    return jsonify([mc.to_dict() for mc in marked_countries]), 200
+    return jsonify(get_user_marks(user.id, 'visited')), 200
 
   except Exception as e:
     print(f"Error getting visited countries: {e}")
@@ -149,11 +171,60 @@ def get_my_wishlist_countries():
     if error_response:
       return error_response, status_code
 
-    marked_countries = MarkedCountry.get_user_marked_countries(user.id, 'wishlist')
-
-    return jsonify([mc.to_dict() for mc in marked_countries]), 200
+    return jsonify(get_user_marks(user.id, 'wishlist')), 200
 
   except Exception as e:
     print(f"Error getting wishlist countries: {e}")
     return jsonify({'error': 'Failed to get wishlist countries'}), 500
 
+@marked_countries_bp.route('/my/changes', methods=['GET'])
+def get_my_mark_changes():
+  # Marks created or updated after `cursor`, oldest first; removals show up in /my/state, not here
+  try:
+    user, error_response, status_code = get_user_from_request()
+    if error_response:
+      return error_response, status_code
+
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
+    after = None
+    cursor = request.args.get('cursor')
+    if cursor:
+      updated_at, _, mark_id = cursor.rpartition('_')
+      try:
+        after = (datetime.fromisoformat(updated_at), int(mark_id))
+      except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    flush_buffered_marks(user.id)
+    rows = MarkedCountry.get_user_changed_rows(user.id, after=after, limit=limit)
+    next_cursor = f'{rows[-1].updated_at.isoformat()}_{rows[-1].id}' if rows else cursor
+    return jsonify({
+      'marked_countries': [MarkedCountry.row_to_dict(row) for row in rows],
+      'cursor': next_cursor,
+      'has_more': len(rows) == limit
+    }), 200
+
+  except Exception as e:
+    print(f"Error getting mark changes: {e}")
+    return jsonify({'error': 'Failed to get mark changes'}), 500
+
+@marked_countries_bp.route('/my/state', methods=['GET'])
+def get_my_map_state():
+  try:
+    user, error_response, status_code = get_user_from_request()
+    if error_response:
+      return error_response, status_code
+
+    state = get_map_state(user.id)
+    if request.if_none_match.contains(state):
+      response = current_app.response_class(status=304)
+    else:
+      response = jsonify({'state': state, 'catalog_version': CATALOG_VERSION})
+    # The state is its own validator: unchanged marks revalidate with a 304
+    response.set_etag(state)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+  except Exception as e:
+    print(f"Error getting map state: {e}")
+    return jsonify({'error': 'Failed to get map state'}), 500
@@ -0,0 +1,74 @@
+from flask import Blueprint, request, jsonify
+from app.models import Job
+from app.extensions import db, cache
+from app.services.job_service import enqueue
+from app.services.bitset_service import decode_map_state
+from app.services.marks_service import flush_buffered_marks, get_map_state
+from app.services.region_service import find_region, get_region_tree
+from app.services.timeline_service import get_user_timeline
+from app.utils.auth import get_user_from_request
+
+statistics_bp = Blueprint('statistics', __name__)
+
+@statistics_bp.route('/my', methods=['GET'])
+def get_my_statistics():
+  try:
+    user, error_response, status_code = get_user_from_request()
+    if error_response:
+      return error_response, status_code
+
+    # Keyed by map state: users with the same marks share stats, and a mark change is a new key
+    key = f'stats:{get_map_state(user.id)}'
+    stats = cache.get(key)
+    if stats is not None:
+      return jsonify(stats), 200
+
+    # Recomputed off the request path
+    job = Job.get_active(user.id, 'recompute_stats') or enqueue('recompute_stats', user_id=user.id)
+    stats = cache.get(key)
+    if stats is not None:
+      return jsonify(stats), 200
+
+    return jsonify({'message': 'Statistics are being computed', 'job': job.to_dict()}), 202
+
+  except Exception as e:
+    print(f"Error getting statistics: {e}")
+    db.session.rollback()
+    return jsonify({'error': 'Failed to get statistics'}), 500
+
+@statistics_bp.route('/my/regions', methods=['GET'])
+def get_my_region_statistics():
+  try:
+    user, error_response, status_code = get_user_from_request()
+    if error_response:
+      return error_response, status_code
+
+    node = get_region_tree()
+    for level in ('continent', 'subregion'):
+      if request.args.get(level):
+        node = find_region(request.args[level], level)
+        if node is None:
+          return jsonify({'error': f'Unknown {level}'}), 404
+
+    _, visited, wishlist = decode_map_state(get_map_state(user.id))
+    return jsonify(node.rollup(visited, wishlist)), 200
+
+  except Exception as e:
+    print(f"Error getting region statistics: {e}")
+    return jsonify({'error': 'Failed to get region statistics'}), 500
+
+@statistics_bp.route('/my/timeline', methods=['GET'])
+def get_my_timeline():
+  # Days abroad per year/month, new countries per year, cumulative curve and longest trip
+  try:
+    user, error_response, status_code = get_user_from_request()
+    if error_response:
+      return error_response, status_code
+
+    flush_buffered_marks(user.id)
+    return jsonify(get_user_timeline(user.id)), 200
+
+  except Exception as e:
+    print(f"Error getting timeline: {e}")
+    db.session.rollback()
+    return jsonify({'error': 'Failed to get timeline'}), 500
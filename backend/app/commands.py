@@ -0,0 +1,280 @@
+import click
+from flask.cli import AppGroup
+
+jobs_cli = AppGroup('jobs', help='Background job queue.')
+
+@jobs_cli.command('work')
+@click.option('--once', is_flag=True, help='Exit when the queue is empty.')
+@click.option('--worker-id', default=None, help='Defaults to hostname:pid.')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds to sleep when idle.')
+@click.option('--max-jobs', type=int, default=None, help='Exit after processing this many jobs.')
+def work_command(once, worker_id, poll_interval, max_jobs):
+  from app.services.job_service import work, default_worker_id
+  worker_id = worker_id or default_worker_id()
+  click.echo(f'Job worker {worker_id} started')
+  processed = work(worker_id=worker_id, once=once, poll_interval=poll_interval, max_jobs=max_jobs)
+  click.echo(f'Processed {processed} jobs')
+
+@jobs_cli.command('requeue-stale')
+@click.option('--stale-after', type=int, default=None, help='Seconds a running job may hold its lock.')
+def requeue_stale_command(stale_after):
+  from app.services.job_service import requeue_stale
+  click.echo(f'Requeued {requeue_stale(stale_after)} jobs')
+
+@jobs_cli.command('status')
+def status_command():
+  from app.extensions import db
+  from app.models import Job
+  counts = db.session.execute(db.select(Job.status, db.func.count()).group_by(Job.status)).all()
+  for status, count in counts:
+    click.echo(f'{status}: {count}')
+
+geometry_cli = AppGroup('geometry', help='Bundled country geometry.')
+
+@geometry_cli.command('build')
+@click.option('--source', default='../frontend/public/world.geojson', show_default=True, type=click.Path(exists=True))
+def build_geometry_command(source):
+  from app.services.geometry_service import build_geometry, load_features, GEOMETRY_PATH
+  from app.services.topology_service import build_topologies
+  count = build_geometry(source)
+  click.echo(f'Wrote {count} features to {GEOMETRY_PATH}')
+  load_features.cache_clear()
+  for lod, size in build_topologies().items():
+    click.echo(f'  {lod}: {size} bytes')
+
+marks_cli = AppGroup('marks', help='Derived data about marked countries.')
+
+@marks_cli.command('rebuild-bitsets')
+def rebuild_bitsets_command():
+  from app.services.marks_service import rebuild_all_bitsets
+  count = rebuild_all_bitsets()
+  click.echo(f'Rebuilt bitsets for {count} users')
+
+@marks_cli.command('timeline')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), default=None, help='Write the JSON here.')
+def timeline_command(output):
+  # All users at once, e.g. for the yearly campaign
+  import json
+  import time
+  from app.services.timeline_service import compute_all_timelines
+  started = time.perf_counter()
+  timeline = compute_all_timelines()
+  elapsed = time.perf_counter() - started
+  if output:
+    with open(output, 'w') as f:
+      json.dump(timeline, f, indent=2)
+  else:
+    click.echo(json.dumps(timeline, indent=2))
+  click.echo(f'{timeline["visited"]} visits of {timeline.get("users", 0)} users in {elapsed:.2f}s', err=True)
+
+@marks_cli.command('leaderboard')
+@click.option('--limit', default=10, show_default=True)
+def leaderboard_command(limit):
+  from app.extensions import db
+  from app.models import User
+  from app.services.marks_service import top_travelers
+  top = top_travelers(limit)
+  names = dict(db.session.execute(db.select(User.id, User.name).where(User.id.in_([user_id for user_id, _ in top]))).all())
+  for rank, (user_id, visited) in enumerate(top, 1):
+    click.echo(f'{rank:>3}. {names.get(user_id, user_id)} ({user_id}): {visited}')
+
+@marks_cli.command('export-all')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), required=True, help='JSON lines file.')
+@click.option('--batch-size', default=10000, show_default=True)
+def export_all_command(output, batch_size):
+  import json
+  from app.services.marks_service import iter_all_marks
+  count = 0
+  with open(output, 'w') as file:
+    for mark in iter_all_marks(batch_size):
+      file.write(json.dumps(mark, default=str) + '\n')
+      count += 1
+  click.echo(f'Exported {count} marks to {output}')
+
+db_cli = AppGroup('db', help='Schema migrations.')
+
+def _migration_options():
+  from flask import current_app
+  from app.extensions import db
+  return db.engine, current_app.config.get('MIGRATIONS_LOCK_TIMEOUT')
+
+@db_cli.command('upgrade')
+@click.option('--to', 'target', type=int, default=None, help='Stop at this revision (default: latest).')
+def upgrade_command(target):
+  from app.extensions import shards
+  from app.migrations import upgrade
+  engine, lock_timeout = _migration_options()
+  applied = upgrade(engine, target, lock_timeout=lock_timeout, echo=click.echo)
+  click.echo(f'Applied {len(applied)} migrations' if applied else 'Already up to date')
+  # Shard databases follow the same revisions
+  for name in shards.names[1:]:
+    applied = upgrade(shards.engine(name), target, lock_timeout=lock_timeout, echo=click.echo)
+    click.echo(f'{name}: applied {len(applied)} migrations' if applied else f'{name}: already up to date')
+
+@db_cli.command('downgrade')
+@click.option('--to', 'target', type=int, default=None, help='Revert down to this revision (default: one step).')
+def downgrade_command(target):
+  from app.migrations import downgrade, MigrationError
+  engine, lock_timeout = _migration_options()
+  try:
+    reverted = downgrade(engine, target, lock_timeout=lock_timeout, echo=click.echo)
+  except MigrationError as e:
+    raise click.ClickException(str(e))
+  click.echo(f'Reverted {len(reverted)} migrations')
+
+@db_cli.command('current')
+def current_command():
+  from app.migrations import current_version, head_revision
+  engine, _ = _migration_options()
+  version = current_version(engine)
+  head = head_revision()
+  click.echo(f'Current: {version if version is not None else "none"} (latest: {head})')
+
+@db_cli.command('history')
+def history_command():
+  from app.migrations import current_version, load_migrations
+  engine, _ = _migration_options()
+  version = current_version(engine) or 0
+  for migration in load_migrations():
+    marker = '*' if migration.revision <= version else ' '
+    mode = '' if getattr(migration, 'transactional', True) else ' (online)'
+    click.echo(f'{marker} {migration.revision:04d} {migration.description}{mode}')
+
+@db_cli.command('optimize')
+def optimize_command():
+  from app.utils.sqlite_tuning import run_maintenance
+  engine, _ = _migration_options()
+  if engine.dialect.name != 'sqlite':
+    raise click.ClickException('Only SQLite databases need this')
+  busy, frames, checkpointed = run_maintenance(engine, checkpoint='TRUNCATE')
+  click.echo(f'Checkpointed {checkpointed}/{frames} WAL frames{" (busy)" if busy else ""}, statistics refreshed')
+
+shards_cli = AppGroup('shards', help='User-sharded data (SHARD_URLS).')
+
+@shards_cli.command('status')
+def shards_status_command():
+  from app.services.shard_service import shard_loads, table_counts
+  loads = shard_loads()
+  for name, counts in table_counts().items():
+    rows = ', '.join(f'{table} {count}' for table, count in counts.items())
+    click.echo(f'{name}: {loads[name]} users ({rows})')
+
+@shards_cli.command('move')
+@click.argument('user_id', type=int)
+@click.argument('shard')
+@click.option('--grace', type=float, default=None, help='Seconds to wait for writes in flight (default: SHARD_MOVE_GRACE_SECONDS).')
+def shards_move_command(user_id, shard, grace):
+  from app.services.shard_service import move_user
+  from app.utils.sharding import ShardingError
+  try:
+    copied = move_user(user_id, shard, grace=grace)
+  except ShardingError as e:
+    raise click.ClickException(str(e))
+  if not copied:
+    click.echo(f'User {user_id} is already on {shard}')
+  else:
+    click.echo(f'Moved user {user_id} to {shard}: ' + ', '.join(f'{table} {count}' for table, count in copied.items()))
+
+@shards_cli.command('rebalance')
+@click.option('--max-moves', type=int, default=None, help='Stop after moving this many users.')
+@click.option('--grace', type=float, default=None, help='Seconds to wait for writes in flight, per user.')
+@click.option('--dry-run', is_flag=True, help='Only print the moves.')
+def shards_rebalance_command(max_moves, grace, dry_run):
+  from app.services.shard_service import plan_rebalance, rebalance
+  if dry_run:
+    moves = plan_rebalance(max_moves)
+    for user_id, source, target in moves:
+      click.echo(f'user {user_id}: {source} -> {target}')
+  else:
+    moves = rebalance(max_moves, grace=grace, echo=click.echo)
+  click.echo(f'{len(moves)} moves' if moves else 'Already balanced')
+
+@shards_cli.command('sync-countries')
+def shards_sync_countries_command():
+  from app.extensions import shards
+  click.echo(f'Copied {shards.sync_countries()} countries to the shards')
+
+purge_cli = AppGroup('purge', help='Account deletion (GDPR purge).')
+
+@purge_cli.command('users')
+@click.argument('user_ids', nargs=-1, type=int)
+@click.option('--file', 'id_file', type=click.File(), default=None, help='One user id per line (compliance sweeps).')
+def purge_users_command(user_ids, id_file):
+  from app.extensions import db
+  from app.models import User
+  from app.services.purge_service import request_deletion
+  ids = list(user_ids) + ([int(line) for line in id_file if line.strip()] if id_file else [])
+  queued = 0
+  for user_id in ids:
+    user = db.session.get(User, user_id)
+    if user is None:
+      click.echo(f'User {user_id} not found', err=True)
+      continue
+    if user.purged_at is not None:
+      click.echo(f'User {user_id} was already purged')
+      continue
+    job = request_deletion(user)
+    click.echo(f'User {user_id}: job {job.id} ({job.status})')
+    queued += 1
+  click.echo(f'Scheduled {queued} account deletions; `flask jobs work` purges them')
+
+@purge_cli.command('status')
+def purge_status_command():
+  from app.extensions import db
+  from app.models import Job, User
+  pending = db.session.execute(db.select(db.func.count()).select_from(User).where(
+    User.deleted_at.is_not(None), User.purged_at.is_(None)
+  )).scalar()
+  click.echo(f'Accounts waiting for their purge: {pending}')
+  jobs = Job.query.filter(Job.type == 'delete_account', Job.status.in_(['queued', 'running', 'failed'])).order_by(Job.id)
+  for job in jobs:
+    deleted = (job.result or {}).get('deleted', {})
+    rows = ', '.join(f'{table} {count}' for table, count in deleted.items()) or 'nothing deleted yet'
+    click.echo(f'job {job.id} user {job.user_id} {job.status} (attempt {job.attempts}): {rows}')
+
+admin_cli = AppGroup('admin', help='Access to the /api/admin endpoints.')
+
+def _set_admin(user_id, granted):
+  from app.extensions import db
+  from app.models import User
+  user = db.session.get(User, user_id)
+  if user is None or user.deleted_at is not None:
+    click.echo(f'User {user_id} not found', err=True)
+    return
+  user.is_admin = granted
+  db.session.commit()
+  click.echo(f'User {user_id} ({user.email}) is {"now" if granted else "no longer"} an admin')
+
+@admin_cli.command('grant')
+@click.argument('user_ids', nargs=-1, type=int, required=True)
+def admin_grant_command(user_ids):
+  for user_id in user_ids:
+    _set_admin(user_id, True)
+
+@admin_cli.command('revoke')
+@click.argument('user_ids', nargs=-1, type=int, required=True)
+def admin_revoke_command(user_ids):
+  for user_id in user_ids:
+    _set_admin(user_id, False)
+
+@admin_cli.command('list')
+def admin_list_command():
+  from app.models import User
+  for user in User.query.filter_by(is_admin=True).order_by(User.id):
+    click.echo(f'{user.id} {user.email}')
+
+analytics_cli = AppGroup('analytics', help='Columnar snapshot for the admin analytics.')
+
+@analytics_cli.command('snapshot')
+def analytics_snapshot_command():
+  import time
+  from app.services.analytics_service import write_snapshot
+  started = time.perf_counter()
+  meta = write_snapshot()
+  click.echo(f'Snapshot {meta["snapshot"]}: {meta["marks"]} marks of {meta["users"]} users in {time.perf_counter() - started:.2f}s')
+
+@analytics_cli.command('schedule')
+def analytics_schedule_command():
+  from app.services.analytics_service import schedule_snapshot
+  job = schedule_snapshot()
+  click.echo(f'Snapshot job {job.id} ({job.status}); it reschedules itself every ANALYTICS_SNAPSHOT_INTERVAL seconds')
@@ -10,19 +10,122 @@ class Config:
   GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
   GOOGLE_CLIENT_SECRET = os.environ.get('GOOGLE_CLIENT_SECRET')
   JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or SECRET_KEY
+  JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'orjson')
+  # local (por processo), sqlite (arquivo compartilhado entre workers) ou redis
+  CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'local')
+  CACHE_URL = os.environ.get('CACHE_URL')
+  CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 300))
+  # Token bucket por usuário (ou IP, se anônimo) em cada blueprint
+  RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+  RATE_LIMIT_STORAGE = os.environ.get('RATE_LIMIT_STORAGE', 'memory')
+  RATE_LIMIT_STORAGE_URL = os.environ.get('RATE_LIMIT_STORAGE_URL')
+  RATE_LIMIT_DEFAULT = '300/minute'
+  # Proxies reversos (nginx...) na frente do app: o IP do cliente vem do X-Forwarded-For
+  PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS', 0))
+  RATE_LIMITS = {
+    'auth': '30/minute',
+    'countries': '300/minute',
+    'marked_countries': '120/minute',
+    'events': '30/minute'
+  }
+  # Fila de jobs (tabela `jobs`); rode `flask jobs work` para processá-la
+  JOBS_EAGER = os.environ.get('JOBS_EAGER', 'false').lower() == 'true'
+  JOBS_MAX_ATTEMPTS = 5
+  JOBS_RETRY_BASE_SECONDS = 10
+  JOBS_RETRY_MAX_SECONDS = 3600
+  # Um job em execução atualiza `locked_at` a cada JOBS_HEARTBEAT_SECONDS; sem isso por
+  # JOBS_STALE_AFTER_SECONDS o worker é dado como morto e o job volta para a fila (ou falha, sem tentativas)
+  JOBS_HEARTBEAT_SECONDS = 60
+  JOBS_STALE_AFTER_SECONDS = 600
+  JOBS_IMPORT_MAX_ENTRIES = 1000
+  # Exclusão de contas: linhas apagadas por transação e pausa entre elas, para não travar o tráfego
+  PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', 500))
+  PURGE_BATCH_PAUSE = float(os.environ.get('PURGE_BATCH_PAUSE', 0.05))
+  MAP_RENDER_CACHE_TTL = 86400
+  GEOCODING_MAX_POINTS = 10000
+  # Agrupa marcações seguidas do mesmo usuário em um único commit (só com um processo worker)
+  MARKS_WRITE_BUFFER = os.environ.get('MARKS_WRITE_BUFFER', 'false').lower() == 'true'
+  MARKS_WRITE_BUFFER_WINDOW = float(os.environ.get('MARKS_WRITE_BUFFER_WINDOW', 0.5))
+  MARKS_WRITE_BUFFER_MAX = 50
+  # Escritas seguidas que podem falhar antes de as marcações pendentes do usuário serem descartadas
+  MARKS_WRITE_BUFFER_MAX_FAILURES = 5
+  # SQLite em arquivo (instalações de um nó só): pragmas aplicados em toda conexão,
+  # pool separado só de leitura e checkpoint/optimize periódicos
+  SQLITE_TUNED = os.environ.get('SQLITE_TUNED', 'true').lower() == 'true'
+  SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -65536,
+    'mmap_size': 268435456,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY'
+  }
+  SQLITE_READ_POOL_SIZE = int(os.environ.get('SQLITE_READ_POOL_SIZE', 4))
+  SQLITE_MAINTENANCE_INTERVAL = int(os.environ.get('SQLITE_MAINTENANCE_INTERVAL', 300))
+  # Máximo de sub-requisições em um POST /api/batch
+  BATCH_MAX_REQUESTS = 10
+  # Eventos em tempo real (SSE): memory (por processo) ou sqlite (arquivo compartilhado entre workers)
+  EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND', 'memory')
+  EVENTS_URL = os.environ.get('EVENTS_URL')
+  EVENTS_LOG_SIZE = 100
+  EVENTS_POLL_INTERVAL = 0.25
+  EVENTS_HEARTBEAT_SECONDS = 15
+  # Validade do ticket (POST /api/events/ticket) que o navegador põe na URL do stream no lugar do token
+  EVENTS_TICKET_SECONDS = int(os.environ.get('EVENTS_TICKET_SECONDS', 60))
+  # Desligado, /api/events/stream responde 204 e o navegador não tenta de novo (o gunicorn.conf.py
+  # desliga com workers sync, onde cada aba aberta prenderia um worker)
+  EVENTS_STREAM_ENABLED = os.environ.get('EVENTS_STREAM_ENABLED', 'true').lower() == 'true'
+  # Conexões são encerradas depois disso; o navegador reconecta com o Last-Event-ID
+  EVENTS_STREAM_MAX_SECONDS = int(os.environ.get('EVENTS_STREAM_MAX_SECONDS', 300))
+  # Tracing no formato OpenTelemetry: none (desligado), memory (testes) ou file (OTLP/JSON, uma linha por trace)
+  TRACING_EXPORTER = os.environ.get('TRACING_EXPORTER', 'none')
+  TRACING_FILE = os.environ.get('TRACING_FILE')
+  TRACING_SERVICE_NAME = os.environ.get('TRACING_SERVICE_NAME', 'travel-map-tracker')
+  # Fração das requisições amostradas; um `traceparent` recebido mantém a decisão de quem chamou
+  TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE', 0.0))
+  TRACING_MAX_SPANS = 1000
+  # Sharding por usuário: bancos extras (URLs separadas por vírgula) viram os shards shard1, shard2...
+  # O banco principal continua com usuários, amizades, jobs e o mapa de shards, e é o shard `default`
+  SHARD_URLS = [url for url in os.environ.get('SHARD_URLS', '').split(',') if url]
+  # Espera antes de copiar um usuário para outro shard, para as escritas em andamento terminarem
+  SHARD_MOVE_GRACE_SECONDS = float(os.environ.get('SHARD_MOVE_GRACE_SECONDS', 1.0))
+  # Snapshot colunar das marcações para as análises do admin (padrão: instance/analytics)
+  ANALYTICS_DIR = os.environ.get('ANALYTICS_DIR')
+  # Intervalo entre snapshots feitos pelo worker (0 desliga o reagendamento)
+  ANALYTICS_SNAPSHOT_INTERVAL = int(os.environ.get('ANALYTICS_SNAPSHOT_INTERVAL', 3600))
+  ANALYTICS_SNAPSHOTS_KEPT = 3
+  # Migrações pendentes rodam no boot só se ativado; em produção use `flask db upgrade`
+  MIGRATIONS_AUTO_UPGRADE = os.environ.get('MIGRATIONS_AUTO_UPGRADE', 'false').lower() == 'true'
+  # Postgres: desiste de um lock em vez de enfileirar (e travar) o tráfego atrás da migração
+  MIGRATIONS_LOCK_TIMEOUT = os.environ.get('MIGRATIONS_LOCK_TIMEOUT', '5s')
 
 class DevelopmentConfig(Config):
   DEBUG = True
   SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///travel_map_tracker.db'
   CORS_ORIGINS = ['http://localhost:5173', 'http://127.0.0.1:5173']
+  # Em desenvolvimento não há worker rodando, então os jobs executam na própria requisição
+  JOBS_EAGER = os.environ.get('JOBS_EAGER', 'true').lower() == 'true'
+  MIGRATIONS_AUTO_UPGRADE = os.environ.get('MIGRATIONS_AUTO_UPGRADE', 'true').lower() == 'true'
 
 class ProductionConfig(Config):
   DEBUG = False
   SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
   CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '').split(',')
 
+class TestingConfig(DevelopmentConfig):
+  TESTING = True
+  # Os testes passam o próprio banco (uma cópia do template, veja tests/conftest.py)
+  SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+  JWT_SECRET_KEY = 'test-secret-key'
+  GOOGLE_CLIENT_ID = 'test-google-client-id'
+  JOBS_EAGER = True
+  MARKS_WRITE_BUFFER = False
+  SQLITE_MAINTENANCE_INTERVAL = 0
+  PURGE_BATCH_PAUSE = 0
+
 config = {
   'development': DevelopmentConfig,
   'production': ProductionConfig,
+  'testing': TestingConfig,
   'default': DevelopmentConfig
 }
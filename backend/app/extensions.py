@@ -1,6 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from app.utils.cache import Cache
+from app.utils.rate_limit import RateLimiter
+from app.utils.events import EventHub
+from app.utils.tracing import Tracing
+from app.utils.sharding import RoutingSession, ShardRouter
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 cors = CORS()
-
+cache = Cache()
+limiter = RateLimiter()
+events = EventHub()
+tracing = Tracing()
+shards = ShardRouter()
@@ -0,0 +1,249 @@
+"""
+Versioned schema migrations.
+
+Each module in app/migrations/versions is one migration:
+
+  revision = 2                # increasing integer, also the file prefix (0002_*.py)
+  description = 'Short text'
+  transactional = True        # False for CREATE INDEX CONCURRENTLY and batched backfills
+
+  def upgrade(ctx): ...
+  def downgrade(ctx): ...
+
+The applied version is kept in `schema_migrations`. A fresh database is created
+from the models and stamped with the latest revision, so every migration must
+be idempotent (the ctx helpers use IF [NOT] EXISTS) and must leave the schema
+equal to what the models declare.
+
+`flask db upgrade` also runs them on every shard database (SHARD_URLS), which
+only holds the sharded tables and `countries` (app.utils.sharding): guard
+each step with ctx.has_table.
+"""
+import importlib
+import pkgutil
+import time
+from datetime import datetime, timezone
+from sqlalchemy import inspect, text
+
+MIGRATIONS_TABLE = 'schema_migrations'
+
+class MigrationError(Exception):
+  pass
+
+def load_migrations():
+  from app.migrations import versions
+  migrations = []
+  for module_info in pkgutil.iter_modules(versions.__path__):
+    module = importlib.import_module(f'{versions.__name__}.{module_info.name}')
+    migrations.append(module)
+  migrations.sort(key=lambda migration: migration.revision)
+  revisions = [migration.revision for migration in migrations]
+  if len(set(revisions)) != len(revisions):
+    raise MigrationError(f'Duplicate migration revisions: {revisions}')
+  return migrations
+
+def head_revision():
+  migrations = load_migrations()
+  return migrations[-1].revision if migrations else 0
+
+class MigrationContext:
+  """What a migration's upgrade/downgrade receive: the connection plus lock-friendly DDL helpers."""
+
+  def __init__(self, engine, connection, transactional, lock_timeout=None, echo=print):
+    self.engine = engine
+    self.connection = connection
+    self.transactional = transactional
+    self.dialect = engine.dialect.name
+    self.lock_timeout = lock_timeout
+    self.echo = echo
+
+  def execute(self, sql, params=None):
+    return self.connection.execute(text(sql), params or {})
+
+  def has_table(self, table):
+    return inspect(self.connection).has_table(table)
+
+  def has_column(self, table, column):
+    return column in {info['name'] for info in inspect(self.connection).get_columns(table)}
+
+  def has_index(self, table, name):
+    return name in {info['name'] for info in inspect(self.connection).get_indexes(table)}
+
+  def create_index(self, name, table, columns, unique=False, where=None):
+    """CREATE INDEX, CONCURRENTLY on Postgres so writes to `table` keep going while it builds."""
+    unique_sql = 'UNIQUE ' if unique else ''
+    where_sql = f' WHERE {where}' if where else ''
+    columns_sql = ', '.join(columns)
+    if self.dialect != 'postgresql':
+      self.execute(f'CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({columns_sql}){where_sql}')
+      return
+
+    if self.transactional:
+      raise MigrationError('Concurrent index builds need `transactional = False` in the migration')
+    # A failed concurrent build leaves an INVALID index behind that IF NOT EXISTS would keep
+    invalid = self.execute(
+      'SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid '
+      'WHERE c.relname = :name AND NOT i.indisvalid', {'name': name}
+    ).first()
+    if invalid:
+      self.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+    self.execute(f'CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns_sql}){where_sql}')
+
+  def drop_index(self, name):
+    if self.dialect == 'postgresql':
+      if self.transactional:
+        raise MigrationError('Concurrent index drops need `transactional = False` in the migration')
+      self.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+    else:
+      self.execute(f'DROP INDEX IF EXISTS {name}')
+
+  def add_column(self, table, column, ddl):
+    # Nullable (or constant-default) columns only: anything else rewrites the table on older Postgres
+    if not self.has_column(table, column):
+      self.execute(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}')
+
+  def drop_column(self, table, column):
+    if self.has_column(table, column):
+      self.execute(f'ALTER TABLE {table} DROP COLUMN {column}')
+
+  def backfill(self, table, set_sql, where=None, params=None, batch_size=1000, pause=0.0, key='id'):
+    """UPDATE `table` in primary-key ranges of `batch_size`, one short transaction per batch.
+
+    Each batch only locks its own rows, so live writes to the table are never
+    blocked for long; `pause` seconds between batches leaves room for them.
+    """
+    if self.transactional:
+      raise MigrationError('Batched backfills need `transactional = False` in the migration')
+
+    bounds = self.execute(f'SELECT MIN({key}), MAX({key}) FROM {table}').first()
+    if bounds[0] is None:
+      return 0
+    low, high = bounds
+    condition = f' AND ({where})' if where else ''
+    updated = 0
+    for start in range(low, high + 1, batch_size):
+      with self.engine.begin() as connection:
+        self._set_lock_timeout(connection)
+        updated += connection.execute(
+          text(f'UPDATE {table} SET {set_sql} WHERE {key} >= :_start AND {key} < :_end{condition}'),
+          {**(params or {}), '_start': start, '_end': start + batch_size}
+        ).rowcount
+      self.echo(f'  {table}: {min(start + batch_size, high + 1) - low}/{high - low + 1} keys scanned, {updated} rows updated')
+      if pause:
+        time.sleep(pause)
+    return updated
+
+  def _set_lock_timeout(self, connection):
+    # Fail fast instead of queueing behind a long transaction (and blocking everything queued after us)
+    if self.dialect == 'postgresql' and self.lock_timeout:
+      connection.execute(text(f"SET LOCAL lock_timeout = '{self.lock_timeout}'"))
+
+def ensure_migrations_table(engine):
+  with engine.begin() as connection:
+    connection.execute(text(
+      f'CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ('
+      'version INTEGER PRIMARY KEY, description VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)'
+    ))
+
+def current_version(engine):
+  # None when the database has never been migrated (or stamped)
+  if not inspect(engine).has_table(MIGRATIONS_TABLE):
+    return None
+  with engine.connect() as connection:
+    return connection.execute(text(f'SELECT MAX(version) FROM {MIGRATIONS_TABLE}')).scalar() or 0
+
+def _record(connection, migration):
+  connection.execute(
+    text(f'INSERT INTO {MIGRATIONS_TABLE} (version, description, applied_at) VALUES (:version, :description, :applied_at)'),
+    {'version': migration.revision, 'description': migration.description, 'applied_at': datetime.now(timezone.utc)}
+  )
+
+def _run(engine, migration, direction, lock_timeout, echo):
+  step = getattr(migration, direction)
+  if getattr(migration, 'transactional', True):
+    with engine.begin() as connection:
+      ctx = MigrationContext(engine, connection, True, lock_timeout, echo)
+      ctx._set_lock_timeout(connection)
+      step(ctx)
+      if direction == 'upgrade':
+        _record(connection, migration)
+      else:
+        connection.execute(text(f'DELETE FROM {MIGRATIONS_TABLE} WHERE version = :version'), {'version': migration.revision})
+    return
+
+  # Autocommit: each statement commits on its own. If this dies halfway the version is not
+  # recorded, and the idempotent helpers let the same migration simply run again
+  with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+    step(MigrationContext(engine, connection, False, lock_timeout, echo))
+  with engine.begin() as connection:
+    if direction == 'upgrade':
+      _record(connection, migration)
+    else:
+      connection.execute(text(f'DELETE FROM {MIGRATIONS_TABLE} WHERE version = :version'), {'version': migration.revision})
+
+def upgrade(engine, target=None, lock_timeout=None, echo=print):
+  ensure_migrations_table(engine)
+  current = current_version(engine)
+  applied = []
+  for migration in load_migrations():
+    if migration.revision <= current or (target is not None and migration.revision > target):
+      continue
+    echo(f'Upgrading to {migration.revision}: {migration.description}')
+    _run(engine, migration, 'upgrade', lock_timeout, echo)
+    applied.append(migration.revision)
+  return applied
+
+def downgrade(engine, target=None, lock_timeout=None, echo=print):
+  # Default target: one step back. Revision 1 (baseline) cannot be downgraded
+  current = current_version(engine) or 0
+  target = current - 1 if target is None else target
+  if target < 1:
+    raise MigrationError('Cannot downgrade below the baseline (revision 1)')
+  reverted = []
+  for migration in reversed(load_migrations()):
+    if migration.revision > current or migration.revision <= target:
+      continue
+    echo(f'Downgrading {migration.revision}: {migration.description}')
+    _run(engine, migration, 'downgrade', lock_timeout, echo)
+    reverted.append(migration.revision)
+  return reverted
+
+def stamp(engine, version):
+  # Marks `version` (and everything before it) as applied without running anything
+  ensure_migrations_table(engine)
+  with engine.begin() as connection:
+    connection.execute(text(f'DELETE FROM {MIGRATIONS_TABLE}'))
+    for migration in load_migrations():
+      if migration.revision <= version:
+        _record(connection, migration)
+
+def ensure_schema(app):
+  """Called at startup instead of a bare create_all().
+
+  No model tables yet: create every table from the models and stamp the latest revision.
+  Database created by create_all() before migrations existed: run the baseline, which
+  creates the tables that database is missing, and stamp it.
+  Pending migrations run automatically only with MIGRATIONS_AUTO_UPGRADE; otherwise
+  run `flask db upgrade` (concurrent index builds don't belong in a worker's boot).
+  """
+  from app.extensions import db
+  engine = db.engine
+  if not set(db.metadata.tables) & set(inspect(engine).get_table_names()):
+    db.create_all()
+    stamp(engine, head_revision())
+    return
+
+  version = current_version(engine)
+  if version is None:
+    # That create_all() only made the tables of its day (no jobs, friendships, user_bitsets...)
+    baseline = load_migrations()[0]
+    with engine.begin() as connection:
+      baseline.upgrade(MigrationContext(engine, connection, True, echo=app.logger.info))
+    stamp(engine, 1)
+    version = 1
+
+  if version < head_revision():
+    if app.config.get('MIGRATIONS_AUTO_UPGRADE'):
+      upgrade(engine, lock_timeout=app.config.get('MIGRATIONS_LOCK_TIMEOUT'), echo=app.logger.info)
+    else:
+      app.logger.warning(f'Database is at revision {version}, latest is {head_revision()}: run `flask db upgrade`')
@@ -0,0 +1,12 @@
+"""Schema as created by db.create_all() before migrations existed."""
+from app.extensions import db
+from app.migrations import MigrationError
+
+revision = 1
+description = 'Baseline schema'
+
+def upgrade(ctx):
+  db.metadata.create_all(ctx.connection, checkfirst=True)
+
+def downgrade(ctx):
+  raise MigrationError('The baseline cannot be downgraded')
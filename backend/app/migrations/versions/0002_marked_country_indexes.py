@@ -0,0 +1,18 @@
+"""Composite (user_id, status) and (user_id, updated_at) indexes on marked_countries.
+
+The single-column user_id index is dropped: the unique (user_id, country_id)
+constraint already serves every lookup by user_id.
+"""
+revision = 2
+description = 'Composite marked_countries indexes'
+transactional = False
+
+def upgrade(ctx):
+  ctx.create_index('ix_marked_countries_user_status', 'marked_countries', ['user_id', 'status', 'country_id'])
+  ctx.create_index('ix_marked_countries_user_updated', 'marked_countries', ['user_id', 'updated_at'])
+  ctx.drop_index('ix_marked_countries_user_id')
+
+def downgrade(ctx):
+  ctx.create_index('ix_marked_countries_user_id', 'marked_countries', ['user_id'])
+  ctx.drop_index('ix_marked_countries_user_updated')
+  ctx.drop_index('ix_marked_countries_user_status')
@@ -0,0 +1,16 @@
+"""Materialized per-user travel timelines (app.services.timeline_service).
+
+Rows are computed on the next write or read of each user's marks, so there is nothing to backfill.
+"""
+from app.models import UserTimeline
+
+revision = 3
+description = 'user_timelines table'
+
+def upgrade(ctx):
+  if not ctx.has_table(UserTimeline.__tablename__):
+    UserTimeline.__table__.create(ctx.connection)
+
+def downgrade(ctx):
+  if ctx.has_table(UserTimeline.__tablename__):
+    UserTimeline.__table__.drop(ctx.connection)
@@ -0,0 +1,16 @@
+"""Shard map (app.utils.sharding).
+
+Users without a row stay on the default shard, so there is nothing to backfill.
+"""
+from app.models import UserShard
+
+revision = 4
+description = 'user_shards table'
+
+def upgrade(ctx):
+  if not ctx.has_table(UserShard.__tablename__):
+    UserShard.__table__.create(ctx.connection)
+
+def downgrade(ctx):
+  if ctx.has_table(UserShard.__tablename__):
+    UserShard.__table__.drop(ctx.connection)
@@ -0,0 +1,14 @@
+"""users.deleted_at: accounts waiting for their purge (app.services.purge_service).
+
+Shard databases have no users table, hence the has_table guard.
+"""
+revision = 5
+description = 'users.deleted_at'
+
+def upgrade(ctx):
+  if ctx.has_table('users'):
+    ctx.add_column('users', 'deleted_at', 'TIMESTAMP')
+
+def downgrade(ctx):
+  if ctx.has_table('users'):
+    ctx.drop_column('users', 'deleted_at')
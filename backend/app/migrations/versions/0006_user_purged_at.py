@@ -0,0 +1,14 @@
+"""users.purged_at: purged accounts keep a scrubbed row (app.services.purge_service).
+
+Shard databases have no users table, hence the has_table guard.
+"""
+revision = 6
+description = 'users.purged_at'
+
+def upgrade(ctx):
+  if ctx.has_table('users'):
+    ctx.add_column('users', 'purged_at', 'TIMESTAMP')
+
+def downgrade(ctx):
+  if ctx.has_table('users'):
+    ctx.drop_column('users', 'purged_at')
@@ -0,0 +1,14 @@
+"""users.is_admin: access to /api/admin, granted with `flask admin grant`.
+
+Shard databases have no users table, hence the has_table guard.
+"""
+revision = 7
+description = 'users.is_admin'
+
+def upgrade(ctx):
+  if ctx.has_table('users'):
+    ctx.add_column('users', 'is_admin', 'BOOLEAN NOT NULL DEFAULT FALSE')
+
+def downgrade(ctx):
+  if ctx.has_table('users'):
+    ctx.drop_column('users', 'is_admin')
@@ -3,5 +3,11 @@ from app.extensions import db
 from .user import User
 from .country import Country
 from .marked_country import MarkedCountry
+from .job import Job
+from .friendship import Friendship
+from .user_bitset import UserBitset
+from .user_timeline import UserTimeline
+from .user_shard import UserShard
+from .region import Region, region_countries
 
-__all__ = ['User', 'Country', 'MarkedCountry']
+__all__ = ['User', 'Country', 'MarkedCountry', 'Job', 'Friendship', 'UserBitset', 'UserTimeline', 'UserShard', 'Region', 'region_countries']
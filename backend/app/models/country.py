@@ -1,4 +1,5 @@
 from app.extensions import db
+from app.utils.sqlite_tuning import read_bind
 
 class Country(db.Model):
   __tablename__ = 'countries'
@@ -21,6 +22,28 @@ class Country(db.Model):
       'continent': self.continent
     }
 
+  @staticmethod
+  def row_to_dict(row):
+    return {
+      'id': row[0],
+      'name': row[1],
+      'code': row[2],
+      'flag': row[3],
+      'continent': row[4]
+    }
+
+  @classmethod
+  def list_rows(cls, continent=None, search=None, codes=None):
+    # Column-level select for read-only listings: plain tuples, no ORM instances
+    query = db.select(cls.id, cls.name, cls.code, cls.flag, cls.continent)
+    if continent:
+      query = query.where(cls.continent == continent)
+    if codes is not None:
+      query = query.where(cls.code.in_(codes))
+    if search:
+      query = query.where(cls.name.ilike(f'%{search}%'))
+    return db.session.execute(query, bind_arguments=read_bind()).all()
+
   @classmethod
   def get_by_continent(cls, continent):
     return cls.query.filter_by(continent=continent).all()
@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+from app.extensions import db
+
+class Friendship(db.Model):
+  __tablename__ = 'friendships'
+
+  id = db.Column(db.Integer, primary_key=True)
+  # user_id pediu a amizade, friend_id aceita
+  user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+  friend_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+  status = db.Column(db.String(20), nullable=False, default='pending')
+  created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+  updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+  __table_args__ = (
+    db.UniqueConstraint('user_id', 'friend_id', name='unique_friendship'),
+    db.CheckConstraint("status IN ('pending', 'accepted')", name='check_friendship_status')
+  )
+
+  def __repr__(self):
+    return f'<Friendship {self.user_id} -> {self.friend_id} ({self.status})>'
+
+  @classmethod
+  def between(cls, user_id, other_id):
+    return cls.query.filter(
+      db.or_(
+        db.and_(cls.user_id == user_id, cls.friend_id == other_id),
+        db.and_(cls.user_id == other_id, cls.friend_id == user_id)
+      )
+    ).first()
+
+  @classmethod
+  def friend_ids(cls, user_id):
+    rows = db.session.execute(
+      db.select(cls.user_id, cls.friend_id)
+      .where(cls.status == 'accepted', db.or_(cls.user_id == user_id, cls.friend_id == user_id))
+    ).all()
+    return {friend_id if requester == user_id else requester for requester, friend_id in rows}
+
+  @classmethod
+  def friends_of_friends(cls, user_id):
+    # Friends of the user's friends who are not already linked to the user (pending requests included)
+    friend_ids = cls.friend_ids(user_id)
+    if not friend_ids:
+      return set()
+    rows = db.session.execute(
+      db.select(cls.user_id, cls.friend_id)
+      .where(cls.status == 'accepted', db.or_(cls.user_id.in_(friend_ids), cls.friend_id.in_(friend_ids)))
+    ).all()
+    linked = db.session.execute(
+      db.select(cls.user_id, cls.friend_id).where(db.or_(cls.user_id == user_id, cls.friend_id == user_id))
+    ).all()
+    return {other for row in rows for other in row} - {other for row in linked for other in row} - {user_id}
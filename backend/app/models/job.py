@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+from app.extensions import db
+
+class Job(db.Model):
+  __tablename__ = 'jobs'
+
+  id = db.Column(db.Integer, primary_key=True)
+  type = db.Column(db.String(50), nullable=False)
+  payload = db.Column(db.JSON, nullable=True)
+  status = db.Column(db.String(20), nullable=False, default='queued')
+  # Sem FK: o job de exclusão de conta sobrevive ao próprio usuário
+  user_id = db.Column(db.Integer, nullable=True, index=True)
+  attempts = db.Column(db.Integer, nullable=False, default=0)
+  max_attempts = db.Column(db.Integer, nullable=False, default=5)
+  run_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+  locked_by = db.Column(db.String(100), nullable=True)
+  locked_at = db.Column(db.DateTime, nullable=True)
+  result = db.Column(db.JSON, nullable=True)
+  error = db.Column(db.Text, nullable=True)
+  created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+  updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+  __table_args__ = (
+    db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    db.CheckConstraint("status IN ('queued', 'running', 'succeeded', 'failed')", name='check_job_status'),
+    # Sem FK, mas os jobs do usuário também são apagados com a conta (purge_service)
+    {'info': {'owner_keys': ('user_id',)}}
+  )
+
+  def __repr__(self):
+    return f'<Job {self.id} {self.type} ({self.status})>'
+
+  def to_dict(self, include_result=True):
+    data = {
+      'id': self.id,
+      'type': self.type,
+      'status': self.status,
+      'attempts': self.attempts,
+      'max_attempts': self.max_attempts,
+      'run_at': self.run_at.isoformat() if self.run_at else None,
+      'error': self.error,
+      'created_at': self.created_at.isoformat(),
+      'updated_at': self.updated_at.isoformat()
+    }
+    if include_result:
+      data['result'] = self.result
+    return data
+
+  @classmethod
+  def get_user_jobs(cls, user_id, limit=50):
+    return cls.query.filter_by(user_id=user_id).order_by(cls.id.desc()).limit(limit).all()
+
+  @classmethod
+  def get_active(cls, user_id, job_type):
+    return cls.query.filter(
+      cls.user_id == user_id,
+      cls.type == job_type,
+      cls.status.in_(['queued', 'running'])
+    ).first()
@@ -1,11 +1,13 @@
 from datetime import datetime, timezone
 from app.extensions import db
+from app.utils.sqlite_tuning import read_bind
+from .country import Country
 
 class MarkedCountry(db.Model):
   __tablename__ = 'marked_countries'
 
   id = db.Column(db.Integer, primary_key=True)
-  user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+  user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
   country_id = db.Column(db.Integer, db.ForeignKey('countries.id'), nullable=False, index=True)
   status = db.Column(db.String(20), nullable=False)
   visit_start_date = db.Column(db.Date, nullable=True)
@@ -14,8 +16,14 @@ class MarkedCountry(db.Model):
   updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
   __table_args__ = (
+    # Also serves every user_id-only lookup, so user_id has no index of its own
     db.UniqueConstraint('user_id', 'country_id', name='unique_user_country_mark'),
-    db.CheckConstraint("status IN ('visited', 'wishlist')", name='check_status')
+    db.CheckConstraint("status IN ('visited', 'wishlist')", name='check_status'),
+    # /my?status=, /my/visited, /my/wishlist; with country_id it also covers the code/status bitset query
+    db.Index('ix_marked_countries_user_status', 'user_id', 'status', 'country_id'),
+    # Changes since a timestamp, in order (sync and pagination)
+    db.Index('ix_marked_countries_user_updated', 'user_id', 'updated_at'),
+    {'info': {'shard_key': 'user_id'}}
   )
 
   user = db.relationship('User', backref='marked_countries')
@@ -38,6 +46,59 @@ class MarkedCountry(db.Model):
       'updated_at': self.updated_at.isoformat()
     }
 
+  @staticmethod
+  def cache_namespace(user_id):
+    return f'marks:{user_id}'
+
+  @staticmethod
+  def row_to_dict(row):
+    return {
+      'id': row[0],
+      'user_id': row[1],
+      'country_id': row[2],
+      'country_name': row[3],
+      'country_code': row[4],
+      'status': row[5],
+      'visit_start_date': row[6].isoformat() if row[6] else None,
+      'visit_end_date': row[7].isoformat() if row[7] else None,
+      'created_at': row[8].isoformat(),
+      'updated_at': row[9].isoformat()
+    }
+
+  @classmethod
+  def get_user_marked_rows(cls, user_id, status=None):
+    # Same shape as to_dict() but selected as tuples in one joined query,
+    # avoiding ORM instances and the per-row lazy load of `country`
+    query = (
+      db.select(
+        cls.id, cls.user_id, cls.country_id, Country.name, Country.code, cls.status,
+        cls.visit_start_date, cls.visit_end_date, cls.created_at, cls.updated_at
+      )
+      .outerjoin(Country, Country.id == cls.country_id)
+      .where(cls.user_id == user_id)
+    )
+    if status:
+      query = query.where(cls.status == status)
+    return db.session.execute(query, bind_arguments=read_bind()).all()
+
+  @classmethod
+  def get_user_changed_rows(cls, user_id, after=None, limit=100):
+    # Rows shaped like get_user_marked_rows, oldest change first, after the (updated_at, id) keyset `after`
+    query = (
+      db.select(
+        cls.id, cls.user_id, cls.country_id, Country.name, Country.code, cls.status,
+        cls.visit_start_date, cls.visit_end_date, cls.created_at, cls.updated_at
+      )
+      .outerjoin(Country, Country.id == cls.country_id)
+      .where(cls.user_id == user_id)
+      .order_by(cls.updated_at, cls.id)
+      .limit(limit)
+    )
+    if after:
+      updated_at, mark_id = after
+      query = query.where(db.or_(cls.updated_at > updated_at, db.and_(cls.updated_at == updated_at, cls.id > mark_id)))
+    return db.session.execute(query, bind_arguments=read_bind()).all()
+
   @classmethod
   def get_user_marked_countries(cls, user_id, status=None):
     query = cls.query.filter_by(user_id=user_id)
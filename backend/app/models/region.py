@@ -0,0 +1,36 @@
+from app.extensions import db
+
+region_countries = db.Table(
+  'region_countries',
+  db.Column('region_id', db.Integer, db.ForeignKey('regions.id'), primary_key=True),
+  db.Column('country_id', db.Integer, db.ForeignKey('countries.id'), primary_key=True)
+)
+
+class Region(db.Model):
+  """Continent or subregion; countries belong to subregions, subregions to continents."""
+  __tablename__ = 'regions'
+
+  id = db.Column(db.Integer, primary_key=True)
+  name = db.Column(db.String(100), nullable=False)
+  level = db.Column(db.String(20), nullable=False)
+  parent_id = db.Column(db.Integer, db.ForeignKey('regions.id'), nullable=True, index=True)
+
+  __table_args__ = (
+    # "South America" is both a continent and its only subregion
+    db.UniqueConstraint('level', 'name', name='unique_region_level_name'),
+    db.CheckConstraint("level IN ('continent', 'subregion')", name='check_region_level')
+  )
+
+  parent = db.relationship('Region', remote_side=[id], backref='children')
+  countries = db.relationship('Country', secondary=region_countries, backref='regions')
+
+  def __repr__(self):
+    return f'<Region {self.level} {self.name}>'
+
+  def to_dict(self):
+    return {
+      'id': self.id,
+      'name': self.name,
+      'level': self.level,
+      'parent_id': self.parent_id
+    }
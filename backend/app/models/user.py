@@ -8,6 +8,12 @@ class User(db.Model):
   email = db.Column(db.String(120), unique=True, nullable=False, index=True)
   name = db.Column(db.String(120), nullable=True)
   google_id = db.Column(db.String(255), unique=True, nullable=True, index=True)
+  # Access to /api/admin; only `flask admin grant` sets it, never anything the user can edit
+  is_admin = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+  # Set when the account deletion is requested
+  deleted_at = db.Column(db.DateTime, nullable=True)
+  # Set when the purge is done: the row stays, scrubbed, so its id is never handed out (and authenticated) again
+  purged_at = db.Column(db.DateTime, nullable=True)
   created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
   updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
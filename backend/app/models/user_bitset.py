@@ -0,0 +1,16 @@
+from datetime import datetime, timezone
+from app.extensions import db
+
+class UserBitset(db.Model):
+  """Precomputed visited/wishlist bitsets per user (see app.services.bitset_service)."""
+  __tablename__ = 'user_bitsets'
+
+  user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+  visited = db.Column(db.LargeBinary, nullable=False)
+  wishlist = db.Column(db.LargeBinary, nullable=False)
+  updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+  __table_args__ = {'info': {'shard_key': 'user_id'}}
+
+  def __repr__(self):
+    return f'<UserBitset {self.user_id}>'
@@ -0,0 +1,19 @@
+from datetime import datetime, timezone
+from app.extensions import db
+
+class UserShard(db.Model):
+  """Shard map: which shard holds each user's data (see app.utils.sharding). No row means `default`."""
+  __tablename__ = 'user_shards'
+
+  user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+  shard = db.Column(db.String(50), nullable=False, index=True)
+  # moving: being copied to another shard (app.services.shard_service.move_user), writes wait
+  state = db.Column(db.String(20), nullable=False, default='active')
+  updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+  __table_args__ = (
+    db.CheckConstraint("state IN ('active', 'moving')", name='check_user_shard_state'),
+  )
+
+  def __repr__(self):
+    return f'<UserShard {self.user_id} -> {self.shard} ({self.state})>'
@@ -0,0 +1,15 @@
+from datetime import datetime, timezone
+from app.extensions import db
+
+class UserTimeline(db.Model):
+  """Precomputed travel timeline per user, as JSON (see app.services.timeline_service)."""
+  __tablename__ = 'user_timelines'
+
+  user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+  data = db.Column(db.Text, nullable=False)
+  updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+  __table_args__ = {'info': {'shard_key': 'user_id'}}
+
+  def __repr__(self):
+    return f'<UserTimeline {self.user_id}>'
@@ -0,0 +1,331 @@
+"""
+Admin analytics over everybody's marks, answered from a columnar snapshot.
+
+A snapshot (`flask analytics snapshot`, or the periodic `analytics_snapshot`
+job) reads every mark once, through the read-only pool and every shard, and
+writes a directory of NumPy arrays under ANALYTICS_DIR:
+
+  user_id.npy    int32/int64  one entry per mark, sorted by (country, status, user)
+  country.npy    int16        index into meta.json's `countries`, not the country id
+  status.npy     int8         0 visited, 1 wishlist
+  visit_start.npy, marked_on.npy  datetime64[D], NaT when missing
+  offsets.npy    int64        marks of country i are [offsets[i], offsets[i + 1])
+  counts.npy     int32        (countries, 2) marks per country and status
+  co_visits.npy  int32        (countries, countries) users who visited both
+  marked_monthly.npy, visit_monthly.npy  int32  (countries, 2, months) marks per
+                 country, status and month marked / visit started, from the
+                 `*_first_month` in meta.json
+
+The arrays are stored uncompressed with narrow dtypes so readers can
+memory-map them: opening a snapshot costs a few page faults, and the pages
+are shared by every worker on the host. The per-mark columns are kept for
+new questions; the current ones are answered from the aggregates, which are
+a few MB whatever the number of marks. Snapshots are written to a temporary
+directory and published by rewriting the CURRENT file, so readers never see
+half of one; the last ANALYTICS_SNAPSHOTS_KEPT stay on disk.
+
+Queries (app/api/admin.py) only read the snapshot, never the database.
+"""
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+import numpy as np
+from flask import current_app
+from app.extensions import db, shards
+from app.models import Country, MarkedCountry
+from app.utils.sqlite_tuning import read_bind
+
+STATUSES = ('visited', 'wishlist')
+FORMAT_VERSION = 1
+LOAD_BATCH_SIZE = 100000
+CO_VISIT_CHUNK = 16384
+CURRENT_FILE = 'CURRENT'
+COLUMNS = (
+  'user_id', 'country', 'status', 'visit_start', 'marked_on',
+  'offsets', 'counts', 'co_visits', 'marked_monthly', 'visit_monthly'
+)
+
+class SnapshotError(Exception):
+  pass
+
+def analytics_dir():
+  return current_app.config.get('ANALYTICS_DIR') or os.path.join(current_app.instance_path, 'analytics')
+
+def load_marks():
+  """Every mark of the current shard as arrays (user_ids, country_ids, statuses, visit_starts, marked_ons)."""
+  query = db.select(
+    MarkedCountry.user_id,
+    MarkedCountry.country_id,
+    MarkedCountry.status,
+    db.cast(MarkedCountry.visit_start_date, db.String),
+    db.func.substr(db.cast(MarkedCountry.created_at, db.String), 1, 10)
+  )
+  chunks = []
+  result = db.session.execute(query.execution_options(yield_per=LOAD_BATCH_SIZE), bind_arguments=read_bind())
+  for rows in result.partitions():
+    user_ids, country_ids, statuses, starts, marked = zip(*rows)
+    chunks.append((
+      np.array(user_ids, dtype=np.int64),
+      np.array(country_ids, dtype=np.int64),
+      (np.array(statuses) == STATUSES[1]).astype(np.int8),
+      np.array(starts, dtype='datetime64[D]'),
+      np.array(marked, dtype='datetime64[D]')
+    ))
+  if not chunks:
+    empty = np.array([], dtype=np.int64)
+    no_dates = np.array([], dtype='datetime64[D]')
+    return empty, empty, np.array([], dtype=np.int8), no_dates, no_dates
+  return tuple(np.concatenate(column) for column in zip(*chunks))
+
+def co_visits(users, countries, size):
+  """(size, size) matrix of how many users visited both countries; `users` are dense ranks."""
+  matrix = np.zeros((size, size), dtype=np.int64)
+  if not len(users):
+    return matrix.astype(np.int32)
+  # One users x countries incidence block at a time keeps memory flat, and each block is a BLAS product
+  order = np.argsort(users, kind='stable')
+  users, countries = users[order], countries[order]
+  bounds = np.searchsorted(users, np.arange(0, users[-1] + CO_VISIT_CHUNK + 1, CO_VISIT_CHUNK))
+  for index in range(len(bounds) - 1):
+    start, stop = bounds[index], bounds[index + 1]
+    if start == stop:
+      continue
+    rows = users[start:stop] - index * CO_VISIT_CHUNK
+    block = np.zeros((rows[-1] + 1, size), dtype=np.float32)
+    block[rows, countries[start:stop]] = 1
+    matrix += (block.T @ block).astype(np.int64)
+  return matrix.astype(np.int32)
+
+def monthly_counts(countries, statuses, dates, size):
+  # -> ((size, 2, months) int32 of marks per country, status and month, first month as 'YYYY-MM'); undated marks are left out
+  months = dates.astype('datetime64[M]')
+  dated = ~np.isnat(months)
+  if not dated.any():
+    return np.zeros((size, 2, 0), dtype=np.int32), '1970-01'
+  first = months[dated].min()
+  offset = (months[dated] - first).astype(np.int64)
+  span = int(offset.max()) + 1
+  key = (countries[dated] * 2 + statuses[dated]) * span + offset
+  return np.bincount(key, minlength=size * 2 * span).reshape(size, 2, span).astype(np.int32), str(first)
+
+def build_snapshot(path, columns, countries, created_at=None):
+  """Writes the snapshot arrays of `columns` (see load_marks) to directory `path`.
+
+  `countries` are (id, code, name, continent) rows; marks of countries not
+  among them are dropped.
+  """
+  user_ids, country_ids, statuses, visit_starts, marked_ons = columns
+  countries = sorted(tuple(row) for row in countries)
+  ids = np.array([row[0] for row in countries], dtype=np.int64)
+  size = len(ids)
+
+  index = np.searchsorted(ids, country_ids)
+  known = (index < size) & (ids[np.minimum(index, size - 1)] == country_ids) if size else np.zeros(len(country_ids), bool)
+  index, user_ids, statuses = index[known], user_ids[known], statuses[known]
+  visit_starts, marked_ons = visit_starts[known], marked_ons[known]
+
+  order = np.lexsort((user_ids, statuses, index))
+  user_dtype = np.int32 if not len(user_ids) or user_ids.max() < 2 ** 31 else np.int64
+  arrays = {
+    'user_id': user_ids[order].astype(user_dtype),
+    'country': index[order].astype(np.int16),
+    'status': statuses[order].astype(np.int8),
+    'visit_start': visit_starts[order],
+    'marked_on': marked_ons[order],
+    'offsets': np.concatenate(([0], np.cumsum(np.bincount(index, minlength=size)))).astype(np.int64),
+    'counts': np.bincount(index * 2 + statuses, minlength=size * 2).reshape(size, 2).astype(np.int32)
+  }
+  visited = statuses == 0
+  _, user_rank = np.unique(user_ids[visited], return_inverse=True)
+  arrays['co_visits'] = co_visits(user_rank, index[visited], size)
+  first_months = {}
+  for by, dates in (('marked', marked_ons), ('visit', visit_starts)):
+    arrays[f'{by}_monthly'], first_months[f'{by}_first_month'] = monthly_counts(index, statuses, dates, size)
+
+  os.makedirs(path)
+  for name, array in arrays.items():
+    np.save(os.path.join(path, f'{name}.npy'), array)
+  meta = {
+    'version': FORMAT_VERSION,
+    'created_at': (created_at or datetime.now(timezone.utc)).isoformat(),
+    'marks': int(len(order)),
+    'users': int(len(np.unique(user_ids))),
+    'countries': [list(row) for row in countries],
+    **first_months
+  }
+  with open(os.path.join(path, 'meta.json'), 'w') as file:
+    json.dump(meta, file)
+  return meta
+
+def write_snapshot():
+  """Snapshots every mark, publishes it as the current snapshot and prunes old ones; returns its meta."""
+  root = analytics_dir()
+  os.makedirs(root, exist_ok=True)
+  countries = db.session.execute(
+    db.select(Country.id, Country.code, Country.name, Country.continent), bind_arguments=read_bind()
+  ).all()
+  per_shard = shards.scatter(lambda name: load_marks()).values()
+  columns = tuple(np.concatenate(column) for column in zip(*per_shard))
+
+  created_at = datetime.now(timezone.utc)
+  name = created_at.strftime('%Y%m%dT%H%M%S%fZ')
+  staging = os.path.join(root, f'.{name}.tmp')
+  meta = build_snapshot(staging, columns, countries, created_at)
+  os.rename(staging, os.path.join(root, name))
+  pointer = os.path.join(root, f'.{CURRENT_FILE}.tmp')
+  with open(pointer, 'w') as file:
+    file.write(name)
+  os.replace(pointer, os.path.join(root, CURRENT_FILE))
+
+  # Readers that still map a pruned snapshot keep their pages until they switch
+  kept = current_app.config.get('ANALYTICS_SNAPSHOTS_KEPT', 3)
+  snapshots = sorted(entry for entry in os.listdir(root) if not entry.startswith('.') and entry != CURRENT_FILE)
+  for old in snapshots[:-kept]:
+    shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+  return {'snapshot': name, **{key: meta[key] for key in ('created_at', 'marks', 'users')}}
+
+class Snapshot:
+  """A published snapshot, memory-mapped. Every method only reads the arrays."""
+
+  def __init__(self, path):
+    self.path = path
+    with open(os.path.join(path, 'meta.json')) as file:
+      self.meta = json.load(file)
+    if self.meta.get('version') != FORMAT_VERSION:
+      raise SnapshotError(f'Unsupported snapshot version: {self.meta.get("version")}')
+    for name in COLUMNS:
+      setattr(self, name, np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r'))
+    self.countries = [tuple(row) for row in self.meta['countries']]
+    self.by_code = {row[1]: index for index, row in enumerate(self.countries)}
+
+  def info(self):
+    created_at = datetime.fromisoformat(self.meta['created_at'])
+    return {
+      'snapshot': os.path.basename(self.path),
+      'created_at': self.meta['created_at'],
+      'age_seconds': round((datetime.now(timezone.utc) - created_at).total_seconds()),
+      'marks': self.meta['marks'],
+      'users': self.meta['users'],
+      'countries': len(self.countries)
+    }
+
+  def describe(self, index, **extra):
+    _, code, name, continent = self.countries[index]
+    return {'code': code, 'name': name, 'continent': continent, **extra}
+
+  def index_of(self, code):
+    index = self.by_code.get(code.upper())
+    if index is None:
+      raise KeyError(code)
+    return index
+
+  def popularity(self, status='visited', continent=None, limit=20):
+    """Countries with the most users marking them `status`."""
+    counts = np.asarray(self.counts[:, STATUSES.index(status)])
+    candidates = np.arange(len(self.countries))
+    if continent is not None:
+      candidates = np.array([index for index, row in enumerate(self.countries) if row[3] == continent], dtype=np.int64)
+    ranked = candidates[np.lexsort((candidates, -counts[candidates]))][:limit]
+    users = max(self.meta['users'], 1)
+    return [
+      self.describe(index, users=int(counts[index]), share=round(float(counts[index]) / users, 4))
+      for index in ranked if counts[index]
+    ]
+
+  def co_visitation(self, code, limit=10):
+    """Countries most often visited by the visitors of `code`, with P(other | code) and lift."""
+    index = self.index_of(code)
+    row = np.asarray(self.co_visits[index], dtype=np.int64)
+    diagonal = np.asarray(self.co_visits.diagonal(), dtype=np.int64)
+    visitors = int(row[index])
+    users = max(self.meta['users'], 1)
+    others = np.flatnonzero(row)
+    others = others[others != index]
+    ranked = others[np.lexsort((others, -row[others]))][:limit]
+    return {
+      'country': self.describe(index, visitors=visitors),
+      'co_visited': [
+        self.describe(
+          other,
+          users=int(row[other]),
+          probability=round(float(row[other]) / visitors, 4),
+          lift=round(float(row[other]) * users / (visitors * float(diagonal[other])), 4)
+        )
+        for other in ranked
+      ]
+    }
+
+  def co_visitation_matrix(self, codes):
+    indexes = [self.index_of(code) for code in codes]
+    matrix = np.asarray(self.co_visits)[np.ix_(indexes, indexes)]
+    return {'codes': [self.countries[index][1] for index in indexes], 'matrix': matrix.tolist()}
+
+  def _monthly(self, by, status):
+    # -> ((countries, months) counts, first month) for marks of `status` by marked day or visit start
+    cube = self.marked_monthly if by == 'marked' else self.visit_monthly
+    return np.asarray(cube[:, STATUSES.index(status), :], dtype=np.int64), np.datetime64(self.meta[f'{by}_first_month'], 'M')
+
+  def trends(self, codes=(), status='visited', by='marked', interval='month', since=None):
+    """Marks per month (or year) overall and for each of `codes`, by the day they were marked or the visit start."""
+    monthly, first = self._monthly(by, status)
+    series = {'all': monthly.sum(axis=0)}
+    for code in codes:
+      index = self.index_of(code)
+      series[self.countries[index][1]] = monthly[index]
+    labels = first + np.arange(monthly.shape[1])
+    if interval == 'year':
+      # Months to years: sum each year's run of months
+      years = labels.astype('datetime64[Y]')
+      starts = np.flatnonzero(np.concatenate(([True], years[1:] != years[:-1]))) if len(years) else np.array([], dtype=np.int64)
+      labels = years[starts]
+      series = {key: np.add.reduceat(values, starts) if len(starts) else values for key, values in series.items()}
+    keep = series['all'] > 0
+    if since is not None:
+      keep &= labels >= np.datetime64(since).astype(labels.dtype)
+    if not keep.any():
+      return {'periods': [], 'series': {key: [] for key in series}}
+    used = np.flatnonzero(keep)
+    window = slice(used[0], used[-1] + 1)
+    return {
+      'periods': labels[window].astype(str).tolist(),
+      'series': {key: values[window].tolist() for key, values in series.items()}
+    }
+
+  def rising(self, status='visited', window=3, limit=10, today=None):
+    """Countries whose marks in the last `window` months grew the most over the `window` months before."""
+    monthly, first = self._monthly('marked', status)
+    month = int(np.datetime64(today or datetime.now(timezone.utc).date(), 'M') - first)
+    def total(stop):
+      # Marks in the `window` months up to and including month `stop` (relative to `first`)
+      start, stop = max(stop - window + 1, 0), min(stop + 1, monthly.shape[1])
+      return monthly[:, start:stop].sum(axis=1) if stop > start else np.zeros(len(monthly), dtype=np.int64)
+    recent, before = total(month), total(month - window)
+    growth = recent - before
+    candidates = np.flatnonzero(recent)
+    ranked = candidates[np.lexsort((candidates, -growth[candidates]))][:limit]
+    return [
+      self.describe(index, recent=int(recent[index]), previous=int(before[index]), growth=int(growth[index]))
+      for index in ranked if growth[index] > 0
+    ]
+
+def current_snapshot():
+  """The published Snapshot, opened once per process and reopened when a newer one is published; None if there is none."""
+  root = analytics_dir()
+  try:
+    with open(os.path.join(root, CURRENT_FILE)) as file:
+      name = file.read().strip()
+  except FileNotFoundError:
+    return None
+  snapshot = current_app.extensions.get('analytics_snapshot')
+  if snapshot is None or os.path.basename(snapshot.path) != name:
+    snapshot = current_app.extensions['analytics_snapshot'] = Snapshot(os.path.join(root, name))
+  return snapshot
+
+def schedule_snapshot(delay=0):
+  """Queues the next analytics_snapshot job, unless one is already queued."""
+  from app.models import Job
+  from app.services.job_service import enqueue
+  # Only queued ones: the running job schedules its own successor
+  pending = Job.query.filter_by(type='analytics_snapshot', status='queued').first()
+  return pending or enqueue('analytics_snapshot', delay=delay)
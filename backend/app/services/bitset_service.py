@@ -0,0 +1,113 @@
+import base64
+import numpy as np
+from app.services.country_service import COUNTRIES_DATA
+
+# Bit i of a bitset is COUNTRIES_DATA[i]; append new countries at the end so existing bits keep their meaning
+CATALOG_CODES = tuple(country['code'] for country in COUNTRIES_DATA)
+CATALOG_INDEX = {code: i for i, code in enumerate(CATALOG_CODES)}
+BITSET_BYTES = (len(CATALOG_CODES) + 7) // 8
+
+# Catalog version -> how many COUNTRIES_DATA entries it covers. The ordering is append-only,
+# so every version is a prefix of the current one; add a version whenever countries are appended
+CATALOG_SIZES = {1: 195}
+CATALOG_VERSION = max(CATALOG_SIZES)
+
+# Set bits per byte value, for popcounts over whole matrices of bitsets
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint16)
+
+def to_bitset(codes):
+  # Codes outside the catalog are ignored
+  bits = 0
+  for code in codes:
+    index = CATALOG_INDEX.get(code)
+    if index is not None:
+      bits |= 1 << index
+  return bits
+
+def to_codes(bits):
+  # Codes in catalog order
+  codes = []
+  while bits:
+    low = bits & -bits
+    codes.append(CATALOG_CODES[low.bit_length() - 1])
+    bits ^= low
+  return codes
+
+def popcount(bits):
+  return bin(bits).count('1')
+
+def jaccard(a, b):
+  union = popcount(a | b)
+  return round(popcount(a & b) / union, 4) if union else 0.0
+
+def to_bytes(bits):
+  return bits.to_bytes(BITSET_BYTES, 'little')
+
+def from_bytes(data):
+  return int.from_bytes(data, 'little')
+
+def compare(mine, theirs):
+  """Compare two (visited, wishlist) bitset pairs from the first user's point of view."""
+  my_visited, my_wishlist = mine
+  their_visited, their_wishlist = theirs
+  return {
+    'visited_both': to_codes(my_visited & their_visited),
+    'visited_only_me': to_codes(my_visited & ~their_visited),
+    'visited_only_them': to_codes(their_visited & ~my_visited),
+    'wishlist_both': to_codes(my_wishlist & their_wishlist),
+    'their_visited_on_my_wishlist': to_codes(their_visited & my_wishlist),
+    'my_visited_on_their_wishlist': to_codes(my_visited & their_wishlist),
+    'visited_jaccard': jaccard(my_visited, their_visited)
+  }
+
+def rank_similar(target, user_ids, matrix, limit=10):
+  """Top `limit` rows of `matrix` (one bitset per row, BITSET_BYTES wide) by Jaccard similarity to `target`.
+
+  Returns [(user_id, jaccard, shared_count)], best first; rows sharing nothing are skipped.
+  """
+  if not len(user_ids):
+    return []
+  target = np.frombuffer(to_bytes(target), dtype=np.uint8)
+  shared = POPCOUNT[matrix & target].sum(axis=1, dtype=np.int64)
+  union = POPCOUNT[matrix | target].sum(axis=1, dtype=np.int64)
+  scores = np.divide(shared, union, out=np.zeros(len(shared)), where=union > 0)
+
+  candidates = np.flatnonzero(shared > 0)
+  if len(candidates) > limit:
+    candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+  # Best score first, then more countries in common, then lower user id
+  order = np.lexsort((user_ids[candidates], -shared[candidates], -scores[candidates]))
+  return [
+    (int(user_ids[i]), round(float(scores[i]), 4), int(shared[i]))
+    for i in candidates[order]
+  ]
+
+def catalog_codes(version=CATALOG_VERSION):
+  return CATALOG_CODES[:CATALOG_SIZES[version]]
+
+def encode_map_state(visited, wishlist, version=CATALOG_VERSION):
+  """Version byte + visited bitset + wishlist bitset, base64url without padding (68 chars for 195 countries)."""
+  width = (CATALOG_SIZES[version] + 7) // 8
+  raw = bytes([version]) + visited.to_bytes(width, 'little') + wishlist.to_bytes(width, 'little')
+  return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+def decode_map_state(state):
+  # -> (version, visited, wishlist); ValueError for anything that is not a valid state
+  try:
+    raw = base64.urlsafe_b64decode(state + '=' * (-len(state) % 4))
+  except (TypeError, ValueError):
+    raise ValueError('Invalid map state')
+  if not raw or raw[0] not in CATALOG_SIZES:
+    raise ValueError('Unknown catalog version')
+  version = raw[0]
+  width = (CATALOG_SIZES[version] + 7) // 8
+  if len(raw) != 1 + 2 * width:
+    raise ValueError('Invalid map state length')
+  return version, from_bytes(raw[1:1 + width]), from_bytes(raw[1 + width:])
+
+def map_state_statuses(state):
+  # {country_code: status}, as rendered on a map
+  _, visited, wishlist = decode_map_state(state)
+  statuses = {code: 'wishlist' for code in to_codes(wishlist)}
+  statuses.update((code, 'visited') for code in to_codes(visited))
+  return statuses
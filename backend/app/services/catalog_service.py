@@ -0,0 +1,57 @@
+"""
+Immutable country catalog, built once per process (or once in a pre-fork
+master, see app.utils.prefork) instead of per request.
+
+Everything is plain tuples, dicts of tuples and bytes, with interned strings:
+no ORM instances, and the response bodies of GET /api/countries are serialized
+up front, so serving them touches one bytes object instead of ~1000 small ones.
+"""
+import sys
+from flask import current_app
+from app.extensions import db
+from app.models import Country
+from app.utils.sqlite_tuning import read_bind
+
+def _intern(value):
+  return sys.intern(value) if isinstance(value, str) else value
+
+class CountryCatalog:
+  """Countries as (id, name, code, flag, continent) tuples, ordered by id. Treat every attribute as read-only."""
+
+  __slots__ = ('rows', 'by_id', 'by_code', 'names', 'continents', '_payloads')
+
+  def __init__(self, rows, dumps):
+    self.rows = tuple(tuple(_intern(value) for value in row) for row in rows)
+    self.by_id = {row[0]: row for row in self.rows}
+    self.by_code = {row[2]: row for row in self.rows}
+    # {id: (name, code)}, the shape returned by country_service.get_country_catalog()
+    self.names = {row[0]: (row[1], row[2]) for row in self.rows}
+    continents = {}
+    for row in self.rows:
+      continents.setdefault(row[4], []).append(row)
+    self.continents = {name: tuple(rows) for name, rows in continents.items()}
+    self._payloads = {
+      continent: dumps([Country.row_to_dict(row) for row in rows]).encode('utf-8')
+      for continent, rows in ((None, self.rows), *self.continents.items())
+    }
+
+  def payload(self, continent=None):
+    # JSON body of GET /api/countries[?continent=]; an unknown continent lists nothing, like the query would
+    return self._payloads.get(continent, b'[]')
+
+def build_catalog():
+  rows = db.session.execute(
+    db.select(Country.id, Country.name, Country.code, Country.flag, Country.continent).order_by(Country.id),
+    bind_arguments=read_bind()
+  ).all()
+  return CountryCatalog(rows, current_app.json.dumps)
+
+def get_catalog():
+  catalog = current_app.extensions.get('country_catalog')
+  if catalog is None:
+    catalog = current_app.extensions['country_catalog'] = build_catalog()
+  return catalog
+
+def reset_catalog():
+  # After the countries table changes (country_service.import_countries)
+  current_app.extensions.pop('country_catalog', None)
@@ -1,5 +1,6 @@
-from app.models import Country
-from app.extensions import db
+from app.models import Country, Region, region_countries
+from app.extensions import db, cache
+from app.services.catalog_service import get_catalog, reset_catalog
 
 COUNTRIES_DATA = [
   {'name': 'Afghanistan', 'code': 'AF', 'flag': '🇦🇫', 'continent': 'Asia'},
@@ -199,6 +200,36 @@ COUNTRIES_DATA = [
   {'name': 'Zimbabwe', 'code': 'ZW', 'flag': '🇿🇼', 'continent': 'Africa'}
 ]
 
+# Subregions (UN M49, grouped under the continents used by COUNTRIES_DATA) and their country codes
+REGIONS_DATA = [
+  {'name': 'Northern Africa', 'continent': 'Africa', 'countries': ['DZ', 'EG', 'LY', 'MA', 'SD', 'TN']},
+  {'name': 'Eastern Africa', 'continent': 'Africa', 'countries': ['BI', 'KM', 'DJ', 'ER', 'ET', 'KE', 'MG', 'MW', 'MU', 'MZ', 'RW', 'SC', 'SO', 'SS', 'TZ', 'UG', 'ZM', 'ZW']},
+  {'name': 'Middle Africa', 'continent': 'Africa', 'countries': ['AO', 'CM', 'CF', 'TD', 'CG', 'CD', 'GQ', 'GA', 'ST']},
+  {'name': 'Southern Africa', 'continent': 'Africa', 'countries': ['BW', 'SZ', 'LS', 'NA', 'ZA']},
+  {'name': 'Western Africa', 'continent': 'Africa', 'countries': ['BJ', 'BF', 'CV', 'GM', 'GH', 'GN', 'GW', 'LR', 'ML', 'MR', 'NE', 'NG', 'SN', 'SL', 'TG']},
+  {'name': 'Central Asia', 'continent': 'Asia', 'countries': ['KZ', 'KG', 'TJ', 'TM', 'UZ']},
+  {'name': 'Eastern Asia', 'continent': 'Asia', 'countries': ['CN', 'JP', 'KP', 'KR', 'MN', 'TW']},
+  {'name': 'South-eastern Asia', 'continent': 'Asia', 'countries': ['BN', 'KH', 'ID', 'LA', 'MY', 'MM', 'PH', 'SG', 'TH', 'VN']},
+  {'name': 'Southern Asia', 'continent': 'Asia', 'countries': ['AF', 'BD', 'BT', 'IN', 'IR', 'MV', 'NP', 'PK', 'LK']},
+  {'name': 'Western Asia', 'continent': 'Asia', 'countries': ['AM', 'AZ', 'BH', 'CY', 'GE', 'IQ', 'IL', 'JO', 'KW', 'LB', 'OM', 'PS', 'QA', 'SA', 'SY', 'TR', 'AE', 'YE']},
+  {'name': 'Eastern Europe', 'continent': 'Europe', 'countries': ['BY', 'BG', 'CZ', 'HU', 'MD', 'PL', 'RO', 'RU', 'SK', 'UA']},
+  {'name': 'Northern Europe', 'continent': 'Europe', 'countries': ['DK', 'EE', 'FI', 'IS', 'IE', 'LV', 'LT', 'NO', 'SE', 'GB']},
+  {'name': 'Southern Europe', 'continent': 'Europe', 'countries': ['AL', 'AD', 'BA', 'HR', 'GR', 'IT', 'XK', 'MT', 'ME', 'MK', 'PT', 'SM', 'RS', 'SI', 'ES', 'VA']},
+  {'name': 'Western Europe', 'continent': 'Europe', 'countries': ['AT', 'BE', 'FR', 'DE', 'LI', 'LU', 'MC', 'NL', 'CH']},
+  {'name': 'Northern America', 'continent': 'North America', 'countries': ['CA', 'US']},
+  {'name': 'Central America', 'continent': 'North America', 'countries': ['BZ', 'CR', 'SV', 'GT', 'HN', 'MX', 'NI', 'PA']},
+  {'name': 'Caribbean', 'continent': 'North America', 'countries': ['AG', 'BS', 'BB', 'CU', 'DM', 'DO', 'GD', 'HT', 'JM', 'KN', 'LC', 'VC', 'TT']},
+  {'name': 'South America', 'continent': 'South America', 'countries': ['AR', 'BO', 'BR', 'CL', 'CO', 'EC', 'GY', 'PY', 'PE', 'SR', 'UY', 'VE']},
+  {'name': 'Australia and New Zealand', 'continent': 'Oceania', 'countries': ['AU', 'NZ']},
+  {'name': 'Melanesia', 'continent': 'Oceania', 'countries': ['FJ', 'PG', 'SB', 'VU']},
+  {'name': 'Micronesia', 'continent': 'Oceania', 'countries': ['KI', 'MH', 'FM', 'NR', 'PW']},
+  {'name': 'Polynesia', 'continent': 'Oceania', 'countries': ['WS', 'TO', 'TV']}
+]
+
+def get_country_catalog():
+  # {country_id: (name, code)} for existence checks and labels without a query; rebuilt when countries are imported
+  return get_catalog().names
+
 def import_countries():
   existing_count = Country.query.count()
 
@@ -218,5 +249,32 @@ def import_countries():
     imported += 1
 
   db.session.commit()
+  cache.invalidate('countries')
+  reset_catalog()
   return {'imported': imported, 'updated': 0, 'message': f'Imported {imported} countries'}
 
+
+def import_regions():
+  # Separate from import_countries so databases seeded before regions existed still get them
+  if Region.query.count() > 0:
+    return {'imported': 0, 'message': 'Regions already exist, skipping import'}
+
+  country_ids = dict(db.session.execute(db.select(Country.code, Country.id)).all())
+  continents = {}
+  for name in dict.fromkeys(country['continent'] for country in COUNTRIES_DATA):
+    continents[name] = Region(name=name, level='continent')
+    db.session.add(continents[name])
+  db.session.flush()
+
+  for region_data in REGIONS_DATA:
+    region = Region(name=region_data['name'], level='subregion', parent_id=continents[region_data['continent']].id)
+    db.session.add(region)
+    db.session.flush()
+    db.session.execute(region_countries.insert(), [
+      {'region_id': region.id, 'country_id': country_ids[code]}
+      for code in region_data['countries'] if code in country_ids
+    ])
+
+  db.session.commit()
+  imported = len(continents) + len(REGIONS_DATA)
+  return {'imported': imported, 'message': f'Imported {imported} regions'}
@@ -0,0 +1,44 @@
+import numpy as np
+from app.extensions import db
+from app.models import User
+from app.services.bitset_service import BITSET_BYTES, compare, rank_similar, to_bytes, to_codes
+from app.services.marks_service import get_user_bitsets, get_users_bitsets
+
+def compare_users(user_id, other_ids):
+  """Pairwise comparison of `user_id` against each of `other_ids`, plus what all of them share."""
+  bitsets = get_users_bitsets([user_id, *other_ids])
+  mine = bitsets.pop(user_id)
+  others = {other_id: bitsets[other_id] for other_id in other_ids}
+  names = dict(db.session.execute(db.select(User.id, User.name).where(User.id.in_(other_ids))).all())
+
+  visited_by_all = mine[0]
+  for visited, _ in others.values():
+    visited_by_all &= visited
+
+  return {
+    'comparisons': [
+      {'user': {'id': other_id, 'name': names.get(other_id)}, **compare(mine, theirs)}
+      for other_id, theirs in others.items()
+    ],
+    'visited_by_all': to_codes(visited_by_all)
+  }
+
+def similar_travelers(user_id, candidate_ids, limit=10):
+  """Those of `candidate_ids` whose visited countries overlap most with `user_id`'s, ranked by Jaccard similarity."""
+  candidate_ids = sorted(set(candidate_ids) - {user_id})
+  visited, _ = get_user_bitsets(user_id)
+  if not visited or not candidate_ids:
+    return []
+
+  bitsets = get_users_bitsets(candidate_ids)
+  user_ids = np.array(candidate_ids, dtype=np.int64)
+  matrix = np.frombuffer(
+    b''.join(to_bytes(bitsets[other_id][0]) for other_id in candidate_ids), dtype=np.uint8
+  ).reshape(len(candidate_ids), BITSET_BYTES)
+
+  ranked = rank_similar(visited, user_ids, matrix, limit)
+  names = dict(db.session.execute(db.select(User.id, User.name).where(User.id.in_([row[0] for row in ranked]))).all())
+  return [
+    {'user': {'id': other_id, 'name': names.get(other_id)}, 'visited_jaccard': score, 'visited_both_count': shared}
+    for other_id, score, shared in ranked
+  ]
@@ -0,0 +1,174 @@
+from functools import lru_cache
+import numpy as np
+from app.services.geometry_service import load_features
+
+# Grid cell size for the index, in degrees
+CELL_DEGREES = 0.5
+# Points this close (in degrees, ~11 km at the equator) to a border still resolve,
+# so photos taken on a beach are not lost to the simplified coastline
+SNAP_DEGREES = 0.1
+# Upper bound on points x edges evaluated at once, keeps temporaries at a few MB
+CHUNK_ELEMENTS = 1 << 20
+
+NEEDS_TEST = -1
+NO_COUNTRY = -2
+
+class GeocodingIndex:
+  """
+  Offline point -> Country.code lookup over the bundled geometry.
+
+  A regular grid maps every cell to the polygons whose (snap-expanded) bounding
+  box overlaps it. Cells no border passes through are resolved once at build
+  time, so most inland and open-sea points are a single array lookup; the rest
+  get exact even-odd point-in-polygon tests, batched per polygon.
+  """
+
+  def __init__(self, features, cell=CELL_DEGREES, snap=SNAP_DEGREES):
+    self.cell = cell
+    self.snap = snap
+    self.cols, self.rows = int(round(360 / cell)), int(round(180 / cell))
+
+    codes, bboxes, edges, edge_start = [], [], [], [0]
+    for code, _, polygons in features:
+      if not code:
+        continue
+      for polygon in polygons:
+        ring_edges = [np.hstack([ring[:-1], ring[1:]]) for ring in (np.asarray(ring, dtype=float) for ring in polygon)]
+        polygon_edges = np.vstack(ring_edges)
+        outer = np.asarray(polygon[0], dtype=float)
+        codes.append(code)
+        bboxes.append([*outer.min(axis=0), *outer.max(axis=0)])
+        edges.append(polygon_edges)
+        edge_start.append(edge_start[-1] + len(polygon_edges))
+
+    self.codes = np.array(codes + [None], dtype=object)
+    self.bboxes = np.array(bboxes)
+    self.edges = np.vstack(edges)
+    self.edge_start = np.array(edge_start)
+
+    x1, y1, x2, y2 = self.edges.T
+    dx, dy = x2 - x1, y2 - y1
+    with np.errstate(divide='ignore', invalid='ignore'):
+      self.inverse_slope = np.where(dy != 0, dx / dy, 0.0)
+    self.length_sq = np.where(dx * dx + dy * dy > 0, dx * dx + dy * dy, 1.0)
+
+    self._build_grid()
+
+  def _cells(self, lon, lat):
+    ix = np.clip(np.floor((lon + 180) / self.cell).astype(np.int64), 0, self.cols - 1)
+    iy = np.clip(np.floor((lat + 90) / self.cell).astype(np.int64), 0, self.rows - 1)
+    return iy * self.cols + ix
+
+  def _cell_ranges(self, west, south, east, north):
+    ix0 = np.clip(np.floor((np.asarray(west) - self.snap + 180) / self.cell).astype(np.int64), 0, self.cols - 1)
+    ix1 = np.clip(np.floor((np.asarray(east) + self.snap + 180) / self.cell).astype(np.int64), 0, self.cols - 1)
+    iy0 = np.clip(np.floor((np.asarray(south) - self.snap + 90) / self.cell).astype(np.int64), 0, self.rows - 1)
+    iy1 = np.clip(np.floor((np.asarray(north) + self.snap + 90) / self.cell).astype(np.int64), 0, self.rows - 1)
+    return ix0, ix1, iy0, iy1
+
+  def _build_grid(self):
+    # CSR layout: candidates of cell c are cell_polygons[cell_start[c]:cell_start[c + 1]]
+    pair_cells, pair_polygons = [], []
+    for polygon, (ix0, ix1, iy0, iy1) in enumerate(zip(*self._cell_ranges(*self.bboxes.T))):
+      cells = (np.arange(iy0, iy1 + 1)[:, None] * self.cols + np.arange(ix0, ix1 + 1)[None, :]).ravel()
+      pair_cells.append(cells)
+      pair_polygons.append(np.full(len(cells), polygon))
+    pair_cells, pair_polygons = np.concatenate(pair_cells), np.concatenate(pair_polygons)
+    order = np.argsort(pair_cells, kind='stable')
+    self.cell_polygons = pair_polygons[order]
+    self.cell_start = np.concatenate([[0], np.cumsum(np.bincount(pair_cells, minlength=self.cols * self.rows))])
+
+    # Cells crossed by a border (or within snapping distance of one) need exact tests
+    x1, y1, x2, y2 = self.edges.T
+    touched = np.zeros(self.cols * self.rows, dtype=bool)
+    for ix0, ix1, iy0, iy1 in zip(*self._cell_ranges(np.minimum(x1, x2), np.minimum(y1, y2), np.maximum(x1, x2), np.maximum(y1, y2))):
+      touched.reshape(self.rows, self.cols)[iy0:iy1 + 1, ix0:ix1 + 1] = True
+
+    # Every other cell lies entirely inside one polygon or outside all of them: test its center once
+    self.cell_owner = np.full(self.cols * self.rows, NEEDS_TEST, dtype=np.int64)
+    untouched = np.flatnonzero(~touched)
+    centers_lon = (untouched % self.cols + 0.5) * self.cell - 180
+    centers_lat = (untouched // self.cols + 0.5) * self.cell - 90
+    owners = self._resolve(centers_lon, centers_lat, untouched, snap=False)
+    self.cell_owner[untouched] = owners
+
+  def _contains(self, polygon, lon, lat):
+    start, end = self.edge_start[polygon], self.edge_start[polygon + 1]
+    x1, y1, _, y2 = self.edges[start:end].T
+    inverse_slope = self.inverse_slope[start:end]
+    inside = np.empty(len(lon), dtype=bool)
+    step = max(1, CHUNK_ELEMENTS // (end - start))
+    for i in range(0, len(lon), step):
+      px, py = lon[i:i + step, None], lat[i:i + step, None]
+      crosses = ((y1 > py) != (y2 > py)) & (px < x1 + (py - y1) * inverse_slope)
+      inside[i:i + step] = np.count_nonzero(crosses, axis=1) % 2 == 1
+    return inside
+
+  def _distance(self, polygon, lon, lat):
+    start, end = self.edge_start[polygon], self.edge_start[polygon + 1]
+    x1, y1, x2, y2 = self.edges[start:end].T
+    length_sq = self.length_sq[start:end]
+    distance = np.empty(len(lon))
+    step = max(1, CHUNK_ELEMENTS // (end - start))
+    for i in range(0, len(lon), step):
+      px, py = lon[i:i + step, None], lat[i:i + step, None]
+      t = np.clip(((px - x1) * (x2 - x1) + (py - y1) * (y2 - y1)) / length_sq, 0, 1)
+      distance[i:i + step] = np.sqrt(((px - x1 - t * (x2 - x1)) ** 2 + (py - y1 - t * (y2 - y1)) ** 2).min(axis=1))
+    return distance
+
+  def _candidates(self, lon, lat, cells, margin):
+    # (point, polygon) pairs from each point's cell, pruned by the polygon bounding box
+    starts = self.cell_start[cells]
+    counts = self.cell_start[cells + 1] - starts
+    points = np.repeat(np.arange(len(cells)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    polygons = self.cell_polygons[np.repeat(starts, counts) + offsets]
+
+    west, south, east, north = self.bboxes[polygons].T
+    x, y = lon[points], lat[points]
+    keep = (x >= west - margin) & (x <= east + margin) & (y >= south - margin) & (y <= north + margin)
+    points, polygons = points[keep], polygons[keep]
+    order = np.argsort(polygons, kind='stable')
+    points, polygons = points[order], polygons[order]
+    bounds = np.flatnonzero(np.diff(polygons)) + 1
+    return zip(np.split(polygons, bounds), np.split(points, bounds))
+
+  def _resolve(self, lon, lat, cells, snap=True):
+    result = np.full(len(lon), NO_COUNTRY, dtype=np.int64)
+    for polygons, points in self._candidates(lon, lat, cells, 0.0):
+      if len(points):
+        inside = self._contains(polygons[0], lon[points], lat[points])
+        result[points[inside]] = polygons[0]
+
+    missing = np.flatnonzero(result == NO_COUNTRY)
+    if snap and self.snap > 0 and len(missing):
+      best = np.full(len(missing), self.snap)
+      for polygons, points in self._candidates(lon[missing], lat[missing], cells[missing], self.snap):
+        if len(points):
+          distance = self._distance(polygons[0], lon[missing][points], lat[missing][points])
+          closer = distance <= best[points]
+          best[points[closer]] = distance[closer]
+          result[missing[points[closer]]] = polygons[0]
+    return result
+
+  def locate(self, lon, lat):
+    """Country codes (or None) for arrays of longitudes/latitudes."""
+    lon = np.asarray(lon, dtype=float).ravel()
+    lat = np.asarray(lat, dtype=float).ravel()
+    cells = self._cells(lon, lat)
+    result = self.cell_owner[cells]
+
+    pending = np.flatnonzero(result == NEEDS_TEST)
+    if len(pending):
+      result[pending] = self._resolve(lon[pending], lat[pending], cells[pending])
+    return self.codes[np.where(result >= 0, result, len(self.codes) - 1)].tolist()
+
+@lru_cache(maxsize=1)
+def get_index():
+  # Built once per process from the bundled geometry (~0.1s)
+  return GeocodingIndex(load_features())
+
+def locate_points(points):
+  """[(lat, lon), ...] -> [code or None, ...]"""
+  points = np.asarray(points, dtype=float).reshape(-1, 2)
+  return get_index().locate(points[:, 1], points[:, 0])
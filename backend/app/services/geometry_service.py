@@ -0,0 +1,99 @@
+import json
+import os
+from functools import lru_cache
+from app.services.country_service import COUNTRIES_DATA
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+GEOMETRY_PATH = os.path.join(DATA_DIR, 'countries.geojson')
+
+# Names used by the source GeoJSON that differ from COUNTRIES_DATA
+NAME_ALIASES = {
+  'Democratic Republic of the Congo': 'Congo (Kinshasa)',
+  'Republic of the Congo': 'Congo (Brazzaville)',
+  'Guinea Bissau': 'Guinea-Bissau',
+  'Macedonia': 'North Macedonia',
+  'Republic of Serbia': 'Serbia',
+  'Swaziland': 'Eswatini',
+  'The Bahamas': 'Bahamas',
+  'United Republic of Tanzania': 'Tanzania',
+  'West Bank': 'Palestine'
+}
+
+def build_geometry(source_path, output_path=GEOMETRY_PATH, precision=4):
+  """Convert a world GeoJSON keyed by country name into the bundled file keyed by Country.code.
+
+  Land that is not in the catalog (Antarctica, Greenland, ...) is kept with a
+  null code so maps still draw it. Coordinates are rounded to `precision` decimals.
+  """
+  with open(source_path) as f:
+    source = json.load(f)
+  codes_by_name = {country['name']: country['code'] for country in COUNTRIES_DATA}
+
+  features = []
+  for feature in source['features']:
+    name = feature['properties']['name']
+    geometry = feature['geometry']
+    polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+    polygons = [
+      [[[round(lon, precision), round(lat, precision)] for lon, lat in ring] for ring in polygon]
+      for polygon in polygons
+    ]
+    features.append({
+      'type': 'Feature',
+      'properties': {'code': codes_by_name.get(NAME_ALIASES.get(name, name)), 'name': name},
+      'geometry': {'type': 'MultiPolygon', 'coordinates': polygons}
+    })
+
+  features.sort(key=lambda feature: feature['properties']['name'])
+  os.makedirs(os.path.dirname(output_path), exist_ok=True)
+  with open(output_path, 'w') as f:
+    json.dump({'type': 'FeatureCollection', 'features': features}, f, separators=(',', ':'))
+  return len(features)
+
+@lru_cache(maxsize=1)
+def load_features():
+  # [(code or None, name, polygons)], polygons -> rings -> tuples of (lon, lat)
+  with open(GEOMETRY_PATH) as f:
+    collection = json.load(f)
+  return tuple(
+    (
+      feature['properties']['code'],
+      feature['properties']['name'],
+      tuple(tuple(tuple(map(tuple, ring)) for ring in polygon) for polygon in feature['geometry']['coordinates'])
+    )
+    for feature in collection['features']
+  )
+
+def simplify_ring(ring, tolerance, min_points=4):
+  # Douglas-Peucker (iterative); keeps first/last points so rings stay closed
+  if len(ring) <= min_points or tolerance <= 0:
+    return ring
+
+  keep = [False] * len(ring)
+  keep[0] = keep[-1] = True
+  stack = [(0, len(ring) - 1)]
+  tolerance_sq = tolerance * tolerance
+
+  while stack:
+    start, end = stack.pop()
+    (x1, y1), (x2, y2) = ring[start], ring[end]
+    dx, dy = x2 - x1, y2 - y1
+    length_sq = dx * dx + dy * dy
+    max_distance, index = -1.0, None
+    for i in range(start + 1, end):
+      px, py = ring[i]
+      if length_sq == 0:
+        distance = (px - x1) ** 2 + (py - y1) ** 2
+      else:
+        t = max(0.0, min(1.0, ((px - x1) * dx + (py - y1) * dy) / length_sq))
+        distance = (px - x1 - t * dx) ** 2 + (py - y1 - t * dy) ** 2
+      if distance > max_distance:
+        max_distance, index = distance, i
+    if index is not None and max_distance > tolerance_sq:
+      keep[index] = True
+      stack.append((start, index))
+      stack.append((index, end))
+
+  simplified = tuple(point for point, kept in zip(ring, keep) if kept)
+  # A ring needs at least 3 distinct points (plus the closing one) to have an area
+  return simplified if len(simplified) >= min_points else ring
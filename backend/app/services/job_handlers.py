@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+from flask import current_app
+from app.extensions import db, cache, events
+from app.models import Country, MarkedCountry
+from app.services.analytics_service import schedule_snapshot, write_snapshot
+from app.services.job_service import job_handler
+from app.services.marks_service import get_map_state, marks_changed, record_mark_changes
+from app.services.purge_service import purge_user
+from app.services.stats_service import compute_state_stats
+from app.utils.validators import parse_iso_date
+
+@job_handler('delete_account')
+def delete_account(job):
+  # Progress is saved with every batch, so a retried job resumes where the last attempt stopped
+  def save_progress(deleted):
+    job.result = {'user_id': job.user_id, 'deleted': dict(deleted), 'done': False}
+
+  previous = (job.result or {}).get('deleted')
+  deleted = purge_user(job.user_id, deleted=previous, progress=save_progress, keep_job_id=job.id)
+  return {
+    'user_id': job.user_id,
+    'deleted_marks': deleted.get(MarkedCountry.__tablename__, 0),
+    'deleted': deleted,
+    'done': True
+  }
+
+@job_handler('export_marks')
+def export_marks(job):
+  rows = MarkedCountry.get_user_marked_rows(job.user_id)
+  return {
+    'exported_at': datetime.now(timezone.utc).isoformat(),
+    'marked_countries': [MarkedCountry.row_to_dict(row) for row in rows]
+  }
+
+@job_handler('import_marks')
+def import_marks(job):
+  entries = (job.payload or {}).get('marked_countries', [])
+  country_ids = dict(db.session.execute(db.select(Country.code, Country.id)).all())
+  existing = {mark.country_id: mark for mark in MarkedCountry.get_user_marked_countries(job.user_id)}
+
+  imported, updated, skipped = 0, 0, []
+  changes = {}
+  for entry in entries:
+    # A malformed entry can never succeed, so it is skipped rather than failing (and retrying) the job
+    if not isinstance(entry, dict):
+      skipped.append({'country_code': None, 'reason': 'entry is not an object'})
+      continue
+    code = entry.get('country_code')
+    country_id = country_ids.get(code) if isinstance(code, str) else None
+    status = entry.get('status')
+    try:
+      start_date = parse_iso_date(entry['visit_start_date']) if entry.get('visit_start_date') else None
+      end_date = parse_iso_date(entry['visit_end_date']) if entry.get('visit_end_date') else None
+    except (ValueError, AttributeError, TypeError):
+      skipped.append({'country_code': code, 'reason': 'invalid date'})
+      continue
+    if not country_id or status not in ['visited', 'wishlist']:
+      skipped.append({'country_code': code, 'reason': 'unknown country or invalid status'})
+      continue
+    if start_date and end_date and start_date > end_date:
+      skipped.append({'country_code': code, 'reason': 'visit_start_date after visit_end_date'})
+      continue
+
+    mark = existing.get(country_id)
+    if mark:
+      mark.status = status
+      mark.visit_start_date = start_date
+      mark.visit_end_date = end_date
+      mark.updated_at = datetime.now(timezone.utc)
+      updated += 1
+    else:
+      mark = MarkedCountry(
+        user_id=job.user_id,
+        country_id=country_id,
+        status=status,
+        visit_start_date=start_date,
+        visit_end_date=end_date
+      )
+      db.session.add(mark)
+      existing[country_id] = mark
+      imported += 1
+    changes[country_id] = status
+
+  db.session.flush()
+  record_mark_changes(job.user_id, changes)
+  db.session.commit()
+  marks_changed(job.user_id)
+  events.publish(job.user_id, 'sync', {'imported': imported, 'updated': updated})
+  return {'imported': imported, 'updated': updated, 'skipped': skipped}
+
+@job_handler('recompute_stats')
+def recompute_stats(job):
+  state = get_map_state(job.user_id)
+  stats = compute_state_stats(state)
+  cache.set(f'stats:{state}', stats)
+  return stats
+
+@job_handler('analytics_snapshot')
+def analytics_snapshot(job):
+  # Periodic: every run queues the next one, ANALYTICS_SNAPSHOT_INTERVAL seconds later
+  meta = write_snapshot()
+  interval = current_app.config.get('ANALYTICS_SNAPSHOT_INTERVAL')
+  if interval and not current_app.config.get('JOBS_EAGER'):
+    schedule_snapshot(delay=interval)
+  return meta
@@ -0,0 +1,191 @@
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from contextlib import nullcontext
+from app.extensions import db, shards
+from app.models import Job
+
+JOB_HANDLERS = {}
+
+def job_handler(job_type):
+  def register(fn):
+    JOB_HANDLERS[job_type] = fn
+    return fn
+  return register
+
+def default_worker_id():
+  return f'{socket.gethostname()}:{os.getpid()}'
+
+def retry_delay(attempts):
+  base = current_app.config.get('JOBS_RETRY_BASE_SECONDS', 10)
+  cap = current_app.config.get('JOBS_RETRY_MAX_SECONDS', 3600)
+  return min(cap, base * 2 ** max(0, attempts - 1))
+
+def enqueue(job_type, payload=None, user_id=None, max_attempts=None, delay=0):
+  if job_type not in JOB_HANDLERS:
+    raise ValueError(f'Unknown job type: {job_type}')
+
+  job = Job(
+    type=job_type,
+    payload=payload or {},
+    user_id=user_id,
+    max_attempts=max_attempts or current_app.config.get('JOBS_MAX_ATTEMPTS', 5),
+    run_at=datetime.now(timezone.utc) + timedelta(seconds=delay)
+  )
+  db.session.add(job)
+  db.session.commit()
+
+  if current_app.config.get('JOBS_EAGER'):
+    # Sem worker (dev/testes): executa na hora, mas pelo mesmo caminho do worker
+    if claim(job.id, 'eager'):
+      db.session.refresh(job)
+      run_job(job)
+  return job
+
+def claim(job_id, worker_id):
+  # Compare-and-set on status, so two workers can never both win the same job
+  now = datetime.now(timezone.utc)
+  claimed = db.session.execute(
+    db.update(Job)
+    .where(Job.id == job_id, Job.status == 'queued')
+    .values(status='running', locked_by=worker_id, locked_at=now, attempts=Job.attempts + 1, updated_at=now)
+    .execution_options(synchronize_session=False)
+  ).rowcount == 1
+  db.session.commit()
+  return claimed
+
+def claim_next(worker_id):
+  now = datetime.now(timezone.utc)
+  query = (
+    db.select(Job.id)
+    .where(Job.status == 'queued', Job.run_at <= now)
+    .order_by(Job.run_at, Job.id)
+    .limit(5)
+  )
+  if db.engine.dialect.name == 'postgresql':
+    query = query.with_for_update(skip_locked=True)
+
+  for job_id in db.session.execute(query).scalars().all():
+    if claim(job_id, worker_id):
+      return db.session.get(Job, job_id, populate_existing=True)
+  db.session.commit()
+  return None
+
+class Heartbeat:
+  """Keeps refreshing a running job's locked_at, so requeue_stale only takes jobs whose worker is gone.
+
+  Runs in a thread with its own connection: handlers can run for much longer
+  than JOBS_STALE_AFTER_SECONDS (a purge with its pauses, a snapshot of every
+  mark) without committing anything in between.
+  """
+
+  def __init__(self, job_id, worker_id, interval):
+    self.job_id = job_id
+    self.worker_id = worker_id
+    self.interval = interval
+    self.engine = db.engine
+    self._stop = threading.Event()
+    self._thread = threading.Thread(target=self._run, name=f'job-{job_id}-heartbeat', daemon=True)
+
+  def __enter__(self):
+    self._thread.start()
+    return self
+
+  def __exit__(self, *exc_info):
+    self._stop.set()
+    self._thread.join()
+
+  def beat(self):
+    with self.engine.begin() as connection:
+      connection.execute(
+        db.update(Job)
+        .where(Job.id == self.job_id, Job.status == 'running', Job.locked_by == self.worker_id)
+        .values(locked_at=datetime.now(timezone.utc))
+      )
+
+  def _run(self):
+    while not self._stop.wait(self.interval):
+      try:
+        self.beat()
+      except Exception as e:
+        # The database may be busy with the job itself; the next beat tries again
+        print(f"Error refreshing the lock of job {self.job_id}: {e}")
+
+def run_job(job):
+  handler = JOB_HANDLERS.get(job.type)
+  interval = current_app.config.get('JOBS_HEARTBEAT_SECONDS', 60)
+  try:
+    if handler is None:
+      raise ValueError(f'No handler registered for job type {job.type}')
+    # A user's job runs on their shard; while they are being moved it fails and is retried later
+    with shards.user_scope(job.user_id, writing=True) if job.user_id else nullcontext():
+      with Heartbeat(job.id, job.locked_by, interval) if interval else nullcontext():
+        result = handler(job)
+    job.status = 'succeeded'
+    job.result = result
+    job.error = None
+  except Exception as e:
+    db.session.rollback()
+    print(f"Error running job {job.id} ({job.type}): {e}")
+    job.error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+    if job.attempts >= job.max_attempts:
+      job.status = 'failed'
+    else:
+      job.status = 'queued'
+      job.run_at = datetime.now(timezone.utc) + timedelta(seconds=retry_delay(job.attempts))
+  job.locked_by = None
+  job.locked_at = None
+  db.session.commit()
+  return job
+
+def requeue_stale(stale_after=None):
+  """
+  Jobs whose worker died mid-run (no heartbeat for `stale_after` seconds) go
+  back to the queue, the attempt still counting; returns how many.
+
+  A job that has used up its attempts fails instead: one that takes its worker
+  down with it (out of memory, a crash in native code) would otherwise be
+  requeued, and kill a worker, forever.
+  """
+  stale_after = stale_after or current_app.config.get('JOBS_STALE_AFTER_SECONDS', 600)
+  now = datetime.now(timezone.utc)
+  stale = db.and_(Job.status == 'running', Job.locked_at < now - timedelta(seconds=stale_after))
+  failed = db.session.execute(
+    db.update(Job)
+    .where(stale, Job.attempts >= Job.max_attempts)
+    .values(
+      status='failed', locked_by=None, locked_at=None, updated_at=now,
+      error='Worker stopped responding while running the job, on its last attempt'
+    )
+    .execution_options(synchronize_session=False)
+  ).rowcount
+  count = db.session.execute(
+    db.update(Job)
+    .where(stale)
+    .values(status='queued', locked_by=None, locked_at=None, updated_at=now)
+    .execution_options(synchronize_session=False)
+  ).rowcount
+  db.session.commit()
+  if failed:
+    print(f"Failed {failed} stale jobs that had no attempts left")
+  return count
+
+def work(worker_id=None, once=False, poll_interval=1.0, max_jobs=None):
+  worker_id = worker_id or default_worker_id()
+  processed = 0
+  while max_jobs is None or processed < max_jobs:
+    job = claim_next(worker_id)
+    if job is None:
+      if once:
+        break
+      requeue_stale()
+      time.sleep(poll_interval)
+      continue
+    run_job(job)
+    processed += 1
+    db.session.expunge_all()
+  return processed
@@ -0,0 +1,96 @@
+import io
+from functools import lru_cache
+from app.services.geometry_service import load_features, simplify_ring
+
+# Mirrors frontend/app/config/mapColors.json (fill colors for each status)
+MAP_THEMES = {
+  'light': {'background': '#cce3ff', 'border': '#F3F4F6', 'default': '#9CA3AF', 'visited': '#10B981', 'wishlist': '#F59E0B'},
+  'midnight': {'background': '#0d1e4f', 'border': '#334155', 'default': '#475569', 'visited': '#22c55e', 'wishlist': '#f59e0b'},
+  'gruvbox': {'background': '#1d2021', 'border': '#504945', 'default': '#665c54', 'visited': '#b8bb26', 'wishlist': '#fabd2f'},
+  'ocean': {'background': '#bae6fd', 'border': '#e0f2fe', 'default': '#94a3b8', 'visited': '#059669', 'wishlist': '#d97706'}
+}
+
+ALLOWED_WIDTHS = (512, 1024, 2048)
+
+# Equirectangular, cropped to where the catalog has land
+WEST, NORTH, EAST, SOUTH = -180.0, 84.0, 180.0, -58.0
+
+# Bump when geometry, projection or styling changes so cached renders are not reused
+RENDER_VERSION = 1
+
+def map_size(width):
+  return width, round(width * (NORTH - SOUTH) / (EAST - WEST))
+
+@lru_cache(maxsize=len(ALLOWED_WIDTHS))
+def projected_features(width):
+  """Simplified, projected rings and SVG path data for every feature at `width` pixels.
+
+  Computed once per width; rendering afterwards is just coloring precomputed paths.
+  """
+  _, height = map_size(width)
+  scale = width / (EAST - WEST)
+  tolerance = 0.5 / scale
+
+  projected = []
+  for code, _, polygons in load_features():
+    rings = []
+    for polygon in polygons:
+      for index, ring in enumerate(simplify_ring(ring, tolerance) for ring in polygon):
+        points = tuple((round((lon - WEST) * scale, 1), round((NORTH - lat) * scale, 1)) for lon, lat in ring)
+        rings.append((index > 0, points))
+    path = ''.join(
+      'M' + 'L'.join(f'{x:g} {y:g}' for x, y in points) + 'Z'
+      for _, points in rings
+    )
+    projected.append((code, tuple(rings), path))
+  return tuple(projected)
+
+def render_svg(statuses, width=1024, theme='light'):
+  colors = MAP_THEMES[theme]
+  width, height = map_size(width)
+  groups = {'default': [], 'visited': [], 'wishlist': []}
+  for code, _, path in projected_features(width):
+    groups[statuses.get(code, 'default')].append(path)
+
+  parts = [
+    f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+    f'<rect width="{width}" height="{height}" fill="{colors["background"]}"/>',
+    f'<g stroke="{colors["border"]}" stroke-width="0.5" fill-rule="evenodd">'
+  ]
+  for status, paths in groups.items():
+    if paths:
+      parts.append(f'<path fill="{colors[status]}" d="{"".join(paths)}"/>')
+  parts.append('</g></svg>')
+  return ''.join(parts)
+
+PALETTE_ORDER = ('background', 'border', 'default', 'visited', 'wishlist')
+
+def render_png(statuses, width=1024, theme='light'):
+  from PIL import Image, ImageColor, ImageDraw
+
+  # Paletted image: five colors, so drawing and PNG encoding work on one byte per pixel
+  colors = MAP_THEMES[theme]
+  index = {name: i for i, name in enumerate(PALETTE_ORDER)}
+  size = map_size(width)
+  image = Image.new('P', size, index['background'])
+  image.putpalette([channel for name in PALETTE_ORDER for channel in ImageColor.getrgb(colors[name])])
+  draw = ImageDraw.Draw(image)
+
+  for code, rings, _ in projected_features(width):
+    fill = index[statuses.get(code, 'default')]
+    if any(is_hole for is_hole, _ in rings):
+      # ImageDraw has no even-odd fill, so polygons with holes go through a mask
+      mask = Image.new('1', size, 0)
+      mask_draw = ImageDraw.Draw(mask)
+      for is_hole, points in rings:
+        mask_draw.polygon(points, fill=0 if is_hole else 1)
+      image.paste(fill, mask=mask)
+      for _, points in rings:
+        draw.line(points, fill=index['border'])
+      continue
+    for _, points in rings:
+      draw.polygon(points, fill=fill, outline=index['border'])
+
+  output = io.BytesIO()
+  image.save(output, format='PNG')
+  return output.getvalue()
@@ -0,0 +1,283 @@
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db, cache, shards
+from app.models import Country, MarkedCountry, UserBitset
+from app.services.bitset_service import CATALOG_INDEX, encode_map_state, to_bitset, to_bytes, from_bytes
+from app.services.country_service import get_country_catalog
+from app.services.timeline_service import invalidate_user_timeline
+
+def get_mark_buffer():
+  # The app's MarkWriteBuffer when MARKS_WRITE_BUFFER is on, else None
+  return current_app.extensions.get('mark_buffer')
+
+def flush_buffered_marks(user_id):
+  # Read-your-writes: anything reading a user's marks from the database calls this first
+  buffer = get_mark_buffer()
+  if buffer is not None:
+    buffer.flush(user_id)
+
+def discard_buffered_marks(user_id):
+  buffer = get_mark_buffer()
+  if buffer is not None:
+    buffer.discard(user_id)
+
+def get_user_marks(user_id, status=None):
+  flush_buffered_marks(user_id)
+  return cache.get_or_set(
+    status or 'all',
+    lambda: [MarkedCountry.row_to_dict(row) for row in MarkedCountry.get_user_marked_rows(user_id, status)],
+    namespace=MarkedCountry.cache_namespace(user_id)
+  )
+
+def get_map_state(user_id):
+  # Compact encoding of the user's whole map (see bitset_service.encode_map_state); also a cache key for derived data
+  flush_buffered_marks(user_id)
+  return cache.get_or_set(
+    'state',
+    lambda: encode_map_state(*get_user_bitsets(user_id)),
+    namespace=MarkedCountry.cache_namespace(user_id)
+  )
+
+UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+def upsert_mark(user_id, country_id, status, visit_start_date=None, visit_end_date=None):
+  """Insert or update the user's mark for a country in one statement; returns (row, created).
+
+  `row` has the MarkedCountry columns (id, user_id, country_id, status, dates, timestamps).
+  Concurrent calls for the same user/country both succeed, the last write wins.
+  """
+  now = datetime.now(timezone.utc)
+  values = {
+    'user_id': user_id,
+    'country_id': country_id,
+    'status': status,
+    'visit_start_date': visit_start_date,
+    'visit_end_date': visit_end_date,
+    'created_at': now,
+    'updated_at': now
+  }
+  statement = _upsert_statement()
+  if statement is None:
+    return _upsert_mark_fallback(values)
+
+  row = db.session.execute(statement.values(**values).returning(
+    MarkedCountry.id, MarkedCountry.user_id, MarkedCountry.country_id, MarkedCountry.status,
+    MarkedCountry.visit_start_date, MarkedCountry.visit_end_date, MarkedCountry.created_at, MarkedCountry.updated_at
+  )).one()
+  record_mark_changes(user_id, {country_id: status})
+  db.session.commit()
+  # An update keeps the original created_at, so only a fresh insert has both timestamps equal
+  return row, row.created_at == row.updated_at
+
+def upsert_marks(user_id, marks):
+  """Apply {country_id: (status, visit_start_date, visit_end_date, marked_at)} in one transaction."""
+  values = [
+    {
+      'user_id': user_id,
+      'country_id': country_id,
+      'status': status,
+      'visit_start_date': start_date,
+      'visit_end_date': end_date,
+      'created_at': marked_at,
+      'updated_at': marked_at
+    }
+    for country_id, (status, start_date, end_date, marked_at) in marks.items()
+  ]
+  statement = _upsert_statement()
+  if statement is None:
+    for mark_values in values:
+      _upsert_mark_fallback(mark_values)
+    return len(values)
+  db.session.execute(statement, values)
+  record_mark_changes(user_id, {country_id: status for country_id, (status, *_) in marks.items()})
+  db.session.commit()
+  return len(values)
+
+def _upsert_statement():
+  # INSERT ... ON CONFLICT (user_id, country_id) DO UPDATE, or None for dialects without it
+  insert = UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+  if insert is None:
+    return None
+  statement = insert(MarkedCountry)
+  return statement.on_conflict_do_update(
+    index_elements=['user_id', 'country_id'],
+    set_={
+      'status': statement.excluded.status,
+      'visit_start_date': statement.excluded.visit_start_date,
+      'visit_end_date': statement.excluded.visit_end_date,
+      'updated_at': statement.excluded.updated_at
+    }
+  )
+
+def _upsert_mark_fallback(values):
+  # Dialects without ON CONFLICT: read, then write, retrying once if a concurrent insert won
+  for _ in range(2):
+    mark = MarkedCountry.get_by_user_and_country(values['user_id'], values['country_id'])
+    created = mark is None
+    if created:
+      mark = MarkedCountry(**values)
+      db.session.add(mark)
+    else:
+      for key in ('status', 'visit_start_date', 'visit_end_date', 'updated_at'):
+        setattr(mark, key, values[key])
+    try:
+      db.session.flush()
+      record_mark_changes(values['user_id'], {values['country_id']: values['status']})
+      db.session.commit()
+      return mark, created
+    except IntegrityError:
+      db.session.rollback()
+  raise RuntimeError('Could not upsert mark')
+
+def compute_users_bitsets(user_ids):
+  # {user_id: (visited, wishlist)} straight from the marks, in one query; users without marks get (0, 0)
+  rows = db.session.execute(
+    db.select(MarkedCountry.user_id, Country.code, MarkedCountry.status)
+    .join(Country, Country.id == MarkedCountry.country_id)
+    .where(MarkedCountry.user_id.in_(user_ids))
+  ).all()
+  codes = {user_id: ([], []) for user_id in user_ids}
+  for user_id, code, status in rows:
+    codes[user_id][0 if status == 'visited' else 1].append(code)
+  return {user_id: (to_bitset(visited), to_bitset(wishlist)) for user_id, (visited, wishlist) in codes.items()}
+
+def compute_user_bitsets(user_id):
+  return compute_users_bitsets([user_id])[user_id]
+
+def update_user_bitsets(user_id, changes):
+  """Applies {country_id: status, or None when unmarked} to the user's stored bitsets.
+
+  Runs in the caller's transaction, next to the write it mirrors, and only
+  flips the bits of the countries changed. The row is locked first, so
+  concurrent writes of the same user cannot lose each other's bits.
+  """
+  row = db.session.execute(
+    db.select(UserBitset).where(UserBitset.user_id == user_id).with_for_update()
+  ).scalar_one_or_none()
+  if row is None:
+    # First write since the user's bitsets were last rebuilt: the marks (this write included) have it all
+    visited, wishlist = compute_user_bitsets(user_id)
+    db.session.add(UserBitset(user_id=user_id, visited=to_bytes(visited), wishlist=to_bytes(wishlist)))
+    return visited, wishlist
+
+  catalog = get_country_catalog()
+  visited, wishlist = from_bytes(row.visited), from_bytes(row.wishlist)
+  for country_id, status in changes.items():
+    index = CATALOG_INDEX.get(catalog.get(country_id, (None, None))[1])
+    if index is None:
+      continue
+    bit = 1 << index
+    visited &= ~bit
+    wishlist &= ~bit
+    if status == 'visited':
+      visited |= bit
+    elif status == 'wishlist':
+      wishlist |= bit
+  row.visited = to_bytes(visited)
+  row.wishlist = to_bytes(wishlist)
+  return visited, wishlist
+
+def record_mark_changes(user_id, changes):
+  """Brings the user's derived data in line with a write to their marks, in the write's transaction.
+
+  `changes` is {country_id: status, or None when unmarked}. Bitsets get the
+  changed bits flipped; the timeline is dropped and rebuilt on its next read.
+  """
+  update_user_bitsets(user_id, changes)
+  invalidate_user_timeline(user_id)
+
+def get_user_bitsets(user_id):
+  # (visited, wishlist) as ints. Reads never write: users without a row (marks from before
+  # user_bitsets, until `flask marks rebuild-bitsets`) are computed from their marks
+  flush_buffered_marks(user_id)
+  row = db.session.get(UserBitset, user_id)
+  if row is None:
+    return compute_user_bitsets(user_id)
+  return from_bytes(row.visited), from_bytes(row.wishlist)
+
+def marks_changed(user_id):
+  # Call after committing changes to a user's marks (see record_mark_changes for what goes in the
+  # transaction). The write itself already succeeded, so a failure here is logged, not raised
+  try:
+    cache.invalidate(MarkedCountry.cache_namespace(user_id))
+  except Exception as e:
+    print(f"Error invalidating cached marks for user {user_id}: {e}")
+
+def get_users_bitsets(user_ids):
+  # {user_id: (visited, wishlist)} in one query per shard, plus one for the users without a row
+  bitsets = {}
+  for name, shard_user_ids in shards.group_by_shard(user_ids).items():
+    with shards.scope(name):
+      rows = db.session.execute(
+        db.select(UserBitset.user_id, UserBitset.visited, UserBitset.wishlist).where(UserBitset.user_id.in_(shard_user_ids))
+      ).all()
+      bitsets.update((user_id, (from_bytes(visited), from_bytes(wishlist))) for user_id, visited, wishlist in rows)
+      missing = [user_id for user_id in shard_user_ids if user_id not in bitsets]
+      if missing:
+        bitsets.update(compute_users_bitsets(missing))
+  return bitsets
+
+def rebuild_all_bitsets(batch_size=1000):
+  # Recompute user_bitsets for every user with marks, in one ordered pass per shard
+  return sum(shards.scatter(lambda name: _rebuild_bitsets(batch_size)).values())
+
+def _rebuild_bitsets(batch_size):
+  rows = db.session.execute(
+    db.select(MarkedCountry.user_id, Country.code, MarkedCountry.status)
+    .join(Country, Country.id == MarkedCountry.country_id)
+    .order_by(MarkedCountry.user_id)
+  )
+  by_user = {}
+  for user_id, code, status in rows:
+    by_user.setdefault(user_id, ([], []))[0 if status == 'visited' else 1].append(code)
+
+  db.session.execute(db.delete(UserBitset))
+  items = list(by_user.items())
+  for start in range(0, len(items), batch_size):
+    db.session.execute(db.insert(UserBitset), [
+      {'user_id': user_id, 'visited': to_bytes(to_bitset(visited)), 'wishlist': to_bytes(to_bitset(wishlist))}
+      for user_id, (visited, wishlist) in items[start:start + batch_size]
+    ])
+  db.session.commit()
+  return len(items)
+
+def top_travelers(limit=10):
+  """[(user_id, visited countries)] for the users with most visited countries, across every shard."""
+  def shard_top(name):
+    visited = db.func.count().label('visited')
+    return db.session.execute(
+      db.select(MarkedCountry.user_id, visited)
+      .where(MarkedCountry.status == 'visited')
+      .group_by(MarkedCountry.user_id)
+      .order_by(visited.desc(), MarkedCountry.user_id)
+      .limit(limit)
+    ).all()
+  # Every shard's top `limit` contains its part of the global top `limit`
+  rows = [tuple(row) for shard_rows in shards.scatter(shard_top).values() for row in shard_rows]
+  return sorted(rows, key=lambda row: (-row[1], row[0]))[:limit]
+
+def iter_all_marks(batch_size=10000):
+  """Every mark as a to_dict()-shaped dict, shard by shard, in batches of `batch_size` (admin exports)."""
+  for name in shards.names:
+    after = 0
+    while True:
+      # Each batch is read inside the shard's scope; the caller consumes it outside
+      with shards.scope(name):
+        rows = db.session.execute(
+          db.select(
+            MarkedCountry.id, MarkedCountry.user_id, MarkedCountry.country_id, Country.name, Country.code,
+            MarkedCountry.status, MarkedCountry.visit_start_date, MarkedCountry.visit_end_date,
+            MarkedCountry.created_at, MarkedCountry.updated_at
+          )
+          .outerjoin(Country, Country.id == MarkedCountry.country_id)
+          .where(MarkedCountry.id > after)
+          .order_by(MarkedCountry.id)
+          .limit(batch_size)
+        ).all()
+      if not rows:
+        break
+      after = rows[-1][0]
+      for row in rows:
+        yield MarkedCountry.row_to_dict(row)
@@ -0,0 +1,124 @@
+"""
+Account deletion (GDPR purge): every row a user owns, deleted in bounded batches.
+
+User-owned tables come from the schema, not from a list kept here: every
+table with a foreign key to users.id, plus tables naming their owner columns
+in `info['owner_keys']` (jobs has no foreign key, so the deletion job can
+outlive its user). A new table is covered as soon as it declares either.
+
+Each batch is one short transaction followed by PURGE_BATCH_PAUSE seconds, so
+live writes never wait long behind a purge, also when a compliance sweep
+queues thousands of them. Progress is committed with every batch; a purge that
+crashes is simply run again (the job is retried or requeued), as whatever was
+deleted stays deleted.
+
+Requesting the deletion already locks the account out: `users.deleted_at` is
+set, which every token of the user fails on (app.utils.auth), the user's
+caches and buffered writes are dropped and open event streams get
+`account_deleted`.
+
+The users row itself is scrubbed rather than deleted (no email, name or
+Google id left, `purged_at` set). SQLite hands the id of a deleted last row to
+the next new user, who would then be authenticated by the purged user's
+tokens; the scrubbed row keeps the id taken and the tokens failing.
+"""
+import time
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import tuple_
+from app.extensions import db, cache, events, shards
+from app.models import Job, MarkedCountry, User, UserShard
+from app.services.job_service import enqueue
+from app.services.marks_service import discard_buffered_marks
+from app.utils.sharding import is_sharded
+
+def owner_columns(table):
+  # Columns holding the owning user's id: foreign keys to users.id, or the declared `owner_keys`
+  declared = table.info.get('owner_keys', ())
+  return [
+    column for column in table.columns
+    if column.name in declared or any(key.target_fullname == 'users.id' for key in column.foreign_keys)
+  ]
+
+def owned_tables(metadata):
+  """[(table, owner columns)] of every table with user data, in deletion order."""
+  owned = [
+    (table, owner_columns(table)) for table in reversed(metadata.sorted_tables)
+    if table.name != User.__tablename__ and owner_columns(table)
+  ]
+  # Sharded data first and the shard map last: a resumed purge must still find the user's shard
+  return sorted(owned, key=lambda entry: (
+    not is_sharded(entry[0]), entry[0].name == UserShard.__tablename__
+  ))
+
+def request_deletion(user):
+  """Locks `user` out and queues the purge; returns the (possibly already queued) delete_account job."""
+  if user.deleted_at is None:
+    user.deleted_at = datetime.now(timezone.utc)
+    db.session.commit()
+    discard_buffered_marks(user.id)
+    cache.invalidate(MarkedCountry.cache_namespace(user.id))
+    events.publish(user.id, 'account_deleted', {})
+  return Job.get_active(user.id, 'delete_account') or enqueue('delete_account', user_id=user.id)
+
+def _delete_batch(table, condition, batch_size):
+  key = list(table.primary_key.columns)
+  ids = db.session.execute(db.select(*key).where(condition).limit(batch_size)).all()
+  if not ids:
+    return 0
+  if len(key) == 1:
+    match = key[0].in_([row[0] for row in ids])
+  else:
+    match = tuple_(*key).in_([tuple(row) for row in ids])
+  return db.session.execute(db.delete(table).where(match)).rowcount
+
+def scrub_user(user):
+  # What is left of a purged account: its id, and the dates telling it was deleted
+  now = datetime.now(timezone.utc)
+  user.email = f'deleted-{user.id}'
+  user.name = None
+  user.google_id = None
+  user.deleted_at = user.deleted_at or now
+  user.purged_at = now
+  user.created_at = user.updated_at = now
+
+def purge_user(user_id, deleted=None, progress=None, keep_job_id=None, batch_size=None, pause=None):
+  """
+  Deletes everything `user_id` owns, then scrubs the user; returns {table: rows deleted}.
+
+  `deleted` carries the counts of an interrupted run; `progress(deleted)` is
+  called before each batch commits, so anything it writes to the session is
+  committed together with the batch. `keep_job_id` spares that job row.
+  """
+  config = current_app.config
+  batch_size = batch_size or config.get('PURGE_BATCH_SIZE', 500)
+  pause = config.get('PURGE_BATCH_PAUSE', 0.05) if pause is None else pause
+  deleted = dict(deleted or {})
+
+  with shards.user_scope(user_id, writing=True):
+    for table, columns in owned_tables(db.metadata):
+      condition = db.or_(*(column == user_id for column in columns))
+      if keep_job_id is not None and table.name == Job.__tablename__:
+        condition = db.and_(condition, table.c.id != keep_job_id)
+      while True:
+        count = _delete_batch(table, condition, batch_size)
+        if not count:
+          break
+        deleted[table.name] = deleted.get(table.name, 0) + count
+        if progress is not None:
+          progress(deleted)
+        db.session.commit()
+        if count < batch_size:
+          break
+        if pause:
+          time.sleep(pause)
+
+  user = db.session.get(User, user_id)
+  if user is not None and user.purged_at is None:
+    scrub_user(user)
+    if progress is not None:
+      progress(deleted)
+  db.session.commit()
+  events.forget(user_id)
+  cache.invalidate(MarkedCountry.cache_namespace(user_id))
+  return deleted
@@ -0,0 +1,59 @@
+from functools import lru_cache
+from app.services.bitset_service import popcount, to_bitset
+from app.services.country_service import COUNTRIES_DATA, REGIONS_DATA
+
+class RegionNode:
+  """Node of the world -> continent -> subregion tree; `mask` is the bitset of every country below it."""
+  __slots__ = ('name', 'level', 'children', 'codes', 'mask', 'total')
+
+  def __init__(self, name, level, children=(), codes=()):
+    self.name = name
+    self.level = level
+    self.children = tuple(children)
+    self.codes = tuple(codes) or tuple(code for child in self.children for code in child.codes)
+    self.mask = to_bitset(self.codes)
+    self.total = len(self.codes)
+
+  def walk(self):
+    yield self
+    for child in self.children:
+      yield from child.walk()
+
+  def to_dict(self, include_codes=False):
+    data = {'name': self.name, 'level': self.level, 'total': self.total}
+    if include_codes and self.level == 'subregion':
+      data['countries'] = list(self.codes)
+    if self.children:
+      data['children'] = [child.to_dict(include_codes) for child in self.children]
+    return data
+
+  def rollup(self, visited, wishlist):
+    # Counts for this node and everything below it: one AND + popcount per node, no queries
+    data = {
+      'name': self.name,
+      'level': self.level,
+      'total': self.total,
+      'visited': popcount(self.mask & visited),
+      'wishlist': popcount(self.mask & wishlist)
+    }
+    if self.children:
+      data['children'] = [child.rollup(visited, wishlist) for child in self.children]
+    return data
+
+@lru_cache(maxsize=1)
+def get_region_tree():
+  # Built once per process from the same static data the regions table is seeded from
+  subregions = {}
+  for region in REGIONS_DATA:
+    subregions.setdefault(region['continent'], []).append(RegionNode(region['name'], 'subregion', codes=region['countries']))
+  continents = [
+    RegionNode(name, 'continent', children=subregions[name])
+    for name in sorted({country['continent'] for country in COUNTRIES_DATA})
+  ]
+  return RegionNode('World', 'world', children=continents)
+
+def find_region(name, level=None):
+  for node in get_region_tree().walk():
+    if node.name == name and (level is None or node.level == level):
+      return node
+  return None
@@ -0,0 +1,143 @@
+"""
+Shard map maintenance: loads, moving users between shards and rebalancing
+(see app.utils.sharding for the routing itself).
+
+Moving a user marks them `moving` in the map, waits SHARD_MOVE_GRACE_SECONDS
+for writes already in flight, copies every sharded row to the target, points
+the map at the target and finally deletes the source rows. Reads keep being
+served throughout; writes get a 503 (requests) or are retried later (jobs)
+while the user is `moving`. Mark ids are per shard, so they change on a move:
+the user's caches are invalidated and their clients get a `sync` event.
+"""
+import time
+from flask import current_app
+from app.extensions import db, cache, events, shards
+from app.models import MarkedCountry, User, UserShard
+from app.services.marks_service import flush_buffered_marks
+from app.utils.sharding import DEFAULT_SHARD, ShardingError, sharded_tables
+
+def shard_loads():
+  # {shard: users}; users without a map row count for the default shard
+  mapped = dict(db.session.execute(
+    db.select(UserShard.shard, db.func.count()).group_by(UserShard.shard)
+  ).all())
+  loads = {name: mapped.get(name, 0) for name in shards.names}
+  # Purged accounts keep a users row but no data (and no map row)
+  users = db.session.execute(db.select(db.func.count()).select_from(User).where(User.purged_at.is_(None))).scalar()
+  unmapped = users - sum(mapped.values())
+  loads[DEFAULT_SHARD] += max(0, unmapped)
+  return loads
+
+def table_counts():
+  # {shard: {table: rows}} for every sharded table
+  def count(name):
+    return {
+      table.name: db.session.execute(db.select(db.func.count()).select_from(table)).scalar()
+      for table in sharded_tables(db.metadata)
+    }
+  return shards.scatter(count)
+
+def users_on(name, limit=None):
+  """Ids of the users on shard `name`, lowest first."""
+  if name == DEFAULT_SHARD:
+    query = (
+      db.select(User.id)
+      .outerjoin(UserShard, UserShard.user_id == User.id)
+      .where(db.or_(UserShard.shard.is_(None), UserShard.shard == DEFAULT_SHARD), User.purged_at.is_(None))
+    )
+  else:
+    query = db.select(UserShard.user_id.label('id')).where(UserShard.shard == name)
+  query = query.order_by('id')
+  if limit is not None:
+    query = query.limit(limit)
+  return db.session.execute(query).scalars().all()
+
+def _set_map(user_id, name, state):
+  row = db.session.get(UserShard, user_id)
+  if row is None:
+    row = UserShard(user_id=user_id)
+    db.session.add(row)
+  row.shard = name
+  row.state = state
+  db.session.commit()
+
+def _copy_user_rows(user_id, source, target):
+  # Every sharded row of the user from source to target, replacing what target may hold from an aborted move
+  copied = {}
+  for table in sharded_tables(db.metadata):
+    key = table.c[table.info['shard_key']]
+    # Surrogate ids are per shard: the target assigns new ones
+    columns = [column for column in table.columns if column is key or not column.primary_key]
+    with shards.scope(source):
+      rows = [dict(row._mapping) for row in db.session.execute(db.select(*columns).where(key == user_id))]
+    with shards.scope(target):
+      db.session.execute(db.delete(table).where(key == user_id))
+      if rows:
+        db.session.execute(db.insert(table), rows)
+    copied[table.name] = len(rows)
+  with shards.scope(target):
+    db.session.commit()
+  return copied
+
+def _delete_user_rows(user_id, name):
+  with shards.scope(name):
+    for table in sharded_tables(db.metadata):
+      db.session.execute(db.delete(table).where(table.c[table.info['shard_key']] == user_id))
+    db.session.commit()
+
+def move_user(user_id, target, grace=None):
+  """Moves `user_id`'s data to shard `target`; returns {table: rows copied} (empty if already there)."""
+  if target not in shards.names:
+    raise ShardingError(f'Unknown shard: {target}')
+  source, state = shards.lookup(user_id)
+  if source == target:
+    return {}
+  if state == 'moving':
+    raise ShardingError(f'User {user_id} is already being moved')
+
+  _set_map(user_id, source, 'moving')
+  try:
+    time.sleep(current_app.config.get('SHARD_MOVE_GRACE_SECONDS', 1.0) if grace is None else grace)
+    with shards.scope(source):
+      flush_buffered_marks(user_id)
+    copied = _copy_user_rows(user_id, source, target)
+  except Exception:
+    db.session.rollback()
+    _set_map(user_id, source, 'active')
+    raise
+  _set_map(user_id, target, 'active')
+  _delete_user_rows(user_id, source)
+
+  cache.invalidate(MarkedCountry.cache_namespace(user_id))
+  events.publish(user_id, 'sync', {'moved': True})
+  return copied
+
+def plan_rebalance(max_moves=None):
+  """[(user_id, source, target)] that evens out users per shard, moving the fewest users."""
+  loads = shard_loads()
+  names = shards.names
+  total = sum(loads.values())
+  # `total % len(names)` shards keep one user more than the others: the fullest ones, so fewer users move
+  fullest = sorted(names, key=lambda name: -loads[name])
+  quota = {name: total // len(names) + (1 if fullest.index(name) < total % len(names) else 0) for name in names}
+  receivers = [[name, quota[name] - loads[name]] for name in names if loads[name] < quota[name]]
+
+  moves = []
+  for name in names:
+    excess = loads[name] - quota[name]
+    if excess <= 0:
+      continue
+    for user_id in users_on(name, limit=excess):
+      if max_moves is not None and len(moves) >= max_moves:
+        return moves
+      receiver = next(receiver for receiver in receivers if receiver[1] > 0)
+      receiver[1] -= 1
+      moves.append((user_id, name, receiver[0]))
+  return moves
+
+def rebalance(max_moves=None, grace=None, echo=print):
+  moves = plan_rebalance(max_moves)
+  for index, (user_id, source, target) in enumerate(moves, 1):
+    copied = move_user(user_id, target, grace=grace)
+    echo(f'[{index}/{len(moves)}] user {user_id}: {source} -> {target} ({sum(copied.values())} rows)')
+  return moves
@@ -0,0 +1,20 @@
+from app.services.bitset_service import decode_map_state
+from app.services.region_service import get_region_tree
+
+def compute_state_stats(state):
+  """Statistics for a map state (see bitset_service.encode_map_state).
+
+  Depends only on the state and the catalog, so the result can be cached under the state.
+  """
+  _, visited, wishlist = decode_map_state(state)
+  world = get_region_tree().rollup(visited, wishlist)
+  return {
+    'visited': world['visited'],
+    'wishlist': world['wishlist'],
+    'total_countries': world['total'],
+    'visited_percentage': round(100 * world['visited'] / world['total'], 1) if world['total'] else 0.0,
+    'by_continent': {
+      continent['name']: {'visited': continent['visited'], 'wishlist': continent['wishlist'], 'total': continent['total']}
+      for continent in world['children']
+    }
+  }
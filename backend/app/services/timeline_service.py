@@ -0,0 +1,187 @@
+"""
+Travel timeline analytics ("year in review") over visit dates, with NumPy.
+
+Visited marks are loaded as columns (user id, country id, first and last day)
+and every metric is an array operation over them, so the same code computes
+one user's timeline (materialized in user_timelines: a write to the user's
+marks drops it, the next read rebuilds it, see marks_service.record_mark_changes)
+and everybody's at once (`flask marks timeline`).
+
+A mark with only one of visit_start_date/visit_end_date is a one-day visit on
+that date; marks with neither are counted as `undated` and left out of the
+time-based metrics. Trips are the union of a user's visits: overlapping or
+back-to-back visits make one trip, and a day is abroad at most once.
+"""
+import json
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db, shards
+from app.models import MarkedCountry, UserBitset, UserTimeline
+from app.services.country_service import get_country_catalog
+from app.utils.sqlite_tuning import read_bind
+
+LOAD_BATCH_SIZE = 100000
+
+def load_visits(user_id=None, primary=False):
+  """Visited marks as arrays (user_ids, country_ids, starts, ends); dates are datetime64[D], NaT when missing.
+
+  Dates come back from the database as ISO strings and are parsed by NumPy in
+  bulk, so no date (or ORM) object is created per row. Reads go to the
+  read-only pool unless `primary`, which reads in the session's transaction.
+  """
+  query = db.select(
+    MarkedCountry.user_id,
+    MarkedCountry.country_id,
+    db.cast(MarkedCountry.visit_start_date, db.String),
+    db.cast(MarkedCountry.visit_end_date, db.String)
+  ).where(MarkedCountry.status == 'visited')
+  if user_id is not None:
+    query = query.where(MarkedCountry.user_id == user_id)
+
+  chunks = []
+  result = db.session.execute(
+    query.execution_options(yield_per=LOAD_BATCH_SIZE), bind_arguments=None if primary else read_bind()
+  )
+  for rows in result.partitions():
+    user_ids, country_ids, starts, ends = zip(*rows)
+    chunks.append((
+      np.array(user_ids, dtype=np.int64),
+      np.array(country_ids, dtype=np.int64),
+      np.array(starts, dtype='datetime64[D]'),
+      np.array(ends, dtype='datetime64[D]')
+    ))
+  if not chunks:
+    empty = np.array([], dtype=np.int64)
+    return empty, empty, np.array([], dtype='datetime64[D]'), np.array([], dtype='datetime64[D]')
+  return tuple(np.concatenate(column) for column in zip(*chunks))
+
+def merge_trips(user_ids, first, last):
+  """Unions each user's visits (day numbers, inclusive) into trips.
+
+  Returns (order, trip_of_visit, trip_first, trip_last): visits sorted by user
+  and first day, the trip of each sorted visit, and each trip's first and last day.
+  """
+  order = np.lexsort((first, user_ids))
+  user_ids, first, last = user_ids[order], first[order], last[order]
+  # Offset every user into their own range of keys, so one running maximum over
+  # all users never lets a trip reach into the next user's visits
+  _, user_rank = np.unique(user_ids, return_inverse=True)
+  origin = first.min()
+  span = int(last.max() - origin) + 2
+  key_first = user_rank * span + (first - origin)
+  key_last = user_rank * span + (last - origin)
+
+  reach = np.maximum.accumulate(key_last)
+  new_trip = np.ones(len(first), dtype=bool)
+  new_trip[1:] = key_first[1:] > reach[:-1] + 1
+  trip_starts = np.flatnonzero(new_trip)
+  trip_first = first[trip_starts]
+  trip_last = np.maximum.reduceat(key_last, trip_starts) - user_rank[trip_starts] * span + origin
+  return order, np.cumsum(new_trip) - 1, trip_first, trip_last
+
+def days_abroad(trip_first, trip_last):
+  # -> ({'2023': days}, {'2023-05': days}), summed over every trip (and user) given
+  origin = trip_first.min()
+  size = int(trip_last.max() - origin) + 2
+  # Trips never overlap within a user, so +1/-1 at their edges counts people abroad per day
+  per_day = np.cumsum(
+    np.bincount(trip_first - origin, minlength=size) - np.bincount(trip_last - origin + 1, minlength=size)
+  )[:-1]
+  days = np.arange(size - 1) + origin
+  totals = {}
+  for unit, key in (('Y', 'by_year'), ('M', 'by_month')):
+    periods, inverse = np.unique(days.astype('datetime64[D]').astype(f'datetime64[{unit}]'), return_inverse=True)
+    sums = np.bincount(inverse, weights=per_day)
+    totals[key] = {str(period): int(total) for period, total in zip(periods, sums) if total}
+  return totals
+
+def empty_timeline(undated=0):
+  return {
+    'visited': undated,
+    'undated': undated,
+    'trips': 0,
+    'days_abroad': {'total': 0, 'by_year': {}, 'by_month': {}},
+    'new_countries': {'by_year': {}},
+    'cumulative_countries': [],
+    'longest_trip': None
+  }
+
+def compute_timeline(user_ids, country_ids, starts, ends):
+  """Timeline metrics for the visits given (one user's or everybody's, see load_visits)."""
+  starts = np.where(np.isnat(starts), ends, starts)
+  ends = np.where(np.isnat(ends), starts, ends)
+  dated = ~np.isnat(starts)
+  undated = int(len(dated) - np.count_nonzero(dated))
+  if not dated.any():
+    return empty_timeline(undated)
+
+  user_ids, country_ids, starts = user_ids[dated], country_ids[dated], starts[dated]
+  first = starts.astype(np.int64)
+  last = np.maximum(ends[dated].astype(np.int64), first)
+
+  years, new_per_year = np.unique(starts.astype('datetime64[Y]'), return_counts=True)
+  months, new_per_month = np.unique(starts.astype('datetime64[M]'), return_counts=True)
+
+  order, trip_of_visit, trip_first, trip_last = merge_trips(user_ids, first, last)
+  abroad = days_abroad(trip_first, trip_last)
+  lengths = trip_last - trip_first + 1
+  longest = int(np.argmax(lengths))
+  catalog = get_country_catalog()
+
+  return {
+    'visited': len(dated),
+    'undated': undated,
+    'trips': len(trip_first),
+    'days_abroad': {'total': int(lengths.sum()), **abroad},
+    'new_countries': {'by_year': {str(year): int(count) for year, count in zip(years, new_per_year)}},
+    'cumulative_countries': [
+      {'month': str(month), 'countries': int(total)} for month, total in zip(months, np.cumsum(new_per_month))
+    ],
+    'longest_trip': {
+      'start': str(np.datetime64(int(trip_first[longest]), 'D')),
+      'end': str(np.datetime64(int(trip_last[longest]), 'D')),
+      'days': int(lengths[longest]),
+      'countries': [
+        catalog[country_id][1] for country_id in country_ids[order][trip_of_visit == longest].tolist()
+        if country_id in catalog
+      ]
+    }
+  }
+
+def compute_user_timeline(user_id):
+  return compute_timeline(*load_visits(user_id))
+
+def compute_all_timelines():
+  """Every user's visits in one pass: days abroad and new countries are totals over all users."""
+  # User ids are unique across shards, so the shards' columns simply concatenate
+  per_shard = shards.scatter(lambda name: load_visits()).values()
+  columns = tuple(np.concatenate(column) for column in zip(*per_shard))
+  timeline = compute_timeline(*columns)
+  timeline['users'] = int(len(np.unique(columns[0])))
+  return timeline
+
+def invalidate_user_timeline(user_id):
+  # In the transaction of a write to the user's marks; the next read rebuilds the timeline
+  db.session.execute(db.delete(UserTimeline).where(UserTimeline.user_id == user_id))
+
+def refresh_user_timeline(user_id):
+  # Visits are read and the timeline stored in one transaction that takes the locks a mark write
+  # takes (SQLite's write lock with the first statement, the user's user_bitsets row elsewhere),
+  # so no write can land in between and leave a timeline built from older marks behind
+  db.session.execute(db.delete(UserTimeline).where(UserTimeline.user_id == user_id))
+  db.session.execute(db.select(UserBitset.user_id).where(UserBitset.user_id == user_id).with_for_update())
+  timeline = compute_timeline(*load_visits(user_id, primary=True))
+  db.session.execute(db.insert(UserTimeline).values(user_id=user_id, data=json.dumps(timeline, separators=(',', ':'))))
+  try:
+    db.session.commit()
+  except IntegrityError:
+    # A concurrent read stored the same timeline first
+    db.session.rollback()
+  return timeline
+
+def get_user_timeline(user_id):
+  # Rebuilt on the first read after a write (or for users whose marks predate user_timelines)
+  data = db.session.execute(db.select(UserTimeline.data).where(UserTimeline.user_id == user_id)).scalar_one_or_none()
+  if data is None:
+    return refresh_user_timeline(user_id)
+  return json.loads(data)
@@ -0,0 +1,201 @@
+import gzip
+import hashlib
+import json
+import os
+from functools import lru_cache
+from app.services.geometry_service import DATA_DIR, load_features, simplify_ring
+
+TOPOLOGY_DIR = os.path.join(DATA_DIR, 'topology')
+
+# Level of detail -> (Douglas-Peucker tolerance in degrees, quantization grid size)
+LODS = {
+  'low': (0.25, 10000),
+  'medium': (0.05, 50000),
+  'high': (0.0, 100000)
+}
+
+def topology_path(lod):
+  return os.path.join(TOPOLOGY_DIR, f'{lod}.json')
+
+def ring_area(ring):
+  # Signed shoelace area (x2); positive for counter-clockwise rings
+  return sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(ring, ring[1:]))
+
+def ring_centroid(ring):
+  area = ring_area(ring)
+  if area == 0:
+    xs, ys = zip(*ring)
+    return sum(xs) / len(xs), sum(ys) / len(ys)
+  cx = sum((x1 + x2) * (x1 * y2 - x2 * y1) for (x1, y1), (x2, y2) in zip(ring, ring[1:]))
+  cy = sum((y1 + y2) * (x1 * y2 - x2 * y1) for (x1, y1), (x2, y2) in zip(ring, ring[1:]))
+  return cx / (3 * area), cy / (3 * area)
+
+def longitude_span(xs):
+  # (west, east) of the shortest arc holding every longitude; west > east when it crosses the antimeridian
+  lons = sorted(set(xs))
+  # The widest gap between neighbouring longitudes, going round the globe, is what the box leaves out
+  gaps = [(lons[0] + 360 - lons[-1], 0)] + [(lons[i] - lons[i - 1], i) for i in range(1, len(lons))]
+  gap, start = max(gaps)
+  if gap < 180:
+    # Round (almost) the whole globe, like Antarctica: no shorter arc to speak of
+    return lons[0], lons[-1]
+  return lons[start], lons[start - 1]
+
+def feature_bounds(polygons):
+  """Bounding box of every ring and the centroid of the largest polygon.
+
+  Using the largest polygon keeps "zoom to country" on the mainland for
+  countries with far-away territories (US, France, Norway, ...). Boxes follow
+  GeoJSON (RFC 7946, 5.2): for countries across the antimeridian (RU, FJ, the
+  US with the Aleutians...) west is greater than east, instead of a box
+  spanning the whole world.
+  """
+  points = [point for polygon in polygons for point in polygon[0]]
+  xs, ys = zip(*points)
+  west, east = longitude_span(xs)
+  largest = max(polygons, key=lambda polygon: abs(ring_area(polygon[0])))
+  cx, cy = ring_centroid(largest[0])
+  return [west, min(ys), east, max(ys)], [round(cx, 4), round(cy, 4)]
+
+def quantize_rings(features, quantization):
+  xs = [x for _, _, polygons in features for polygon in polygons for ring in polygon for x, _ in ring]
+  ys = [y for _, _, polygons in features for polygon in polygons for ring in polygon for _, y in ring]
+  x0, y0, x1, y1 = min(xs), min(ys), max(xs), max(ys)
+  kx, ky = (x1 - x0) / (quantization - 1), (y1 - y0) / (quantization - 1)
+
+  quantized = []
+  for _, _, polygons in features:
+    feature_polygons = []
+    for polygon in polygons:
+      rings = []
+      for ring in polygon:
+        points = []
+        for x, y in ring:
+          point = (round((x - x0) / kx), round((y - y0) / ky))
+          if not points or points[-1] != point:
+            points.append(point)
+        if len(points) >= 4:
+          rings.append(points)
+      if rings:
+        feature_polygons.append(rings)
+    quantized.append(feature_polygons)
+  return quantized, [x0, y0, x1, y1], {'scale': [kx, ky], 'translate': [x0, y0]}
+
+def find_junctions(rings):
+  # A point is a junction when it is reached from different neighbours, i.e. where borders split
+  neighbours, junctions = {}, set()
+  for ring in rings:
+    open_ring = ring[:-1]
+    for i, point in enumerate(open_ring):
+      pair = frozenset((open_ring[i - 1], open_ring[(i + 1) % len(open_ring)]))
+      seen = neighbours.setdefault(point, pair)
+      if seen != pair:
+        junctions.add(point)
+  return junctions
+
+def cut_ring(ring, junctions):
+  open_ring = ring[:-1]
+  cuts = [i for i, point in enumerate(open_ring) if point in junctions]
+  if not cuts:
+    # Closed arc: rotate to the smallest point so identical rings (enclaves) dedupe
+    start = open_ring.index(min(open_ring))
+    rotated = open_ring[start:] + open_ring[:start]
+    return [rotated + [rotated[0]]]
+  rotated = open_ring[cuts[0]:] + open_ring[:cuts[0]] + [open_ring[cuts[0]]]
+  offsets = [i - cuts[0] for i in cuts] + [len(open_ring)]
+  return [rotated[start:end + 1] for start, end in zip(offsets, offsets[1:])]
+
+def build_topology(features, tolerance, quantization):
+  """TopoJSON topology for `features` with shared, delta-encoded arcs.
+
+  Borders between neighbours are stored once and simplified once, so
+  simplifying never opens gaps or overlaps between adjacent countries.
+  """
+  quantized, bbox, transform = quantize_rings(features, quantization)
+  junctions = find_junctions([ring for polygons in quantized for rings in polygons for ring in rings])
+
+  arcs, arc_index = [], {}
+  def add_arc(points):
+    key = tuple(points)
+    if key in arc_index:
+      return arc_index[key]
+    reversed_key = key[::-1]
+    if reversed_key in arc_index:
+      return ~arc_index[reversed_key]
+    arc_index[key] = len(arcs)
+    arcs.append(points)
+    return arc_index[key]
+
+  geometries = []
+  for (code, name, polygons), feature_polygons in zip(features, quantized):
+    arc_polygons = [[[add_arc(arc) for arc in cut_ring(ring, junctions)] for ring in rings] for rings in feature_polygons]
+    bounds, centroid = feature_bounds(polygons)
+    geometry = {
+      'type': 'MultiPolygon',
+      'arcs': arc_polygons,
+      'properties': {'code': code, 'name': name, 'bbox': bounds, 'centroid': centroid}
+    }
+    if code:
+      geometry['id'] = code
+    geometries.append(geometry)
+
+  grid_tolerance = tolerance / min(transform['scale'])
+  # Open arcs only need their two junctions; closed ones need to stay rings
+  simplified = [simplify_ring(tuple(arc), grid_tolerance, 4 if arc[0] == arc[-1] else 2) for arc in arcs]
+  # Rings that simplification collapsed keep their original arcs instead
+  for geometry in geometries:
+    for polygon in geometry['arcs']:
+      for ring in polygon:
+        points = sum(len(simplified[i if i >= 0 else ~i]) - 1 for i in ring)
+        if points < 3:
+          for i in ring:
+            simplified[i if i >= 0 else ~i] = arcs[i if i >= 0 else ~i]
+
+  encoded = []
+  for arc in simplified:
+    deltas, (px, py) = [list(arc[0])], arc[0]
+    for x, y in arc[1:]:
+      deltas.append([x - px, y - py])
+      px, py = x, y
+    encoded.append(deltas)
+
+  return {
+    'type': 'Topology',
+    'bbox': bbox,
+    'transform': transform,
+    'objects': {'countries': {'type': 'GeometryCollection', 'geometries': geometries}},
+    'arcs': encoded
+  }
+
+def build_topologies(features=None, output_dir=TOPOLOGY_DIR):
+  features = features or load_features()
+  os.makedirs(output_dir, exist_ok=True)
+  sizes = {}
+  for lod, (tolerance, quantization) in LODS.items():
+    topology = build_topology(features, tolerance, quantization)
+    path = os.path.join(output_dir, f'{lod}.json')
+    with open(path, 'w') as f:
+      json.dump(topology, f, separators=(',', ':'))
+    sizes[lod] = os.path.getsize(path)
+  return sizes
+
+@lru_cache(maxsize=len(LODS))
+def load_topology(lod):
+  # (raw bytes, gzip bytes, content hash); served as-is, never re-serialized per request
+  with open(topology_path(lod), 'rb') as f:
+    raw = f.read()
+  return raw, gzip.compress(raw, compresslevel=9, mtime=0), hashlib.sha1(raw).hexdigest()[:16]
+
+@lru_cache(maxsize=1)
+def country_bounds():
+  # {code: {'name', 'bbox', 'centroid'}} for catalog countries, from the bundled topology
+  topology = json.loads(load_topology('low')[0])
+  return {
+    geometry['id']: {
+      'name': geometry['properties']['name'],
+      'bbox': geometry['properties']['bbox'],
+      'centroid': geometry['properties']['centroid']
+    }
+    for geometry in topology['objects']['countries']['geometries']
+    if geometry.get('id')
+  }
@@ -0,0 +1,146 @@
+import atexit
+import threading
+import time
+from datetime import datetime, timezone
+from app.extensions import db, events, shards
+from app.services.marks_service import marks_changed, upsert_marks
+
+class MarkWriteBuffer:
+  """
+  Write-behind buffer for POST /mark, per process.
+
+  Marks are kept per user for up to `window` seconds (last write per country
+  wins) and then written in one transaction, so a user clicking through the
+  map costs one commit instead of one per click. Reads of a user's marks flush
+  that user first (marks_service.flush_buffered_marks), and unmark, import,
+  export and account deletion flush or discard before they run.
+
+  Durability: a buffered mark is acknowledged (202) before it is committed.
+  Shutting down cleanly flushes everything (atexit); a crash or kill -9 loses
+  up to `window` seconds of marks. A failed flush keeps the marks buffered and
+  retries on the next tick; after `max_failures` flushes in a row fail, the
+  user's buffered marks are dropped (logged, and a `reset` event makes their
+  clients refetch what was really saved), as they would otherwise be retried,
+  and shown as saved, forever. Buffers are not shared between processes, so
+  only enable this with a single worker process.
+  """
+
+  FLUSH_LOCKS = 64
+
+  def __init__(self, app, window=0.5, max_pending=50, max_failures=5):
+    self.app = app
+    self.window = window
+    self.max_pending = max_pending
+    self.max_failures = max_failures
+    self._pending = {}
+    self._due = {}
+    self._failures = {}
+    self._lock = threading.Lock()
+    # A flush takes its user's lock for the whole write, so a read that flushes
+    # waits for an in-flight flush instead of reading around it
+    self._flush_locks = [threading.Lock() for _ in range(self.FLUSH_LOCKS)]
+    self._stop = threading.Event()
+    self._thread = None
+
+  def add(self, user_id, country_id, status, visit_start_date=None, visit_end_date=None):
+    marked_at = datetime.now(timezone.utc)
+    with self._lock:
+      marks = self._pending.setdefault(user_id, {})
+      marks[country_id] = (status, visit_start_date, visit_end_date, marked_at)
+      self._due.setdefault(user_id, time.monotonic() + self.window)
+      full = len(marks) >= self.max_pending
+    if full:
+      self.flush(user_id)
+    else:
+      self._start()
+    return marked_at
+
+  def pending(self, user_id):
+    with self._lock:
+      return dict(self._pending.get(user_id, {}))
+
+  def flush(self, user_id):
+    # Writes the user's buffered marks now; returns how many were written
+    with self._flush_locks[user_id % self.FLUSH_LOCKS]:
+      with self._lock:
+        marks = self._pending.pop(user_id, None)
+        self._due.pop(user_id, None)
+      if not marks:
+        return 0
+      with shards.user_scope(user_id):
+        try:
+          upsert_marks(user_id, marks)
+        except Exception as e:
+          db.session.rollback()
+          with self._lock:
+            failures = self._failures.pop(user_id, 0) + 1
+            if failures < self.max_failures:
+              self._failures[user_id] = failures
+          if failures < self.max_failures:
+            self._restore(user_id, marks)
+          else:
+            self._drop(user_id, marks, e)
+          raise
+        with self._lock:
+          self._failures.pop(user_id, None)
+        marks_changed(user_id)
+      return len(marks)
+
+  def discard(self, user_id):
+    with self._flush_locks[user_id % self.FLUSH_LOCKS]:
+      with self._lock:
+        self._due.pop(user_id, None)
+        self._failures.pop(user_id, None)
+        return len(self._pending.pop(user_id, {}))
+
+  def flush_due(self, now=None):
+    now = time.monotonic() if now is None else now
+    with self._lock:
+      due = [user_id for user_id, deadline in self._due.items() if deadline <= now]
+    flushed = 0
+    for user_id in due:
+      try:
+        flushed += self.flush(user_id)
+      except Exception as e:
+        print(f"Error flushing buffered marks for user {user_id}: {e}")
+    return flushed
+
+  def flush_all(self):
+    return self.flush_due(now=float('inf'))
+
+  def close(self):
+    self._stop.set()
+    if self._thread is not None and self._thread is not threading.current_thread():
+      self._thread.join()
+    with self.app.app_context():
+      return self.flush_all()
+
+  def _restore(self, user_id, marks):
+    # Put back what failed to write, without overwriting marks that arrived meanwhile
+    with self._lock:
+      current = self._pending.setdefault(user_id, {})
+      for country_id, mark in marks.items():
+        current.setdefault(country_id, mark)
+      self._due.setdefault(user_id, time.monotonic() + self.window)
+
+  def _drop(self, user_id, marks, error):
+    # Acknowledged with a 202 (and published) but never written: tell the user's clients to refetch
+    message = f'Dropped {len(marks)} buffered marks of user {user_id} after {self.max_failures} failed writes: {error}'
+    print(f"Error flushing buffered marks: {message}")
+    self.app.logger.error(message)
+    events.publish(user_id, 'reset', {'dropped': sorted(marks)})
+
+  def _start(self):
+    if self._thread is not None:
+      return
+    with self._lock:
+      if self._thread is not None:
+        return
+      self._thread = threading.Thread(target=self._run, name='mark-write-buffer', daemon=True)
+      self._thread.start()
+    atexit.register(self.close)
+
+  def _run(self):
+    while not self._stop.wait(self.window / 2):
+      with self.app.app_context():
+        self.flush_due()
@@ -1,16 +1,22 @@
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, g
 from functools import wraps
 import jwt
+from app.extensions import shards
 from app.models import User
+from app.utils.tracing import span
+from app.utils.sharding import SAFE_METHODS
 
 def verify_token(token):
-  try:
-    payload = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-    return payload.get('user_id'), None
-  except jwt.ExpiredSignatureError:
-    return None, 'expired'
-  except jwt.InvalidTokenError:
-    return None, 'invalid'
+  with span('auth.verify_token') as token_span:
+    try:
+      payload = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+      return payload.get('user_id'), None
+    except jwt.ExpiredSignatureError:
+      token_span.set_attribute('auth.error', 'expired')
+      return None, 'expired'
+    except jwt.InvalidTokenError:
+      token_span.set_attribute('auth.error', 'invalid')
+      return None, 'invalid'
 
 def generate_token(user_id):
   from datetime import datetime, timedelta, timezone
@@ -24,7 +30,51 @@ def generate_token(user_id):
     return token.decode('utf-8')
   return token
 
-def get_user_from_request():
+def generate_stream_ticket(user_id, seconds):
+  # Only good for opening /api/events/stream: no `user_id` claim, so verify_token refuses it
+  from datetime import datetime, timedelta, timezone
+  payload = {
+    'sub': str(user_id),
+    'scope': 'events',
+    'exp': datetime.now(timezone.utc) + timedelta(seconds=seconds)
+  }
+  ticket = jwt.encode(payload, current_app.config['JWT_SECRET_KEY'], algorithm='HS256')
+  if isinstance(ticket, bytes):
+    return ticket.decode('utf-8')
+  return ticket
+
+def verify_stream_ticket(ticket):
+  try:
+    payload = jwt.decode(ticket, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+  except jwt.ExpiredSignatureError:
+    return None, 'expired'
+  except jwt.InvalidTokenError:
+    return None, 'invalid'
+  if payload.get('scope') != 'events' or not str(payload.get('sub', '')).isdigit():
+    return None, 'invalid'
+  return int(payload['sub']), None
+
+def verify_request_token(token):
+  # The rate limiter and the view both need the token, decode it once per request
+  cached = g.get('verified_token')
+  if cached and cached[0] == token:
+    return cached[1]
+  result = verify_token(token)
+  g.verified_token = (token, result)
+  return result
+
+def get_user_id_from_request():
+  # Identity only, without the database lookup done by get_user_from_request
+  auth_header = request.headers.get('Authorization')
+  if not auth_header:
+    return None
+  parts = auth_header.split(' ')
+  if len(parts) < 2:
+    return None
+  user_id, _ = verify_request_token(parts[1])
+  return user_id
+
+def get_user_from_request(allow_deleted=False):
   auth_header = request.headers.get('Authorization')
 
   if not auth_header:
@@ -35,18 +85,50 @@ def get_user_from_request():
   except IndexError:
     return None, jsonify({'error': 'Invalid authorization header format'}), 401
 
-  user_id, token_error = verify_token(token)
+  # Sub-requests of a batch (app/api/batch.py) reuse the user it already loaded
+  batch_auth = g.get('batch_auth')
+  if batch_auth and batch_auth[0] == token:
+    return enter_user_shard(batch_auth[1])
+
+  user_id, token_error = verify_request_token(token)
   if not user_id:
     if token_error == 'expired':
       return None, jsonify({'error': 'Token has expired'}), 401
     return None, jsonify({'error': 'Invalid token'}), 401
 
-  user = User.query.get(user_id)
+  with span('auth.user_lookup', **{'enduser.id': user_id}):
+    user = User.query.get(user_id)
   if not user:
     return None, jsonify({'error': 'User not found'}), 404
+  # Every token of an account dies with the deletion request, before the purge gets to the row
+  if user.deleted_at is not None and (not allow_deleted or user.purged_at is not None):
+    return None, jsonify({'error': 'Account has been deleted'}), 401
+
+  return enter_user_shard(user)
 
+def enter_user_shard(user):
+  # The rest of the request reads and writes the user's shard (app.utils.sharding)
+  if shards.enter_user(user.id) == 'moving' and request.method not in SAFE_METHODS:
+    response = jsonify({'error': 'Account is being moved, try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return None, response, 503
   return user, None, None
 
+def is_admin(user):
+  # Not derived from the email: users change theirs freely (PUT /api/auth/users/me) and unverified
+  return user.is_admin
+
+def require_admin(f):
+  @wraps(f)
+  def decorated_function(*args, **kwargs):
+    user, error_response, status_code = get_user_from_request()
+    if error_response:
+      return error_response, status_code
+    if not is_admin(user):
+      return jsonify({'error': 'Admin access required'}), 403
+    return f(user, *args, **kwargs)
+  return decorated_function
+
 def require_auth(f):
   @wraps(f)
   def decorated_function(*args, **kwargs):
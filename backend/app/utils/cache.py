@@ -0,0 +1,313 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+# Backends store JSON-compatible values; `None` is reserved to mean "miss".
+
+class LocalCacheBackend:
+  # In-process LRU. Fast, but every worker holds (and invalidates) its own copy.
+
+  def __init__(self, max_entries=4096):
+    self.max_entries = max_entries
+    self._data = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    with self._lock:
+      entry = self._data.get(key)
+      if entry is None:
+        return None
+      value, expires_at = entry
+      if expires_at is not None and expires_at <= time.monotonic():
+        del self._data[key]
+        return None
+      self._data.move_to_end(key)
+      return value
+
+  def _store(self, key, value, ttl):
+    expires_at = time.monotonic() + ttl if ttl else None
+    self._data[key] = (value, expires_at)
+    self._data.move_to_end(key)
+    while len(self._data) > self.max_entries:
+      self._data.popitem(last=False)
+
+  def set(self, key, value, ttl=None):
+    with self._lock:
+      self._store(key, value, ttl)
+
+  def add(self, key, value, ttl=None):
+    with self._lock:
+      entry = self._data.get(key)
+      if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+        return False
+      self._store(key, value, ttl)
+      return True
+
+  def delete(self, key):
+    with self._lock:
+      self._data.pop(key, None)
+
+  def clear(self, prefix=''):
+    with self._lock:
+      for key in [key for key in self._data if key.startswith(prefix)]:
+        del self._data[key]
+
+class SQLiteCacheBackend:
+  # Shared file cache for several workers on one machine (local stand-in for Redis)
+
+  PURGE_EVERY = 500
+
+  def __init__(self, path):
+    self.path = path
+    self._local = threading.local()
+    self._writes = 0
+    with self._connection() as conn:
+      conn.execute(
+        'CREATE TABLE IF NOT EXISTS cache_entries ('
+        'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)'
+      )
+
+  def _connection(self):
+    conn = getattr(self._local, 'conn', None)
+    if conn is None:
+      conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+      conn.execute('PRAGMA journal_mode=WAL')
+      conn.execute('PRAGMA synchronous=NORMAL')
+      self._local.conn = conn
+    return conn
+
+  def get(self, key):
+    row = self._connection().execute(
+      'SELECT value, expires_at FROM cache_entries WHERE key = ?', (key,)
+    ).fetchone()
+    if row is None:
+      return None
+    if row[1] is not None and row[1] <= time.time():
+      return None
+    return json.loads(row[0])
+
+  def _maybe_purge(self, conn):
+    self._writes += 1
+    if self._writes % self.PURGE_EVERY == 0:
+      conn.execute('DELETE FROM cache_entries WHERE expires_at <= ?', (time.time(),))
+
+  def set(self, key, value, ttl=None):
+    conn = self._connection()
+    conn.execute(
+      'INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)',
+      (key, json.dumps(value), time.time() + ttl if ttl else None)
+    )
+    self._maybe_purge(conn)
+
+  def add(self, key, value, ttl=None):
+    conn = self._connection()
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+      conn.execute('DELETE FROM cache_entries WHERE key = ? AND expires_at <= ?', (key, now))
+      cursor = conn.execute(
+        'INSERT OR IGNORE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)',
+        (key, json.dumps(value), now + ttl if ttl else None)
+      )
+      conn.execute('COMMIT')
+    except Exception:
+      conn.execute('ROLLBACK')
+      raise
+    return cursor.rowcount == 1
+
+  def delete(self, key):
+    self._connection().execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+
+  def clear(self, prefix=''):
+    self._connection().execute('DELETE FROM cache_entries WHERE substr(key, 1, ?) = ?', (len(prefix), prefix))
+
+class RedisCacheBackend:
+  # Anything speaking the Redis protocol (Redis, Valkey, KeyDB...). Needs the `redis` package.
+
+  def __init__(self, url):
+    import redis
+    self.client = redis.Redis.from_url(url)
+
+  def get(self, key):
+    raw = self.client.get(key)
+    return json.loads(raw) if raw is not None else None
+
+  def set(self, key, value, ttl=None):
+    self.client.set(key, json.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+  def add(self, key, value, ttl=None):
+    return bool(self.client.set(key, json.dumps(value), px=int(ttl * 1000) if ttl else None, nx=True))
+
+  def delete(self, key):
+    self.client.delete(key)
+
+  def clear(self, prefix=''):
+    # Only our keys: the Redis database may be shared with other apps
+    pattern = re.sub(r'([*?\[\]\\])', r'\\\1', prefix) + '*'
+    batch = []
+    for key in self.client.scan_iter(match=pattern, count=500):
+      batch.append(key)
+      if len(batch) == 500:
+        self.client.delete(*batch)
+        batch = []
+    if batch:
+      self.client.delete(*batch)
+
+def create_backend(app):
+  name = app.config.get('CACHE_BACKEND', 'local')
+  url = app.config.get('CACHE_URL')
+
+  if name == 'local':
+    return LocalCacheBackend(max_entries=app.config.get('CACHE_MAX_ENTRIES', 4096))
+  if name == 'sqlite':
+    if not url:
+      os.makedirs(app.instance_path, exist_ok=True)
+      url = os.path.join(app.instance_path, 'cache.db')
+    return SQLiteCacheBackend(url)
+  if name == 'redis':
+    return RedisCacheBackend(url or 'redis://localhost:6379/0')
+  raise ValueError(f'Unknown CACHE_BACKEND: {name}')
+
+class Cache:
+  """
+  Cache with versioned namespaces, TTLs, single-flight recompute and metrics.
+
+  Keys live inside a namespace (e.g. `marks:42`) whose current version is
+  stored in the backend itself, so `invalidate(namespace)` in one worker
+  makes every worker sharing the backend miss on its next read.
+  """
+
+  METRICS = ('hits', 'misses', 'sets', 'invalidations', 'recomputes', 'waits')
+
+  def __init__(self, backend=None, key_prefix='tmt:', default_ttl=300, lock_timeout=10):
+    self.backend = backend
+    self.key_prefix = key_prefix
+    self.default_ttl = default_ttl
+    self.lock_timeout = lock_timeout
+    self._metrics = dict.fromkeys(self.METRICS, 0)
+    self._metrics_lock = threading.Lock()
+    self._flight_locks = {}
+    self._flight_guard = threading.Lock()
+
+  def init_app(self, app):
+    app.extensions['cache'] = Cache(
+      backend=create_backend(app),
+      key_prefix=app.config.get('CACHE_KEY_PREFIX', 'tmt:'),
+      default_ttl=app.config.get('CACHE_DEFAULT_TTL', 300)
+    )
+
+  def _target(self):
+    if self.backend is not None:
+      return self
+    return current_app.extensions['cache']
+
+  def _count(self, metric):
+    with self._metrics_lock:
+      self._metrics[metric] += 1
+
+  def _version(self, namespace):
+    version_key = f'{self.key_prefix}ns:{namespace}'
+    version = self.backend.get(version_key)
+    if version is None:
+      # Random (not incrementing) versions, so a version key that gets evicted
+      # can never resurrect entries written under an older version
+      self.backend.add(version_key, os.urandom(6).hex())
+      version = self.backend.get(version_key)
+    return version
+
+  def _key(self, key, namespace):
+    if namespace is None:
+      return f'{self.key_prefix}{key}'
+    return f'{self.key_prefix}{namespace}@{self._version(namespace)}:{key}'
+
+  def get(self, key, namespace=None):
+    target = self._target()
+    value = target.backend.get(target._key(key, namespace))
+    target._count('hits' if value is not None else 'misses')
+    return value
+
+  def set(self, key, value, ttl=None, namespace=None):
+    target = self._target()
+    target.backend.set(target._key(key, namespace), value, target.default_ttl if ttl is None else ttl)
+    target._count('sets')
+
+  def delete(self, key, namespace=None):
+    target = self._target()
+    target.backend.delete(target._key(key, namespace))
+
+  def invalidate(self, namespace):
+    target = self._target()
+    target.backend.set(f'{target.key_prefix}ns:{namespace}', os.urandom(6).hex())
+    target._count('invalidations')
+
+  def get_or_set(self, key, compute, ttl=None, namespace=None):
+    target = self._target()
+    full_key = target._key(key, namespace)
+    value = target.backend.get(full_key)
+    if value is not None:
+      target._count('hits')
+      return value
+    target._count('misses')
+
+    # Single flight: one thread per process, and one process per backend, recomputes.
+    # The per-key lock is reference counted and only dropped once nobody waits on it.
+    with target._flight_guard:
+      flight = target._flight_locks.setdefault(full_key, [threading.Lock(), 0])
+      flight[1] += 1
+    try:
+      with flight[0]:
+        value = target.backend.get(full_key)
+        if value is not None:
+          target._count('waits')
+          return value
+        return target._recompute(full_key, compute, ttl)
+    finally:
+      with target._flight_guard:
+        flight[1] -= 1
+        if not flight[1]:
+          target._flight_locks.pop(full_key, None)
+
+  def _recompute(self, full_key, compute, ttl):
+    lock_key = f'{full_key}:lock'
+    token = os.urandom(8).hex()
+    owned = self.backend.add(lock_key, token, self.lock_timeout)
+    if not owned:
+      deadline = time.monotonic() + self.lock_timeout
+      while time.monotonic() < deadline:
+        time.sleep(0.01)
+        value = self.backend.get(full_key)
+        if value is not None:
+          self._count('waits')
+          return value
+        owned = self.backend.add(lock_key, token, self.lock_timeout)
+        if owned:
+          break
+    # Past the deadline the holder is presumed stuck: compute anyway, but leave its lock alone
+    try:
+      value = compute()
+      self._count('recomputes')
+      if value is not None:
+        self.backend.set(full_key, value, self.default_ttl if ttl is None else ttl)
+        self._count('sets')
+      return value
+    finally:
+      # Our lock may have expired and been taken by another process meanwhile
+      if owned and self.backend.get(lock_key) == token:
+        self.backend.delete(lock_key)
+
+  def stats(self):
+    target = self._target()
+    with target._metrics_lock:
+      stats = dict(target._metrics)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+  def clear(self):
+    target = self._target()
+    target.backend.clear(target.key_prefix)
@@ -0,0 +1,289 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from flask import current_app
+
+# Events are (id, type, data) where `id` counts up per user (it is the SSE
+# Last-Event-ID) and `data` is already JSON, serialized once at publish time
+
+class MemoryEventLog:
+  # Last `size` events of the most recently active users, per process: streams only
+  # see events published by their own worker
+
+  shared = False
+
+  def __init__(self, size=100, max_users=10000):
+    self.size = size
+    self.max_users = max_users
+    self._logs = OrderedDict()
+    self._lock = threading.Lock()
+
+  def append(self, user_id, event_type, data):
+    with self._lock:
+      log = self._logs.pop(user_id, None)
+      if log is None:
+        log = deque(maxlen=self.size)
+      event = (log[-1][0] + 1 if log else 1, event_type, data)
+      log.append(event)
+      self._logs[user_id] = log
+      if len(self._logs) > self.max_users:
+        # Evicted users restart at id 1; since() then reports a reset to their open streams
+        self._logs.popitem(last=False)
+    return event
+
+  def since(self, user_id, last_id):
+    # Events after `last_id`, or None when that point is no longer (or not yet) in the log
+    with self._lock:
+      log = list(self._logs.get(user_id, ()))
+    return _events_since(log, last_id)
+
+  def latest_id(self, user_id):
+    with self._lock:
+      log = self._logs.get(user_id)
+      return log[-1][0] if log else 0
+
+  def forget(self, user_id):
+    with self._lock:
+      self._logs.pop(user_id, None)
+
+def _events_since(log, last_id):
+  latest = log[-1][0] if log else 0
+  if last_id > latest:
+    return None
+  if log and log[0][0] > last_id + 1:
+    return None
+  return [event for event in log if event[0] > last_id]
+
+class SQLiteEventLog:
+  # Shared by every worker on the host through one SQLite file; workers pick up
+  # each other's events by polling for new rows (one thread per process)
+
+  shared = True
+  PRUNE_EVERY = 50
+
+  def __init__(self, path, size=100):
+    self.path = path
+    self.size = size
+    self._local = threading.local()
+    self._appends = 0
+    self._connection().execute(
+      'CREATE TABLE IF NOT EXISTS events ('
+      'rowid INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, seq INTEGER NOT NULL, '
+      'type TEXT NOT NULL, data TEXT NOT NULL, created_at REAL NOT NULL, UNIQUE (user_id, seq))'
+    )
+
+  def _connection(self):
+    conn = getattr(self._local, 'conn', None)
+    if conn is None:
+      conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+      conn.execute('PRAGMA journal_mode=WAL')
+      conn.execute('PRAGMA synchronous=NORMAL')
+      self._local.conn = conn
+    return conn
+
+  def append(self, user_id, event_type, data):
+    conn = self._connection()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+      seq = conn.execute('SELECT COALESCE(MAX(seq), 0) + 1 FROM events WHERE user_id = ?', (user_id,)).fetchone()[0]
+      conn.execute(
+        'INSERT INTO events (user_id, seq, type, data, created_at) VALUES (?, ?, ?, ?, ?)',
+        (user_id, seq, event_type, data, time.time())
+      )
+      self._appends += 1
+      if seq > self.size and self._appends % self.PRUNE_EVERY == 0:
+        conn.execute('DELETE FROM events WHERE user_id = ? AND seq <= ?', (user_id, seq - self.size))
+      conn.execute('COMMIT')
+    except Exception:
+      conn.execute('ROLLBACK')
+      raise
+    return (seq, event_type, data)
+
+  def since(self, user_id, last_id):
+    rows = self._connection().execute(
+      'SELECT seq, type, data FROM events WHERE user_id = ? ORDER BY seq DESC LIMIT ?', (user_id, self.size)
+    ).fetchall()
+    return _events_since([tuple(row) for row in reversed(rows)], last_id)
+
+  def latest_id(self, user_id):
+    return self._connection().execute('SELECT COALESCE(MAX(seq), 0) FROM events WHERE user_id = ?', (user_id,)).fetchone()[0]
+
+  def forget(self, user_id):
+    self._connection().execute('DELETE FROM events WHERE user_id = ?', (user_id,))
+
+  def last_rowid(self):
+    return self._connection().execute('SELECT COALESCE(MAX(rowid), 0) FROM events').fetchone()[0]
+
+  def poll(self, after_rowid, limit=1000):
+    # -> [(rowid, user_id, event)] written by any worker after `after_rowid`
+    rows = self._connection().execute(
+      'SELECT rowid, user_id, seq, type, data FROM events WHERE rowid > ? ORDER BY rowid LIMIT ?', (after_rowid, limit)
+    ).fetchall()
+    return [(rowid, user_id, (seq, event_type, data)) for rowid, user_id, seq, event_type, data in rows]
+
+def create_event_log(app):
+  name = app.config.get('EVENTS_BACKEND', 'memory')
+  size = app.config.get('EVENTS_LOG_SIZE', 100)
+  if name == 'memory':
+    return MemoryEventLog(size)
+  if name == 'sqlite':
+    path = app.config.get('EVENTS_URL')
+    if not path:
+      os.makedirs(app.instance_path, exist_ok=True)
+      path = os.path.join(app.instance_path, 'events.db')
+    return SQLiteEventLog(path, size)
+  raise ValueError(f'Unknown EVENTS_BACKEND: {name}')
+
+class Subscription:
+  """One open stream. Waiting blocks on an Event, so under gevent an idle stream is a parked greenlet."""
+
+  MAX_QUEUED = 256
+
+  def __init__(self, hub, user_id, last_id=0):
+    self.hub = hub
+    self.user_id = user_id
+    self.last_id = last_id
+    self._queue = deque()
+    self._ready = threading.Event()
+    self._lock = threading.Lock()
+
+  def push(self, events):
+    with self._lock:
+      self._append(events)
+
+  def _append(self, events):
+    for event in events:
+      # Replay, local delivery and polling can overlap; ids make delivery exactly-once
+      if event[0] <= self.last_id:
+        continue
+      self.last_id = event[0]
+      if len(self._queue) >= self.MAX_QUEUED:
+        # A client this far behind resyncs instead of buffering without bound
+        self._queue.clear()
+        event = (event[0], 'reset', '{}')
+      self._queue.append(event)
+    if self._queue:
+      self._ready.set()
+
+  def _reset(self, latest_id):
+    self.last_id = latest_id
+    self._queue.append((latest_id, 'reset', '{}'))
+    self._ready.set()
+
+  def wait(self, timeout):
+    # Queued events, or [] after `timeout` seconds without any
+    if not self._ready.wait(timeout):
+      return []
+    with self._lock:
+      events = list(self._queue)
+      self._queue.clear()
+      self._ready.clear()
+    return events
+
+  def close(self):
+    self.hub._unsubscribe(self)
+
+class EventHub:
+  """
+  In-process pub/sub for per-user events, on top of a bounded event log.
+
+  publish() appends to the log and wakes the user's local subscriptions. With a
+  shared log (EVENTS_BACKEND=sqlite) one poller thread per process also
+  forwards events published by other workers. subscribe() replays the log
+  after a Last-Event-ID, or queues a `reset` event when that point is gone.
+  """
+
+  def __init__(self, log=None, poll_interval=0.25):
+    self.log = log
+    self.poll_interval = poll_interval
+    self._subscribers = {}
+    self._lock = threading.Lock()
+    self._poller = None
+
+  def init_app(self, app):
+    app.extensions['events'] = EventHub(create_event_log(app), app.config.get('EVENTS_POLL_INTERVAL', 0.25))
+
+  def _target(self):
+    if self.log is not None:
+      return self
+    return current_app.extensions['events']
+
+  def publish(self, user_id, event_type, data):
+    # Best effort: a failed publish must not fail the write that triggered it
+    target = self._target()
+    try:
+      event = target.log.append(user_id, event_type, json.dumps(data, separators=(',', ':')))
+    except Exception as e:
+      print(f"Error publishing {event_type} event: {e}")
+      return None
+    target._deliver(user_id, [event])
+    return event
+
+  def forget(self, user_id):
+    # Drops the user's event history (account deletion); open streams just stop receiving
+    self._target().log.forget(user_id)
+
+  def subscribe(self, user_id, last_event_id=None):
+    target = self._target()
+    subscription = Subscription(target, user_id, last_id=last_event_id or 0)
+    # Register before reading the log so nothing published in between is missed, and hold
+    # the subscription's lock until the replay is queued so live events can't overtake it
+    with subscription._lock:
+      with target._lock:
+        target._subscribers.setdefault(user_id, set()).add(subscription)
+      if last_event_id is None:
+        subscription.last_id = target.log.latest_id(user_id)
+      else:
+        events = target.log.since(user_id, last_event_id)
+        if events is None:
+          subscription._reset(target.log.latest_id(user_id))
+        else:
+          subscription._append(events)
+    if target.log.shared:
+      target._start_poller()
+    return subscription
+
+  def subscriber_count(self):
+    target = self._target()
+    with target._lock:
+      return sum(len(subscriptions) for subscriptions in target._subscribers.values())
+
+  def _unsubscribe(self, subscription):
+    with self._lock:
+      subscriptions = self._subscribers.get(subscription.user_id)
+      if subscriptions:
+        subscriptions.discard(subscription)
+        if not subscriptions:
+          del self._subscribers[subscription.user_id]
+
+  def _deliver(self, user_id, events):
+    with self._lock:
+      subscriptions = list(self._subscribers.get(user_id, ()))
+    for subscription in subscriptions:
+      subscription.push(events)
+
+  def _start_poller(self):
+    if self._poller is not None:
+      return
+    with self._lock:
+      if self._poller is None:
+        self._poller = threading.Thread(target=self._poll, name='event-poller', daemon=True)
+        self._poller.start()
+
+  def _poll(self):
+    cursor = self.log.last_rowid()
+    while True:
+      time.sleep(self.poll_interval)
+      try:
+        for rowid, user_id, event in self.log.poll(cursor):
+          cursor = rowid
+          self._deliver(user_id, [event])
+      except Exception as e:
+        print(f"Error polling events: {e}")
+
+def format_event(event):
+  event_id, event_type, data = event
+  return f'id: {event_id}\nevent: {event_type}\ndata: {data}\n\n'
@@ -0,0 +1,72 @@
+"""
+Pre-fork support: build the read-only data every worker needs once, in the
+master, so forked workers share those memory pages instead of each building
+(and paying for) a private copy.
+
+Pages stay shared only while nobody writes to them, and CPython writes to an
+object whenever it touches its refcount or GC header. So the preloaded data is
+mostly large buffers (serialized payloads, NumPy arrays) or tuples of
+interned strings, and gunicorn.conf.py freezes the GC before forking, which
+keeps the collector in the workers from ever visiting the preloaded objects.
+"""
+import os
+import resource
+
+def preload(app):
+  """Builds the country catalog, region tree, map topology and geocoding index; returns seconds per step."""
+  import time
+  from app.extensions import db
+  from app.services.catalog_service import get_catalog
+  from app.services.geocoding_service import get_index
+  from app.services.region_service import get_region_tree
+  from app.services.topology_service import LODS, load_topology
+
+  steps = {
+    'catalog': get_catalog,
+    'regions': get_region_tree,
+    'topology': lambda: [load_topology(lod) for lod in LODS],
+    'geocoding': get_index
+  }
+  timings = {}
+  with app.app_context():
+    for name, step in steps.items():
+      started = time.perf_counter()
+      step()
+      timings[name] = round(time.perf_counter() - started, 3)
+    # Connections must never be shared with the workers: each one opens its own after the fork
+    db.engine.dispose()
+    read_engine = app.extensions.get('sqlite_read_engine')
+    if read_engine is not None:
+      read_engine.dispose()
+  return timings
+
+def memory_usage(pid='self'):
+  """
+  Memory of a process in KiB: rss, plus (on Linux) pss, shared and private.
+
+  rss counts shared pages in full for every worker; pss divides them among the
+  processes sharing them, so the sum of pss over the workers is what the box
+  actually spends. `private` is what a worker has copied or allocated itself.
+  """
+  try:
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+      fields = {}
+      for line in f:
+        parts = line.split()
+        if len(parts) == 3 and parts[2] == 'kB':
+          fields[parts[0].rstrip(':')] = int(parts[1])
+  except OSError:
+    if pid != 'self' and pid != os.getpid():
+      return None
+    # Peak RSS only, e.g. on macOS (where it is in bytes)
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {'rss': maxrss // 1024 if os.uname().sysname == 'Darwin' else maxrss}
+  return {
+    'rss': fields.get('Rss', 0),
+    'pss': fields.get('Pss', 0),
+    'shared': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+    'private': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+  }
+
+def format_memory(usage):
+  return ', '.join(f'{key} {value / 1024:.1f} MiB' for key, value in usage.items())
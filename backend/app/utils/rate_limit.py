@@ -0,0 +1,171 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from flask import current_app, g, jsonify, request
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+def parse_limit(limit):
+  # '60/minute' -> (capacity, tokens refilled per second)
+  count, _, period = limit.partition('/')
+  capacity = int(count)
+  return capacity, capacity / PERIODS[period.strip()]
+
+class MemoryBucketStore:
+  # One entry per key, updated in O(1); buckets that have refilled completely are pruned
+
+  PRUNE_EVERY = 10000
+
+  def __init__(self):
+    self._buckets = {}
+    self._lock = threading.Lock()
+    self._calls = 0
+
+  def take(self, key, capacity, rate, now=None):
+    now = time.monotonic() if now is None else now
+    with self._lock:
+      bucket = self._buckets.get(key)
+      tokens = capacity if bucket is None else min(capacity, bucket[0] + (now - bucket[1]) * rate)
+      allowed = tokens >= 1
+      if allowed:
+        tokens -= 1
+      self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+
+      self._calls += 1
+      if self._calls % self.PRUNE_EVERY == 0:
+        self._prune(now)
+    return allowed, tokens
+
+  def _prune(self, now):
+    full = [key for key, bucket in self._buckets.items() if bucket[2] <= now]
+    for key in full:
+      del self._buckets[key]
+
+class SQLiteBucketStore:
+  # Buckets shared by every worker on the host through one SQLite file; like the
+  # memory store, buckets that have refilled completely are pruned now and then
+
+  PRUNE_EVERY = 1000
+
+  def __init__(self, path):
+    self.path = path
+    self._local = threading.local()
+    self._calls = 0
+    conn = self._connection()
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(rate_limit_buckets)')]
+    if columns and 'full_at' not in columns:
+      # File from before pruning: buckets are throwaway state, start over
+      conn.execute('DROP TABLE rate_limit_buckets')
+    conn.execute(
+      'CREATE TABLE IF NOT EXISTS rate_limit_buckets ('
+      'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL)'
+    )
+    conn.execute('CREATE INDEX IF NOT EXISTS ix_rate_limit_buckets_full_at ON rate_limit_buckets (full_at)')
+
+  def _connection(self):
+    conn = getattr(self._local, 'conn', None)
+    if conn is None:
+      conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+      conn.execute('PRAGMA journal_mode=WAL')
+      conn.execute('PRAGMA synchronous=NORMAL')
+      self._local.conn = conn
+    return conn
+
+  def take(self, key, capacity, rate, now=None):
+    now = time.time() if now is None else now
+    conn = self._connection()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+      row = conn.execute('SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?', (key,)).fetchone()
+      tokens, updated_at = row if row else (capacity, now)
+      tokens = min(capacity, tokens + max(0, now - updated_at) * rate)
+      allowed = tokens >= 1
+      if allowed:
+        tokens -= 1
+      conn.execute(
+        'INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)',
+        (key, tokens, now, now + (capacity - tokens) / rate)
+      )
+      conn.execute('COMMIT')
+    except Exception:
+      conn.execute('ROLLBACK')
+      raise
+
+    self._calls += 1
+    if self._calls % self.PRUNE_EVERY == 0:
+      self._prune(now)
+    return allowed, tokens
+
+  def _prune(self, now):
+    # A bucket idle for a full refill is the same as no bucket at all
+    self._connection().execute('DELETE FROM rate_limit_buckets WHERE full_at <= ?', (now,))
+
+def create_store(app):
+  name = app.config.get('RATE_LIMIT_STORAGE', 'memory')
+  if name == 'memory':
+    return MemoryBucketStore()
+  if name == 'sqlite':
+    path = app.config.get('RATE_LIMIT_STORAGE_URL')
+    if not path:
+      os.makedirs(app.instance_path, exist_ok=True)
+      path = os.path.join(app.instance_path, 'rate_limits.db')
+    return SQLiteBucketStore(path)
+  raise ValueError(f'Unknown RATE_LIMIT_STORAGE: {name}')
+
+class RateLimiter:
+  """
+  Token-bucket limits per blueprint, keyed by the authenticated user id or,
+  for anonymous requests, the client IP. Limits come from RATE_LIMITS
+  (`{'marked_countries': '120/minute'}`) with RATE_LIMIT_DEFAULT as fallback.
+  Behind a reverse proxy, set PROXY_FIX_HOPS so the client IP is taken from
+  X-Forwarded-For instead of being the proxy's for everybody.
+  """
+
+  def init_app(self, app):
+    app.extensions['rate_limiter'] = create_store(app)
+    app.before_request(self._check)
+    app.after_request(self._add_headers)
+
+  def limit_for(self, blueprint):
+    config = current_app.config
+    name = blueprint.rsplit('.', 1)[-1]
+    limit = config.get('RATE_LIMITS', {}).get(name, config.get('RATE_LIMIT_DEFAULT'))
+    return parse_limit(limit) if limit else None
+
+  def identity(self):
+    from app.utils.auth import get_user_id_from_request
+    user_id = get_user_id_from_request()
+    if user_id:
+      return f'user:{user_id}'
+    return f'ip:{request.remote_addr}'
+
+  def _check(self):
+    if not current_app.config.get('RATE_LIMIT_ENABLED', True):
+      return None
+    if request.method == 'OPTIONS' or not request.blueprint:
+      return None
+    limit = self.limit_for(request.blueprint)
+    if not limit:
+      return None
+
+    capacity, rate = limit
+    store = current_app.extensions['rate_limiter']
+    allowed, tokens = store.take(f'{request.blueprint}:{self.identity()}', capacity, rate)
+    g.rate_limit = (capacity, int(tokens))
+
+    if not allowed:
+      retry_after = math.ceil((1 - tokens) / rate)
+      response = jsonify({'error': 'Too many requests', 'retry_after': retry_after})
+      response.status_code = 429
+      response.headers['Retry-After'] = str(retry_after)
+      return response
+    return None
+
+  def _add_headers(self, response):
+    rate_limit = g.get('rate_limit')
+    if rate_limit:
+      response.headers['X-RateLimit-Limit'] = str(rate_limit[0])
+      response.headers['X-RateLimit-Remaining'] = str(rate_limit[1])
+    return response
@@ -0,0 +1,243 @@
+"""
+User-sharded data layer.
+
+Tables whose `info` has a `shard_key` (marked_countries, user_bitsets,
+user_timelines) hold data owned by one user and can live on any of several
+databases ("shards"). Everything else (users, friendships, jobs, the shard
+map itself) stays in the main database, the directory, which is also the
+first shard, `default`. SHARD_URLS adds the others as binds shard1, shard2...
+
+A user's shard comes from the shard map (user_shards); users without a row
+(everyone, before sharding was turned on) are on `default`. New users are
+placed on the least loaded shard.
+
+Statements touching a sharded table run on the shard of the current scope:
+the authenticated user of a request (auth.get_user_from_request), the user
+of a job or a write-buffer flush, or an explicit `shards.scope(name)` /
+`shards.user_scope(user_id)`. Global queries visit every shard with
+`shards.scatter(fn)`. A sharded statement without a scope raises
+ShardingError rather than silently reading a single shard.
+
+Each shard gets the sharded tables plus a copy of `countries`, so the usual
+joins keep working inside a shard; foreign keys to `users` are left out
+there, as that table only exists in the directory.
+
+With SHARD_URLS empty (the default) there is one shard and nothing changes:
+no map lookups, no routing.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import current_app, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import MetaData, Table, inspect
+from sqlalchemy.sql.util import find_tables
+
+DEFAULT_SHARD = 'default'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_current_shard = ContextVar('current_shard', default=None)
+
+class ShardingError(Exception):
+  pass
+
+class ShardMoving(ShardingError):
+  # The user's data is being copied to another shard; writes must wait
+  pass
+
+def is_sharded(table):
+  return 'shard_key' in table.info
+
+def sharded_tables(metadata):
+  return [table for table in metadata.sorted_tables if is_sharded(table)]
+
+def touches_sharded_table(mapper, clause):
+  if mapper is not None and is_sharded(inspect(mapper).local_table):
+    return True
+  if clause is None:
+    return False
+  return any(
+    isinstance(table, Table) and is_sharded(table)
+    for table in find_tables(clause, check_columns=True, include_crud=True)
+  )
+
+def current_shard():
+  return _current_shard.get()
+
+class RoutingSession(Session):
+  """Flask-SQLAlchemy's session, sending statements on sharded tables to the current shard."""
+
+  def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+    router = current_app.extensions.get('shards')
+    if router is None or not router.enabled or not touches_sharded_table(mapper, clause):
+      return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    name = _current_shard.get()
+    if name is None:
+      raise ShardingError('Query on a sharded table outside a shard scope: use shards.user_scope() or shards.scatter()')
+    if name == DEFAULT_SHARD:
+      # Also keeps an explicit read-only bind (sqlite_tuning.read_bind) for the directory
+      return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+    return self._db.engines[name]
+
+def shard_metadata(metadata):
+  """The tables a shard database holds: sharded tables and a copy of `countries`, without foreign keys to `users`."""
+  target = MetaData()
+  metadata.tables['countries'].to_metadata(target)
+  for table in sharded_tables(metadata):
+    copy = table.to_metadata(target)
+    for constraint in list(copy.foreign_key_constraints):
+      if constraint.elements[0].target_fullname.split('.')[0] == 'users':
+        copy.constraints.discard(constraint)
+        for element in constraint.elements:
+          copy.foreign_keys.discard(element)
+          element.parent.foreign_keys.discard(element)
+  return target
+
+class ShardRouter:
+  """
+  Shard names, the current scope and the shard map. `init_app` must run
+  before `db.init_app`: it turns SHARD_URLS into SQLALCHEMY_BINDS.
+  """
+
+  def init_app(self, app):
+    urls = app.config.get('SHARD_URLS') or []
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    names = [DEFAULT_SHARD]
+    for index, url in enumerate(urls, 1):
+      binds[f'shard{index}'] = url
+      names.append(f'shard{index}')
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.extensions['shards'] = self
+    app.extensions['shard_names'] = names
+    app.teardown_request(self._leave_request)
+
+  @property
+  def names(self):
+    return current_app.extensions['shard_names']
+
+  @property
+  def enabled(self):
+    return len(current_app.extensions['shard_names']) > 1
+
+  def engine(self, name):
+    from app.extensions import db
+    return db.engine if name == DEFAULT_SHARD else db.engines[name]
+
+  def ensure_schema(self):
+    """Creates the shard tables where missing and copies new countries to every shard."""
+    from app.extensions import db
+    from app.migrations import current_version, head_revision, stamp
+    from app.utils.sqlite_tuning import install_pragmas
+    if not self.enabled:
+      return
+    metadata = shard_metadata(db.metadata)
+    for name in self.names[1:]:
+      engine = self.engine(name)
+      install_pragmas(current_app, engine)
+      metadata.create_all(engine)
+      if current_version(engine) is None:
+        stamp(engine, head_revision())
+    self.sync_countries()
+
+  def sync_countries(self):
+    # Countries are only ever added (country_service.import_countries), so copying the missing ids is enough
+    from app.extensions import db
+    from app.models import Country
+    table = Country.__table__
+    with db.engine.connect() as connection:
+      rows = [dict(row._mapping) for row in connection.execute(table.select())]
+    copied = 0
+    for name in self.names[1:]:
+      with self.engine(name).begin() as connection:
+        existing = set(connection.execute(table.select().with_only_columns(table.c.id)).scalars())
+        missing = [row for row in rows if row['id'] not in existing]
+        if missing:
+          connection.execute(table.insert(), missing)
+          copied += len(missing)
+    return copied
+
+  @contextmanager
+  def scope(self, name):
+    if name not in self.names:
+      raise ShardingError(f'Unknown shard: {name}')
+    token = _current_shard.set(name)
+    try:
+      yield name
+    finally:
+      _current_shard.reset(token)
+
+  def lookup(self, user_id):
+    # -> (shard, state) from the shard map; users without a row are on the default shard
+    from app.extensions import db
+    from app.models import UserShard
+    row = db.session.execute(
+      db.select(UserShard.shard, UserShard.state).where(UserShard.user_id == user_id)
+    ).first()
+    return (row[0], row[1]) if row else (DEFAULT_SHARD, 'active')
+
+  def shard_for(self, user_id):
+    return self.lookup(user_id)[0] if self.enabled else DEFAULT_SHARD
+
+  @contextmanager
+  def user_scope(self, user_id, writing=False):
+    """Scope of `user_id`'s shard; with `writing`, raises ShardMoving while the user is being moved."""
+    if not self.enabled:
+      yield DEFAULT_SHARD
+      return
+    name, state = self.lookup(user_id)
+    if writing and state == 'moving':
+      raise ShardMoving(f'User {user_id} is being moved to another shard')
+    with self.scope(name):
+      yield name
+
+  def enter_user(self, user_id):
+    """Scopes the rest of the current request to `user_id`'s shard; returns the map state ('active' or 'moving')."""
+    if not self.enabled:
+      return 'active'
+    name, state = self.lookup(user_id)
+    token = _current_shard.set(name)
+    request.environ.setdefault('sharding.token', token)
+    return state
+
+  def _leave_request(self, exc):
+    token = request.environ.pop('sharding.token', None)
+    if token is not None:
+      _current_shard.reset(token)
+
+  def scatter(self, fn):
+    """Runs `fn(name)` inside every shard's scope, one shard after the other; returns {name: result}."""
+    results = {}
+    for name in self.names:
+      with self.scope(name):
+        results[name] = fn(name)
+    return results
+
+  def group_by_shard(self, user_ids):
+    # {shard: [user ids]} with one map query for all of them
+    from app.extensions import db
+    from app.models import UserShard
+    if not self.enabled:
+      return {DEFAULT_SHARD: list(user_ids)}
+    mapped = dict(db.session.execute(
+      db.select(UserShard.user_id, UserShard.shard).where(UserShard.user_id.in_(user_ids))
+    ).all())
+    groups = {}
+    for user_id in user_ids:
+      groups.setdefault(mapped.get(user_id, DEFAULT_SHARD), []).append(user_id)
+    return groups
+
+  def assign(self, user_id):
+    """Places a new user on the least loaded shard; no-op without sharding. Returns the shard."""
+    from app.extensions import db
+    from app.models import UserShard
+    from app.services.shard_service import shard_loads
+    if not self.enabled:
+      return DEFAULT_SHARD
+    loads = shard_loads()
+    # The new user has no map row yet, so it was counted on the default shard
+    loads[DEFAULT_SHARD] -= 1
+    name = min(self.names, key=lambda shard: (loads[shard], self.names.index(shard)))
+    db.session.add(UserShard(user_id=user_id, shard=name))
+    db.session.commit()
+    return name
@@ -0,0 +1,127 @@
+"""
+SQLite profile for single-node deployments.
+
+For a file database (and SQLITE_TUNED on) every new connection gets
+SQLITE_PRAGMAS: WAL so readers never block the writer, synchronous=NORMAL
+(durable at every checkpoint, only the last transactions can roll back on
+power loss), a bigger page cache, mmap reads and a busy timeout instead of
+immediate `database is locked` errors. Hot read paths can run on a separate
+pool of read-only connections (read_bind()), and a maintenance thread
+checkpoints the WAL and runs PRAGMA optimize periodically.
+"""
+import os
+import threading
+from flask import current_app
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+
+# Pragmas that only concern the connection itself, safe on read-only connections
+CONNECTION_PRAGMAS = ('busy_timeout', 'cache_size', 'mmap_size', 'temp_store')
+
+def sqlite_file_path(uri):
+  # Absolute path of a file-backed SQLite database, or None (other dialects, :memory:)
+  url = make_url(uri)
+  if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+    return None
+  database = url.database
+  if url.query.get('uri'):
+    if 'mode=memory' in str(url) or not database.startswith('file:'):
+      return None
+    database = database[5:]
+  return database
+
+def apply_pragmas(dbapi_connection, pragmas):
+  cursor = dbapi_connection.cursor()
+  try:
+    for name, value in pragmas.items():
+      cursor.execute(f'PRAGMA {name} = {value}')
+  finally:
+    cursor.close()
+
+def install_pragmas(app, engine):
+  """SQLITE_PRAGMAS on every new connection of `engine`; returns the file path, or None unless it is a tuned SQLite file."""
+  if not app.config.get('SQLITE_TUNED') or engine.dialect.name != 'sqlite':
+    return None
+  path = sqlite_file_path(str(engine.url))
+  if path is None:
+    return None
+  pragmas = app.config['SQLITE_PRAGMAS']
+  event.listen(engine, 'connect', lambda dbapi_connection, record: apply_pragmas(dbapi_connection, pragmas))
+  return path
+
+def configure_sqlite(app, engine):
+  """Installs the pragmas on `engine` and creates the read-only pool; no-op unless it is a tuned SQLite file."""
+  path = install_pragmas(app, engine)
+  if path is None:
+    return
+
+  pragmas = app.config['SQLITE_PRAGMAS']
+
+  pool_size = app.config.get('SQLITE_READ_POOL_SIZE', 0)
+  if pool_size:
+    read_pragmas = {name: value for name, value in pragmas.items() if name in CONNECTION_PRAGMAS}
+    read_pragmas['query_only'] = 'ON'
+    read_engine = create_engine(
+      f'sqlite:///file:{os.path.abspath(path)}?mode=ro&uri=true',
+      pool_size=pool_size,
+      max_overflow=pool_size
+    )
+    event.listen(read_engine, 'connect', lambda dbapi_connection, record: apply_pragmas(dbapi_connection, read_pragmas))
+    app.extensions['sqlite_read_engine'] = read_engine
+
+  interval = app.config.get('SQLITE_MAINTENANCE_INTERVAL')
+  if interval:
+    app.extensions['sqlite_maintenance'] = SQLiteMaintenance(app, engine, interval)
+
+def read_bind():
+  """bind_arguments for read-only statements that run after the request's writes are committed.
+
+  Uses the read-only pool when there is one, so reads never take a
+  connection from (or queue behind) the writer's pool.
+  """
+  engine = current_app.extensions.get('sqlite_read_engine')
+  return {'bind': engine} if engine is not None else None
+
+def run_maintenance(engine, checkpoint='PASSIVE'):
+  # -> (busy, wal_frames, checkpointed_frames) from the checkpoint
+  with engine.connect() as connection:
+    result = tuple(connection.execute(text(f'PRAGMA wal_checkpoint({checkpoint})')).one())
+    connection.execute(text('PRAGMA optimize'))
+  return result
+
+class SQLiteMaintenance:
+  """Checkpoints the WAL and refreshes planner statistics every `interval` seconds.
+
+  A PASSIVE checkpoint never waits for readers or blocks writers; it just keeps
+  the WAL from growing while readers are always active. Started by the first
+  request, so it runs in the serving process rather than a pre-fork parent.
+  """
+
+  def __init__(self, app, engine, interval):
+    self.app = app
+    self.engine = engine
+    self.interval = interval
+    self.runs = 0
+    self._stop = threading.Event()
+    self._thread = None
+    self._lock = threading.Lock()
+    app.before_request(self.start)
+
+  def start(self):
+    if self._thread is not None:
+      return
+    with self._lock:
+      if self._thread is None:
+        self._thread = threading.Thread(target=self._run, name='sqlite-maintenance', daemon=True)
+        self._thread.start()
+
+  def stop(self):
+    self._stop.set()
+
+  def _run(self):
+    while not self._stop.wait(self.interval):
+      try:
+        run_maintenance(self.engine)
+        self.runs += 1
+      except Exception as e:
+        print(f"Error running SQLite maintenance: {e}")
@@ -0,0 +1,384 @@
+"""
+Request tracing in the OpenTelemetry data model, without the SDK.
+
+Every sampled request gets a SERVER span; `span(name)` opens children
+(token decode, user lookup, Google verification, JSON serialization) and
+every SQL statement becomes a CLIENT span through SQLAlchemy cursor events.
+The trace context comes from the incoming W3C `traceparent` header and is
+passed on to outbound HTTP calls with `inject()`.
+
+Sampling is parent-based: a request with a `traceparent` keeps its parent's
+decision, the others are sampled by trace id with TRACING_SAMPLE_RATE. When
+a request is not sampled nothing is recorded at all: `span()` is a context
+variable lookup returning a shared no-op span.
+
+Finished traces go to an exporter: `memory` (kept in process, for tests),
+`file` (one OTLP/JSON ExportTraceServiceRequest per line, readable by the
+collector's otlpjsonfile receiver) or `none`, which leaves the app untouched.
+"""
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+STATUS_ERROR = 2
+
+MAX_STATEMENT_LENGTH = 2048
+
+_current = ContextVar('tracing_current_span', default=None)
+
+class NoopSpan:
+  # Stands in for every span of a request that is not sampled
+
+  __slots__ = ()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    return False
+
+  def set_attribute(self, key, value):
+    pass
+
+  def record_exception(self, exc):
+    pass
+
+NOOP_SPAN = NoopSpan()
+
+class Trace:
+  # Spans of one trace recorded by this process, exported together when the local root ends
+
+  __slots__ = ('trace_id', 'spans', 'dropped', 'max_spans', 'exporter')
+
+  def __init__(self, trace_id, max_spans, exporter):
+    self.trace_id = trace_id
+    self.spans = []
+    self.dropped = 0
+    self.max_spans = max_spans
+    self.exporter = exporter
+
+class Span:
+  __slots__ = ('trace', 'span_id', 'parent_id', 'parent', 'name', 'kind', 'start', 'end', 'attributes', 'status', 'events')
+
+  def __init__(self, trace, name, kind=KIND_INTERNAL, parent=None, parent_id=None, attributes=None):
+    self.trace = trace
+    self.span_id = random.getrandbits(64) or 1
+    self.parent = parent
+    self.parent_id = parent.span_id if parent is not None else parent_id
+    self.name = name
+    self.kind = kind
+    self.start = time.time_ns()
+    self.end = None
+    self.attributes = attributes or {}
+    self.status = None
+    self.events = None
+
+  def set_attribute(self, key, value):
+    self.attributes[key] = value
+
+  def record_exception(self, exc):
+    self.status = (STATUS_ERROR, str(exc))
+    if self.events is None:
+      self.events = []
+    self.events.append((time.time_ns(), 'exception', {
+      'exception.type': type(exc).__name__,
+      'exception.message': str(exc)
+    }))
+
+  def activate(self):
+    _current.set(self)
+    return self
+
+  def finish(self):
+    if self.end is not None:
+      return
+    self.end = time.time_ns()
+    if _current.get() is self:
+      _current.set(self.parent)
+    self.trace.spans.append(self)
+    if self.parent is None:
+      self.trace.exporter.export(self.trace)
+
+  def __enter__(self):
+    return self.activate()
+
+  def __exit__(self, exc_type, exc, tb):
+    if exc is not None:
+      self.record_exception(exc)
+    self.finish()
+    return False
+
+  @property
+  def context(self):
+    return self.trace.trace_id, self.span_id
+
+  def to_otlp(self):
+    span = {
+      'traceId': f'{self.trace.trace_id:032x}',
+      'spanId': f'{self.span_id:016x}',
+      'name': self.name,
+      'kind': self.kind,
+      'startTimeUnixNano': str(self.start),
+      'endTimeUnixNano': str(self.end),
+      'attributes': otlp_attributes(self.attributes),
+      'status': {'code': self.status[0], 'message': self.status[1]} if self.status else {}
+    }
+    if self.parent_id:
+      span['parentSpanId'] = f'{self.parent_id:016x}'
+    if self.events:
+      span['events'] = [
+        {'timeUnixNano': str(at), 'name': name, 'attributes': otlp_attributes(attributes)}
+        for at, name, attributes in self.events
+      ]
+    return span
+
+def otlp_value(value):
+  if isinstance(value, bool):
+    return {'boolValue': value}
+  if isinstance(value, int):
+    return {'intValue': str(value)}
+  if isinstance(value, float):
+    return {'doubleValue': value}
+  return {'stringValue': str(value)}
+
+def otlp_attributes(attributes):
+  return [{'key': key, 'value': otlp_value(value)} for key, value in attributes.items()]
+
+def parse_traceparent(header):
+  """'00-<32 hex trace id>-<16 hex span id>-<2 hex flags>' -> (trace_id, span_id, sampled) or None."""
+  if not header:
+    return None
+  parts = header.strip().split('-')
+  if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == 'ff':
+    return None
+  if len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+    return None
+  # Version 00 has exactly four fields; later versions may append more
+  if parts[0] == '00' and len(parts) != 4:
+    return None
+  try:
+    trace_id, span_id, flags = int(parts[1], 16), int(parts[2], 16), int(parts[3], 16)
+  except ValueError:
+    return None
+  if not trace_id or not span_id:
+    return None
+  return trace_id, span_id, bool(flags & 1)
+
+def format_traceparent(trace_id, span_id, sampled=True):
+  return f'00-{trace_id:032x}-{span_id:016x}-{"01" if sampled else "00"}'
+
+def should_sample(trace_id, rate):
+  # Trace-id ratio, like OpenTelemetry's TraceIdRatioBased: same decision for a trace id everywhere
+  if rate >= 1:
+    return True
+  if rate <= 0:
+    return False
+  return (trace_id & 0xFFFFFFFFFFFFFFFF) < int(rate * (1 << 64))
+
+def current_span():
+  return _current.get()
+
+def span(name, kind=KIND_INTERNAL, **attributes):
+  """Child of the current span, as a context manager; a no-op outside sampled requests."""
+  parent = _current.get()
+  if parent is None:
+    return NOOP_SPAN
+  trace = parent.trace
+  if len(trace.spans) >= trace.max_spans:
+    trace.dropped += 1
+    return NOOP_SPAN
+  return Span(trace, name, kind, parent=parent, attributes=attributes)
+
+def inject(headers):
+  """Adds `traceparent` for the current span to an outbound request's headers."""
+  parent = _current.get()
+  if parent is not None:
+    headers['traceparent'] = format_traceparent(*parent.context)
+  return headers
+
+class MemoryExporter:
+  # Finished spans kept in process (newest `size`), for tests and the benchmark
+
+  def __init__(self, size=10000):
+    self.spans = deque(maxlen=size)
+
+  def export(self, trace):
+    self.spans.extend(trace.spans)
+
+  def clear(self):
+    self.spans.clear()
+
+  def find(self, name):
+    return [span for span in self.spans if span.name == name]
+
+class FileExporter:
+  # One OTLP/JSON line per trace; every worker appends to the same file
+
+  def __init__(self, path, service_name):
+    self.path = path
+    self.service_name = service_name
+    self._fd = None
+    self._pid = None
+    self._lock = threading.Lock()
+
+  def _file(self):
+    # Opened lazily, and again after a fork, so workers never share a descriptor offset
+    if self._fd is None or self._pid != os.getpid():
+      self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+      self._pid = os.getpid()
+    return self._fd
+
+  def export(self, trace):
+    line = {
+      'resourceSpans': [{
+        'resource': {'attributes': otlp_attributes({'service.name': self.service_name})},
+        'scopeSpans': [{'scope': {'name': 'app.utils.tracing'}, 'spans': [span.to_otlp() for span in trace.spans]}]
+      }]
+    }
+    data = json.dumps(line, separators=(',', ':')).encode('utf-8') + b'\n'
+    try:
+      with self._lock:
+        os.write(self._file(), data)
+    except Exception as e:
+      print(f"Error exporting trace: {e}")
+
+def create_exporter(app):
+  name = app.config.get('TRACING_EXPORTER', 'none')
+  if name == 'none':
+    return None
+  if name == 'memory':
+    return MemoryExporter()
+  if name == 'file':
+    path = app.config.get('TRACING_FILE')
+    if not path:
+      os.makedirs(app.instance_path, exist_ok=True)
+      path = os.path.join(app.instance_path, 'traces.jsonl')
+    return FileExporter(path, app.config.get('TRACING_SERVICE_NAME', 'travel-map-tracker'))
+  raise ValueError(f'Unknown TRACING_EXPORTER: {name}')
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  parent = _current.get()
+  if parent is None or context is None:
+    return
+  operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'SQL'
+  sql_span = span(operation, KIND_CLIENT, **{
+    'db.system': conn.dialect.name,
+    'db.statement': statement[:MAX_STATEMENT_LENGTH]
+  })
+  if sql_span is not NOOP_SPAN:
+    if executemany:
+      sql_span.set_attribute('db.executemany', True)
+    context._trace_span = sql_span.activate()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  sql_span = getattr(context, '_trace_span', None)
+  if sql_span is not None:
+    if cursor.rowcount is not None and cursor.rowcount >= 0:
+      sql_span.set_attribute('db.rowcount', cursor.rowcount)
+    sql_span.finish()
+
+def _handle_error(exception_context):
+  sql_span = getattr(exception_context.execution_context, '_trace_span', None)
+  if sql_span is not None:
+    sql_span.record_exception(exception_context.original_exception)
+    sql_span.finish()
+
+_sql_lock = threading.Lock()
+_sql_instrumented = False
+
+def instrument_sql():
+  # Listeners on the Engine class cover every engine (the read-only pool too); installed once per process
+  global _sql_instrumented
+  with _sql_lock:
+    if _sql_instrumented:
+      return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+    _sql_instrumented = True
+
+class Tracing:
+  """
+  Starts a SERVER span per request (or a child span, for batch sub-requests
+  that run inside another request) and ends it at teardown. With
+  TRACING_EXPORTER=none init_app installs nothing.
+  """
+
+  def init_app(self, app):
+    exporter = create_exporter(app)
+    app.extensions['tracing_exporter'] = exporter
+    if exporter is None:
+      return
+    instrument_sql()
+    app.before_request(self._start)
+    app.after_request(self._add_headers)
+    app.teardown_request(self._finish)
+
+    response = app.json.response
+    def traced_response(*args, **kwargs):
+      with span('json.serialize'):
+        return response(*args, **kwargs)
+    app.json.response = traced_response
+
+  @property
+  def exporter(self):
+    return current_app.extensions.get('tracing_exporter')
+
+  def _start(self):
+    # The sampling decision comes first: an unsampled request costs a header lookup
+    parent = _current.get()
+    if parent is None:
+      config = current_app.config
+      remote = parse_traceparent(request.headers.get('traceparent'))
+      if remote:
+        trace_id, parent_id, sampled = remote
+      else:
+        trace_id, parent_id = random.getrandbits(128) or 1, None
+        sampled = should_sample(trace_id, config.get('TRACING_SAMPLE_RATE', 0.0))
+      if not sampled:
+        return None
+
+    route = request.url_rule.rule if request.url_rule else request.path
+    name = f'{request.method} {route}'
+    attributes = {'http.request.method': request.method, 'url.path': request.path, 'http.route': route}
+    if parent is not None:
+      # Batch sub-request (app/api/batch.py): same trace, nested under the batch's span
+      request_span = span(name, KIND_SERVER, **attributes)
+      if request_span is NOOP_SPAN:
+        return None
+    else:
+      trace = Trace(trace_id, config.get('TRACING_MAX_SPANS', 1000), current_app.extensions['tracing_exporter'])
+      request_span = Span(trace, name, KIND_SERVER, parent_id=parent_id, attributes=attributes)
+    request.environ['tracing.span'] = request_span.activate()
+    return None
+
+  def _add_headers(self, response):
+    request_span = request.environ.get('tracing.span')
+    if request_span is not None:
+      request_span.set_attribute('http.response.status_code', response.status_code)
+      if response.status_code >= 500:
+        request_span.status = (STATUS_ERROR, response.status)
+      if request_span.parent is None:
+        response.headers['X-Trace-Id'] = f'{request_span.trace.trace_id:032x}'
+    return response
+
+  def _finish(self, exc):
+    request_span = request.environ.pop('tracing.span', None)
+    if request_span is None:
+      return
+    if exc is not None:
+      request_span.record_exception(exc)
+    if request_span.trace.dropped:
+      request_span.set_attribute('tracing.dropped_spans', request_span.trace.dropped)
+    request_span.finish()
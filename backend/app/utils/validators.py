@@ -1,4 +1,5 @@
 import re
+from datetime import datetime
 
 def validate_email(email):
   if not email:
@@ -6,3 +7,7 @@ def validate_email(email):
   pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
   return bool(re.match(pattern, email))
 
+
+def parse_iso_date(value):
+  # Accepts 'YYYY-MM-DD' or a full ISO timestamp; raises ValueError/AttributeError otherwise
+  return datetime.fromisoformat(value.replace('Z', '+00:00')).date()
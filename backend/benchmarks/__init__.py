@@ -0,0 +1 @@
+# Benchmarks ficam fora de `tests/` para não rodarem junto com o pytest
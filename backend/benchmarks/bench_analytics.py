@@ -0,0 +1,81 @@
+"""
+Admin analytics snapshot (app.services.analytics_service) on synthetic data.
+
+Generates `--users` x `--visits-per-user` visits as arrays, times writing the
+snapshot and opening it, then the median latency of each query over
+`--repeat` runs. With `--database`, the visits are also written to a SQLite
+file and the popularity GROUP BY the snapshot replaces is timed there.
+
+  python -m benchmarks.bench_analytics --users 100000 --visits-per-user 20
+  python -m benchmarks.bench_analytics --users 50000 --database
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+import numpy as np
+from benchmarks.bench_timeline import synthetic_visits, write_visits
+
+def median_ms(fn, repeat):
+  timings = []
+  for _ in range(repeat):
+    started = time.perf_counter()
+    fn()
+    timings.append((time.perf_counter() - started) * 1000)
+  return statistics.median(timings)
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--users', type=int, default=100000)
+  parser.add_argument('--visits-per-user', type=int, default=20)
+  parser.add_argument('--repeat', type=int, default=20)
+  parser.add_argument('--database', action='store_true', help='Also time the equivalent SQL on SQLite.')
+  args = parser.parse_args()
+
+  from app import create_app
+  from app.extensions import db
+  from app.models import Country, MarkedCountry
+  from app.services.analytics_service import Snapshot, build_snapshot
+
+  app = create_app()
+  with app.app_context():
+    countries = db.session.execute(db.select(Country.id, Country.code, Country.name, Country.continent)).all()
+    user_ids, country_ids, starts, _ = synthetic_visits(args.users, min(args.visits_per_user, len(countries)), len(countries))
+    rng = np.random.default_rng(1)
+    statuses = (rng.random(len(user_ids)) < 0.3).astype(np.int8)
+    marked = np.datetime64('2020-01-01') + rng.integers(0, 5 * 365, len(user_ids)).astype('timedelta64[D]')
+    print(f'{len(user_ids):,} marks of {args.users:,} users')
+
+    path = os.path.join(tempfile.mkdtemp(), 'snapshot')
+    started = time.perf_counter()
+    build_snapshot(path, (user_ids, country_ids, statuses, starts, marked), countries)
+    size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    print(f'build_snapshot: {time.perf_counter() - started:.2f}s, {size / 1e6:.1f} MB')
+    print(f'open snapshot: {median_ms(lambda: Snapshot(path), args.repeat):.2f} ms')
+
+    snapshot = Snapshot(path)
+    code = snapshot.countries[0][1]
+    queries = [
+      ('popularity', lambda: snapshot.popularity()),
+      ('popularity continent', lambda: snapshot.popularity(continent='Europe')),
+      ('co-visitation country', lambda: snapshot.co_visitation(code)),
+      ('co-visitation matrix 50', lambda: snapshot.co_visitation_matrix([row[1] for row in snapshot.countries[:50]])),
+      ('trends (all + 1 country)', lambda: snapshot.trends([code])),
+      ('trends by visit, yearly', lambda: snapshot.trends(by='visit', interval='year')),
+      ('rising', lambda: snapshot.rising(today=np.datetime64('2024-12-31')))
+    ]
+    for name, query in queries:
+      print(f'{name:<28} {median_ms(query, args.repeat):9.2f} ms')
+
+    if args.database:
+      write_visits((user_ids, country_ids, starts, starts))
+      popularity = db.select(MarkedCountry.country_id, db.func.count()).group_by(MarkedCountry.country_id)
+      sql = median_ms(lambda: db.session.execute(popularity).all(), max(args.repeat // 4, 1))
+      print(f'{"SQL popularity GROUP BY":<28} {sql:9.2f} ms')
+
+if __name__ == '__main__':
+  main()
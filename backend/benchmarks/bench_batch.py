@@ -0,0 +1,97 @@
+"""
+Home page load: the three calls the frontend used to make one after the
+other (/auth/me, then /countries, then /marked-countries/my) against a single
+GET /api/bootstrap, over links with `--rtt` milliseconds of round-trip time.
+
+The app is served over real HTTP on a local port; a WSGI middleware holds
+each response for one RTT, so every HTTP round trip pays the latency a
+distant client would. Reports the time until all three payloads are in.
+
+  python -m benchmarks.bench_batch --rtt 0 50 150 300 --iterations 20
+"""
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from benchmarks.load import percentile
+
+HOME_PAGE_CALLS = ['/api/auth/me', '/api/countries', '/api/marked-countries/my']
+
+class Latency:
+  # WSGI middleware that delays every response by the current round-trip time
+
+  def __init__(self, app):
+    self.app = app
+    self.rtt = 0.0
+
+  def __call__(self, environ, start_response):
+    if self.rtt:
+      time.sleep(self.rtt)
+    return self.app(environ, start_response)
+
+def serial(session, base_url, headers):
+  for path in HOME_PAGE_CALLS:
+    session.get(base_url + path, headers=headers).raise_for_status()
+
+def bootstrap(session, base_url, headers):
+  response = session.get(base_url + '/api/bootstrap', headers=headers)
+  response.raise_for_status()
+  assert all(entry['status'] == 200 for entry in response.json()['responses'].values())
+
+def measure(run, session, base_url, headers, iterations):
+  latencies = []
+  for _ in range(iterations):
+    start = time.perf_counter()
+    run(session, base_url, headers)
+    latencies.append((time.perf_counter() - start) * 1000)
+  latencies.sort()
+  return percentile(latencies, 50), percentile(latencies, 95)
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--rtt', type=float, nargs='+', default=[0, 50, 150, 300], help='Round-trip times in ms.')
+  parser.add_argument('--iterations', type=int, default=20)
+  parser.add_argument('--marks', type=int, default=50, help='Marks of the benchmark user.')
+  args = parser.parse_args()
+
+  import requests
+  from werkzeug.serving import make_server
+  from app import create_app
+  from app.extensions import db
+  from app.utils.auth import generate_token
+  from benchmarks.seed import seed
+
+  app = create_app()
+  app.config.update({'DEBUG': False, 'RATE_LIMIT_ENABLED': False})
+  with app.app_context():
+    user_id = seed(1, args.marks)[0]
+    headers = {'Authorization': f'Bearer {generate_token(user_id)}'}
+    db.session.remove()
+
+  latency = Latency(app)
+  logging.getLogger('werkzeug').setLevel(logging.ERROR)
+  server = make_server('127.0.0.1', 0, latency, threaded=True)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  base_url = f'http://127.0.0.1:{server.server_port}'
+
+  header = f'{"rtt ms":>7} {"mode":<10} {"p50 ms":>9} {"p95 ms":>9}'
+  print(header)
+  print('-' * len(header))
+  try:
+    with requests.Session() as session:
+      for rtt in args.rtt:
+        latency.rtt = rtt / 1000
+        for name, run in (('serial', serial), ('bootstrap', bootstrap)):
+          run(session, base_url, headers)
+          p50, p95 = measure(run, session, base_url, headers, args.iterations)
+          print(f'{rtt:>7.0f} {name:<10} {p50:>9.1f} {p95:>9.1f}')
+  finally:
+    server.shutdown()
+
+if __name__ == '__main__':
+  main()
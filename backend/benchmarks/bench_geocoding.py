@@ -0,0 +1,51 @@
+"""
+Reverse geocoding throughput: points/second for batched lookups (one call per
+batch, as the photo import does) against one call per point, plus the
+one-off cost of building the index.
+
+  python -m benchmarks.bench_geocoding --points 1000000
+"""
+import argparse
+import time
+import numpy as np
+from app.services.geocoding_service import GeocodingIndex
+from app.services.geometry_service import load_features
+from app.services.topology_service import country_bounds
+
+def camera_roll(rng, count):
+  # Photos cluster around a few places: jitter around random country centroids, plus some uniform noise
+  centroids = np.array([bounds['centroid'] for bounds in country_bounds().values()])
+  clustered = centroids[rng.integers(0, len(centroids), count)] + rng.normal(0, 1.0, (count, 2))
+  uniform = np.column_stack([rng.uniform(-180, 180, count), rng.uniform(-60, 80, count)])
+  lon, lat = np.where(rng.random((count, 1)) < 0.8, clustered, uniform).T
+  return np.clip(lon, -180, 180), np.clip(lat, -90, 90)
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--points', type=int, default=200000)
+  parser.add_argument('--batch', type=int, default=10000, help='Points per call (GEOCODING_MAX_POINTS).')
+  parser.add_argument('--single', type=int, default=2000, help='Points looked up one call at a time.')
+  parser.add_argument('--seed', type=int, default=42)
+  args = parser.parse_args()
+
+  features = load_features()
+  start = time.perf_counter()
+  index = GeocodingIndex(features)
+  print(f'{"build index":<28} {(time.perf_counter() - start) * 1000:10.1f} ms')
+
+  lon, lat = camera_roll(np.random.default_rng(args.seed), args.points)
+  start = time.perf_counter()
+  found = 0
+  for i in range(0, args.points, args.batch):
+    found += sum(code is not None for code in index.locate(lon[i:i + args.batch], lat[i:i + args.batch]))
+  elapsed = time.perf_counter() - start
+  print(f'{"batched (" + str(args.batch) + "/call)":<28} {args.points / elapsed:10.0f} points/s  ({found / args.points:.0%} on land)')
+
+  start = time.perf_counter()
+  for i in range(args.single):
+    index.locate(lon[i:i + 1], lat[i:i + 1])
+  elapsed = time.perf_counter() - start
+  print(f'{"one point per call":<28} {args.single / elapsed:10.0f} points/s')
+
+if __name__ == '__main__':
+  main()
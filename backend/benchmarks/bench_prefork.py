@@ -0,0 +1,108 @@
+"""
+Per-worker memory of a pre-fork server, with and without the master preload
+(app.utils.prefork, as done by gunicorn.conf.py).
+
+For each mode the app is created in this process, `--workers` children are
+forked from it and each serves `--requests` read requests (country lists,
+regions, map topology, geocoding) through the WSGI app. Every worker's rss,
+pss and private memory is read from /proc before and after, while all of
+them are alive, so pss splits the shared pages between them. Linux only.
+
+  python -m benchmarks.bench_prefork --workers 8 --requests 200
+"""
+import argparse
+import gc
+import os
+import tempfile
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+PATHS = [
+  '/api/countries',
+  '/api/countries?continent=Europe',
+  '/api/countries/regions',
+  '/api/geometry/medium.json',
+  '/api/geometry/locate?lat=-23.55&lon=-46.63'
+]
+
+def serve(app, requests):
+  client = app.test_client()
+  for i in range(requests):
+    response = client.get(PATHS[i % len(PATHS)])
+    assert response.status_code == 200, response.status_code
+
+def run_mode(preloaded, workers, requests):
+  from app import create_app
+  from app.extensions import db
+  from app.utils.prefork import memory_usage, preload
+
+  gc.disable()
+  app = create_app()
+  app.config.update({'DEBUG': False, 'RATE_LIMIT_ENABLED': False, 'SQLITE_MAINTENANCE_INTERVAL': 0})
+  if preloaded:
+    preload(app)
+  else:
+    with app.app_context():
+      db.engine.dispose()
+
+  children = []
+  for _ in range(workers):
+    go_read, go_write = os.pipe()
+    done_read, done_write = os.pipe()
+    gc.freeze()
+    pid = os.fork()
+    if pid == 0:
+      gc.enable()
+      os.read(go_read, 1)
+      serve(app, requests)
+      os.write(done_write, b'1')
+      # Stay alive until every worker has been measured
+      os.read(go_read, 1)
+      os._exit(0)
+    children.append((pid, go_write, done_read))
+  gc.enable()
+
+  before = [memory_usage(pid) for pid, _, _ in children]
+  for _, go_write, _ in children:
+    os.write(go_write, b'1')
+  for _, _, done_read in children:
+    os.read(done_read, 1)
+  after = [memory_usage(pid) for pid, _, _ in children]
+  for pid, go_write, _ in children:
+    os.write(go_write, b'1')
+    os.waitpid(pid, 0)
+  return before, after
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--workers', type=int, default=4)
+  parser.add_argument('--requests', type=int, default=100, help='Requests per worker.')
+  args = parser.parse_args()
+
+  header = f'{"mode":<9} {"when":<7} {"rss MiB":>9} {"pss MiB":>9} {"private MiB":>12} {"sum pss MiB":>12}'
+  print(f'{args.workers} workers, {args.requests} requests each (means per worker)')
+  print(header)
+  print('-' * len(header))
+  # Each mode in a fresh process, so the first one's caches don't leak into the second
+  for name, preloaded in (('lazy', False), ('preload', True)):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+      os.close(read_fd)
+      before, after = run_mode(preloaded, args.workers, args.requests)
+      lines = []
+      for when, samples in (('before', before), ('after', after)):
+        mean = {key: sum(sample[key] for sample in samples) / len(samples) / 1024 for key in ('rss', 'pss', 'private')}
+        lines.append(
+          f'{name:<9} {when:<7} {mean["rss"]:>9.1f} {mean["pss"]:>9.1f} {mean["private"]:>12.1f} '
+          f'{sum(sample["pss"] for sample in samples) / 1024:>12.1f}'
+        )
+      os.write(write_fd, '\n'.join(lines).encode() + b'\n')
+      os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as output:
+      print(output.read(), end='')
+    os.waitpid(pid, 0)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,93 @@
+"""
+Serialization microbenchmark for model listings.
+
+Compares the ORM path (`query.all()` + `to_dict()` + stdlib JSON) against
+column-level row selects encoded with the stdlib and orjson providers.
+
+  python -m benchmarks.bench_serialization --rows 10000
+"""
+import argparse
+import os
+import time
+from datetime import date, datetime, timezone
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import create_app
+from app.extensions import db
+from app.models import User, Country, MarkedCountry
+from app.utils.json_provider import get_json_provider_class
+
+def seed(rows):
+  countries = Country.query.order_by(Country.id).all()
+  users_needed = rows // len(countries) + 1
+  users = [User(email=f'bench{i}@example.com', name=f'Bench {i}') for i in range(users_needed)]
+  db.session.add_all(users)
+  db.session.flush()
+
+  now = datetime.now(timezone.utc)
+  marks = []
+  for i in range(rows):
+    user = users[i // len(countries)]
+    country = countries[i % len(countries)]
+    marks.append({
+      'user_id': user.id,
+      'country_id': country.id,
+      'status': 'visited' if i % 3 else 'wishlist',
+      'visit_start_date': date(2020, 1 + i % 12, 1),
+      'visit_end_date': date(2020, 1 + i % 12, 15),
+      'created_at': now,
+      'updated_at': now
+    })
+  db.session.execute(db.insert(MarkedCountry), marks)
+  db.session.commit()
+
+def timed(label, fn, repeat):
+  best = None
+  for _ in range(repeat):
+    db.session.expunge_all()
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+  print(f'{label:<40} {best * 1000:9.2f} ms  ({size} bytes)')
+  return best
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--rows', type=int, default=10000)
+  parser.add_argument('--repeat', type=int, default=5)
+  args = parser.parse_args()
+
+  app = create_app()
+  with app.app_context():
+    seed(args.rows)
+    default_json = get_json_provider_class('default')(app)
+    fast_json = get_json_provider_class('orjson')(app)
+
+    def orm_default():
+      marks = MarkedCountry.query.all()
+      return len(default_json.dumps([mc.to_dict() for mc in marks]))
+
+    def rows_query():
+      query = db.select(
+        MarkedCountry.id, MarkedCountry.user_id, MarkedCountry.country_id, Country.name, Country.code,
+        MarkedCountry.status, MarkedCountry.visit_start_date, MarkedCountry.visit_end_date,
+        MarkedCountry.created_at, MarkedCountry.updated_at
+      ).outerjoin(Country, Country.id == MarkedCountry.country_id)
+      return db.session.execute(query).all()
+
+    def rows_default():
+      return len(default_json.dumps([MarkedCountry.row_to_dict(row) for row in rows_query()]))
+
+    def rows_orjson():
+      return len(fast_json.dumps([MarkedCountry.row_to_dict(row) for row in rows_query()]))
+
+    print(f'{args.rows} marked countries, best of {args.repeat}')
+    baseline = timed('ORM to_dict + default provider', orm_default, args.repeat)
+    for label, fn in (('rows + default provider', rows_default), ('rows + orjson provider', rows_orjson)):
+      elapsed = timed(label, fn, args.repeat)
+      print(f'{"":<40} {baseline / elapsed:9.1f}x faster')
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,161 @@
+"""
+Concurrency of the SQLite profiles on a file database: the default rollback
+journal against the tuned profile (WAL, per-connection pragmas and the
+read-only pool from app.utils.sqlite_tuning).
+
+`--writers` threads upsert marks (one commit each, like POST /mark) while
+`--readers` threads run the /my query, for `--duration` seconds per profile.
+Reports operations/s, p50/p95/p99 latency and `database is locked` errors.
+
+  python -m benchmarks.bench_sqlite --writers 4 --readers 16 --duration 10
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from flask import Flask
+from sqlalchemy import create_engine, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import OperationalError
+from app.config import Config
+from app.extensions import db
+from app.models import User, Country, MarkedCountry
+from app.services.country_service import COUNTRIES_DATA
+from app.utils.sqlite_tuning import configure_sqlite
+from benchmarks.load import percentile
+
+def make_engines(path, tuned, pool_size):
+  engine = create_engine(f'sqlite:///{path}', pool_size=pool_size, max_overflow=pool_size)
+  if not tuned:
+    return engine, engine
+  app = Flask(__name__)
+  app.config.update({
+    'SQLITE_TUNED': True,
+    'SQLITE_PRAGMAS': Config.SQLITE_PRAGMAS,
+    'SQLITE_READ_POOL_SIZE': pool_size,
+    'SQLITE_MAINTENANCE_INTERVAL': 0
+  })
+  configure_sqlite(app, engine)
+  return engine, app.extensions['sqlite_read_engine']
+
+def seed(engine, users, marks_per_user):
+  db.metadata.create_all(engine)
+  now = datetime.now(timezone.utc)
+  with engine.begin() as connection:
+    connection.execute(db.insert(Country), [
+      {'name': country['name'], 'code': country['code'], 'flag': country['flag'], 'continent': country['continent']}
+      for country in COUNTRIES_DATA
+    ])
+    connection.execute(db.insert(User), [{'email': f'sqlite{i}@example.com', 'name': f'SQLite {i}'} for i in range(users)])
+    user_ids = connection.execute(select(User.id)).scalars().all()
+    country_ids = connection.execute(select(Country.id)).scalars().all()
+    rng = random.Random(42)
+    connection.execute(db.insert(MarkedCountry), [
+      {
+        'user_id': user_id, 'country_id': country_id, 'status': rng.choice(['visited', 'wishlist']),
+        'created_at': now, 'updated_at': now
+      }
+      for user_id in user_ids for country_id in rng.sample(country_ids, marks_per_user)
+    ])
+  return user_ids, country_ids
+
+def upsert(connection, user_id, country_id, status):
+  now = datetime.now(timezone.utc)
+  statement = insert(MarkedCountry).values(
+    user_id=user_id, country_id=country_id, status=status, created_at=now, updated_at=now
+  )
+  connection.execute(statement.on_conflict_do_update(
+    index_elements=['user_id', 'country_id'],
+    set_={'status': statement.excluded.status, 'updated_at': statement.excluded.updated_at}
+  ))
+
+def read_marks(connection, user_id):
+  return connection.execute(
+    select(MarkedCountry.id, Country.name, Country.code, MarkedCountry.status, MarkedCountry.updated_at)
+    .join(Country, Country.id == MarkedCountry.country_id)
+    .where(MarkedCountry.user_id == user_id)
+  ).all()
+
+def run_profile(tuned, args):
+  with tempfile.TemporaryDirectory() as tmp:
+    engine, read_engine = make_engines(os.path.join(tmp, 'bench.db'), tuned, args.writers + args.readers)
+    user_ids, country_ids = seed(engine, args.users, args.marks_per_user)
+
+    samples = {'write': [], 'read': []}
+    errors = {'write': 0, 'read': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def worker(kind, index):
+      rng = random.Random(index)
+      latencies, failed = [], 0
+      while time.perf_counter() < deadline:
+        user_id = rng.choice(user_ids)
+        start = time.perf_counter()
+        try:
+          if kind == 'write':
+            with engine.begin() as connection:
+              upsert(connection, user_id, rng.choice(country_ids), rng.choice(['visited', 'wishlist']))
+          else:
+            with read_engine.connect() as connection:
+              read_marks(connection, user_id)
+        except OperationalError:
+          failed += 1
+          continue
+        latencies.append(time.perf_counter() - start)
+      with lock:
+        samples[kind].extend(latencies)
+        errors[kind] += failed
+
+    threads = [threading.Thread(target=worker, args=('write', i)) for i in range(args.writers)]
+    threads += [threading.Thread(target=worker, args=('read', 1000 + i)) for i in range(args.readers)]
+    started = time.perf_counter()
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    elapsed = time.perf_counter() - started
+
+    engine.dispose()
+    read_engine.dispose()
+
+  results = {}
+  for kind, latencies in samples.items():
+    latencies = sorted(latency * 1000 for latency in latencies)
+    results[kind] = {
+      'ops': round(len(latencies) / elapsed, 1),
+      'p50_ms': percentile(latencies, 50),
+      'p95_ms': percentile(latencies, 95),
+      'p99_ms': percentile(latencies, 99),
+      'errors': errors[kind]
+    }
+  return results
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--users', type=int, default=1000)
+  parser.add_argument('--marks-per-user', type=int, default=20)
+  parser.add_argument('--writers', type=int, default=4)
+  parser.add_argument('--readers', type=int, default=16)
+  parser.add_argument('--duration', type=float, default=5.0, help='Seconds per profile.')
+  args = parser.parse_args()
+
+  print(f'{args.writers} writers + {args.readers} readers, {args.duration:.0f}s per profile')
+  header = f'{"profile":<10} {"kind":<6} {"ops/s":>9} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"errors":>7}'
+  print(header)
+  print('-' * len(header))
+  for name, tuned in (('default', False), ('tuned', True)):
+    for kind, stats in run_profile(tuned, args).items():
+      print(
+        f'{name:<10} {kind:<6} {stats["ops"]:>9.1f} {stats["p50_ms"] or 0:>8.2f} '
+        f'{stats["p95_ms"] or 0:>8.2f} {stats["p99_ms"] or 0:>8.2f} {stats["errors"]:>7}'
+      )
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,83 @@
+"""
+All-users travel timeline (app.services.timeline_service) on synthetic data.
+
+Generates `--users` x `--visits-per-user` dated visits as arrays and times
+compute_timeline over all of them. With `--database`, the visits are also
+written to a SQLite file first and the run includes load_visits, i.e. what
+`flask marks timeline` does end to end.
+
+  python -m benchmarks.bench_timeline --users 100000 --visits-per-user 20
+  python -m benchmarks.bench_timeline --users 50000 --visits-per-user 20 --database
+"""
+import argparse
+import os
+import tempfile
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+import numpy as np
+
+def synthetic_visits(users, visits_per_user, countries, seed=42):
+  rng = np.random.default_rng(seed)
+  total = users * visits_per_user
+  user_ids = np.repeat(np.arange(1, users + 1, dtype=np.int64), visits_per_user)
+  # Distinct countries per user, like the (user_id, country_id) constraint
+  country_ids = (np.argsort(rng.random((users, countries)), axis=1)[:, :visits_per_user] + 1).ravel()
+  starts = np.datetime64('2010-01-01') + rng.integers(0, 15 * 365, total).astype('timedelta64[D]')
+  ends = starts + rng.integers(0, 30, total).astype('timedelta64[D]')
+  return user_ids, country_ids.astype(np.int64), starts, ends
+
+def write_visits(visits, batch_size=50000):
+  from app.extensions import db
+  from app.models import User, MarkedCountry
+  user_ids, country_ids, starts, ends = visits
+  users = int(user_ids.max())
+  db.session.execute(db.insert(User), [{'id': i, 'email': f'timeline{i}@example.com', 'name': f'Timeline {i}'} for i in range(1, users + 1)])
+  starts, ends = starts.astype(str).tolist(), ends.astype(str).tolist()
+  for start in range(0, len(user_ids), batch_size):
+    stop = start + batch_size
+    db.session.execute(db.text(
+      'INSERT INTO marked_countries (user_id, country_id, status, visit_start_date, visit_end_date, created_at, updated_at) '
+      "VALUES (:user_id, :country_id, 'visited', :start, :end, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+    ), [
+      {'user_id': user_id, 'country_id': country_id, 'start': first, 'end': last}
+      for user_id, country_id, first, last in zip(
+        user_ids[start:stop].tolist(), country_ids[start:stop].tolist(), starts[start:stop], ends[start:stop]
+      )
+    ])
+  db.session.commit()
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--users', type=int, default=100000)
+  parser.add_argument('--visits-per-user', type=int, default=20)
+  parser.add_argument('--database', action='store_true', help='Also time loading the visits from SQLite.')
+  args = parser.parse_args()
+
+  from app import create_app
+  from app.models import Country
+  from app.services.timeline_service import compute_timeline, load_visits
+
+  app = create_app()
+  with app.app_context():
+    countries = Country.query.count()
+    visits = synthetic_visits(args.users, min(args.visits_per_user, countries), countries)
+    print(f'{len(visits[0]):,} visits of {args.users:,} users')
+
+    started = time.perf_counter()
+    timeline = compute_timeline(*visits)
+    print(f'compute_timeline: {time.perf_counter() - started:.2f}s ({timeline["trips"]:,} trips)')
+
+    if args.database:
+      started = time.perf_counter()
+      write_visits(visits)
+      print(f'seeded in {time.perf_counter() - started:.1f}s')
+      started = time.perf_counter()
+      loaded = load_visits()
+      loaded_at = time.perf_counter()
+      compute_timeline(*loaded)
+      print(f'load_visits: {loaded_at - started:.2f}s, compute_timeline: {time.perf_counter() - loaded_at:.2f}s')
+
+if __name__ == '__main__':
+  main()
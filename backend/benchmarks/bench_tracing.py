@@ -0,0 +1,171 @@
+"""
+Overhead of request tracing (app.utils.tracing).
+
+Part one times the instrumentation points directly: `span()` outside a
+sampled trace (what every traced phase costs with sampling off) and inside
+one, the request hooks, and a SQL statement before and after the cursor
+listeners are installed. Part two serves the same request mix through the WSGI app in three
+modes, each in a fresh forked process so the SQL listeners of one mode never
+leak into another. Modes alternate for `--rounds` rounds and the latencies of
+all rounds are pooled, so drift on the machine hits every mode alike:
+
+  off       TRACING_EXPORTER=none, nothing installed
+  sampled0  memory exporter, TRACING_SAMPLE_RATE=0 (hooks installed, nothing recorded)
+  sampled1  memory exporter, every request traced
+
+  python -m benchmarks.bench_tracing --requests 2000 --rounds 5
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from benchmarks.load import percentile
+
+MODES = [
+  ('off', {'TRACING_EXPORTER': 'none'}),
+  ('sampled0', {'TRACING_EXPORTER': 'memory', 'TRACING_SAMPLE_RATE': 0.0}),
+  ('sampled1', {'TRACING_EXPORTER': 'memory', 'TRACING_SAMPLE_RATE': 1.0})
+]
+
+PATHS = ['/api/auth/me', '/api/marked-countries/my', '/api/statistics/my/timeline', '/api/countries?continent=Europe']
+
+def per_call_ns(fn, iterations):
+  start = time.perf_counter_ns()
+  for _ in range(iterations):
+    fn()
+  return (time.perf_counter_ns() - start) / iterations
+
+def micro(iterations):
+  from app.utils.tracing import MemoryExporter, Span, Trace, span
+
+  def noop():
+    with span('phase'):
+      pass
+
+  print(f'{"span() outside a sampled trace":<44} {per_call_ns(noop, iterations):8.0f} ns')
+  root = Span(Trace(1, iterations + 1, MemoryExporter()), 'root').activate()
+  try:
+    print(f'{"span() inside a sampled trace":<44} {per_call_ns(noop, iterations):8.0f} ns')
+  finally:
+    root.finish()
+
+def hooks(iterations, headers):
+  # End-to-end timings are too noisy to isolate sub-microsecond costs, so time the
+  # request hooks and the SQL listeners directly, as bench_rate_limit does
+  from sqlalchemy import text
+  from app import create_app
+  from app.extensions import db, tracing
+  from app.utils.tracing import instrument_sql
+
+  app = create_app(test_config={'TRACING_EXPORTER': 'memory', 'TRACING_SAMPLE_RATE': 0.0, 'RATE_LIMIT_ENABLED': False})
+  with app.test_request_context('/api/marked-countries/my', headers=headers):
+    response = app.response_class()
+
+    def request_hooks():
+      tracing._start()
+      tracing._add_headers(response)
+      tracing._finish(None)
+
+    print(f'{"request hooks, not sampled":<44} {per_call_ns(request_hooks, iterations):8.0f} ns')
+    app.config['TRACING_SAMPLE_RATE'] = 1.0
+    print(f'{"request hooks, sampled (root span export)":<44} {per_call_ns(request_hooks, iterations // 10):8.0f} ns')
+
+  # A fresh process has no listeners yet: time a statement before and after installing them
+  engine = db.create_engine('sqlite://')
+  with engine.connect() as connection:
+    statement = text('SELECT 1')
+    run = lambda: connection.execute(statement).scalar()
+    iterations = iterations // 10
+    for _ in range(1000):
+      run()
+    before = per_call_ns(run, iterations)
+    instrument_sql()
+    after = per_call_ns(run, iterations)
+  print(f'{"SQL statement, no listeners":<44} {before:8.0f} ns')
+  print(f'{"SQL statement, listeners, not sampled":<44} {after:8.0f} ns')
+
+def serve(overrides, requests, headers):
+  from app import create_app
+
+  # Tracing settings must be in place before the extensions initialize
+  app = create_app(test_config={'DEBUG': False, 'RATE_LIMIT_ENABLED': False, 'SQLITE_MAINTENANCE_INTERVAL': 0, **overrides})
+  client = app.test_client()
+  for path in PATHS * 20:
+    client.get(path, headers=headers)
+
+  latencies = []
+  for i in range(requests):
+    path = PATHS[i % len(PATHS)]
+    start = time.perf_counter()
+    response = client.get(path, headers=headers)
+    latencies.append((time.perf_counter() - start) * 1e6)
+    assert response.status_code == 200, (path, response.status_code)
+  exporter = app.extensions.get('tracing_exporter')
+  return latencies, len(exporter.spans) if exporter is not None else 0
+
+def forked(fn, *args):
+  # Runs fn in a child process and returns its (JSON) result
+  read_fd, write_fd = os.pipe()
+  pid = os.fork()
+  if pid == 0:
+    os.close(read_fd)
+    try:
+      os.write(write_fd, json.dumps(fn(*args)).encode())
+    finally:
+      os._exit(0)
+  os.close(write_fd)
+  with os.fdopen(read_fd) as output:
+    data = output.read()
+  os.waitpid(pid, 0)
+  return json.loads(data)
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--requests', type=int, default=2000, help='Requests per mode and round.')
+  parser.add_argument('--rounds', type=int, default=5)
+  parser.add_argument('--marks', type=int, default=50, help='Marks of the benchmark user.')
+  parser.add_argument('--iterations', type=int, default=200000, help='Calls for the span() timings.')
+  args = parser.parse_args()
+
+  from app import create_app
+  from app.extensions import db
+  from app.utils.auth import generate_token
+  from benchmarks.seed import seed
+
+  app = create_app()
+  with app.app_context():
+    user_id = seed(1, args.marks)[0]
+    headers = {'Authorization': f'Bearer {generate_token(user_id)}'}
+    db.session.remove()
+    db.engine.dispose()
+
+  micro(args.iterations)
+  forked(hooks, args.iterations, headers)
+  print()
+  header = f'{"mode":<9} {"mean us":>9} {"p50 us":>9} {"p99 us":>9} {"vs off":>8} {"spans":>8}'
+  print(header)
+  print('-' * len(header))
+  latencies = {name: [] for name, _ in MODES}
+  spans = dict.fromkeys(latencies, 0)
+  for _ in range(args.rounds):
+    for name, overrides in MODES:
+      round_latencies, round_spans = forked(serve, overrides, args.requests, headers)
+      latencies[name].extend(round_latencies)
+      spans[name] += round_spans
+
+  baseline = None
+  for name, _ in MODES:
+    samples = sorted(latencies[name])
+    mean = sum(samples) / len(samples)
+    baseline = baseline or mean
+    print(
+      f'{name:<9} {mean:>9.0f} {percentile(samples, 50):>9.0f} {percentile(samples, 99):>9.0f} '
+      f'{(mean / baseline - 1) * 100:>+7.1f}% {spans[name]:>8}'
+    )
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,38 @@
+"""
+Compare two load test reports written by benchmarks.load.
+
+  python -m benchmarks.compare benchmarks/results/<before>.json benchmarks/results/<after>.json
+"""
+import argparse
+import json
+
+METRICS = ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'mean_queries')
+
+def change(before, after):
+  if before in (None, 0) or after is None:
+    return '-'
+  return f'{(after - before) / before * 100:+.1f}%'
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('before')
+  parser.add_argument('after')
+  args = parser.parse_args()
+
+  with open(args.before) as f:
+    before = json.load(f)
+  with open(args.after) as f:
+    after = json.load(f)
+
+  print(f'{before["meta"].get("commit")} -> {after["meta"].get("commit")}')
+  scenarios = dict(after['results']['scenarios'], overall=after['results']['overall'])
+  for name, stats in scenarios.items():
+    old = before['results']['overall'] if name == 'overall' else before['results']['scenarios'].get(name)
+    if old is None:
+      continue
+    print(f'\n{name}')
+    for metric in METRICS:
+      print(f'  {metric:<16} {old[metric] if old[metric] is not None else "-":>10} -> {stats[metric] if stats[metric] is not None else "-":>10}  {change(old[metric], stats[metric])}')
+
+if __name__ == '__main__':
+  main()
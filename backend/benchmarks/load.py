@@ -0,0 +1,216 @@
+"""
+Load test that drives the real HTTP endpoints with concurrent clients.
+
+Seeds synthetic data (see benchmarks.seed), serves the app with a threaded
+WSGI server on a random local port and runs a weighted mix of requests from
+`--clients` threads for `--duration` seconds. Reports p50/p95/p99 latency,
+throughput and SQL queries per request, and writes the report as JSON to
+`--output` so runs can be compared across commits (benchmarks.compare).
+
+  python -m benchmarks.load --users 10000 --marks-per-user 100 --clients 32
+  python -m benchmarks.load --database-url postgresql://localhost/tmt_bench
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+
+# (name, method, path, weight); mark/unmark bodies are filled per request
+SCENARIOS = [
+  ('countries', 'GET', '/api/countries', 10),
+  ('me', 'GET', '/api/auth/me', 10),
+  ('my_marks', 'GET', '/api/marked-countries/my', 30),
+  ('my_visited', 'GET', '/api/marked-countries/my/visited', 15),
+  ('mark', 'POST', '/api/marked-countries/mark', 25),
+  ('unmark', 'POST', '/api/marked-countries/unmark', 10),
+  ('suggestions', 'GET', '/api/friends/suggestions', 5),
+]
+
+def percentile(sorted_values, pct):
+  # Nearest-rank percentile over an already sorted list
+  if not sorted_values:
+    return None
+  rank = max(1, int(round(pct / 100 * len(sorted_values))))
+  return round(sorted_values[min(rank, len(sorted_values)) - 1], 3)
+
+def summarize(samples, elapsed):
+  """`samples` are (scenario, latency_seconds, status_code, query_count) tuples."""
+  def stats(rows):
+    latencies = sorted(row[1] * 1000 for row in rows)
+    queries = [row[3] for row in rows if row[3] is not None]
+    return {
+      'requests': len(rows),
+      'errors': sum(1 for row in rows if row[2] >= 500 or row[2] == 0),
+      'throughput_rps': round(len(rows) / elapsed, 2) if elapsed else None,
+      'p50_ms': percentile(latencies, 50),
+      'p95_ms': percentile(latencies, 95),
+      'p99_ms': percentile(latencies, 99),
+      'mean_queries': round(sum(queries) / len(queries), 2) if queries else None
+    }
+
+  by_scenario = {}
+  for row in samples:
+    by_scenario.setdefault(row[0], []).append(row)
+  return {
+    'overall': stats(samples),
+    'scenarios': {name: stats(rows) for name, rows in sorted(by_scenario.items())}
+  }
+
+def git_commit():
+  try:
+    return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+def install_query_counter(app):
+  # Counts SQL statements per request and reports them in X-Query-Count
+  from flask import g, has_app_context
+  from sqlalchemy import event
+  from app.extensions import db
+
+  def count(*args):
+    if has_app_context():
+      g.query_count = g.get('query_count', 0) + 1
+
+  with app.app_context():
+    event.listen(db.engine, 'before_cursor_execute', count)
+
+  @app.after_request
+  def add_query_count(response):
+    response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+    return response
+
+def run_clients(base_url, tokens, country_ids, clients, duration, random_seed):
+  import requests
+
+  samples = []
+  lock = threading.Lock()
+  deadline = time.perf_counter() + duration
+  weights = [scenario[3] for scenario in SCENARIOS]
+
+  def client(index):
+    rng = random.Random(random_seed + index)
+    session = requests.Session()
+    local = []
+    while time.perf_counter() < deadline:
+      name, method, path, _ = rng.choices(SCENARIOS, weights)[0]
+      headers = {'Authorization': f'Bearer {rng.choice(tokens)}'}
+      body = None
+      if name == 'mark':
+        body = {'country_id': rng.choice(country_ids), 'status': rng.choice(['visited', 'wishlist'])}
+      elif name == 'unmark':
+        body = {'country_id': rng.choice(country_ids)}
+
+      start = time.perf_counter()
+      try:
+        response = session.request(method, base_url + path, json=body, headers=headers, timeout=30)
+        status, queries = response.status_code, response.headers.get('X-Query-Count')
+      except requests.RequestException:
+        status, queries = 0, None
+      local.append((name, time.perf_counter() - start, status, int(queries) if queries is not None else None))
+    with lock:
+      samples.extend(local)
+
+  threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+  started = time.perf_counter()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  return samples, time.perf_counter() - started
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--database-url', default=None, help='Defaults to a sqlite file in a temp dir.')
+  parser.add_argument('--users', type=int, default=1000)
+  parser.add_argument('--marks-per-user', type=int, default=20)
+  parser.add_argument('--clients', type=int, default=8)
+  parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load.')
+  parser.add_argument('--active-users', type=int, default=500, help='How many seeded users the clients log in as.')
+  parser.add_argument('--seed', type=int, default=42)
+  parser.add_argument('--output', default=os.path.join(os.path.dirname(__file__), 'results'))
+  args = parser.parse_args()
+
+  if args.database_url is None:
+    import tempfile
+    args.database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+  # Config reads DATABASE_URL at import time, so set it before importing the app
+  os.environ['DATABASE_URL'] = args.database_url
+
+  from werkzeug.serving import make_server
+  from app import create_app
+  from app.extensions import db
+  from app.models import Country
+  from app.utils.auth import generate_token
+  from benchmarks.seed import seed
+
+  app = create_app()
+  app.config.update({'DEBUG': False, 'RATE_LIMIT_ENABLED': False})
+  install_query_counter(app)
+
+  with app.app_context():
+    print(f'Seeding {args.users} users x {args.marks_per_user} marks...')
+    started = time.perf_counter()
+    user_ids = seed(args.users, args.marks_per_user, random_seed=args.seed)
+    print(f'Seeded in {time.perf_counter() - started:.1f}s')
+    active = random.Random(args.seed).sample(user_ids, min(args.active_users, len(user_ids)))
+    tokens = [generate_token(user_id) for user_id in active]
+    country_ids = db.session.execute(db.select(Country.id)).scalars().all()
+    dialect = db.engine.dialect.name
+
+  logging.getLogger('werkzeug').setLevel(logging.ERROR)
+  server = make_server('127.0.0.1', 0, app, threaded=True)
+  server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+  server_thread.start()
+  base_url = f'http://127.0.0.1:{server.server_port}'
+
+  print(f'Running {args.clients} clients for {args.duration:.0f}s against {dialect}...')
+  try:
+    samples, elapsed = run_clients(base_url, tokens, country_ids, args.clients, args.duration, args.seed)
+  finally:
+    server.shutdown()
+
+  report = {
+    'meta': {
+      'commit': git_commit(),
+      'timestamp': datetime.now(timezone.utc).isoformat(),
+      'database': dialect,
+      'users': args.users,
+      'marks_per_user': args.marks_per_user,
+      'clients': args.clients,
+      'duration_s': round(elapsed, 2),
+      'python': platform.python_version(),
+      'platform': platform.platform()
+    },
+    'results': summarize(samples, elapsed)
+  }
+
+  print_report(report)
+  os.makedirs(args.output, exist_ok=True)
+  filename = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{report['meta']['commit'] or 'nogit'}.json"
+  path = os.path.join(args.output, filename)
+  with open(path, 'w') as f:
+    json.dump(report, f, indent=2)
+  print(f'Saved {path}')
+
+def print_report(report):
+  header = f'{"scenario":<12} {"reqs":>7} {"err":>5} {"rps":>9} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"q/req":>6}'
+  print(header)
+  print('-' * len(header))
+  results = report['results']
+  rows = list(results['scenarios'].items()) + [('overall', results['overall'])]
+  for name, stats in rows:
+    print(
+      f'{name:<12} {stats["requests"]:>7} {stats["errors"]:>5} {stats["throughput_rps"] or 0:>9.1f} '
+      f'{stats["p50_ms"] or 0:>8.2f} {stats["p95_ms"] or 0:>8.2f} {stats["p99_ms"] or 0:>8.2f} '
+      f'{stats["mean_queries"] if stats["mean_queries"] is not None else "-":>6}'
+    )
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,81 @@
+"""
+Seed synthetic users and marked countries in bulk.
+
+  DATABASE_URL=sqlite:///bench.db python -m benchmarks.seed --users 10000 --marks-per-user 100
+"""
+import argparse
+import random
+from datetime import date, datetime, timedelta, timezone
+
+from app.extensions import db
+from app.models import User, Country, MarkedCountry
+from app.services.marks_service import rebuild_all_bitsets
+
+EMAIL_TEMPLATE = 'bench-{}@example.com'
+
+def seed(users, marks_per_user, batch_size=10000, random_seed=42):
+  """Insert `users` users with `marks_per_user` marks each; returns the seeded user ids.
+
+  Idempotent: users that already exist (by e-mail) are reused and not re-marked.
+  """
+  rng = random.Random(random_seed)
+  country_ids = db.session.execute(db.select(Country.id).order_by(Country.id)).scalars().all()
+  marks_per_user = min(marks_per_user, len(country_ids))
+
+  emails = [EMAIL_TEMPLATE.format(i) for i in range(users)]
+  existing = set(db.session.execute(
+    db.select(User.email).where(User.email.like(EMAIL_TEMPLATE.format('%')))
+  ).scalars().all())
+  now = datetime.now(timezone.utc)
+  missing = [email for email in emails if email not in existing]
+  for start in range(0, len(missing), batch_size):
+    db.session.execute(db.insert(User), [
+      {'email': email, 'name': email.split('@')[0], 'created_at': now, 'updated_at': now}
+      for email in missing[start:start + batch_size]
+    ])
+  db.session.commit()
+
+  ids_by_email = dict(db.session.execute(
+    db.select(User.email, User.id).where(User.email.like(EMAIL_TEMPLATE.format('%')))
+  ).all())
+  new_ids = [ids_by_email[email] for email in missing]
+
+  batch = []
+  for user_id in new_ids:
+    for country_id in rng.sample(country_ids, marks_per_user):
+      start_date = date(2015, 1, 1) + timedelta(days=rng.randrange(3650))
+      visited = rng.random() < 0.7
+      batch.append({
+        'user_id': user_id,
+        'country_id': country_id,
+        'status': 'visited' if visited else 'wishlist',
+        'visit_start_date': start_date if visited else None,
+        'visit_end_date': start_date + timedelta(days=rng.randrange(1, 30)) if visited else None,
+        'created_at': now,
+        'updated_at': now
+      })
+      if len(batch) >= batch_size:
+        db.session.execute(db.insert(MarkedCountry), batch)
+        batch = []
+  if batch:
+    db.session.execute(db.insert(MarkedCountry), batch)
+  db.session.commit()
+  if new_ids:
+    rebuild_all_bitsets(batch_size)
+
+  return [ids_by_email[email] for email in emails]
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--users', type=int, default=1000)
+  parser.add_argument('--marks-per-user', type=int, default=20)
+  args = parser.parse_args()
+
+  from app import create_app
+  app = create_app()
+  with app.app_context():
+    user_ids = seed(args.users, args.marks_per_user)
+    print(f'{len(user_ids)} users, {MarkedCountry.query.count()} marked countries in {db.engine.url.render_as_string()}')
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,73 @@
+"""
+Gunicorn settings for production: `gunicorn` (run from backend/) picks this file up.
+
+The app is loaded once in the master (preload_app) and app.utils.prefork.preload
+builds the shared read-only data there. Following the gc module's advice for
+fork without exec: GC off in the master while loading, gc.freeze() right
+before each fork, GC back on in the worker. Workers log their memory right
+after the fork and every MEMORY_REPORT_EVERY requests.
+
+Every signed-in tab keeps a /api/events/stream connection open, idle most of
+the time. So workers are gevent by default: each one holds up to
+GUNICORN_WORKER_CONNECTIONS of them. With sync workers each stream would pin
+a whole worker (and be killed by `timeout`), so streams are switched off.
+
+With more than one worker, state the workers must agree on defaults to the
+shared SQLite backends (with the per-process ones a worker would serve a map
+another worker already invalidated, and a stream would miss the marks posted
+to other workers); an explicit setting always wins.
+"""
+import gc
+import os
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+if workers > 1:
+  # Read by app.config, which the preload below imports
+  os.environ.setdefault('CACHE_BACKEND', 'sqlite')
+  # Otherwise a stream only sees the marks posted to its own worker, and event ids are per worker
+  os.environ.setdefault('EVENTS_BACKEND', 'sqlite')
+
+STREAMS_ENABLED = os.environ.get('EVENTS_STREAM_ENABLED', 'true').lower() == 'true'
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent' if STREAMS_ENABLED else 'sync')
+if worker_class == 'gevent':
+  # Before the app (and threading, socket, ssl...) is imported: preload_app loads it in the master
+  from gevent import monkey
+  monkey.patch_all()
+elif worker_class == 'sync':
+  # Read by app.config, which the preload below imports
+  os.environ['EVENTS_STREAM_ENABLED'] = 'false'
+
+from app.utils.prefork import format_memory, memory_usage, preload
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5001')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+# A sync worker silent for this long is killed, long requests included. gevent workers report
+# in on their own, so open streams (up to EVENTS_STREAM_MAX_SECONDS) are not affected
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+wsgi_app = 'run:app'
+preload_app = True
+
+MEMORY_REPORT_EVERY = int(os.environ.get('MEMORY_REPORT_EVERY', 10000))
+
+gc.disable()
+
+def when_ready(server):
+  timings = preload(server.app.wsgi())
+  server.log.info(f'Preloaded {", ".join(f"{name} ({seconds}s)" for name, seconds in timings.items())}')
+  server.log.info(f'Master memory: {format_memory(memory_usage())}')
+
+def pre_fork(server, worker):
+  gc.freeze()
+
+def post_fork(server, worker):
+  gc.enable()
+  worker.requests_served = 0
+  server.log.info(f'Worker {os.getpid()} memory after fork: {format_memory(memory_usage())}')
+
+def post_request(worker, req, environ, resp):
+  worker.requests_served += 1
+  if worker.requests_served % MEMORY_REPORT_EVERY == 0:
+    worker.log.info(f'Worker {os.getpid()} memory after {worker.requests_served} requests: {format_memory(memory_usage())}')
+
+def worker_exit(server, worker):
+  server.log.info(f'Worker {worker.pid} memory at exit: {format_memory(memory_usage())}')
@@ -1,29 +1,63 @@
+import sqlite3
+from contextlib import closing
 import pytest
 from app import create_app
 from app.extensions import db
 from app.models import User, Country, MarkedCountry
 from datetime import datetime, timezone
+from tests.factories import BulkDataFactory
+
+
+def sqlite_uri(path):
+    return f'sqlite:///{path}'
+
+
+def copy_database(source, target):
+    # SQLite online backup: a page-level copy, much faster than rebuilding the schema
+    with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(target)) as dst:
+        src.backup(dst)
+
+
+def dispose_engines(app):
+    db.engine.dispose()
+    read_engine = app.extensions.get('sqlite_read_engine')
+    if read_engine is not None:
+        read_engine.dispose()
+
+
+@pytest.fixture(scope='session')
+def template_database(tmp_path_factory):
+    """Migrated schema with countries and regions, built once per session.
+
+    tmp_path_factory gives every pytest-xdist worker its own base directory,
+    so parallel workers never share a database file.
+    """
+    path = tmp_path_factory.mktemp('template') / 'template.db'
+    template_app = create_app('TestingConfig', {'SQLALCHEMY_DATABASE_URI': sqlite_uri(path)})
+    with template_app.app_context():
+        with db.engine.connect() as connection:
+            # Fold the WAL into the main file, so copying that file copies everything
+            connection.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+        dispose_engines(template_app)
+    return path
 
 
 @pytest.fixture(scope='function')
-def app():
-    test_app = create_app()
-    test_app.config.update({
-        'TESTING': True,
-        # Usa um banco de dados em memória para testes :)
-        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
-        'JWT_SECRET_KEY': 'test-secret-key',
-        'GOOGLE_CLIENT_ID': 'test-google-client-id',
-        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
-        'SQLALCHEMY_ECHO': False
-    })
+def app(request, template_database, tmp_path):
+    # Every test gets a private copy of the template and its own app instance
+    database = tmp_path / 'test.db'
+    copy_database(template_database, database)
+    test_config = {'SQLALCHEMY_DATABASE_URI': sqlite_uri(database)}
+    marker = request.node.get_closest_marker('app_config')
+    if marker:
+        test_config.update(marker.kwargs)
+    test_app = create_app('TestingConfig', test_config)
 
     with test_app.app_context():
         db.session.expire_on_commit = False
-        db.create_all()
         yield test_app
         db.session.remove()
-        db.drop_all()
+        dispose_engines(test_app)
 
 
 @pytest.fixture
@@ -67,3 +101,8 @@ def sample_country(app):
 def auth_token(sample_user):
     from app.utils.auth import generate_token
     return generate_token(sample_user.id)
+
+
+@pytest.fixture
+def bulk_data(app):
+    return BulkDataFactory()
@@ -0,0 +1,190 @@
+import os
+from datetime import date, datetime, timezone
+import numpy as np
+import pytest
+from app.extensions import db
+from app.models import Country, Job, MarkedCountry, User
+from app.services import analytics_service
+from app.services.analytics_service import Snapshot, build_snapshot, co_visits, current_snapshot, write_snapshot
+from app.services.job_service import work
+from app.utils.auth import generate_token
+
+@pytest.fixture
+def admin(sample_user):
+    sample_user.is_admin = True
+    db.session.commit()
+    return sample_user
+
+
+@pytest.fixture
+def analytics(app, tmp_path):
+    app.config['ANALYTICS_DIR'] = str(tmp_path / 'analytics')
+    return app
+
+
+@pytest.fixture
+def countries(app):
+    return {country.code: country.id for country in Country.query.filter(Country.code.in_(['FR', 'IT', 'JP', 'BR']))}
+
+
+@pytest.fixture
+def marks(analytics, sample_user, countries):
+    # Three travellers: FR is visited by all, IT by two of them, JP wishlisted by one
+    users = [sample_user] + [User(email=f'traveller{i}@example.com') for i in range(2)]
+    db.session.add_all(users[1:])
+    db.session.commit()
+    plan = [
+        (users[0], 'FR', 'visited', date(2024, 1, 10)), (users[0], 'IT', 'visited', date(2024, 2, 1)),
+        (users[1], 'FR', 'visited', date(2024, 2, 5)), (users[1], 'IT', 'visited', date(2024, 2, 6)),
+        (users[2], 'FR', 'visited', None), (users[2], 'JP', 'wishlist', None)
+    ]
+    for user, code, status, start in plan:
+        db.session.add(MarkedCountry(
+            user_id=user.id, country_id=countries[code], status=status, visit_start_date=start,
+            created_at=datetime(2024, start.month if start else 3, 15, tzinfo=timezone.utc)
+        ))
+    db.session.commit()
+    return users
+
+
+def admin_headers(user):
+    return {'Authorization': f'Bearer {generate_token(user.id)}'}
+
+
+class TestSnapshotFormat:
+    def test_co_visits_match_brute_force(self, monkeypatch):
+        rng = np.random.default_rng(7)
+        users = rng.integers(0, 50, 400)
+        countries = rng.integers(0, 12, 400)
+        pairs = np.unique(np.stack([users, countries], axis=1), axis=0)
+        incidence = np.zeros((50, 12), dtype=np.int64)
+        incidence[pairs[:, 0], pairs[:, 1]] = 1
+        expected = incidence.T @ incidence
+        # Small blocks, so the chunking itself is exercised
+        monkeypatch.setattr(analytics_service, 'CO_VISIT_CHUNK', 7)
+        assert np.array_equal(co_visits(pairs[:, 0], pairs[:, 1], 12), expected)
+
+    def test_round_trip(self, tmp_path):
+        columns = (
+            np.array([5, 6, 5, 7]), np.array([20, 20, 10, 99]), np.array([0, 0, 1, 0], dtype=np.int8),
+            np.array(['2023-05-01', 'NaT', 'NaT', '2023-01-01'], dtype='datetime64[D]'),
+            np.array(['2023-05-02', '2023-06-01', '2023-06-02', '2023-01-01'], dtype='datetime64[D]')
+        )
+        countries = [(20, 'FR', 'France', 'Europe'), (10, 'BR', 'Brazil', 'South America')]
+        meta = build_snapshot(str(tmp_path / 'snapshot'), columns, countries)
+        # Country 99 is unknown and left out
+        assert meta['marks'] == 3 and meta['users'] == 2
+
+        snapshot = Snapshot(str(tmp_path / 'snapshot'))
+        assert snapshot.user_id.dtype == np.int32 and snapshot.country.dtype == np.int16
+        assert isinstance(snapshot.user_id, np.memmap)
+        assert list(snapshot.offsets) == [0, 1, 3]
+        assert [row['code'] for row in snapshot.popularity('wishlist')] == ['BR']
+
+
+class TestAdminAccess:
+    def test_requires_an_admin(self, client, auth_token):
+        response = client.get('/api/admin/analytics/popularity', headers={'Authorization': f'Bearer {auth_token}'})
+        assert response.status_code == 403
+        assert client.get('/api/admin/analytics/popularity').status_code == 401
+
+    def test_not_granted_by_the_email(self, client, auth_token):
+        headers = {'Authorization': f'Bearer {auth_token}'}
+        client.put('/api/auth/users/me', headers=headers, json={'email': 'admin@example.com'})
+        assert client.get('/api/admin/analytics/snapshot', headers=headers).status_code == 403
+
+    def test_granted_and_revoked_from_the_cli(self, analytics, runner, client, sample_user):
+        headers = admin_headers(sample_user)
+        result = runner.invoke(args=['admin', 'grant', str(sample_user.id), '999999'])
+        assert 'User 999999 not found' in result.output
+        assert client.get('/api/admin/analytics/snapshot', headers=headers).status_code == 404
+        assert runner.invoke(args=['admin', 'list']).output == f'{sample_user.id} test@example.com\n'
+
+        runner.invoke(args=['admin', 'revoke', str(sample_user.id)])
+        assert client.get('/api/admin/analytics/snapshot', headers=headers).status_code == 403
+
+    def test_no_snapshot_yet(self, analytics, client, admin):
+        response = client.get('/api/admin/analytics/snapshot', headers=admin_headers(admin))
+        assert response.status_code == 404
+
+
+class TestAnalytics:
+    @pytest.fixture(autouse=True)
+    def snapshot(self, admin, marks, client):
+        response = client.post('/api/admin/analytics/snapshot', headers=admin_headers(marks[0]))
+        assert response.status_code == 202
+        assert response.get_json()['job']['status'] == 'succeeded'
+
+    def test_popularity(self, client, marks):
+        response = client.get('/api/admin/analytics/popularity', headers=admin_headers(marks[0]))
+        body = response.get_json()
+        assert body['marks'] == 6 and body['users'] == 3
+        assert [(row['code'], row['users']) for row in body['countries']] == [('FR', 3), ('IT', 2)]
+        assert body['countries'][0]['share'] == 1.0
+
+        response = client.get('/api/admin/analytics/popularity?status=wishlist&continent=Asia', headers=admin_headers(marks[0]))
+        assert [row['code'] for row in response.get_json()['countries']] == ['JP']
+        assert client.get('/api/admin/analytics/popularity?status=lived', headers=admin_headers(marks[0])).status_code == 400
+
+    def test_co_visitation(self, client, marks):
+        response = client.get('/api/admin/analytics/co-visitation?country=it', headers=admin_headers(marks[0]))
+        body = response.get_json()
+        assert body['country']['visitors'] == 2
+        assert body['co_visited'] == [{
+            'code': 'FR', 'name': 'France', 'continent': 'Europe', 'users': 2, 'probability': 1.0, 'lift': 1.0
+        }]
+
+        response = client.get('/api/admin/analytics/co-visitation?codes=FR,IT,JP', headers=admin_headers(marks[0]))
+        assert response.get_json()['matrix'] == [[3, 2, 0], [2, 2, 0], [0, 0, 0]]
+        assert client.get('/api/admin/analytics/co-visitation?country=XX', headers=admin_headers(marks[0])).status_code == 404
+        assert client.get('/api/admin/analytics/co-visitation', headers=admin_headers(marks[0])).status_code == 400
+
+    def test_trends(self, client, marks):
+        response = client.get('/api/admin/analytics/trends?codes=IT', headers=admin_headers(marks[0]))
+        body = response.get_json()
+        assert body['periods'] == ['2024-01', '2024-02', '2024-03']
+        assert body['series'] == {'all': [1, 3, 1], 'IT': [0, 2, 0]}
+
+        response = client.get('/api/admin/analytics/trends?by=visit&interval=year', headers=admin_headers(marks[0]))
+        assert response.get_json()['series'] == {'all': [4]}
+        response = client.get('/api/admin/analytics/trends?since=2024-02', headers=admin_headers(marks[0]))
+        assert response.get_json()['periods'] == ['2024-02', '2024-03']
+        assert client.get('/api/admin/analytics/trends?since=last-week', headers=admin_headers(marks[0])).status_code == 400
+
+    def test_rising(self, app, marks):
+        snapshot = current_snapshot()
+        # FR was marked once in January and once in February: no growth
+        rising = snapshot.rising(window=1, today=date(2024, 2, 20))
+        assert [(row['code'], row['recent'], row['previous']) for row in rising] == [('IT', 2, 0)]
+
+    def test_answers_come_from_the_snapshot(self, client, marks):
+        MarkedCountry.query.delete()
+        db.session.commit()
+        response = client.get('/api/admin/analytics/popularity', headers=admin_headers(marks[0]))
+        assert response.get_json()['countries'][0]['users'] == 3
+
+    def test_new_snapshots_replace_old_ones(self, app, marks):
+        app.config['ANALYTICS_SNAPSHOTS_KEPT'] = 2
+        first = current_snapshot()
+        MarkedCountry.query.filter_by(status='wishlist').delete()
+        db.session.commit()
+        for _ in range(3):
+            write_snapshot()
+
+        snapshot = current_snapshot()
+        assert snapshot is not first
+        assert snapshot.meta['marks'] == 5
+        entries = [entry for entry in os.listdir(app.config['ANALYTICS_DIR']) if entry != 'CURRENT']
+        assert len(entries) == 2
+
+
+class TestSchedule:
+    def test_snapshot_job_reschedules_itself(self, analytics, runner):
+        analytics.config['JOBS_EAGER'] = False
+        result = runner.invoke(args=['analytics', 'schedule'])
+        assert result.exit_code == 0, result.output
+        work(once=True)
+
+        jobs = Job.query.filter_by(type='analytics_snapshot').order_by(Job.id).all()
+        assert [job.status for job in jobs] == ['succeeded', 'queued']
+        assert jobs[1].run_at > datetime.now() and current_snapshot() is not None
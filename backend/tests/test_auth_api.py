@@ -1,3 +1,7 @@
+from app.extensions import db
+from app.models import User
+
+
 class TestRegister:
     def test_register_success(self, client):
         response = client.post('/api/auth/register', json={
@@ -90,3 +94,11 @@ class TestUpdateCurrentUser:
         data = response.get_json()
         assert 'error' in data
 
+    def test_update_user_email_taken_in_another_case(self, client, auth_token):
+        db.session.add(User(email='other@example.com'))
+        db.session.commit()
+        response = client.put('/api/auth/users/me',
+            headers={'Authorization': f'Bearer {auth_token}'},
+            json={'email': 'Other@Example.com'}
+        )
+        assert response.status_code == 400
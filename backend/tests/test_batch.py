@@ -0,0 +1,67 @@
+import pytest
+from sqlalchemy import event
+from app.extensions import db
+from app.models import Country
+from app.utils.auth import generate_token
+
+
+@pytest.fixture
+def headers(sample_user):
+    return {'Authorization': f'Bearer {generate_token(sample_user.id)}'}
+
+
+def batch(client, headers, *requests):
+    return client.post('/api/batch', headers=headers, json={
+        'requests': [{'id': request_id, 'path': path} for request_id, path in requests]
+    })
+
+
+class TestBootstrap:
+    def test_matches_the_individual_calls(self, client, headers):
+        country_id = db.session.execute(db.select(Country.id).where(Country.code == 'BR')).scalar_one()
+        client.post('/api/marked-countries/mark', headers=headers, json={'country_id': country_id, 'status': 'visited'})
+
+        response = client.get('/api/bootstrap', headers=headers)
+        assert response.status_code == 200
+        responses = response.get_json()['responses']
+        for request_id, path in [('me', '/api/auth/me'), ('countries', '/api/countries'), ('marked_countries', '/api/marked-countries/my')]:
+            assert responses[request_id] == {'status': 200, 'body': client.get(path, headers=headers).get_json()}
+
+    def test_resolves_the_user_once(self, client, headers):
+        db.session.expunge_all()
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            assert client.get('/api/bootstrap', headers=headers).status_code == 200
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        assert len([statement for statement in statements if 'FROM users' in statement]) == 1
+
+    def test_requires_auth(self, client):
+        assert client.get('/api/bootstrap').status_code == 401
+
+
+class TestBatch:
+    def test_sub_request_errors_stay_in_their_entry(self, client, headers):
+        response = batch(client, headers, ('me', '/api/auth/me'), ('bad', '/api/countries?subregion=Atlantis'))
+        assert response.status_code == 200
+        responses = response.get_json()['responses']
+        assert responses['me']['status'] == 200
+        assert responses['bad'] == {'status': 400, 'body': {'error': 'Unknown subregion'}}
+
+    def test_passes_query_strings(self, client, headers):
+        responses = batch(client, headers, ('europe', '/api/countries?continent=Europe')).get_json()['responses']
+        assert {country['continent'] for country in responses['europe']['body']} == {'Europe'}
+
+    @pytest.mark.parametrize('path', ['/other', '/api/batch', '/api/bootstrap', '/api/events/stream', None])
+    def test_rejects_paths_outside_the_api(self, client, headers, path):
+        assert batch(client, headers, ('x', path)).status_code == 400
+
+    def test_rejects_writes_and_bad_bodies(self, client, headers):
+        assert client.post('/api/batch', headers=headers, json={
+            'requests': [{'id': 'mark', 'path': '/api/marked-countries/mark', 'method': 'POST'}]
+        }).status_code == 400
+        assert client.post('/api/batch', headers=headers, json={'requests': []}).status_code == 400
+        assert batch(client, headers, ('me', '/api/auth/me'), ('me', '/api/auth/me')).status_code == 400
+        assert batch(client, headers, *[(str(i), '/api/auth/me') for i in range(11)]).status_code == 400
@@ -0,0 +1,35 @@
+from app.models import User, MarkedCountry
+from benchmarks.load import percentile, summarize
+from benchmarks.seed import seed
+
+
+class TestSeed:
+    def test_seed_is_idempotent(self, app):
+        user_ids = seed(users=5, marks_per_user=3)
+        assert len(user_ids) == 5
+        assert MarkedCountry.query.count() == 15
+
+        assert seed(users=6, marks_per_user=3)[:5] == user_ids
+        assert User.query.count() == 6
+        assert MarkedCountry.query.count() == 18
+
+
+class TestSummary:
+    def test_percentile(self):
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 99) == 99
+        assert percentile([], 50) is None
+
+    def test_summarize(self):
+        samples = [
+            ('my_marks', 0.010, 200, 2),
+            ('my_marks', 0.020, 200, 2),
+            ('mark', 0.030, 500, 5),
+        ]
+        report = summarize(samples, elapsed=1.0)
+        assert report['overall']['requests'] == 3
+        assert report['overall']['errors'] == 1
+        assert report['overall']['throughput_rps'] == 3.0
+        assert report['scenarios']['my_marks']['p50_ms'] == 10.0
+        assert report['scenarios']['mark']['mean_queries'] == 5.0
@@ -0,0 +1,187 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from app import create_app
+from app.extensions import cache
+from app.utils.cache import Cache, LocalCacheBackend, SQLiteCacheBackend
+
+
+class TestLocalBackend:
+    def test_lru_eviction(self):
+        backend = LocalCacheBackend(max_entries=2)
+        backend.set('a', 1)
+        backend.set('b', 2)
+        backend.get('a')
+        backend.set('c', 3)
+        assert backend.get('a') == 1
+        assert backend.get('b') is None
+        assert backend.get('c') == 3
+
+    def test_ttl_expiry(self):
+        backend = LocalCacheBackend()
+        backend.set('a', 1, ttl=0.01)
+        time.sleep(0.02)
+        assert backend.get('a') is None
+
+    def test_add_only_when_absent(self):
+        backend = LocalCacheBackend()
+        assert backend.add('lock', 1) is True
+        assert backend.add('lock', 1) is False
+
+
+class TestCache:
+    def test_versioned_invalidation(self):
+        local = Cache(backend=LocalCacheBackend())
+        local.set('all', [1, 2], namespace='marks:1')
+        local.set('all', [3], namespace='marks:2')
+        local.invalidate('marks:1')
+        assert local.get('all', namespace='marks:1') is None
+        assert local.get('all', namespace='marks:2') == [3]
+
+    def test_metrics(self):
+        local = Cache(backend=LocalCacheBackend())
+        local.get_or_set('key', lambda: 'value')
+        local.get_or_set('key', lambda: 'other')
+        stats = local.stats()
+        assert stats['misses'] == 1
+        assert stats['hits'] == 1
+        assert stats['recomputes'] == 1
+        assert stats['hit_rate'] == 0.5
+
+    def test_single_flight_recompute(self):
+        local = Cache(backend=LocalCacheBackend())
+        calls = []
+
+        def slow_compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(local.get_or_set('key', slow_compute)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == ['value'] * 8
+
+    def test_sqlite_backend_shared_between_workers(self, tmp_path):
+        path = str(tmp_path / 'cache.db')
+        worker_a = Cache(backend=SQLiteCacheBackend(path))
+        worker_b = Cache(backend=SQLiteCacheBackend(path))
+
+        worker_a.set('all', {'count': 1}, namespace='marks:1')
+        assert worker_b.get('all', namespace='marks:1') == {'count': 1}
+
+        worker_b.invalidate('marks:1')
+        assert worker_a.get('all', namespace='marks:1') is None
+
+    def test_clear_keeps_other_prefixes(self, tmp_path):
+        backend = SQLiteCacheBackend(str(tmp_path / 'cache.db'))
+        backend.set('other-app:key', 1)
+        local = Cache(backend=backend)
+        local.set('key', 2)
+        local.clear()
+        assert local.get('key') is None
+        assert backend.get('other-app:key') == 1
+
+    def test_flight_lock_outlives_its_waiters(self):
+        local = Cache(backend=LocalCacheBackend())
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow_compute():
+            calls.append(1)
+            started.set()
+            release.wait(1)
+            return 'value'
+
+        threads = [threading.Thread(target=local.get_or_set, args=('key', slow_compute)) for _ in range(3)]
+        threads[0].start()
+        started.wait(1)
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.02)
+        # Still held by the first thread and waited on by the others
+        assert local._flight_locks[local._key('key', None)][1] == 3
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+        assert local._flight_locks == {}
+
+    def test_recompute_leaves_foreign_locks_alone(self):
+        local = Cache(backend=LocalCacheBackend(), lock_timeout=0.05)
+        full_key = local._key('key', None)
+        # Another process holds the lock and never finishes
+        local.backend.add(f'{full_key}:lock', 'theirs', 10)
+        assert local.get_or_set('key', lambda: 'value') == 'value'
+        assert local.backend.get(f'{full_key}:lock') == 'theirs'
+
+    def test_sqlite_backend_ttl(self, tmp_path):
+        backend = SQLiteCacheBackend(str(tmp_path / 'cache.db'))
+        backend.set('a', 1, ttl=0.01)
+        time.sleep(0.02)
+        assert backend.get('a') is None
+        assert backend.add('a', 2) is True
+
+
+class TestCacheInvalidationOnWrites:
+    def test_marking_invalidates_cached_list(self, client, auth_token, sample_country):
+        headers = {'Authorization': f'Bearer {auth_token}'}
+        assert client.get('/api/marked-countries/my', headers=headers).get_json() == []
+
+        client.post('/api/marked-countries/mark', headers=headers, json={
+            'country_id': sample_country.id,
+            'status': 'visited'
+        })
+        data = client.get('/api/marked-countries/my', headers=headers).get_json()
+        assert [mc['country_id'] for mc in data] == [sample_country.id]
+
+        client.post('/api/marked-countries/unmark', headers=headers, json={'country_id': sample_country.id})
+        assert client.get('/api/marked-countries/my', headers=headers).get_json() == []
+        assert cache.stats()['invalidations'] >= 2
+
+    def test_write_on_one_worker_invalidates_the_others(self, app, auth_token, sample_country, tmp_path):
+        # Two app instances on one database and one cache file, as two gunicorn workers are
+        shared = {
+            'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI'],
+            'CACHE_BACKEND': 'sqlite',
+            'CACHE_URL': str(tmp_path / 'cache.db')
+        }
+        worker_a = create_app('TestingConfig', shared).test_client()
+        worker_b = create_app('TestingConfig', shared).test_client()
+        headers = {'Authorization': f'Bearer {auth_token}'}
+        assert worker_b.get('/api/marked-countries/my', headers=headers).get_json() == []
+
+        worker_a.post('/api/marked-countries/mark', headers=headers, json={
+            'country_id': sample_country.id,
+            'status': 'visited'
+        })
+        data = worker_b.get('/api/marked-countries/my', headers=headers).get_json()
+        assert [mc['country_id'] for mc in data] == [sample_country.id]
+
+
+class TestGunicornDefaults:
+    def backends(self, **env):
+        # gunicorn.conf.py run as gunicorn runs it; sync workers keep gevent (and its monkey patching) out
+        script = "import os, runpy; runpy.run_path('gunicorn.conf.py'); print(os.environ.get('CACHE_BACKEND'), os.environ.get('EVENTS_BACKEND'))"
+        environ = {key: value for key, value in os.environ.items() if key not in ('CACHE_BACKEND', 'EVENTS_BACKEND')}
+        environ.update(GUNICORN_WORKER_CLASS='sync', **env)
+        backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, '-c', script], cwd=backend_dir, env=environ, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        return result.stdout.split()
+
+    def test_shared_backends_with_several_workers(self):
+        assert self.backends(WEB_CONCURRENCY='4') == ['sqlite', 'sqlite']
+        assert self.backends(WEB_CONCURRENCY='1') == ['None', 'None']
+        assert self.backends(WEB_CONCURRENCY='4', CACHE_BACKEND='redis', EVENTS_BACKEND='memory') == ['redis', 'memory']
@@ -0,0 +1,54 @@
+import json
+import sys
+from app.extensions import db
+from app.models import Country
+from app.services.catalog_service import CountryCatalog, get_catalog
+from app.services.country_service import get_country_catalog, import_countries
+from app.utils.prefork import memory_usage, preload
+
+
+class TestCountryCatalog:
+    def test_payloads_match_the_query(self, client):
+        for continent in (None, 'Europe', 'Atlantis'):
+            expected = [Country.row_to_dict(row) for row in Country.list_rows(continent=continent)]
+            assert json.loads(get_catalog().payload(continent)) == expected
+            path = f'/api/countries?continent={continent}' if continent else '/api/countries'
+            assert client.get(path).get_json() == expected
+
+    def test_compact_and_shared(self, app):
+        catalog = get_catalog()
+        assert get_catalog() is catalog
+        assert not hasattr(catalog, '__dict__')
+        assert all(type(row) is tuple for row in catalog.rows)
+        country_id, name, code, _, continent = catalog.rows[0]
+        assert catalog.by_code[code] is catalog.by_id[country_id]
+        assert continent is sys.intern(str(continent))
+        assert get_country_catalog()[country_id] == (name, code)
+
+    def test_rebuilt_after_import(self, app):
+        catalog = get_catalog()
+        db.session.execute(db.delete(Country))
+        db.session.commit()
+        import_countries()
+        assert get_catalog() is not catalog
+        assert len(get_catalog().rows) == len(catalog.rows)
+
+    def test_empty(self):
+        catalog = CountryCatalog([], json.dumps)
+        assert catalog.payload() == b'[]'
+        assert catalog.payload('Europe') == b'[]'
+
+
+class TestPrefork:
+    def test_preload_builds_everything_and_drops_connections(self, app):
+        app.extensions.pop('country_catalog', None)
+        timings = preload(app)
+        assert set(timings) == {'catalog', 'regions', 'topology', 'geocoding'}
+        assert 'country_catalog' in app.extensions
+        assert db.engine.pool.checkedout() == 0
+
+    def test_memory_usage(self):
+        usage = memory_usage()
+        assert usage['rss'] > 0
+        if 'pss' in usage:
+            assert usage['private'] <= usage['rss']
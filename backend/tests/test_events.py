@@ -0,0 +1,185 @@
+import json
+import time
+from datetime import datetime, timezone
+import pytest
+from app.extensions import db, events
+from app.models import Country
+from app.utils.auth import generate_stream_ticket, generate_token
+from app.utils.events import EventHub, MemoryEventLog, SQLiteEventLog, format_event
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def log(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryEventLog(size=3)
+    return SQLiteEventLog(str(tmp_path / 'events.db'), size=3)
+
+
+def parse_stream(body):
+    parsed = []
+    for block in body.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':') and ': ' in line)
+        if 'event' in fields:
+            parsed.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return parsed
+
+
+class TestEventLog:
+    def test_ids_count_up_per_user(self, log):
+        assert log.append(1, 'mark', '{}')[0] == 1
+        assert log.append(1, 'mark', '{}')[0] == 2
+        assert log.append(2, 'mark', '{}')[0] == 1
+        assert log.latest_id(1) == 2
+        assert log.latest_id(3) == 0
+
+    def test_since_replays_after_last_id(self, log):
+        for index in range(3):
+            log.append(1, 'mark', json.dumps({'index': index}))
+        assert [event[0] for event in log.since(1, 1)] == [2, 3]
+        assert log.since(1, 3) == []
+        assert log.since(2, 0) == []
+
+    def test_since_reports_gaps(self, log):
+        for _ in range(5):
+            log.append(1, 'mark', '{}')
+        assert [event[0] for event in log.since(1, 2)] == [3, 4, 5]
+        # Event 2 has been dropped from the log, and event 9 was never published
+        assert log.since(1, 1) is None
+        assert log.since(1, 9) is None
+
+    def test_sqlite_log_is_shared_between_instances(self, tmp_path):
+        path = str(tmp_path / 'events.db')
+        first, second = SQLiteEventLog(path), SQLiteEventLog(path)
+        first.append(1, 'mark', '{}')
+        assert second.append(1, 'unmark', '{}')[0] == 2
+        assert [event[1] for event in first.since(1, 0)] == ['mark', 'unmark']
+        assert [user_id for _, user_id, _ in first.poll(0)] == [1, 1]
+
+
+class TestEventHub:
+    def test_publish_reaches_only_the_users_subscriptions(self):
+        hub = EventHub(MemoryEventLog())
+        mine, theirs = hub.subscribe(1), hub.subscribe(2)
+        hub.publish(1, 'mark', {'country_id': 7})
+        assert mine.wait(0) == [(1, 'mark', '{"country_id":7}')]
+        assert theirs.wait(0) == []
+
+    def test_subscribe_replays_after_last_event_id(self):
+        hub = EventHub(MemoryEventLog())
+        for country_id in (1, 2, 3):
+            hub.publish(1, 'mark', {'country_id': country_id})
+        assert [event[0] for event in hub.subscribe(1, 1).wait(0)] == [2, 3]
+        # Without a Last-Event-ID a new stream starts from now
+        assert hub.subscribe(1).wait(0) == []
+
+    def test_subscribe_resets_when_replay_is_impossible(self):
+        hub = EventHub(MemoryEventLog(size=2))
+        for country_id in (1, 2, 3):
+            hub.publish(1, 'mark', {'country_id': country_id})
+        assert hub.subscribe(1, 0).wait(0) == [(3, 'reset', '{}')]
+
+    def test_slow_subscriptions_are_reset_instead_of_growing(self, monkeypatch):
+        hub = EventHub(MemoryEventLog())
+        subscription = hub.subscribe(1)
+        monkeypatch.setattr(subscription, 'MAX_QUEUED', 2)
+        for country_id in range(4):
+            hub.publish(1, 'mark', {'country_id': country_id})
+        # Events 1-2 are dropped for a reset at 3; later events queue behind it
+        assert subscription.wait(0) == [(3, 'reset', '{}'), (4, 'mark', '{"country_id":3}')]
+
+    def test_close_unsubscribes(self):
+        hub = EventHub(MemoryEventLog())
+        subscription = hub.subscribe(1)
+        assert hub.subscriber_count() == 1
+        subscription.close()
+        assert hub.subscriber_count() == 0
+
+    def test_shared_log_delivers_between_hubs(self, tmp_path):
+        path = str(tmp_path / 'events.db')
+        worker_a = EventHub(SQLiteEventLog(path), poll_interval=0.01)
+        worker_b = EventHub(SQLiteEventLog(path), poll_interval=0.01)
+        subscription = worker_a.subscribe(1)
+        time.sleep(0.05)
+        worker_b.publish(1, 'mark', {'country_id': 7})
+        assert subscription.wait(2) == [(1, 'mark', '{"country_id":7}')]
+
+    def test_format_event(self):
+        assert format_event((3, 'mark', '{}')) == 'id: 3\nevent: mark\ndata: {}\n\n'
+
+
+class TestEventStream:
+    @pytest.fixture(autouse=True)
+    def short_streams(self, app):
+        app.config.update({'EVENTS_STREAM_MAX_SECONDS': 0.3, 'EVENTS_HEARTBEAT_SECONDS': 0.1})
+
+    def ticket(self, client, user):
+        response = client.post('/api/events/ticket', headers={'Authorization': f'Bearer {generate_token(user.id)}'})
+        assert response.status_code == 200
+        return response.json['ticket']
+
+    def test_requires_a_token(self, client):
+        assert client.get('/api/events/stream').status_code == 401
+        assert client.get('/api/events/stream?ticket=nope').status_code == 401
+        assert client.post('/api/events/ticket').status_code == 401
+
+    def test_ticket_opens_the_stream(self, app, client, sample_user):
+        response = client.post('/api/events/ticket', headers={'Authorization': f'Bearer {generate_token(sample_user.id)}'})
+        assert response.json['expires_in'] == app.config['EVENTS_TICKET_SECONDS']
+        response = client.get(f'/api/events/stream?ticket={response.json["ticket"]}')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+
+    def test_url_does_not_take_the_auth_token(self, client, sample_user):
+        token = generate_token(sample_user.id)
+        assert client.get(f'/api/events/stream?token={token}').status_code == 401
+        assert client.get(f'/api/events/stream?ticket={token}').status_code == 401
+
+    def test_ticket_is_not_an_auth_token(self, client, sample_user):
+        ticket = self.ticket(client, sample_user)
+        assert client.get('/api/auth/me', headers={'Authorization': f'Bearer {ticket}'}).status_code == 401
+
+    def test_expired_ticket(self, app, client, sample_user):
+        with app.app_context():
+            ticket = generate_stream_ticket(sample_user.id, -1)
+        response = client.get(f'/api/events/stream?ticket={ticket}')
+        assert response.status_code == 401
+        assert response.json['error'] == 'Token has expired'
+
+    def test_disabled_streams_tell_the_browser_to_stop(self, app, client, sample_user):
+        app.config['EVENTS_STREAM_ENABLED'] = False
+        assert client.post('/api/events/ticket', headers={'Authorization': f'Bearer {generate_token(sample_user.id)}'}).json['ticket'] is None
+        response = client.get('/api/events/stream', headers={'Authorization': f'Bearer {generate_token(sample_user.id)}'})
+        assert response.status_code == 204
+        assert events.subscriber_count() == 0
+
+    def test_deleted_accounts_are_turned_away(self, client, sample_user):
+        ticket = self.ticket(client, sample_user)
+        sample_user.deleted_at = datetime.now(timezone.utc)
+        db.session.commit()
+        assert client.get(f'/api/events/stream?ticket={ticket}').status_code == 401
+        assert events.subscriber_count() == 0
+
+    def test_streams_mark_changes(self, client, sample_user):
+        token = generate_token(sample_user.id)
+        headers = {'Authorization': f'Bearer {token}'}
+        country_id = db.session.execute(db.select(Country.id).where(Country.code == 'BR')).scalar_one()
+        client.post('/api/marked-countries/mark', headers=headers, json={'country_id': country_id, 'status': 'visited'})
+        client.post('/api/marked-countries/unmark', headers=headers, json={'country_id': country_id})
+
+        response = client.get(f'/api/events/stream?ticket={self.ticket(client, sample_user)}&last_event_id=0')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        body = response.get_data(as_text=True)
+        assert body.startswith('retry: ')
+        assert ': keep-alive' in body
+        assert parse_stream(body) == [
+            (1, 'mark', {
+                'country_id': country_id, 'country_code': 'BR', 'status': 'visited',
+                'visit_start_date': None, 'visit_end_date': None
+            }),
+            (2, 'unmark', {'country_id': country_id, 'country_code': 'BR'})
+        ]
+
+        response = client.get('/api/events/stream', headers={**headers, 'Last-Event-ID': '1'})
+        assert [event[1] for event in parse_stream(response.get_data(as_text=True))] == ['unmark']
+        assert events.subscriber_count() == 0
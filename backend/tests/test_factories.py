@@ -0,0 +1,55 @@
+import time
+from app.extensions import db
+from app.models import User, MarkedCountry, Friendship, UserBitset
+from app.services.friends_service import similar_travelers
+from app.services.marks_service import compute_user_bitsets, get_user_bitsets
+from tests.factories import BulkDataFactory
+
+
+class TestBulkDataFactory:
+    def test_users_marks_and_friendships(self, bulk_data):
+        user_ids = bulk_data.users(50)
+        assert len(set(user_ids)) == 50
+        assert bulk_data.marks(user_ids, per_user=10) == 500
+        assert bulk_data.friendships(user_ids, per_user=3) > 0
+
+        assert db.session.query(MarkedCountry).count() == 500
+        assert db.session.query(UserBitset).count() == 50
+        assert get_user_bitsets(user_ids[0]) == compute_user_bitsets(user_ids[0])
+        assert db.session.query(Friendship).filter(Friendship.user_id == Friendship.friend_id).count() == 0
+        # Later batches never reuse e-mails
+        assert len(bulk_data.users(5)) == 5
+        assert db.session.query(User).count() == 55
+
+    def test_deterministic(self, app):
+        first = BulkDataFactory(seed=7)
+        user_ids = first.users(3)
+        first.marks(user_ids, per_user=5)
+        rows = db.session.execute(
+            db.select(MarkedCountry.country_id, MarkedCountry.status, MarkedCountry.visit_start_date)
+            .order_by(MarkedCountry.id)
+        ).all()
+
+        db.session.execute(db.delete(MarkedCountry))
+        db.session.commit()
+        second = BulkDataFactory(seed=7)
+        second._next_user = 3
+        second.marks(user_ids, per_user=5)
+        assert db.session.execute(
+            db.select(MarkedCountry.country_id, MarkedCountry.status, MarkedCountry.visit_start_date)
+            .order_by(MarkedCountry.id)
+        ).all() == rows
+
+
+class TestAtScale:
+    def test_similar_travelers_over_two_thousand_users(self, bulk_data):
+        user_ids = bulk_data.users(2000)
+        bulk_data.marks(user_ids, per_user=20)
+
+        started = time.perf_counter()
+        ranked = similar_travelers(user_ids[0], user_ids, limit=10)
+        elapsed = time.perf_counter() - started
+        assert len(ranked) == 10
+        scores = [row['visited_jaccard'] for row in ranked]
+        assert scores == sorted(scores, reverse=True)
+        assert elapsed < 1
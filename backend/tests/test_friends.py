@@ -0,0 +1,154 @@
+import numpy as np
+from app.extensions import db
+from app.models import User, Country, MarkedCountry, Friendship, UserBitset
+from app.services.bitset_service import (
+    BITSET_BYTES, CATALOG_CODES, from_bytes, jaccard, popcount, rank_similar, to_bitset, to_bytes, to_codes
+)
+from app.services.marks_service import get_user_bitsets, rebuild_all_bitsets
+from app.utils.auth import generate_token
+
+
+def make_user(email, marks):
+    user = User(email=email, name=email.split('@')[0])
+    db.session.add(user)
+    db.session.commit()
+    ids = dict(db.session.execute(db.select(Country.code, Country.id)).all())
+    for code, status in marks.items():
+        db.session.add(MarkedCountry(user_id=user.id, country_id=ids[code], status=status))
+    db.session.commit()
+    return user
+
+
+def befriend(a, b):
+    db.session.add(Friendship(user_id=a.id, friend_id=b.id, status='accepted'))
+    db.session.commit()
+
+
+def auth(user):
+    return {'Authorization': f'Bearer {generate_token(user.id)}'}
+
+
+class TestBitsets:
+    def test_round_trip_in_catalog_order(self):
+        bits = to_bitset(['BR', 'AF', 'ZW', 'XX'])
+        assert to_codes(bits) == ['AF', 'BR', 'ZW']
+        assert popcount(bits) == 3
+        assert len(to_bytes(bits)) == BITSET_BYTES
+        assert from_bytes(to_bytes(bits)) == bits
+        assert to_bitset(CATALOG_CODES) == (1 << len(CATALOG_CODES)) - 1
+
+    def test_jaccard(self):
+        assert jaccard(to_bitset(['BR', 'AR']), to_bitset(['BR', 'CL'])) == round(1 / 3, 4)
+        assert jaccard(0, 0) == 0.0
+
+    def test_rank_similar(self):
+        target = to_bitset(['BR', 'AR', 'CL'])
+        rows = [['BR'], ['BR', 'AR', 'CL'], ['FR'], ['BR', 'AR']]
+        matrix = np.frombuffer(b''.join(to_bytes(to_bitset(codes)) for codes in rows), dtype=np.uint8).reshape(len(rows), BITSET_BYTES)
+        ranked = rank_similar(target, np.array([10, 11, 12, 13]), matrix, limit=2)
+        assert ranked == [(11, 1.0, 3), (13, round(2 / 3, 4), 2)]
+
+
+class TestUserBitsets:
+    def test_marks_endpoints_keep_bitsets_current(self, client, app, auth_token, sample_user, sample_country):
+        headers = {'Authorization': f'Bearer {auth_token}'}
+        client.post('/api/marked-countries/mark', headers=headers, json={'country_id': sample_country.id, 'status': 'visited'})
+        assert get_user_bitsets(sample_user.id) == (to_bitset(['US']), 0)
+
+        client.post('/api/marked-countries/unmark', headers=headers, json={'country_id': sample_country.id})
+        assert get_user_bitsets(sample_user.id) == (0, 0)
+
+    def test_writes_flip_only_the_changed_bits(self, client, app, sample_user, sample_country):
+        headers = {'Authorization': f'Bearer {generate_token(sample_user.id)}'}
+        client.post('/api/marked-countries/mark', headers=headers, json={'country_id': sample_country.id, 'status': 'wishlist'})
+        # Bits the marks don't explain survive, so nothing was recomputed from the marks
+        row = db.session.get(UserBitset, sample_user.id)
+        row.visited = to_bytes(to_bitset(['BR']))
+        db.session.commit()
+
+        client.post('/api/marked-countries/mark', headers=headers, json={'country_id': sample_country.id, 'status': 'visited'})
+        assert get_user_bitsets(sample_user.id) == (to_bitset(['BR', 'US']), 0)
+
+    def test_rebuild_and_backfill(self, app):
+        user = make_user('a@example.com', {'BR': 'visited', 'FR': 'wishlist'})
+        # Reads compute missing bitsets without storing them
+        assert get_user_bitsets(user.id) == (to_bitset(['BR']), to_bitset(['FR']))
+        assert db.session.get(UserBitset, user.id) is None
+        assert rebuild_all_bitsets() == 1
+        assert get_user_bitsets(user.id) == (to_bitset(['BR']), to_bitset(['FR']))
+
+
+class TestFriendsEndpoints:
+    def test_request_and_accept(self, client, app):
+        alice = make_user('alice@example.com', {})
+        bob = make_user('bob@example.com', {})
+
+        response = client.post('/api/friends', headers=auth(alice), json={'email': 'bob@example.com'})
+        assert response.status_code == 202
+        assert response.json == {'message': 'Friend request sent', 'status': 'pending'}
+        assert client.get('/api/friends', headers=auth(bob)).json['incoming'][0]['id'] == alice.id
+
+        assert client.post(f'/api/friends/{alice.id}/accept', headers=auth(bob)).status_code == 200
+        assert client.get('/api/friends', headers=auth(alice)).json['friends'][0]['id'] == bob.id
+
+        assert client.delete(f'/api/friends/{alice.id}', headers=auth(bob)).status_code == 200
+        assert client.get('/api/friends', headers=auth(alice)).json['friends'] == []
+
+    def test_add_validation(self, client, app):
+        alice = make_user('alice@example.com', {})
+        assert client.post('/api/friends', headers=auth(alice), json={}).status_code == 400
+        assert client.post('/api/friends', headers=auth(alice), json={'email': 'alice@example.com'}).status_code == 400
+
+    def test_add_does_not_reveal_accounts(self, client, app):
+        alice = make_user('alice@example.com', {})
+        make_user('bob@example.com', {})
+        existing = client.post('/api/friends', headers=auth(alice), json={'email': 'bob@example.com'})
+        unknown = client.post('/api/friends', headers=auth(alice), json={'email': 'nobody@example.com'})
+        assert (existing.status_code, existing.json) == (unknown.status_code, unknown.json)
+        assert 'outgoing' not in client.get('/api/friends', headers=auth(alice)).json
+
+    def test_compare(self, client, app):
+        alice = make_user('alice@example.com', {'BR': 'visited', 'FR': 'visited', 'JP': 'wishlist'})
+        bob = make_user('bob@example.com', {'BR': 'visited', 'JP': 'visited', 'FR': 'wishlist'})
+        carol = make_user('carol@example.com', {'BR': 'visited'})
+        befriend(alice, bob)
+        befriend(carol, alice)
+
+        response = client.get(f'/api/friends/compare?user_ids={bob.id},{carol.id}', headers=auth(alice))
+        assert response.status_code == 200
+        with_bob = response.json['comparisons'][0]
+        assert with_bob['user']['id'] == bob.id
+        assert with_bob['visited_both'] == ['BR']
+        assert with_bob['visited_only_me'] == ['FR']
+        assert with_bob['visited_only_them'] == ['JP']
+        assert with_bob['their_visited_on_my_wishlist'] == ['JP']
+        assert with_bob['my_visited_on_their_wishlist'] == ['FR']
+        assert with_bob['visited_jaccard'] == round(1 / 3, 4)
+        assert response.json['visited_by_all'] == ['BR']
+
+    def test_compare_requires_friendship(self, client, app):
+        alice = make_user('alice@example.com', {})
+        bob = make_user('bob@example.com', {})
+        assert client.get(f'/api/friends/compare?user_ids={bob.id}', headers=auth(alice)).status_code == 403
+        assert client.get('/api/friends/compare?user_ids=x', headers=auth(alice)).status_code == 400
+        assert client.get('/api/friends/compare', headers=auth(alice)).status_code == 400
+
+    def test_suggestions(self, client, app):
+        alice = make_user('alice@example.com', {'BR': 'visited', 'AR': 'visited', 'CL': 'visited'})
+        bob = make_user('bob@example.com', {'BR': 'visited', 'AR': 'visited'})
+        carol = make_user('carol@example.com', {'BR': 'visited', 'AR': 'visited', 'CL': 'visited'})
+        dave = make_user('dave@example.com', {'JP': 'visited'})
+        stranger = make_user('frank@example.com', {'BR': 'visited', 'AR': 'visited', 'CL': 'visited'})
+        friend = make_user('erin@example.com', {'BR': 'visited', 'AR': 'visited', 'CL': 'visited'})
+        befriend(alice, friend)
+        # Only friends of friends are suggested: erin knows bob, carol and dave, nobody knows frank
+        for other in (bob, carol, dave):
+            befriend(friend, other)
+        rebuild_all_bitsets()
+
+        response = client.get('/api/friends/suggestions', headers=auth(alice))
+        assert response.status_code == 200
+        assert [row['user']['id'] for row in response.json] == [carol.id, bob.id]
+        assert stranger.id not in [row['user']['id'] for row in response.json]
+        assert response.json[0]['visited_jaccard'] == 1.0
+        assert 'email' not in response.json[0]['user']
@@ -0,0 +1,69 @@
+import numpy as np
+from app.services.geocoding_service import GeocodingIndex, get_index, locate_points
+from app.services.geometry_service import load_features
+
+
+class TestGeocodingIndex:
+    def test_known_places(self):
+        places = [
+            ((-23.55, -46.63), 'BR'),   # São Paulo
+            ((48.85, 2.35), 'FR'),      # Paris
+            ((-29.31, 27.48), 'LS'),    # Maseru, enclave inside South Africa
+            ((-26.20, 28.05), 'ZA'),    # Johannesburg
+            ((35.68, 139.69), 'JP'),    # Tokyo
+            ((0.0, -30.0), None),       # Atlantic
+        ]
+        assert locate_points([point for point, _ in places]) == [code for _, code in places]
+
+    def test_snaps_points_just_off_the_coast(self):
+        # Copacabana beach falls outside the simplified coastline
+        assert locate_points([(-22.9711, -43.1822)]) == ['BR']
+
+    def test_matches_brute_force(self):
+        index = GeocodingIndex(load_features(), snap=0)
+        rng = np.random.default_rng(7)
+        lon, lat = rng.uniform(-180, 180, 5000), rng.uniform(-60, 80, 5000)
+
+        brute = np.full(len(lon), len(index.codes) - 1)
+        for polygon in range(len(index.bboxes)):
+            brute[index._contains(polygon, lon, lat)] = polygon
+        assert index.locate(lon, lat) == index.codes[brute].tolist()
+
+    def test_index_is_built_once(self):
+        assert get_index() is get_index()
+
+
+class TestLocateEndpoints:
+    def test_single(self, client, sample_country):
+        response = client.get('/api/geometry/locate?lat=40.71&lon=-74.0')
+        assert response.status_code == 200
+        assert response.json['code'] == 'US'
+        assert response.json['country_id'] == sample_country.id
+
+    def test_single_validation(self, client):
+        assert client.get('/api/geometry/locate?lat=40.71').status_code == 400
+        assert client.get('/api/geometry/locate?lat=91&lon=0').status_code == 400
+
+    def test_batch(self, client, sample_country):
+        response = client.post('/api/geometry/locate', json={'points': [[40.71, -74.0], [0, -30], [48.85, 2.35]]})
+        assert response.status_code == 200
+        assert response.json['codes'] == ['US', None, 'FR']
+        assert response.json['country_ids']['US'] == sample_country.id
+        assert set(response.json['country_ids']) <= {'US', 'FR'}
+
+    def test_batch_validation(self, client, app):
+        assert client.post('/api/geometry/locate', json={'points': 'nope'}).status_code == 400
+        assert client.post('/api/geometry/locate', json=[[1, 2]]).status_code == 400
+        assert client.post('/api/geometry/locate', data='not json').status_code == 400
+        assert client.post('/api/geometry/locate', json={'points': [[1, 2, 3]]}).status_code == 400
+        assert client.post('/api/geometry/locate', json={'points': [[[1, 2]]]}).status_code == 400
+        assert client.post('/api/geometry/locate', json={'points': [1, 2]}).status_code == 400
+        assert client.post('/api/geometry/locate', json={'points': [[100, 0]]}).status_code == 400
+        assert client.post('/api/geometry/locate', json={'points': [['a', 'b']]}).status_code == 400
+
+        app.config['GEOCODING_MAX_POINTS'] = 2
+        assert client.post('/api/geometry/locate', json={'points': [[0, 0]] * 3}).status_code == 400
+
+    def test_empty_batch(self, client):
+        response = client.post('/api/geometry/locate', json={'points': []})
+        assert response.json == {'codes': [], 'country_ids': {}}
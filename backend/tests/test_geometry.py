@@ -0,0 +1,107 @@
+import gzip
+import json
+from app.services.geometry_service import load_features
+from app.services.topology_service import LODS, build_topology, load_topology, longitude_span, quantize_rings
+
+
+def decode_rings(topology):
+    arcs = []
+    for arc in topology['arcs']:
+        x = y = 0
+        points = []
+        for dx, dy in arc:
+            x, y = x + dx, y + dy
+            points.append((x, y))
+        arcs.append(points)
+
+    def ring(indexes):
+        points = []
+        for index in indexes:
+            arc = arcs[index] if index >= 0 else arcs[~index][::-1]
+            points.extend(arc[1:] if points else arc)
+        return points
+
+    return [
+        [[ring(indexes) for indexes in polygon] for polygon in geometry['arcs']]
+        for geometry in topology['objects']['countries']['geometries']
+    ]
+
+
+class TestTopology:
+    def test_full_detail_round_trips(self):
+        features = load_features()
+        topology = build_topology(features, 0.0, 100000)
+        quantized, _, _ = quantize_rings(features, 100000)
+
+        for decoded, original in zip(decode_rings(topology), quantized):
+            for decoded_polygon, original_polygon in zip(decoded, original):
+                for decoded_ring, original_ring in zip(decoded_polygon, original_polygon):
+                    assert decoded_ring[0] == decoded_ring[-1]
+                    assert set(decoded_ring) == set(original_ring)
+
+    def test_shared_borders_are_stored_once(self):
+        features = load_features()
+        topology = build_topology(features, 0.0, 100000)
+        stored = sum(len(arc) for arc in topology['arcs'])
+        total = sum(len(ring) for _, _, polygons in features for polygon in polygons for ring in polygon)
+        assert stored < total
+
+    def test_longitude_span(self):
+        assert longitude_span([-73.9, -34.7, -50.0]) == (-73.9, -34.7)
+        # Across the antimeridian: from 170E eastwards to 170W
+        assert longitude_span([170.0, 179.5, -179.5, -170.0]) == (170.0, -170.0)
+        # Round the whole globe
+        assert longitude_span([-180.0, -60.0, 60.0, 180.0]) == (-180.0, 180.0)
+
+    def test_lower_detail_is_smaller(self):
+        sizes = [len(load_topology(lod)[0]) for lod in ('low', 'medium', 'high')]
+        assert sizes == sorted(sizes)
+
+    def test_bundled_topologies_are_current(self):
+        # Run `flask geometry build` after changing the geometry or LODS
+        for lod, (tolerance, quantization) in LODS.items():
+            assert json.loads(load_topology(lod)[0]) == json.loads(json.dumps(build_topology(load_features(), tolerance, quantization)))
+
+
+class TestGeometryEndpoints:
+    def test_index_lists_versioned_urls(self, client):
+        response = client.get('/api/geometry')
+        assert response.status_code == 200
+        assert set(response.json['lods']) == set(LODS)
+        assert '?v=' in response.json['lods']['low']['url']
+
+    def test_versioned_topology_is_immutable(self, client):
+        url = client.get('/api/geometry').json['lods']['medium']['url']
+        response = client.get(url)
+        assert response.status_code == 200
+        assert 'immutable' in response.headers['Cache-Control']
+        assert response.json['type'] == 'Topology'
+
+        not_modified = client.get(url, headers={'If-None-Match': response.headers['ETag']})
+        assert not_modified.status_code == 304
+
+    def test_gzip(self, client):
+        response = client.get('/api/geometry/low.json', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'immutable' not in response.headers['Cache-Control']
+        assert json.loads(gzip.decompress(response.data))['type'] == 'Topology'
+
+    def test_unknown_lod(self, client):
+        assert client.get('/api/geometry/ultra.json').status_code == 404
+
+    def test_country_bounds(self, client):
+        response = client.get('/api/geometry/bounds/br')
+        assert response.status_code == 200
+        west, south, east, north = response.json['bbox']
+        lon, lat = response.json['centroid']
+        assert west < lon < east and south < lat < north
+        assert client.get('/api/geometry/bounds/XX').status_code == 404
+        assert 'US' in client.get('/api/geometry/bounds').json
+
+    def test_bounds_across_the_antimeridian(self, client):
+        # The shorter arc, west > east (RFC 7946), not a box around the whole world
+        west, _, east, _ = client.get('/api/geometry/bounds/RU').json['bbox']
+        assert west > east
+        assert (east + 360) - west < 180
+        west, _, east, _ = client.get('/api/geometry/bounds/BR').json['bbox']
+        assert west < east
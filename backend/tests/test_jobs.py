@@ -0,0 +1,190 @@
+import time
+import pytest
+from app.extensions import db
+from app.models import Job, MarkedCountry, User
+from app.services.job_service import JOB_HANDLERS, enqueue, claim_next, run_job, work, requeue_stale
+
+
+@pytest.fixture
+def queued(app):
+    app.config['JOBS_EAGER'] = False
+    app.config['JOBS_RETRY_BASE_SECONDS'] = 0
+    return app
+
+
+@pytest.fixture
+def flaky_handler():
+    calls = []
+
+    def handler(job):
+        calls.append(job.attempts)
+        if len(calls) < 2:
+            raise RuntimeError('temporary failure')
+        return {'ok': True}
+
+    JOB_HANDLERS['flaky'] = handler
+    yield calls
+    del JOB_HANDLERS['flaky']
+
+
+class TestJobQueue:
+    def test_enqueue_rejects_unknown_type(self, queued):
+        with pytest.raises(ValueError):
+            enqueue('does_not_exist')
+
+    def test_claim_is_exclusive(self, queued, sample_user):
+        enqueue('export_marks', user_id=sample_user.id)
+        job = claim_next('worker-a')
+        assert job.status == 'running'
+        assert job.attempts == 1
+        assert claim_next('worker-b') is None
+
+    def test_retries_with_backoff_then_succeeds(self, queued, flaky_handler):
+        job_id = enqueue('flaky').id
+        assert work(once=True) == 2
+        job = db.session.get(Job, job_id)
+        assert job.status == 'succeeded'
+        assert job.result == {'ok': True}
+        assert flaky_handler == [1, 2]
+
+    def test_fails_after_max_attempts(self, queued, flaky_handler):
+        job_id = enqueue('flaky', max_attempts=1).id
+        work(once=True)
+        job = db.session.get(Job, job_id)
+        assert job.status == 'failed'
+        assert 'temporary failure' in job.error
+
+    def test_requeue_stale(self, queued, sample_user):
+        enqueue('export_marks', user_id=sample_user.id)
+        job = claim_next('dead-worker')
+        assert requeue_stale(stale_after=-1) == 1
+        db.session.refresh(job)
+        assert job.status == 'queued'
+
+    def test_stale_job_without_attempts_left_fails(self, queued, sample_user):
+        enqueue('export_marks', user_id=sample_user.id, max_attempts=1)
+        job = claim_next('dead-worker')
+        assert requeue_stale(stale_after=-1) == 0
+        db.session.refresh(job)
+        assert job.status == 'failed'
+        assert 'stopped responding' in job.error
+        assert job.locked_by is None
+
+    @pytest.mark.app_config(JOBS_HEARTBEAT_SECONDS=0.05)
+    def test_heartbeat_keeps_a_long_job_claimed(self, queued):
+        def long_handler(job):
+            time.sleep(0.3)
+            # Claimed 0.3s ago, but the heartbeat has kept its lock fresh
+            return {'requeued': requeue_stale(stale_after=0.2)}
+
+        JOB_HANDLERS['long'] = long_handler
+        try:
+            job_id = enqueue('long').id
+            work(once=True)
+        finally:
+            del JOB_HANDLERS['long']
+        job = db.session.get(Job, job_id)
+        assert job.status == 'succeeded'
+        assert job.result == {'requeued': 0}
+        assert job.attempts == 1
+
+
+class TestJobEndpoints:
+    def test_export_job(self, queued, client, auth_token, sample_user, sample_country):
+        headers = {'Authorization': f'Bearer {auth_token}'}
+        client.post('/api/marked-countries/mark', headers=headers, json={
+            'country_id': sample_country.id,
+            'status': 'visited'
+        })
+
+        response = client.post('/api/jobs/exports', headers=headers)
+        assert response.status_code == 202
+        job_id = response.get_json()['job']['id']
+        assert client.get(f'/api/jobs/{job_id}', headers=headers).get_json()['status'] == 'queued'
+
+        work(once=True)
+        data = client.get(f'/api/jobs/{job_id}', headers=headers).get_json()
+        assert data['status'] == 'succeeded'
+        assert data['result']['marked_countries'][0]['country_code'] == 'US'
+
+    def test_import_job(self, client, auth_token, sample_user):
+        headers = {'Authorization': f'Bearer {auth_token}'}
+        response = client.post('/api/jobs/imports', headers=headers, json={'marked_countries': [
+            {'country_code': 'BR', 'status': 'visited', 'visit_start_date': '2023-05-01'},
+            {'country_code': 'JP', 'status': 'wishlist'},
+            {'country_code': 'ZZ', 'status': 'visited'}
+        ]})
+        assert response.status_code == 202
+        result = response.get_json()['job']['result']
+        assert result['imported'] == 2
+        assert result['skipped'][0]['country_code'] == 'ZZ'
+
+        data = client.get('/api/marked-countries/my', headers=headers).get_json()
+        assert sorted(mc['country_code'] for mc in data) == ['BR', 'JP']
+
+    def test_import_requires_list(self, client, auth_token):
+        response = client.post('/api/jobs/imports',
+            headers={'Authorization': f'Bearer {auth_token}'},
+            json={'marked_countries': 'BR'}
+        )
+        assert response.status_code == 400
+        response = client.post('/api/jobs/imports',
+            headers={'Authorization': f'Bearer {auth_token}'},
+            json={'marked_countries': ['BR']}
+        )
+        assert response.status_code == 400
+
+    def test_import_skips_malformed_entries(self, queued, sample_user):
+        # Queued before validation existed, or by hand: the job finishes instead of retrying forever
+        job = enqueue('import_marks', payload={'marked_countries': [
+            'BR', {'country_code': ['JP'], 'status': 'visited'}, {'country_code': 'JP', 'status': 'visited'}
+        ]}, user_id=sample_user.id)
+        run_job(claim_next('worker'))
+        job = db.session.get(Job, job.id)
+        assert job.status == 'succeeded'
+        assert job.result['imported'] == 1
+        assert len(job.result['skipped']) == 2
+
+    def test_job_of_another_user_is_hidden(self, queued, client, auth_token):
+        other = User(email='other@example.com')
+        db.session.add(other)
+        db.session.commit()
+        job = enqueue('export_marks', user_id=other.id)
+        response = client.get(f'/api/jobs/{job.id}', headers={'Authorization': f'Bearer {auth_token}'})
+        assert response.status_code == 404
+
+    def test_account_deletion_runs_as_job(self, queued, client, auth_token, sample_user, sample_country):
+        headers = {'Authorization': f'Bearer {auth_token}'}
+        user_id = sample_user.id
+        client.post('/api/marked-countries/mark', headers=headers, json={
+            'country_id': sample_country.id,
+            'status': 'visited'
+        })
+
+        response = client.delete('/api/auth/users/me', headers=headers)
+        assert response.status_code == 202
+        assert response.get_json()['job']['type'] == 'delete_account'
+        # A second request reuses the pending job instead of queueing another
+        assert client.delete('/api/auth/users/me', headers=headers).get_json()['job']['id'] == response.get_json()['job']['id']
+
+        work(once=True)
+        db.session.expunge_all()
+        assert db.session.get(User, user_id).purged_at is not None
+        assert MarkedCountry.query.filter_by(user_id=user_id).count() == 0
+
+    def test_statistics_computed_by_job(self, queued, client, auth_token, sample_country):
+        headers = {'Authorization': f'Bearer {auth_token}'}
+        client.post('/api/marked-countries/mark', headers=headers, json={
+            'country_id': sample_country.id,
+            'status': 'visited'
+        })
+
+        response = client.get('/api/statistics/my', headers=headers)
+        assert response.status_code == 202
+
+        work(once=True)
+        response = client.get('/api/statistics/my', headers=headers)
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['visited'] == 1
+        assert data['by_continent']['North America']['visited'] == 1
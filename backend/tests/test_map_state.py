@@ -0,0 +1,51 @@
+import hashlib
+import pytest
+from app.services.bitset_service import (
+    CATALOG_CODES, CATALOG_SIZES, CATALOG_VERSION, decode_map_state, encode_map_state, map_state_statuses, to_bitset
+)
+
+
+class TestMapStateEncoding:
+    def test_catalog_version_is_pinned(self):
+        # Changing the order of existing countries breaks every stored state; only append and add a version
+        assert CATALOG_SIZES[CATALOG_VERSION] == len(CATALOG_CODES)
+        fingerprint = hashlib.sha1(','.join(CATALOG_CODES[:CATALOG_SIZES[1]]).encode()).hexdigest()
+        assert fingerprint == '0aa055c07ea5731c6181cd51af6c5a0049213de4'
+
+    def test_round_trip(self):
+        visited, wishlist = to_bitset(['BR', 'FR']), to_bitset(['JP'])
+        state = encode_map_state(visited, wishlist)
+        assert len(state) == 68
+        assert decode_map_state(state) == (CATALOG_VERSION, visited, wishlist)
+        assert map_state_statuses(state) == {'BR': 'visited', 'FR': 'visited', 'JP': 'wishlist'}
+
+    @pytest.mark.parametrize('state', ['', 'not base64!', 'AA', encode_map_state(0, 0)[:-4]])
+    def test_invalid_states(self, state):
+        with pytest.raises(ValueError):
+            decode_map_state(state)
+
+
+class TestMapStateEndpoints:
+    def test_state_follows_marks(self, client, auth_token, sample_country):
+        headers = {'Authorization': f'Bearer {auth_token}'}
+        empty = client.get('/api/marked-countries/my/state', headers=headers)
+        assert empty.status_code == 200
+        assert empty.json['catalog_version'] == CATALOG_VERSION
+        assert decode_map_state(empty.json['state'])[1:] == (0, 0)
+
+        not_modified = client.get('/api/marked-countries/my/state', headers={**headers, 'If-None-Match': empty.headers['ETag']})
+        assert not_modified.status_code == 304
+
+        client.post('/api/marked-countries/mark', headers=headers, json={'country_id': sample_country.id, 'status': 'wishlist'})
+        changed = client.get('/api/marked-countries/my/state', headers={**headers, 'If-None-Match': empty.headers['ETag']})
+        assert changed.status_code == 200
+        assert map_state_statuses(changed.json['state']) == {'US': 'wishlist'}
+
+    def test_catalog(self, client):
+        response = client.get('/api/countries/catalog')
+        assert response.json['version'] == CATALOG_VERSION
+        assert response.json['codes'] == list(CATALOG_CODES)
+
+        pinned = client.get(f'/api/countries/catalog?version={CATALOG_VERSION}')
+        assert 'immutable' in pinned.headers['Cache-Control']
+        assert client.get('/api/countries/catalog?version=99').status_code == 404
@@ -0,0 +1,66 @@
+from app.extensions import cache
+from app.services.geometry_service import load_features, simplify_ring
+from app.services.map_render_service import render_svg, render_png
+
+
+class TestGeometry:
+    def test_bundled_features_are_keyed_by_catalog_code(self):
+        codes = {code for code, _, _ in load_features() if code}
+        assert {'BR', 'US', 'CD', 'RS', 'PS'} <= codes
+
+    def test_simplify_keeps_ring_closed(self):
+        ring = tuple((x, 0.001 * (x % 2)) for x in range(20)) + ((19, 5), (0, 5), (0, 0))
+        simplified = simplify_ring(ring, 0.1)
+        assert len(simplified) < len(ring)
+        assert simplified[0] == simplified[-1] == (0, 0)
+
+
+class TestRendering:
+    def test_svg_colors_marked_countries(self):
+        svg = render_svg({'BR': 'visited'}, width=512, theme='light')
+        assert svg.startswith('<svg')
+        assert 'fill="#10B981"' in svg
+        assert 'fill="#F59E0B"' not in svg
+
+    def test_png(self):
+        png = render_png({'BR': 'visited', 'ZA': 'wishlist'}, width=512)
+        assert png[:8] == b'\x89PNG\r\n\x1a\n'
+
+
+class TestMapEndpoint:
+    def test_render_and_cache(self, client, auth_token, sample_country):
+        headers = {'Authorization': f'Bearer {auth_token}'}
+        client.post('/api/marked-countries/mark', headers=headers, json={
+            'country_id': sample_country.id,
+            'status': 'visited'
+        })
+
+        response = client.get('/api/maps/my.png?width=512', headers=headers)
+        assert response.status_code == 200
+        assert response.mimetype == 'image/png'
+        etag = response.headers['ETag']
+
+        recomputes = cache.stats()['recomputes']
+        again = client.get('/api/maps/my.png?width=512', headers=headers)
+        assert again.data == response.data
+        assert cache.stats()['recomputes'] == recomputes
+
+        not_modified = client.get('/api/maps/my.png?width=512', headers={**headers, 'If-None-Match': etag})
+        assert not_modified.status_code == 304
+
+    def test_etag_changes_with_marks(self, client, auth_token, sample_country):
+        headers = {'Authorization': f'Bearer {auth_token}'}
+        before = client.get('/api/maps/my.svg', headers=headers)
+        assert before.mimetype == 'image/svg+xml'
+        client.post('/api/marked-countries/mark', headers=headers, json={
+            'country_id': sample_country.id,
+            'status': 'wishlist'
+        })
+        after = client.get('/api/maps/my.svg', headers=headers)
+        assert after.headers['ETag'] != before.headers['ETag']
+
+    def test_invalid_options(self, client, auth_token):
+        headers = {'Authorization': f'Bearer {auth_token}'}
+        assert client.get('/api/maps/my.png?width=333', headers=headers).status_code == 400
+        assert client.get('/api/maps/my.png?theme=neon', headers=headers).status_code == 400
+        assert client.get('/api/maps/my.png').status_code == 401
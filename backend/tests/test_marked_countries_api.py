@@ -1,3 +1,6 @@
+from app.extensions import db
+from app.models import MarkedCountry
+
 
 class TestMarkCountry:
     def test_mark_country_as_visited(self, client, auth_token, sample_country):
@@ -70,6 +73,66 @@ class TestMarkCountry:
         assert response.status_code == 401
 
 
+class TestMarkUpsert:
+    def mark(self, client, auth_token, country_id, status, **dates):
+        return client.post('/api/marked-countries/mark',
+            headers={'Authorization': f'Bearer {auth_token}'},
+            json={'country_id': country_id, 'status': status, **dates}
+        )
+
+    def test_remark_updates_in_place(self, client, auth_token, sample_country, sample_user):
+        first = self.mark(client, auth_token, sample_country.id, 'wishlist')
+        second = self.mark(client, auth_token, sample_country.id, 'visited', visit_start_date='2024-03-01')
+        assert first.status_code == 201
+        assert second.status_code == 200
+        created, updated = first.get_json()['marked_country'], second.get_json()['marked_country']
+        assert updated['id'] == created['id']
+        assert updated['created_at'] == created['created_at']
+        assert updated['status'] == 'visited'
+        assert updated['visit_start_date'] == '2024-03-01'
+        assert updated['country_code'] == 'US'
+        assert MarkedCountry.query.filter_by(user_id=sample_user.id).count() == 1
+
+    def test_upsert_is_one_statement(self, app, sample_user, sample_country):
+        from sqlalchemy import event
+        from app.services.marks_service import upsert_mark
+        user_id, country_id = sample_user.id, sample_country.id
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            _, created = upsert_mark(user_id, country_id, 'visited')
+            statements.clear()
+            _, created_again = upsert_mark(user_id, country_id, 'wishlist')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        assert (created, created_again) == (True, False)
+        # One statement for the mark; the rest update the user's bitsets and drop their timeline, by primary key
+        marks = [statement for statement in statements if 'marked_countries' in statement]
+        assert len(marks) == 1 and 'ON CONFLICT' in marks[0]
+        assert all(
+            'user_bitsets' in statement or 'user_timelines' in statement
+            for statement in statements if statement not in marks
+        )
+
+    def test_unknown_country_is_rejected_without_query(self, client, auth_token, sample_country):
+        self.mark(client, auth_token, sample_country.id, 'visited')
+        response = self.mark(client, auth_token, 999999, 'visited')
+        assert response.status_code == 404
+        assert self.mark(client, auth_token, 'abc', 'visited').status_code == 404
+        assert self.mark(client, auth_token, str(sample_country.id), 'visited').status_code == 200
+
+    def test_saved_mark_is_not_reported_as_failed(self, client, auth_token, sample_country, sample_user, monkeypatch):
+        from app.services import marks_service
+
+        def broken_invalidate(namespace):
+            raise RuntimeError('cache is down')
+
+        monkeypatch.setattr(marks_service.cache, 'invalidate', broken_invalidate)
+        assert self.mark(client, auth_token, sample_country.id, 'visited').status_code == 201
+        assert MarkedCountry.query.filter_by(user_id=sample_user.id).count() == 1
+
+
 class TestUnmarkCountry:
     def test_unmark_country(self, client, auth_token, sample_country, app):
         client.post('/api/marked-countries/mark',
@@ -0,0 +1,209 @@
+import types
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from app import migrations
+from app.extensions import db
+from app.migrations import MigrationContext, MigrationError, current_version, downgrade, ensure_schema, stamp, upgrade
+
+
+def make_migration(revision, upgrade_step, downgrade_step=None, transactional=True):
+    return types.SimpleNamespace(
+        revision=revision,
+        description=f'Migration {revision}',
+        transactional=transactional,
+        upgrade=upgrade_step,
+        downgrade=downgrade_step or (lambda ctx: None)
+    )
+
+
+def add_score(ctx):
+    ctx.add_column('items', 'score', 'INTEGER')
+
+
+def drop_score(ctx):
+    ctx.drop_column('items', 'score')
+
+
+def index_and_backfill(ctx):
+    ctx.create_index('ix_items_score', 'items', ['score'])
+    ctx.backfill('items', 'score = id * 2', where='score IS NULL', batch_size=3)
+
+
+def drop_score_index(ctx):
+    ctx.drop_index('ix_items_score')
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "migrations.db"}')
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE items (id INTEGER PRIMARY KEY, name VARCHAR(20))'))
+        connection.execute(text('INSERT INTO items (name) VALUES ' + ', '.join(f"('item{i}')" for i in range(10))))
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def versions(monkeypatch):
+    steps = [
+        make_migration(1, lambda ctx: None),
+        make_migration(2, add_score, drop_score),
+        make_migration(3, index_and_backfill, drop_score_index, transactional=False)
+    ]
+    monkeypatch.setattr(migrations, 'load_migrations', lambda: steps)
+    return steps
+
+
+class TestMigrations:
+    def test_real_migrations_are_ordered_and_reversible(self):
+        loaded = migrations.load_migrations()
+        assert [migration.revision for migration in loaded] == list(range(1, len(loaded) + 1))
+        for migration in loaded:
+            assert migration.description
+            assert callable(migration.upgrade) and callable(migration.downgrade)
+
+    def test_upgrade_records_versions(self, engine, versions):
+        assert current_version(engine) is None
+        assert upgrade(engine, echo=lambda message: None) == [1, 2, 3]
+        assert current_version(engine) == 3
+        assert upgrade(engine, echo=lambda message: None) == []
+
+        with engine.connect() as connection:
+            scores = connection.execute(text('SELECT id, score FROM items ORDER BY id')).all()
+        assert all(score == row_id * 2 for row_id, score in scores)
+        assert 'ix_items_score' in {index['name'] for index in inspect(engine).get_indexes('items')}
+
+    def test_upgrade_to_target_then_resume(self, engine, versions):
+        assert upgrade(engine, target=2, echo=lambda message: None) == [1, 2]
+        assert current_version(engine) == 2
+        assert upgrade(engine, echo=lambda message: None) == [3]
+
+    def test_downgrade_one_step_and_to_target(self, engine, versions):
+        upgrade(engine, echo=lambda message: None)
+        assert downgrade(engine, echo=lambda message: None) == [3]
+        assert 'ix_items_score' not in {index['name'] for index in inspect(engine).get_indexes('items')}
+        assert downgrade(engine, target=1, echo=lambda message: None) == [2]
+        assert current_version(engine) == 1
+        assert 'score' not in {column['name'] for column in inspect(engine).get_columns('items')}
+
+    def test_cannot_downgrade_baseline(self, engine, versions):
+        upgrade(engine, target=1, echo=lambda message: None)
+        with pytest.raises(MigrationError):
+            downgrade(engine, echo=lambda message: None)
+
+    def test_failed_transactional_migration_rolls_back(self, engine, versions):
+        def broken(ctx):
+            ctx.execute("INSERT INTO items (name) VALUES ('partial')")
+            raise RuntimeError('boom')
+        versions[1].upgrade = broken
+
+        with pytest.raises(RuntimeError):
+            upgrade(engine, echo=lambda message: None)
+        assert current_version(engine) == 1
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT COUNT(*) FROM items WHERE name = 'partial'")).scalar() == 0
+
+    def test_interrupted_online_migration_can_rerun(self, engine, versions):
+        calls = []
+
+        def flaky(ctx):
+            index_and_backfill(ctx)
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError('connection lost')
+        versions[2].upgrade = flaky
+
+        with pytest.raises(RuntimeError):
+            upgrade(engine, echo=lambda message: None)
+        assert current_version(engine) == 2
+        assert upgrade(engine, echo=lambda message: None) == [3]
+
+    def test_backfill_requires_online_migration(self, engine):
+        with engine.begin() as connection:
+            ctx = MigrationContext(engine, connection, transactional=True)
+            with pytest.raises(MigrationError):
+                ctx.backfill('items', 'name = name')
+
+    def test_backfill_reports_progress(self, engine):
+        messages = []
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            ctx = MigrationContext(engine, connection, transactional=False, echo=messages.append)
+            assert ctx.backfill('items', "name = 'renamed'", batch_size=4) == 10
+        assert len(messages) == 3
+        assert messages[-1].startswith('  items: 10/10 keys scanned')
+
+
+class TestEnsureSchema:
+    def test_fresh_database_is_created_at_head(self, app):
+        db.drop_all()
+        with db.engine.begin() as connection:
+            connection.execute(text(f'DROP TABLE IF EXISTS {migrations.MIGRATIONS_TABLE}'))
+
+        ensure_schema(app)
+        assert current_version(db.engine) == migrations.head_revision()
+        assert inspect(db.engine).has_table('marked_countries')
+
+    def test_legacy_database_is_stamped_as_baseline(self, app, monkeypatch):
+        # As left by the app before migrations: only the tables create_all() knew about then
+        with db.engine.begin() as connection:
+            connection.execute(text(f'DROP TABLE IF EXISTS {migrations.MIGRATIONS_TABLE}'))
+            for table in ('jobs', 'friendships', 'user_bitsets', 'region_countries', 'regions'):
+                connection.execute(text(f'DROP TABLE {table}'))
+        applied = []
+        monkeypatch.setattr(migrations, 'upgrade', lambda engine, **kwargs: applied.append(current_version(engine)))
+        monkeypatch.setattr(migrations, 'head_revision', lambda: 2)
+        app.config['MIGRATIONS_AUTO_UPGRADE'] = True
+
+        ensure_schema(app)
+        assert current_version(db.engine) == 1
+        assert applied == [1]
+        assert {'jobs', 'friendships', 'user_bitsets', 'regions'} <= set(inspect(db.engine).get_table_names())
+
+    def test_pending_migrations_wait_for_cli_without_auto_upgrade(self, app, monkeypatch):
+        stamp(db.engine, 1)
+        monkeypatch.setattr(migrations, 'upgrade', lambda engine, **kwargs: pytest.fail('should not upgrade'))
+        monkeypatch.setattr(migrations, 'head_revision', lambda: 2)
+        app.config['MIGRATIONS_AUTO_UPGRADE'] = False
+        ensure_schema(app)
+        assert current_version(db.engine) == 1
+
+
+class TestMigrationCommands:
+    def test_current_and_history(self, app, runner):
+        stamp(db.engine, migrations.head_revision())
+        result = runner.invoke(args=['db', 'current'])
+        assert f'Current: {migrations.head_revision()}' in result.output
+        result = runner.invoke(args=['db', 'history'])
+        assert '* 0001 Baseline schema' in result.output
+
+    def test_upgrade_is_noop_at_head(self, app, runner):
+        stamp(db.engine, migrations.head_revision())
+        result = runner.invoke(args=['db', 'upgrade'])
+        assert 'Already up to date' in result.output
+
+    def test_downgrade_baseline_fails(self, app, runner):
+        stamp(db.engine, 1)
+        result = runner.invoke(args=['db', 'downgrade', '--to', '0'])
+        assert result.exit_code != 0
+        assert 'baseline' in result.output
+
+
+class TestMarkedCountryIndexMigration:
+    def indexes(self):
+        return {index['name'] for index in inspect(db.engine).get_indexes('marked_countries')}
+
+    def test_upgrade_and_downgrade(self, app):
+        # Start from the pre-migration layout
+        with db.engine.begin() as connection:
+            connection.execute(text('DROP INDEX ix_marked_countries_user_status'))
+            connection.execute(text('DROP INDEX ix_marked_countries_user_updated'))
+            connection.execute(text('CREATE INDEX ix_marked_countries_user_id ON marked_countries (user_id)'))
+        stamp(db.engine, 1)
+
+        upgrade(db.engine, target=2, echo=lambda message: None)
+        assert {'ix_marked_countries_user_status', 'ix_marked_countries_user_updated'} <= self.indexes()
+        assert 'ix_marked_countries_user_id' not in self.indexes()
+
+        downgrade(db.engine, target=1, echo=lambda message: None)
+        assert 'ix_marked_countries_user_id' in self.indexes()
+        assert not {'ix_marked_countries_user_status', 'ix_marked_countries_user_updated'} & self.indexes()
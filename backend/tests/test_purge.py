@@ -0,0 +1,163 @@
+import pytest
+from app.extensions import db, events
+from app.models import Friendship, Job, MarkedCountry, User, UserBitset, UserTimeline
+from app.services import purge_service
+from app.services.job_service import claim_next, run_job, work
+from app.services.marks_service import rebuild_all_bitsets
+from app.services.timeline_service import refresh_user_timeline
+from app.utils.auth import generate_token
+
+
+@pytest.fixture
+def queued(app):
+    app.config['JOBS_EAGER'] = False
+    app.config['JOBS_RETRY_BASE_SECONDS'] = 0
+    return app
+
+
+@pytest.fixture
+def owner(app, bulk_data):
+    # A user with 20 marks, bitsets, a timeline, friends on both sides of the friendship and an old job
+    user_ids = bulk_data.users(4)
+    bulk_data.marks(user_ids, per_user=20)
+    bulk_data.friendships(user_ids, per_user=3)
+    rebuild_all_bitsets()
+    refresh_user_timeline(user_ids[0])
+    db.session.add(Job(type='export_marks', user_id=user_ids[0], status='succeeded'))
+    db.session.commit()
+    return user_ids[0]
+
+
+def headers(user_id):
+    return {'Authorization': f'Bearer {generate_token(user_id)}'}
+
+
+def remaining(user_id):
+    return {
+        'marks': MarkedCountry.query.filter_by(user_id=user_id).count(),
+        'bitsets': UserBitset.query.filter_by(user_id=user_id).count(),
+        'timelines': UserTimeline.query.filter_by(user_id=user_id).count(),
+        'friendships': Friendship.query.filter(db.or_(Friendship.user_id == user_id, Friendship.friend_id == user_id)).count()
+    }
+
+
+class TestOwnedTables:
+    def test_discovered_from_the_schema(self, app):
+        owned = {table.name: [column.name for column in columns] for table, columns in purge_service.owned_tables(db.metadata)}
+        assert owned == {
+            'marked_countries': ['user_id'],
+            'user_bitsets': ['user_id'],
+            'user_timelines': ['user_id'],
+            'friendships': ['user_id', 'friend_id'],
+            'jobs': ['user_id'],
+            'user_shards': ['user_id']
+        }
+
+    def test_deletion_order(self, app):
+        names = [table.name for table, _ in purge_service.owned_tables(db.metadata)]
+        assert set(names[:3]) == {'marked_countries', 'user_bitsets', 'user_timelines'}
+        assert names[-1] == 'user_shards'
+
+
+@pytest.mark.app_config(PURGE_BATCH_SIZE=3)
+class TestPurge:
+    def test_deletion_request_locks_the_account_out(self, queued, client, owner):
+        subscription = events.subscribe(owner)
+        response = client.delete('/api/auth/users/me', headers=headers(owner))
+        assert response.status_code == 202
+
+        assert client.get('/api/auth/me', headers=headers(owner)).status_code == 401
+        assert [event[1] for event in subscription.wait(0)] == ['account_deleted']
+        # Repeating the request returns the pending job
+        again = client.delete('/api/auth/users/me', headers=headers(owner))
+        assert again.get_json()['job']['id'] == response.get_json()['job']['id']
+        subscription.close()
+
+    def test_purge_in_batches(self, queued, client, owner):
+        job_id = client.delete('/api/auth/users/me', headers=headers(owner)).get_json()['job']['id']
+        work(once=True)
+        db.session.expunge_all()
+
+        job = db.session.get(Job, job_id)
+        assert job.status == 'succeeded'
+        assert job.result['done'] is True
+        assert job.result['deleted_marks'] == 20
+        assert 'users' not in job.result['deleted']
+        # Only a scrubbed row is left of the user
+        user = db.session.get(User, owner)
+        assert (user.email, user.name, user.google_id) == (f'deleted-{owner}', None, None)
+        assert user.purged_at is not None
+        assert remaining(owner) == {'marks': 0, 'bitsets': 0, 'timelines': 0, 'friendships': 0}
+        # The user's other jobs go, the deletion job stays as the record of the purge
+        assert [job.id for job in Job.query.filter_by(user_id=owner)] == [job_id]
+        # The account_deleted event went with the rest of the event history
+        assert queued.extensions['events'].log.latest_id(owner) == 0
+
+    def test_other_users_are_untouched(self, queued, client, owner):
+        others = MarkedCountry.query.filter(MarkedCountry.user_id != owner).count()
+        client.delete('/api/auth/users/me', headers=headers(owner))
+        work(once=True)
+        assert MarkedCountry.query.count() == others
+
+    def test_resumes_after_a_crash(self, queued, client, owner, monkeypatch):
+        delete_batch = purge_service._delete_batch
+        calls = []
+
+        def crashing_delete_batch(table, condition, batch_size):
+            if table.name == 'marked_countries':
+                calls.append(table.name)
+                if len(calls) == 3:
+                    raise RuntimeError('worker died')
+            return delete_batch(table, condition, batch_size)
+
+        monkeypatch.setattr(purge_service, '_delete_batch', crashing_delete_batch)
+        job_id = client.delete('/api/auth/users/me', headers=headers(owner)).get_json()['job']['id']
+        run_job(claim_next('worker-a'))
+        db.session.expunge_all()
+
+        job = db.session.get(Job, job_id)
+        assert job.status == 'queued'
+        # The two committed batches are kept, with their progress
+        assert job.result['done'] is False
+        assert job.result['deleted']['marked_countries'] == 6
+        assert MarkedCountry.query.filter_by(user_id=owner).count() == 14
+
+        run_job(claim_next('worker-b'))
+        job = db.session.get(Job, job_id)
+        assert job.status == 'succeeded'
+        assert job.result['deleted']['marked_countries'] == 20
+        assert db.session.get(User, owner).purged_at is not None
+
+    def test_purged_ids_are_not_reused(self, queued, client, owner):
+        token_headers = headers(owner)
+        client.delete('/api/auth/users/me', headers=token_headers)
+        work(once=True)
+        newcomer = User(email='newcomer@example.com', name='Newcomer')
+        db.session.add(newcomer)
+        db.session.commit()
+        assert newcomer.id > owner
+        assert client.get('/api/auth/me', headers=token_headers).status_code == 401
+        # Nor does a repeated DELETE queue another purge
+        assert client.delete('/api/auth/users/me', headers=token_headers).status_code == 401
+        assert Job.query.filter_by(type='delete_account').count() == 1
+
+
+class TestCommands:
+    def test_sweep_from_file(self, queued, runner, bulk_data, tmp_path):
+        user_ids = bulk_data.users(3)
+        id_file = tmp_path / 'ids.txt'
+        id_file.write_text(f'{user_ids[0]}\n{user_ids[1]}\n999999\n')
+
+        result = runner.invoke(args=['purge', 'users', '--file', str(id_file), str(user_ids[1])])
+        assert result.exit_code == 0, result.output
+        assert 'User 999999 not found' in result.output
+        assert Job.query.filter_by(type='delete_account').count() == 2
+
+        result = runner.invoke(args=['purge', 'status'])
+        assert 'Accounts waiting for their purge: 2' in result.output
+
+        work(once=True)
+        assert User.query.filter(User.id.in_(user_ids), User.purged_at.is_(None)).count() == 1
+        result = runner.invoke(args=['purge', 'users', str(user_ids[0])])
+        assert f'User {user_ids[0]} was already purged' in result.output
+        assert 'Accounts waiting for their purge: 0' in runner.invoke(args=['purge', 'status']).output
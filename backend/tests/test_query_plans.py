@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+import pytest
+from flask import current_app
+from sqlalchemy import event, inspect, text
+from app.extensions import db
+from app.models import Country, MarkedCountry, User
+from app.services.marks_service import compute_user_bitsets
+from app.utils.auth import generate_token
+
+
+@pytest.fixture
+def marks(app):
+    # A few users with many marks each, so a table scan would be a real regression
+    country_ids = db.session.execute(db.select(Country.id).order_by(Country.id)).scalars().all()
+    users = [User(email=f'plan{i}@example.com', name=f'Plan {i}') for i in range(5)]
+    db.session.add_all(users)
+    db.session.commit()
+    start = datetime(2024, 1, 1)
+    db.session.add_all(
+        MarkedCountry(
+            user_id=user.id, country_id=country_id, status='visited' if i % 3 else 'wishlist',
+            updated_at=start + timedelta(minutes=i)
+        )
+        for user in users for i, country_id in enumerate(country_ids)
+    )
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    return users
+
+
+def query_plans(call):
+    """EXPLAIN QUERY PLAN of every marked_countries query `call` runs, as one string per query."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if 'marked_countries' in statement and not statement.startswith('EXPLAIN'):
+            statements.append((statement, parameters))
+
+    # Reads may run on the read-only SQLite pool instead of the default engine
+    engines = [db.engine] + [engine for engine in [current_app.extensions.get('sqlite_read_engine')] if engine is not None]
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        call()
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', capture)
+
+    assert statements
+    plans = []
+    for statement, parameters in statements:
+        rows = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+        plans.append(' | '.join(row[-1] for row in rows))
+    return plans
+
+
+def assert_uses(call, index):
+    for plan in query_plans(call):
+        assert 'SCAN marked_countries' not in plan, plan
+        assert f'INDEX {index}' in plan, plan
+
+
+class TestMarkedCountryIndexes:
+    def test_declared_indexes(self, app):
+        indexes = {index['name']: index['column_names'] for index in inspect(db.engine).get_indexes('marked_countries')}
+        assert indexes['ix_marked_countries_user_status'] == ['user_id', 'status', 'country_id']
+        assert indexes['ix_marked_countries_user_updated'] == ['user_id', 'updated_at']
+        # Redundant with the (user_id, country_id) unique constraint
+        assert 'ix_marked_countries_user_id' not in indexes
+
+
+class TestMarkedCountryQueryPlans:
+    def test_marked_rows_by_status(self, marks):
+        assert_uses(lambda: MarkedCountry.get_user_marked_rows(marks[0].id, 'visited'), 'ix_marked_countries_user_status')
+
+    def test_marked_rows_all(self, marks):
+        for plan in query_plans(lambda: MarkedCountry.get_user_marked_rows(marks[0].id)):
+            assert 'SEARCH marked_countries USING' in plan, plan
+
+    def test_marked_countries_by_status(self, marks):
+        assert_uses(lambda: MarkedCountry.get_user_marked_countries(marks[0].id, 'wishlist'), 'ix_marked_countries_user_status')
+
+    def test_by_user_and_country(self, marks, sample_country):
+        assert_uses(
+            lambda: MarkedCountry.get_by_user_and_country(marks[0].id, sample_country.id),
+            'sqlite_autoindex_marked_countries_1'
+        )
+
+    def test_changed_rows(self, marks):
+        for after in (None, (datetime(2024, 1, 1, 1), 0)):
+            plans = query_plans(lambda: MarkedCountry.get_user_changed_rows(marks[0].id, after=after))
+            for plan in plans:
+                assert 'INDEX ix_marked_countries_user_updated' in plan, plan
+                # Rows come out of the index already ordered
+                assert 'TEMP B-TREE' not in plan, plan
+
+    def test_bitsets_are_index_only(self, marks):
+        assert_uses(lambda: compute_user_bitsets(marks[0].id), 'ix_marked_countries_user_status')
+        assert 'COVERING INDEX ix_marked_countries_user_status' in query_plans(lambda: compute_user_bitsets(marks[0].id))[0]
+
+
+class TestMarkChanges:
+    def test_pages_through_changes(self, client, marks):
+        headers = {'Authorization': f'Bearer {generate_token(marks[0].id)}'}
+        seen, cursor = [], None
+        while True:
+            response = client.get('/api/marked-countries/my/changes', headers=headers, query_string={'limit': 50, 'cursor': cursor} if cursor else {'limit': 50})
+            assert response.status_code == 200
+            data = response.get_json()
+            seen.extend(mark['id'] for mark in data['marked_countries'])
+            cursor = data['cursor']
+            if not data['has_more']:
+                break
+        expected = db.session.execute(
+            db.select(MarkedCountry.id).where(MarkedCountry.user_id == marks[0].id).order_by(MarkedCountry.updated_at)
+        ).scalars().all()
+        assert seen == expected
+
+    def test_invalid_cursor(self, client, marks):
+        headers = {'Authorization': f'Bearer {generate_token(marks[0].id)}'}
+        response = client.get('/api/marked-countries/my/changes?cursor=garbage', headers=headers)
+        assert response.status_code == 400
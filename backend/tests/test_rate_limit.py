@@ -0,0 +1,81 @@
+import pytest
+from app.utils.rate_limit import MemoryBucketStore, SQLiteBucketStore, parse_limit
+
+
+class TestParseLimit:
+    def test_parse_limit(self):
+        assert parse_limit('60/minute') == (60, 1.0)
+        assert parse_limit('10/second') == (10, 10.0)
+
+
+class TestBucketStores:
+    def test_memory_bucket_refills(self):
+        store = MemoryBucketStore()
+        assert store.take('key', 2, 1.0, now=0)[0] is True
+        assert store.take('key', 2, 1.0, now=0)[0] is True
+        assert store.take('key', 2, 1.0, now=0)[0] is False
+        assert store.take('key', 2, 1.0, now=1.0)[0] is True
+
+    def test_memory_prunes_full_buckets(self):
+        store = MemoryBucketStore()
+        store.take('key', 2, 1.0, now=0)
+        store._prune(now=10)
+        assert store._buckets == {}
+
+    def test_sqlite_bucket_shared_between_workers(self, tmp_path):
+        path = str(tmp_path / 'limits.db')
+        worker_a = SQLiteBucketStore(path)
+        worker_b = SQLiteBucketStore(path)
+        assert worker_a.take('key', 1, 0.1, now=100)[0] is True
+        assert worker_b.take('key', 1, 0.1, now=100)[0] is False
+        assert worker_b.take('key', 1, 0.1, now=110)[0] is True
+
+    def test_sqlite_prunes_full_buckets(self, tmp_path):
+        store = SQLiteBucketStore(str(tmp_path / 'limits.db'))
+        store.take('slow', 2, 0.1, now=0)
+        store.take('fast', 2, 1.0, now=0)
+        store._prune(now=5)
+        keys = [row[0] for row in store._connection().execute('SELECT key FROM rate_limit_buckets')]
+        assert keys == ['slow']
+
+
+class TestRateLimitedEndpoints:
+    def test_returns_429_with_retry_after(self, app, client):
+        app.config['RATE_LIMITS'] = {'countries': '2/minute'}
+        assert client.get('/api/countries').status_code == 200
+        response = client.get('/api/countries')
+        assert response.status_code == 200
+        assert response.headers['X-RateLimit-Limit'] == '2'
+        assert response.headers['X-RateLimit-Remaining'] == '0'
+
+        response = client.get('/api/countries')
+        assert response.status_code == 429
+        assert int(response.headers['Retry-After']) == 30
+        assert 'error' in response.get_json()
+
+    def test_limits_are_per_user(self, app, client, auth_token, sample_country):
+        app.config['RATE_LIMITS'] = {'marked_countries': '1/minute'}
+        headers = {'Authorization': f'Bearer {auth_token}'}
+        assert client.get('/api/marked-countries/my', headers=headers).status_code == 200
+        assert client.get('/api/marked-countries/my', headers=headers).status_code == 429
+        # Anonymous clients get their own bucket, keyed by IP
+        assert client.get('/api/marked-countries/my').status_code == 401
+
+    @pytest.mark.app_config(PROXY_FIX_HOPS=1, RATE_LIMITS={'countries': '1/minute'})
+    def test_anonymous_clients_behind_a_proxy(self, client):
+        # Both requests come from the proxy, on behalf of two different clients
+        first = {'X-Forwarded-For': '203.0.113.1'}
+        assert client.get('/api/countries', headers=first).status_code == 200
+        assert client.get('/api/countries', headers={'X-Forwarded-For': '203.0.113.2'}).status_code == 200
+        assert client.get('/api/countries', headers=first).status_code == 429
+
+    def test_disabled(self, app, client):
+        app.config['RATE_LIMITS'] = {'countries': '1/minute'}
+        app.config['RATE_LIMIT_ENABLED'] = False
+        for _ in range(3):
+            assert client.get('/api/countries').status_code == 200
+
+    def test_health_is_not_limited(self, app, client):
+        app.config['RATE_LIMIT_DEFAULT'] = '1/minute'
+        for _ in range(3):
+            assert client.get('/health').status_code == 200
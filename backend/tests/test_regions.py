@@ -0,0 +1,66 @@
+from app.models import Region
+from app.services.bitset_service import to_bitset
+from app.services.country_service import COUNTRIES_DATA, REGIONS_DATA, import_regions
+from app.services.region_service import find_region, get_region_tree
+
+
+class TestRegionTree:
+    def test_every_country_in_exactly_one_subregion(self):
+        codes = [code for region in REGIONS_DATA for code in region['countries']]
+        assert sorted(codes) == sorted(country['code'] for country in COUNTRIES_DATA)
+
+    def test_subregions_match_country_continents(self):
+        continents = {country['code']: country['continent'] for country in COUNTRIES_DATA}
+        for region in REGIONS_DATA:
+            assert {continents[code] for code in region['countries']} == {region['continent']}
+
+    def test_rollup(self):
+        tree = get_region_tree()
+        assert tree.total == len(COUNTRIES_DATA)
+
+        rollup = find_region('Southern Europe').rollup(to_bitset(['IT', 'ES', 'FR']), to_bitset(['GR']))
+        assert rollup['visited'] == 2
+        assert rollup['wishlist'] == 1
+        assert rollup['total'] == 16
+
+    def test_find_region_by_level(self):
+        assert find_region('South America', 'continent').level == 'continent'
+        assert find_region('South America', 'subregion').level == 'subregion'
+        assert find_region('Atlantis') is None
+
+
+class TestRegionSeed:
+    def test_regions_seeded_with_countries(self, app):
+        southern_europe = Region.query.filter_by(name='Southern Europe').first()
+        assert southern_europe.parent.name == 'Europe'
+        assert 'IT' in {country.code for country in southern_europe.countries}
+        assert Region.query.count() == 6 + len(REGIONS_DATA)
+
+    def test_import_is_idempotent(self, app):
+        assert import_regions()['imported'] == 0
+
+
+class TestRegionEndpoints:
+    def test_regions_tree(self, client):
+        response = client.get('/api/countries/regions')
+        assert response.status_code == 200
+        europe = next(child for child in response.json['children'] if child['name'] == 'Europe')
+        assert europe['total'] == 45
+        assert 'IT' in next(child for child in europe['children'] if child['name'] == 'Southern Europe')['countries']
+
+    def test_countries_by_subregion(self, client):
+        response = client.get('/api/countries?subregion=Northern America')
+        assert sorted(country['code'] for country in response.json) == ['CA', 'US']
+        assert client.get('/api/countries?subregion=Atlantis').status_code == 400
+
+    def test_my_region_statistics(self, client, auth_token, sample_country):
+        headers = {'Authorization': f'Bearer {auth_token}'}
+        client.post('/api/marked-countries/mark', headers=headers, json={'country_id': sample_country.id, 'status': 'visited'})
+
+        response = client.get('/api/statistics/my/regions?subregion=Northern America', headers=headers)
+        assert response.status_code == 200
+        assert response.json == {'name': 'Northern America', 'level': 'subregion', 'total': 2, 'visited': 1, 'wishlist': 0}
+
+        world = client.get('/api/statistics/my/regions', headers=headers).json
+        assert world['visited'] == 1
+        assert client.get('/api/statistics/my/regions?continent=Atlantis', headers=headers).status_code == 404
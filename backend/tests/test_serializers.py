@@ -0,0 +1,56 @@
+from datetime import date, datetime
+from flask.json.provider import DefaultJSONProvider
+from app.extensions import db
+from app.models import Country, MarkedCountry
+from app.utils.json_provider import OrjsonProvider, get_json_provider_class
+
+
+class TestRowSerializers:
+    def test_country_rows_match_to_dict(self, app):
+        rows = Country.list_rows(continent='Europe')
+        countries = Country.query.filter_by(continent='Europe').all()
+        assert len(rows) == len(countries) > 0
+        assert [Country.row_to_dict(row) for row in rows] == [c.to_dict() for c in countries]
+
+    def test_country_rows_search(self, app):
+        rows = Country.list_rows(search='united')
+        names = {Country.row_to_dict(row)['name'] for row in rows}
+        assert 'United States' in names
+        assert all('united' in name.lower() for name in names)
+
+    def test_marked_country_rows_match_to_dict(self, app, sample_user, sample_country):
+        mark = MarkedCountry(
+            user_id=sample_user.id,
+            country_id=sample_country.id,
+            status='visited',
+            visit_start_date=date(2024, 1, 1),
+            visit_end_date=date(2024, 1, 10)
+        )
+        db.session.add(mark)
+        db.session.commit()
+
+        rows = MarkedCountry.get_user_marked_rows(sample_user.id)
+        assert [MarkedCountry.row_to_dict(row) for row in rows] == [mark.to_dict()]
+        assert MarkedCountry.get_user_marked_rows(sample_user.id, 'wishlist') == []
+
+
+class TestJsonProvider:
+    def test_provider_selection(self):
+        assert get_json_provider_class('orjson') is OrjsonProvider
+        assert get_json_provider_class('default') is DefaultJSONProvider
+        assert get_json_provider_class(None) is DefaultJSONProvider
+
+    def test_app_uses_configured_provider(self, app):
+        assert isinstance(app.json, OrjsonProvider)
+
+    def test_orjson_matches_default_output(self, app):
+        payload = {'b': 1, 'a': ['ção', None, 2.5], 'day': date(2024, 1, 2), 'when': datetime(2024, 1, 2, 3, 4, 5)}
+        fast = OrjsonProvider(app)
+        default = DefaultJSONProvider(app)
+        assert fast.loads(fast.dumps(payload)) == default.loads(default.dumps(payload))
+        assert list(fast.loads(fast.dumps(payload))) == ['a', 'b', 'day', 'when']
+
+    def test_orjson_response(self, app):
+        response = OrjsonProvider(app).response({1: 'one'})
+        assert response.mimetype == 'application/json'
+        assert response.get_json() == {'1': 'one'}
@@ -0,0 +1,197 @@
+import json
+import sqlite3
+from contextlib import closing
+import pytest
+from sqlalchemy.schema import CreateTable
+from app import create_app
+from app.extensions import db, shards
+from app.models import Country, Friendship, Job, MarkedCountry, User, UserShard
+from app.services import shard_service
+from app.services.friends_service import similar_travelers
+from app.services.job_service import enqueue
+from app.services.marks_service import iter_all_marks, top_travelers
+from app.services.timeline_service import compute_all_timelines
+from app.utils.auth import generate_token
+from app.utils.sharding import ShardingError, shard_metadata
+from tests.conftest import copy_database, sqlite_uri
+
+
+@pytest.fixture
+def app(template_database, tmp_path):
+    # The main database plus two shard files: three shards in total
+    database = tmp_path / 'test.db'
+    copy_database(template_database, database)
+    test_app = create_app('TestingConfig', {
+        'SQLALCHEMY_DATABASE_URI': sqlite_uri(database),
+        'SHARD_URLS': [sqlite_uri(tmp_path / 'shard1.db'), sqlite_uri(tmp_path / 'shard2.db')],
+        'SHARD_MOVE_GRACE_SECONDS': 0
+    })
+    with test_app.app_context():
+        db.session.expire_on_commit = False
+        yield test_app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def shard_rows(tmp_path, name, sql):
+    with closing(sqlite3.connect(tmp_path / f'{name}.db')) as connection:
+        return connection.execute(sql).fetchall()
+
+
+def new_user(index):
+    user = User(email=f'user{index}@example.com', name=f'User {index}')
+    db.session.add(user)
+    db.session.commit()
+    shards.assign(user.id)
+    return user
+
+
+def headers(user):
+    return {'Authorization': f'Bearer {generate_token(user.id)}'}
+
+
+@pytest.fixture
+def users(app):
+    return [new_user(index) for index in range(3)]
+
+
+@pytest.fixture
+def country_ids(app):
+    return [country.id for country in Country.query.order_by(Country.id).limit(5)]
+
+
+def mark(client, user, country_id, status='visited'):
+    return client.post('/api/marked-countries/mark', headers=headers(user), json={'country_id': country_id, 'status': status})
+
+
+class TestShardMap:
+    def test_new_users_go_to_the_least_loaded_shard(self, users):
+        assert [shards.shard_for(user.id) for user in users] == ['default', 'shard1', 'shard2']
+        assert shard_service.shard_loads() == {'default': 1, 'shard1': 1, 'shard2': 1}
+
+    def test_unmapped_users_are_on_default(self, app):
+        user = User(email='legacy@example.com', name='Legacy')
+        db.session.add(user)
+        db.session.commit()
+        assert shards.lookup(user.id) == ('default', 'active')
+
+    def test_countries_are_replicated(self, app, tmp_path):
+        count = Country.query.count()
+        assert count > 0
+        for name in ('shard1', 'shard2'):
+            assert shard_rows(tmp_path, name, 'SELECT COUNT(*) FROM countries')[0][0] == count
+        assert shards.sync_countries() == 0
+
+    def test_shard_schema_has_no_foreign_keys_to_users(self, app):
+        metadata = shard_metadata(db.metadata)
+        assert 'users' not in metadata.tables
+        ddl = str(CreateTable(metadata.tables['marked_countries']))
+        assert 'users' not in ddl and 'countries' in ddl
+
+    def test_unscoped_query_on_sharded_table_is_refused(self, users):
+        with pytest.raises(ShardingError):
+            MarkedCountry.query.count()
+        # Directory tables need no scope
+        assert User.query.count() == 3
+
+
+class TestRouting:
+    def test_marks_land_on_the_users_shard(self, client, users, country_ids, tmp_path):
+        for user in users:
+            assert mark(client, user, country_ids[0]).status_code == 201
+        assert shard_rows(tmp_path, 'shard1', 'SELECT user_id FROM marked_countries') == [(users[1].id,)]
+        assert shard_rows(tmp_path, 'shard2', 'SELECT user_id FROM marked_countries') == [(users[2].id,)]
+
+        response = client.get('/api/marked-countries/my', headers=headers(users[2]))
+        assert [entry['country_id'] for entry in response.get_json()] == [country_ids[0]]
+
+    def test_friend_comparison_across_shards(self, client, users, country_ids):
+        mark(client, users[0], country_ids[0])
+        mark(client, users[1], country_ids[0])
+        mark(client, users[1], country_ids[1])
+        db.session.add(Friendship(user_id=users[0].id, friend_id=users[1].id, status='accepted'))
+        db.session.commit()
+
+        response = client.get(f'/api/friends/compare?user_ids={users[1].id}', headers=headers(users[0]))
+        assert response.status_code == 200
+        assert len(response.get_json()['visited_by_all']) == 1
+
+    def test_scatter_gather_queries(self, client, users, country_ids):
+        for index, user in enumerate(users):
+            for country_id in country_ids[:index + 1]:
+                mark(client, user, country_id)
+
+        with shards.user_scope(users[2].id):
+            ranked = similar_travelers(users[2].id, [user.id for user in users])
+        assert [entry['user']['id'] for entry in ranked] == [users[1].id, users[0].id]
+        assert top_travelers(2) == [(users[2].id, 3), (users[1].id, 2)]
+        assert len(list(iter_all_marks(batch_size=2))) == 6
+        assert compute_all_timelines()['visited'] == 6
+
+    def test_delete_account_clears_the_shard(self, client, users, country_ids, tmp_path):
+        mark(client, users[1], country_ids[0])
+        enqueue('delete_account', user_id=users[1].id)
+        assert shard_rows(tmp_path, 'shard1', 'SELECT COUNT(*) FROM marked_countries') == [(0,)]
+        assert db.session.get(UserShard, users[1].id) is None
+
+
+class TestMoves:
+    def test_move_user(self, app, client, users, country_ids, tmp_path):
+        for country_id in country_ids[:3]:
+            mark(client, users[1], country_id)
+
+        copied = shard_service.move_user(users[1].id, 'shard2')
+        assert copied['marked_countries'] == 3
+        assert shards.lookup(users[1].id) == ('shard2', 'active')
+        assert shard_rows(tmp_path, 'shard1', 'SELECT COUNT(*) FROM marked_countries') == [(0,)]
+        response = client.get('/api/marked-countries/my', headers=headers(users[1]))
+        assert len(response.get_json()) == 3
+        assert shard_service.move_user(users[1].id, 'shard2') == {}
+
+    def test_writes_wait_while_moving(self, client, users, country_ids):
+        UserShard.query.filter_by(user_id=users[1].id).update({'state': 'moving'})
+        db.session.commit()
+
+        response = mark(client, users[1], country_ids[0])
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert client.get('/api/marked-countries/my', headers=headers(users[1])).status_code == 200
+
+        job = enqueue('recompute_stats', user_id=users[1].id)
+        assert db.session.get(Job, job.id).status == 'queued'
+        assert 'being moved' in job.error
+
+    def test_unknown_shard(self, users):
+        with pytest.raises(ShardingError):
+            shard_service.move_user(users[0].id, 'shard9')
+
+    def test_rebalance(self, app, runner, users, country_ids):
+        # Everyone on shard1: two of the three users move out, one to each other shard
+        for user in users:
+            UserShard.query.filter_by(user_id=user.id).update({'shard': 'shard1'})
+        db.session.commit()
+
+        plan = shard_service.plan_rebalance()
+        assert sorted(target for _, _, target in plan) == ['default', 'shard2']
+        assert len(shard_service.plan_rebalance(max_moves=1)) == 1
+
+        result = runner.invoke(args=['shards', 'rebalance'])
+        assert result.exit_code == 0, result.output
+        assert shard_service.shard_loads() == {'default': 1, 'shard1': 1, 'shard2': 1}
+        assert shard_service.plan_rebalance() == []
+
+
+class TestCommands:
+    def test_status_and_export(self, runner, client, users, country_ids, tmp_path):
+        mark(client, users[0], country_ids[0])
+        mark(client, users[2], country_ids[1])
+
+        result = runner.invoke(args=['shards', 'status'])
+        assert 'shard2: 1 users (' in result.output
+
+        output = tmp_path / 'marks.jsonl'
+        result = runner.invoke(args=['marks', 'export-all', '--output', str(output)])
+        assert result.exit_code == 0, result.output
+        exported = [json.loads(line) for line in open(output)]
+        assert sorted(entry['user_id'] for entry in exported) == [users[0].id, users[2].id]
@@ -0,0 +1,114 @@
+import time
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from app.config import Config
+from app.extensions import db
+from app.models import Country
+from app.utils.sqlite_tuning import SQLiteMaintenance, configure_sqlite, read_bind, run_maintenance, sqlite_file_path
+
+
+@pytest.fixture
+def tuned(tmp_path):
+    app = Flask(__name__)
+    app.config.update({
+        'SQLITE_TUNED': True,
+        'SQLITE_PRAGMAS': Config.SQLITE_PRAGMAS,
+        'SQLITE_READ_POOL_SIZE': 2,
+        'SQLITE_MAINTENANCE_INTERVAL': 0
+    })
+    engine = create_engine(f'sqlite:///{tmp_path / "tuned.db"}')
+    configure_sqlite(app, engine)
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)'))
+    yield app, engine
+    engine.dispose()
+    app.extensions['sqlite_read_engine'].dispose()
+
+
+def pragma(connection, name):
+    return connection.execute(text(f'PRAGMA {name}')).scalar()
+
+
+class TestSQLiteProfile:
+    def test_file_paths(self):
+        assert sqlite_file_path('sqlite:///data/app.db') == 'data/app.db'
+        assert sqlite_file_path('sqlite:////srv/app.db') == '/srv/app.db'
+        assert sqlite_file_path('sqlite:///file:/srv/app.db?mode=ro&uri=true') == '/srv/app.db'
+        assert sqlite_file_path('sqlite://') is None
+        assert sqlite_file_path('sqlite:///:memory:') is None
+        assert sqlite_file_path('postgresql://localhost/tmt') is None
+
+    def test_pragmas_on_every_connection(self, tuned):
+        _, engine = tuned
+        with engine.connect() as first, engine.connect() as second:
+            for connection in (first, second):
+                assert pragma(connection, 'journal_mode') == 'wal'
+                assert pragma(connection, 'synchronous') == 1
+                assert pragma(connection, 'busy_timeout') == 5000
+                assert pragma(connection, 'cache_size') == -65536
+
+    def test_read_pool_is_read_only(self, tuned):
+        app, engine = tuned
+        with engine.begin() as connection:
+            connection.execute(text("INSERT INTO items (name) VALUES ('a')"))
+        with app.app_context():
+            read_engine = read_bind()['bind']
+        with read_engine.connect() as connection:
+            assert pragma(connection, 'query_only') == 1
+            assert connection.execute(text('SELECT name FROM items')).scalars().all() == ['a']
+            with pytest.raises(OperationalError):
+                connection.execute(text("INSERT INTO items (name) VALUES ('b')"))
+
+    def test_reader_not_blocked_by_open_write(self, tuned):
+        app, engine = tuned
+        read_engine = app.extensions['sqlite_read_engine']
+        with engine.connect() as writer:
+            writer.execute(text('BEGIN IMMEDIATE'))
+            writer.execute(text("INSERT INTO items (name) VALUES ('pending')"))
+            started = time.perf_counter()
+            with read_engine.connect() as reader:
+                assert reader.execute(text('SELECT COUNT(*) FROM items')).scalar() == 0
+            assert time.perf_counter() - started < 1
+            writer.execute(text('COMMIT'))
+
+    def test_memory_database_is_untouched(self):
+        app = Flask(__name__)
+        app.config.update({'SQLITE_TUNED': True, 'SQLITE_PRAGMAS': Config.SQLITE_PRAGMAS, 'SQLITE_READ_POOL_SIZE': 2})
+        engine = create_engine('sqlite://')
+        configure_sqlite(app, engine)
+        assert 'sqlite_read_engine' not in app.extensions
+        with app.app_context():
+            assert read_bind() is None
+
+    def test_maintenance(self, tuned):
+        app, engine = tuned
+        with engine.begin() as connection:
+            connection.execute(text("INSERT INTO items (name) VALUES ('a')"))
+        busy, frames, checkpointed = run_maintenance(engine, checkpoint='TRUNCATE')
+        assert busy == 0
+        assert checkpointed == frames
+
+        maintenance = SQLiteMaintenance(app, engine, interval=0.01)
+        maintenance.start()
+        deadline = time.monotonic() + 5
+        while maintenance.runs == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        maintenance.stop()
+        assert maintenance.runs > 0
+
+
+class TestAppProfile:
+    def test_app_reads_use_read_pool(self, app):
+        if 'sqlite_read_engine' not in app.extensions:
+            pytest.skip('test database is not a SQLite file')
+        assert read_bind()['bind'] is app.extensions['sqlite_read_engine']
+        assert len(Country.list_rows()) == Country.query.count()
+
+    def test_optimize_command(self, app, runner):
+        result = runner.invoke(args=['db', 'optimize'])
+        if db.engine.dialect.name != 'sqlite':
+            assert result.exit_code != 0
+        else:
+            assert 'statistics refreshed' in result.output
@@ -0,0 +1,130 @@
+import json
+import numpy as np
+import pytest
+from app.extensions import db
+from app.models import Country, UserTimeline
+from app.services.timeline_service import compute_timeline, load_visits, merge_trips
+from app.utils.auth import generate_token
+
+
+def visits(*rows):
+    # rows: (user_id, country_id, start, end) with ISO dates or None
+    user_ids, country_ids, starts, ends = zip(*rows)
+    return (
+        np.array(user_ids, dtype=np.int64),
+        np.array(country_ids, dtype=np.int64),
+        np.array(starts, dtype='datetime64[D]'),
+        np.array(ends, dtype='datetime64[D]')
+    )
+
+
+@pytest.fixture
+def countries(app):
+    return dict(db.session.execute(db.select(Country.code, Country.id)).all())
+
+
+# Country codes of the longest trip come from the catalog, which needs the app
+@pytest.mark.usefixtures('app')
+class TestComputeTimeline:
+    def test_overlapping_and_adjacent_visits_are_one_trip(self, countries):
+        timeline = compute_timeline(*visits(
+            (1, countries['FR'], '2023-05-01', '2023-05-10'),
+            (1, countries['DE'], '2023-05-08', '2023-05-12'),
+            (1, countries['AT'], '2023-05-13', '2023-05-14'),
+            (1, countries['JP'], '2024-01-01', '2024-01-03')
+        ))
+        assert timeline['trips'] == 2
+        assert timeline['days_abroad'] == {
+            'total': 17,
+            'by_year': {'2023': 14, '2024': 3},
+            'by_month': {'2023-05': 14, '2024-01': 3}
+        }
+        assert timeline['longest_trip'] == {
+            'start': '2023-05-01', 'end': '2023-05-14', 'days': 14, 'countries': ['FR', 'DE', 'AT']
+        }
+
+    def test_new_countries_and_cumulative_curve(self):
+        timeline = compute_timeline(*visits(
+            (1, 1, '2019-03-01', None),
+            (1, 2, None, '2019-03-20'),
+            (1, 3, '2021-07-01', '2021-07-02'),
+            (1, 4, None, None)
+        ))
+        assert timeline['visited'] == 4
+        assert timeline['undated'] == 1
+        assert timeline['new_countries'] == {'by_year': {'2019': 2, '2021': 1}}
+        assert timeline['cumulative_countries'] == [
+            {'month': '2019-03', 'countries': 2}, {'month': '2021-07', 'countries': 3}
+        ]
+        # A single date is a one-day visit
+        assert timeline['days_abroad']['total'] == 4
+
+    def test_days_split_across_months_and_years(self):
+        timeline = compute_timeline(*visits((1, 1, '2022-12-30', '2023-01-02')))
+        assert timeline['days_abroad']['by_year'] == {'2022': 2, '2023': 2}
+        assert timeline['days_abroad']['by_month'] == {'2022-12': 2, '2023-01': 2}
+
+    def test_users_are_never_merged(self):
+        order, trip_of_visit, trip_first, trip_last = merge_trips(
+            np.array([2, 1, 1]), np.array([10, 10, 12]), np.array([12, 11, 15])
+        )
+        assert trip_first.tolist() == [10, 10]
+        assert trip_last.tolist() == [15, 12]
+        assert trip_of_visit.tolist() == [0, 0, 1]
+
+        timeline = compute_timeline(*visits((1, 1, '2023-01-01', '2023-01-05'), (2, 1, '2023-01-03', '2023-01-04')))
+        assert timeline['days_abroad']['by_month'] == {'2023-01': 7}
+
+    def test_no_dated_visits(self):
+        timeline = compute_timeline(*visits((1, 1, None, None)))
+        assert timeline['undated'] == 1
+        assert timeline['longest_trip'] is None
+        assert compute_timeline(*load_visits(user_id=-1))['visited'] == 0
+
+
+class TestTimelineApi:
+    def test_rebuilt_on_the_read_after_a_write(self, client, sample_user, countries):
+        headers = {'Authorization': f'Bearer {generate_token(sample_user.id)}'}
+        client.post('/api/marked-countries/mark', headers=headers, json={
+            'country_id': countries['BR'], 'status': 'visited',
+            'visit_start_date': '2022-02-01', 'visit_end_date': '2022-02-10'
+        })
+        # Writes only drop the stored timeline
+        assert db.session.get(UserTimeline, sample_user.id) is None
+        assert client.get('/api/statistics/my/timeline', headers=headers).get_json()['days_abroad']['total'] == 10
+        stored = json.loads(db.session.get(UserTimeline, sample_user.id).data)
+        assert stored['days_abroad']['total'] == 10
+
+        client.post('/api/marked-countries/mark', headers=headers, json={'country_id': countries['BR'], 'status': 'wishlist'})
+        response = client.get('/api/statistics/my/timeline', headers=headers)
+        assert response.status_code == 200
+        assert response.get_json()['visited'] == 0
+
+    def test_backfilled_on_first_read(self, client, sample_user):
+        headers = {'Authorization': f'Bearer {generate_token(sample_user.id)}'}
+        assert db.session.get(UserTimeline, sample_user.id) is None
+        assert client.get('/api/statistics/my/timeline', headers=headers).get_json()['trips'] == 0
+        assert db.session.get(UserTimeline, sample_user.id) is not None
+
+    def test_all_users_command(self, app, runner, sample_user, countries, tmp_path):
+        from app.models import MarkedCountry, User
+        from datetime import date
+        other = User(email='other@example.com', name='Other')
+        db.session.add(other)
+        db.session.commit()
+        db.session.add_all([
+            MarkedCountry(user_id=sample_user.id, country_id=countries['FR'], status='visited',
+                          visit_start_date=date(2020, 1, 1), visit_end_date=date(2020, 1, 3)),
+            MarkedCountry(user_id=other.id, country_id=countries['FR'], status='visited',
+                          visit_start_date=date(2020, 1, 2), visit_end_date=date(2020, 1, 2)),
+            MarkedCountry(user_id=other.id, country_id=countries['IT'], status='wishlist')
+        ])
+        db.session.commit()
+
+        output = tmp_path / 'timeline.json'
+        result = runner.invoke(args=['marks', 'timeline', '--output', str(output)])
+        assert result.exit_code == 0, result.output
+        timeline = json.loads(output.read_text())
+        assert timeline['users'] == 2
+        assert timeline['new_countries']['by_year'] == {'2020': 2}
+        assert timeline['days_abroad']['by_month'] == {'2020-01': 4}
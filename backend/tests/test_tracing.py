@@ -0,0 +1,170 @@
+import json
+import pytest
+from app.api import auth as auth_api
+from app.extensions import db
+from app.utils.tracing import (
+    KIND_CLIENT, KIND_SERVER, NOOP_SPAN, create_exporter, format_traceparent, parse_traceparent,
+    should_sample, span
+)
+
+TRACE_ID = 0x4bf92f3577b34da6a3ce929d0e0e4736
+PARENT_ID = 0x00f067aa0ba902b7
+
+
+def exporter(app):
+    return app.extensions['tracing_exporter']
+
+
+def auth_headers(token, **extra):
+    return {'Authorization': f'Bearer {token}', **extra}
+
+
+class TestTraceContext:
+    def test_parse_and_format(self):
+        header = '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01'
+        assert parse_traceparent(header) == (TRACE_ID, PARENT_ID, True)
+        assert format_traceparent(TRACE_ID, PARENT_ID) == header
+        assert parse_traceparent(format_traceparent(TRACE_ID, PARENT_ID, sampled=False))[2] is False
+
+    def test_invalid_headers_are_ignored(self):
+        for header in (
+            None, '', 'garbage', '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7',
+            'ff-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01',
+            '00-00000000000000000000000000000000-00f067aa0ba902b7-01',
+            '00-4bf92f3577b34da6a3ce929d0e0e4736-zzf067aa0ba902b7-01',
+            '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01-extra'
+        ):
+            assert parse_traceparent(header) is None
+        # Future versions may append fields
+        assert parse_traceparent('01-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01-extra') is not None
+
+    def test_sampling_by_trace_id(self):
+        assert should_sample(TRACE_ID, 1.0) and not should_sample(TRACE_ID, 0.0)
+        sampled = sum(should_sample(trace_id * 0x9E3779B97F4A7C15, 0.25) for trace_id in range(1, 10001))
+        assert 2000 < sampled < 3000
+        assert should_sample(TRACE_ID, 0.5) == should_sample(TRACE_ID, 0.5)
+
+    def test_span_outside_a_trace_is_a_noop(self):
+        with span('anything') as current:
+            assert current is NOOP_SPAN
+
+
+class TestDisabled:
+    def test_nothing_installed_without_exporter(self, app, client, auth_token):
+        assert app.extensions['tracing_exporter'] is None
+        response = client.get('/api/auth/me', headers=auth_headers(auth_token))
+        assert response.status_code == 200
+        assert 'X-Trace-Id' not in response.headers
+
+
+@pytest.mark.app_config(TRACING_EXPORTER='memory', TRACING_SAMPLE_RATE=1.0)
+class TestRequestSpans:
+    def test_request_phases(self, app, client, auth_token, sample_user):
+        # The lookup must reach the database, not the identity map
+        db.session.expunge_all()
+        response = client.get('/api/auth/me', headers=auth_headers(auth_token))
+        assert response.status_code == 200
+
+        spans = {span.name: span for span in exporter(app).spans}
+        root = spans['GET /api/auth/me']
+        assert root.kind == KIND_SERVER and root.parent_id is None
+        assert root.attributes['http.response.status_code'] == 200
+        assert response.headers['X-Trace-Id'] == f'{root.trace.trace_id:032x}'
+
+        lookup = spans['auth.user_lookup']
+        assert lookup.attributes['enduser.id'] == sample_user.id
+        select = [span for span in exporter(app).spans if span.parent is lookup]
+        assert [span.kind for span in select] == [KIND_CLIENT]
+        assert select[0].attributes['db.system'] == 'sqlite'
+        assert select[0].attributes['db.statement'].startswith('SELECT')
+        # Decoded once: the limiter's check and the view share the result
+        assert len(exporter(app).find('auth.verify_token')) == 1
+        assert spans['json.serialize'].parent is root
+        assert all(span.trace is root.trace and span.start <= span.end for span in exporter(app).spans)
+
+    def test_invalid_token_is_recorded(self, app, client):
+        client.get('/api/auth/me', headers=auth_headers('not-a-token'))
+        assert exporter(app).find('auth.verify_token')[0].attributes['auth.error'] == 'invalid'
+
+    def test_batch_sub_requests_share_the_trace(self, app, client, auth_token):
+        client.get('/api/bootstrap', headers=auth_headers(auth_token))
+        roots = [span for span in exporter(app).spans if span.parent is None]
+        assert [span.name for span in roots] == ['GET /api/bootstrap']
+        children = {span.name for span in exporter(app).spans if span.parent is roots[0] and span.kind == KIND_SERVER}
+        assert children == {'GET /api/auth/me', 'GET /api/countries', 'GET /api/marked-countries/my'}
+
+    def test_span_limit(self, app, client, auth_token):
+        app.config['TRACING_MAX_SPANS'] = 2
+        client.get('/api/marked-countries/my', headers=auth_headers(auth_token))
+        spans = list(exporter(app).spans)
+        assert len(spans) == 3
+        assert spans[-1].attributes['tracing.dropped_spans'] > 0
+
+    def test_google_verification_propagates_context(self, app, client, monkeypatch):
+        calls = []
+
+        class Response:
+            status_code = 400
+
+        def fake_get(url, headers=None):
+            calls.append(headers)
+            return Response()
+
+        monkeypatch.setattr(auth_api.requests, 'get', fake_get)
+        response = client.post('/api/auth/google/verify', json={'id_token': 'secret-id-token'})
+        assert response.status_code == 401
+
+        google = exporter(app).find('auth.google_verify')[0]
+        assert google.kind == KIND_CLIENT
+        assert google.attributes['http.response.status_code'] == 400
+        assert 'secret-id-token' not in json.dumps(google.to_otlp())
+        assert parse_traceparent(calls[0]['traceparent']) == (google.trace.trace_id, google.span_id, True)
+
+
+@pytest.mark.app_config(TRACING_EXPORTER='memory', TRACING_SAMPLE_RATE=0.0)
+class TestSampling:
+    def test_unsampled_requests_record_nothing(self, app, client, auth_token):
+        response = client.get('/api/auth/me', headers=auth_headers(auth_token))
+        assert response.status_code == 200
+        assert len(exporter(app).spans) == 0
+        assert 'X-Trace-Id' not in response.headers
+
+    def test_incoming_context_is_continued(self, app, client, auth_token):
+        client.get('/api/auth/me', headers=auth_headers(auth_token, traceparent=format_traceparent(TRACE_ID, PARENT_ID)))
+        root = exporter(app).find('GET /api/auth/me')[0]
+        assert root.trace.trace_id == TRACE_ID
+        assert root.parent_id == PARENT_ID
+
+    def test_unsampled_parent_is_respected(self, app, client, auth_token):
+        headers = auth_headers(auth_token, traceparent=format_traceparent(TRACE_ID, PARENT_ID, sampled=False))
+        client.get('/api/auth/me', headers=headers)
+        assert len(exporter(app).spans) == 0
+
+
+class TestFileExporter:
+    @pytest.mark.app_config(TRACING_EXPORTER='file', TRACING_SAMPLE_RATE=1.0)
+    def test_otlp_json_lines(self, app, client, auth_token, tmp_path):
+        trace_file = exporter(app).path = str(tmp_path / 'traces.jsonl')
+        client.get('/api/auth/me', headers=auth_headers(auth_token))
+        client.get('/api/countries')
+
+        lines = [json.loads(line) for line in open(trace_file)]
+        assert len(lines) == 2
+        resource_spans = lines[0]['resourceSpans'][0]
+        assert resource_spans['resource']['attributes'] == [
+            {'key': 'service.name', 'value': {'stringValue': 'travel-map-tracker'}}
+        ]
+        spans = resource_spans['scopeSpans'][0]['spans']
+        root = next(span for span in spans if 'parentSpanId' not in span)
+        assert root['name'] == 'GET /api/auth/me'
+        assert {span['traceId'] for span in spans} == {root['traceId']}
+        assert len(root['traceId']) == 32 and len(root['spanId']) == 16
+        status = next(attribute for attribute in root['attributes'] if attribute['key'] == 'http.response.status_code')
+        assert status['value'] == {'intValue': '200'}
+
+    def test_default_path_is_in_instance(self, app):
+        app.config.update({'TRACING_EXPORTER': 'file', 'TRACING_FILE': None})
+        assert create_exporter(app).path == f'{app.instance_path}/traces.jsonl'
+        app.config['TRACING_EXPORTER'] = 'zipkin'
+        with pytest.raises(ValueError):
+            create_exporter(app)
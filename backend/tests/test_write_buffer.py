@@ -0,0 +1,158 @@
+import time
+import pytest
+from sqlalchemy import event
+from app.extensions import db, events
+from app.models import Country, MarkedCountry
+from app.services import write_buffer
+from app.services.write_buffer import MarkWriteBuffer
+from app.utils.auth import generate_token
+
+
+@pytest.fixture
+def buffer(app):
+    buffer = MarkWriteBuffer(app, window=60, max_pending=50)
+    app.extensions['mark_buffer'] = buffer
+    yield buffer
+    buffer._stop.set()
+    app.extensions.pop('mark_buffer')
+
+
+@pytest.fixture
+def headers(sample_user):
+    return {'Authorization': f'Bearer {generate_token(sample_user.id)}'}
+
+
+@pytest.fixture
+def countries(app):
+    return dict(db.session.execute(db.select(Country.code, Country.id)).all())
+
+
+def mark(client, headers, country_id, status):
+    return client.post('/api/marked-countries/mark', headers=headers, json={'country_id': country_id, 'status': status})
+
+
+def stored(user_id):
+    return dict(db.session.execute(
+        db.select(MarkedCountry.country_id, MarkedCountry.status).where(MarkedCountry.user_id == user_id)
+    ).all())
+
+
+class TestMarkWriteBuffer:
+    def test_marks_are_coalesced_into_one_write(self, client, buffer, headers, sample_user, countries):
+        user_id = sample_user.id
+        for code, status in [('BR', 'wishlist'), ('FR', 'visited'), ('BR', 'visited')]:
+            response = mark(client, headers, countries[code], status)
+            assert response.status_code == 202
+            assert response.get_json()['marked_country']['country_code'] == code
+        assert stored(user_id) == {}
+        assert len(buffer.pending(user_id)) == 2
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            assert buffer.flush(user_id) == 2
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        assert len([statement for statement in statements if 'INSERT INTO marked_countries' in statement]) == 1
+        assert stored(user_id) == {countries['BR']: 'visited', countries['FR']: 'visited'}
+
+    def test_reads_see_buffered_writes(self, client, buffer, headers, countries):
+        mark(client, headers, countries['JP'], 'visited')
+        response = client.get('/api/marked-countries/my', headers=headers)
+        assert [item['country_code'] for item in response.get_json()] == ['JP']
+
+        mark(client, headers, countries['JP'], 'wishlist')
+        response = client.get('/api/marked-countries/my/wishlist', headers=headers)
+        assert [item['country_code'] for item in response.get_json()] == ['JP']
+
+        state = client.get('/api/marked-countries/my/state', headers=headers).get_json()['state']
+        mark(client, headers, countries['JP'], 'visited')
+        assert client.get('/api/marked-countries/my/state', headers=headers).get_json()['state'] != state
+
+    def test_flushes_after_window(self, client, buffer, headers, sample_user, countries):
+        mark(client, headers, countries['PE'], 'visited')
+        assert buffer.flush_due(now=time.monotonic()) == 0
+        assert buffer.flush_due(now=time.monotonic() + 61) == 1
+        assert stored(sample_user.id) == {countries['PE']: 'visited'}
+
+    def test_background_flush(self, app, client, headers, sample_user, countries):
+        buffer = MarkWriteBuffer(app, window=0.05)
+        app.extensions['mark_buffer'] = buffer
+        try:
+            mark(client, headers, countries['CL'], 'visited')
+            user_id, deadline = sample_user.id, time.monotonic() + 5
+            while not stored(user_id) and time.monotonic() < deadline:
+                # End the read transaction so the flusher thread can write
+                db.session.remove()
+                time.sleep(0.02)
+            assert stored(user_id) == {countries['CL']: 'visited'}
+        finally:
+            buffer._stop.set()
+            app.extensions.pop('mark_buffer')
+
+    def test_full_buffer_flushes_immediately(self, client, buffer, headers, sample_user, countries):
+        buffer.max_pending = 2
+        mark(client, headers, countries['AR'], 'visited')
+        assert stored(sample_user.id) == {}
+        mark(client, headers, countries['UY'], 'visited')
+        assert len(stored(sample_user.id)) == 2
+        assert buffer.pending(sample_user.id) == {}
+
+    def test_failed_flush_keeps_marks_for_retry(self, client, buffer, headers, sample_user, countries, monkeypatch):
+        user_id = sample_user.id
+        mark(client, headers, countries['IT'], 'wishlist')
+
+        def failing(user_id, marks):
+            # A newer click for the same country arrives while the write is failing
+            buffer.add(user_id, countries['IT'], 'visited')
+            raise RuntimeError('database is locked')
+        monkeypatch.setattr(write_buffer, 'upsert_marks', failing)
+        assert buffer.flush_due(now=float('inf')) == 0
+        assert buffer.pending(user_id)[countries['IT']][0] == 'visited'
+
+        monkeypatch.undo()
+        assert buffer.flush(user_id) == 1
+        assert stored(user_id) == {countries['IT']: 'visited'}
+
+    def test_marks_that_keep_failing_are_dropped(self, client, buffer, headers, sample_user, countries, monkeypatch):
+        user_id = sample_user.id
+        subscription = events.subscribe(user_id)
+        mark(client, headers, countries['IT'], 'visited')
+
+        def failing(user_id, marks):
+            raise RuntimeError('FOREIGN KEY constraint failed')
+        monkeypatch.setattr(write_buffer, 'upsert_marks', failing)
+        for _ in range(buffer.max_failures - 1):
+            assert buffer.flush_due(now=float('inf')) == 0
+            assert countries['IT'] in buffer.pending(user_id)
+        assert buffer.flush_due(now=float('inf')) == 0
+        assert buffer.pending(user_id) == {}
+
+        # The 202 was already published as a mark; the clients are told to refetch
+        assert [event[1] for event in subscription.wait(0)] == ['mark', 'reset']
+        subscription.close()
+        monkeypatch.undo()
+        assert buffer.flush_all() == 0
+        assert stored(user_id) == {}
+
+    def test_close_flushes_everything(self, client, buffer, headers, sample_user, countries):
+        mark(client, headers, countries['DE'], 'visited')
+        assert buffer.close() == 1
+        assert stored(sample_user.id) == {countries['DE']: 'visited'}
+
+    def test_unmark_sees_buffered_mark(self, client, buffer, headers, sample_user, countries):
+        mark(client, headers, countries['ES'], 'visited')
+        response = client.post('/api/marked-countries/unmark', headers=headers, json={'country_id': countries['ES']})
+        assert response.status_code == 200
+        assert stored(sample_user.id) == {}
+
+    def test_account_deletion_discards_buffer(self, client, buffer, headers, sample_user, countries):
+        mark(client, headers, countries['GR'], 'visited')
+        assert client.delete('/api/auth/users/me', headers=headers).status_code == 202
+        assert buffer.pending(sample_user.id) == {}
+        assert stored(sample_user.id) == {}
+
+    def test_disabled_by_default(self, client, headers, sample_user, countries):
+        assert mark(client, headers, countries['NO'], 'visited').status_code == 201
+        assert stored(sample_user.id) == {countries['NO']: 'visited'}
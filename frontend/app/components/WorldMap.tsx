@@ -7,6 +7,8 @@ import CountryModal from './CountryModal';
 import CountryManagementModal from './CountryManagementModal';
 import { useTheme } from '../hooks/useTheme';
 import { useCountryData } from '../hooks/useCountryData';
+import { API_BASE_URL } from '../utils/api';
+import { isTopology, topologyToGeoJSON } from '../utils/topology';
 import { Plus } from 'lucide-react';
 import './WorldMap.css';
 
@@ -77,7 +79,7 @@ function MapContent({ onCountryClick, onCountrySelect, getCountryStatus, visited
   }, [map]);
 
   const fetchWorldData = async (retryCount = 0): Promise<any> => {
-    const maxRetries = 1;
+    const maxRetries = 2;
     const retryDelay = 1000;
 
     try {
@@ -91,6 +93,7 @@ function MapContent({ onCountryClick, onCountrySelect, getCountryStatus, visited
       console.log(`Fetching world data (attempt ${retryCount + 1})`);
 
       const urls = [
+        `${API_BASE_URL}/geometry/medium.json`,
         '/world.geojson',
         'https://raw.githubusercontent.com/holtzy/D3-graph-gallery/master/DATA/world.geojson',
       ];
@@ -109,7 +112,8 @@ function MapContent({ onCountryClick, onCountrySelect, getCountryStatus, visited
         throw new Error(`HTTP error! status: ${response.status}`);
       }
 
-      const data = await response.json();
+      const body = await response.json();
+      const data = isTopology(body) ? topologyToGeoJSON(body) : body;
 
       // Cache the data
       worldDataCache = data;
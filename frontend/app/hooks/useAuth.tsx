@@ -1,7 +1,7 @@
 import { createContext, useContext, useState, useEffect } from 'react';
 import type { ReactNode } from 'react';
 import { useNavigate } from 'react-router';
-import { api } from '../utils/api';
+import { api, bootstrap } from '../utils/api';
 
 export interface User {
   id: number;
@@ -32,6 +32,8 @@ export function AuthProvider({ children }: { children: ReactNode }) {
     // Check if user is already logged in
     const token = localStorage.getItem('auth_token');
     if (token) {
+      // One request for the user, countries and marks; the hooks below pick up their parts
+      bootstrap();
       // Verify token and get user info
       api.get<User>('/auth/me')
         .then((userData) => {
@@ -193,6 +193,43 @@ describe('useCountryData', () => {
       status: 'visited',
     });
   });
-});
 
+  it('should open the live updates stream with a ticket, not the auth token', async () => {
+    const urls: string[] = [];
+    class FakeEventSource {
+      static CLOSED = 2;
+      readyState = 0;
+      constructor(url: string) {
+        urls.push(url);
+      }
+      addEventListener() {}
+      close() {}
+    }
+    vi.stubGlobal('EventSource', FakeEventSource);
+    localStorage.setItem('auth_token', 'login-token');
+    vi.mocked(api.get).mockResolvedValue([]);
+    vi.mocked(api.post).mockResolvedValue({ ticket: 'stream-ticket' });
+
+    const { unmount } = renderHook(() => useCountryData(), {
+      wrapper: ({ children }) => (
+        <BrowserRouter>
+          <AuthProvider>
+            <CountryDataProvider>{children}</CountryDataProvider>
+          </AuthProvider>
+        </BrowserRouter>
+      ),
+    });
+
+    await waitFor(() => {
+      expect(urls).toHaveLength(1);
+    });
 
+    expect(api.post).toHaveBeenCalledWith('/events/ticket');
+    expect(urls[0]).toContain('/events/stream?ticket=stream-ticket');
+    expect(urls[0]).not.toContain('login-token');
+
+    unmount();
+    localStorage.removeItem('auth_token');
+    vi.unstubAllGlobals();
+  });
+});
@@ -1,6 +1,6 @@
-import { useState, useEffect, createContext, useContext } from 'react';
+import { useState, useEffect, useRef, createContext, useContext } from 'react';
 import type { ReactNode } from 'react';
-import { api } from '../utils/api';
+import { api, API_BASE_URL } from '../utils/api';
 import { useAuth } from './useAuth';
 
 interface CountryDataContextType {
@@ -146,6 +146,55 @@ export function CountryDataProvider({ children }: { children: ReactNode }) {
     }
   };
 
+  const refreshRef = useRef(refreshMarkedCountries);
+  refreshRef.current = refreshMarkedCountries;
+
+  // Live updates from the user's other tabs and devices. EventSource reconnects on its own
+  // and sends Last-Event-ID, so the server replays whatever was missed in between.
+  // It can't send headers, so the URL carries a short-lived stream ticket, never the auth
+  // token. Once the ticket has expired the browser's reconnect is refused and gives up
+  // (CLOSED): then a fresh ticket is fetched, resuming from the last event seen
+  useEffect(() => {
+    if (authLoading || !isAuthenticated || typeof EventSource === 'undefined') return;
+
+    let source: EventSource | null = null;
+    let retry: ReturnType<typeof setTimeout> | undefined;
+    let lastEventId = '';
+    let stopped = false;
+
+    const refresh = (event: Event) => {
+      lastEventId = (event as MessageEvent).lastEventId || lastEventId;
+      refreshRef.current();
+    };
+
+    const connect = async () => {
+      try {
+        const { ticket } = await api.post<{ ticket: string | null }>('/events/ticket');
+        // null: streams are switched off on the server
+        if (stopped || !ticket) return;
+        const params = new URLSearchParams({ ticket });
+        if (lastEventId) params.set('last_event_id', lastEventId);
+        source = new EventSource(`${API_BASE_URL}/events/stream?${params}`);
+        ['mark', 'unmark', 'sync', 'reset'].forEach((type) => source!.addEventListener(type, refresh));
+        source.addEventListener('error', () => {
+          if (source?.readyState !== EventSource.CLOSED) return;
+          source.close();
+          retry = setTimeout(connect, 3000);
+        });
+      } catch (error) {
+        console.error('Error opening the live updates stream:', error);
+        if (!stopped) retry = setTimeout(connect, 30000);
+      }
+    };
+    connect();
+
+    return () => {
+      stopped = true;
+      clearTimeout(retry);
+      source?.close();
+    };
+  }, [isAuthenticated, authLoading]);
+
   const updateCountry = async (countryName: string, status: 'visited' | 'wishlist' | null, visitStartDate?: string, visitEndDate?: string) => {
     if (!isAuthenticated) {
       setError('User not authenticated');
@@ -2,7 +2,7 @@
  * API utility functions for authenticated requests
  */
 
-const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:5001/api';
+export const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:5001/api';
 
 export interface ApiError {
   error: string;
@@ -36,8 +36,46 @@ export async function apiRequest<T>(
   return response.json();
 }
 
+interface BatchResponse {
+  status: number;
+  body: any;
+}
+
+// GET /bootstrap answers the home page's first calls in one round trip
+const BOOTSTRAP_ENDPOINTS: Record<string, string> = {
+  '/auth/me': 'me',
+  '/countries': 'countries',
+  '/marked-countries/my': 'marked_countries',
+};
+
+let bootstrapResponses: Promise<Record<string, BatchResponse>> | null = null;
+const unusedBootstrapEndpoints = new Set<string>();
+
+export function bootstrap() {
+  bootstrapResponses = apiRequest<{ responses: Record<string, BatchResponse> }>('/bootstrap')
+    .then((result) => result.responses)
+    .catch(() => ({}));
+  Object.keys(BOOTSTRAP_ENDPOINTS).forEach((endpoint) => unusedBootstrapEndpoints.add(endpoint));
+}
+
+// Each bootstrapped response is used once; later calls (refreshes) go to the API
+async function fromBootstrap<T>(endpoint: string): Promise<T | undefined> {
+  if (!bootstrapResponses || !unusedBootstrapEndpoints.delete(endpoint)) {
+    return undefined;
+  }
+  const entry = (await bootstrapResponses)[BOOTSTRAP_ENDPOINTS[endpoint]];
+  if (!entry) {
+    return undefined;
+  }
+  if (entry.status >= 400) {
+    throw new Error(entry.body?.error || `HTTP error! status: ${entry.status}`);
+  }
+  return entry.body as T;
+}
+
 export const api = {
-  get: <T>(endpoint: string) => apiRequest<T>(endpoint, { method: 'GET' }),
+  get: async <T>(endpoint: string) =>
+    (await fromBootstrap<T>(endpoint)) ?? apiRequest<T>(endpoint, { method: 'GET' }),
   post: <T>(endpoint: string, data?: unknown) =>
     apiRequest<T>(endpoint, {
       method: 'POST',
@@ -0,0 +1,58 @@
+/**
+ * Decodes the quantized TopoJSON served by /api/geometry into GeoJSON
+ */
+
+interface Topology {
+  type: 'Topology';
+  transform: { scale: [number, number]; translate: [number, number] };
+  objects: Record<string, { type: 'GeometryCollection'; geometries: TopologyGeometry[] }>;
+  arcs: number[][][];
+}
+
+interface TopologyGeometry {
+  type: 'MultiPolygon';
+  id?: string;
+  arcs: number[][][];
+  properties: Record<string, unknown>;
+}
+
+export function isTopology(data: any): data is Topology {
+  return data?.type === 'Topology';
+}
+
+export function topologyToGeoJSON(topology: Topology, objectName = 'countries') {
+  const { scale: [kx, ky], translate: [dx, dy] } = topology.transform;
+
+  // Arcs are delta-encoded on an integer grid
+  const arcs = topology.arcs.map((arc) => {
+    let x = 0;
+    let y = 0;
+    return arc.map(([px, py]) => {
+      x += px;
+      y += py;
+      return [x * kx + dx, y * ky + dy];
+    });
+  });
+
+  const ring = (indexes: number[]) => {
+    const points: number[][] = [];
+    indexes.forEach((index) => {
+      const arc = index >= 0 ? arcs[index] : arcs[~index].slice().reverse();
+      points.push(...(points.length ? arc.slice(1) : arc));
+    });
+    return points;
+  };
+
+  return {
+    type: 'FeatureCollection',
+    features: topology.objects[objectName].geometries.map((geometry) => ({
+      type: 'Feature',
+      id: geometry.id,
+      properties: geometry.properties,
+      geometry: {
+        type: 'MultiPolygon',
+        coordinates: geometry.arcs.map((polygon) => polygon.map(ring)),
+      },
+    })),
+  };
+}